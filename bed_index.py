@@ -0,0 +1,319 @@
+#!/usr/bin/python
+
+"""
+This module indexes the regions of a BED file for the scripts that filter variants to regions, and computes the number
+of bases of the region BED files of the benchmarking workflow (truthWholeExomeBED, truthCodingExonsBED).
+
+The regions of each chromosome are sorted and merged, so containment and overlap queries are a binary search, and the
+number of bases is the total length of the merged regions.  Run as a script, it creates the number_of_bases file of
+benchmarking_truth_set.py from a manifest of BED files:
+
+    #case   whole exome BED                                   coding exons BED
+    NA12878 HG001_..._refseqWholeExomemerged_chrRemoved.bed   HG001_..._refseqCodingExonsmerged_chrRemoved.bed
+
+The number of bases only depends on the content of the BED file, so it can be cached by the BED file's content hash
+(-c), the same way indel_distribution.py caches the indel distribution of a truth VCF file.
+"""
+
+import argparse
+import bisect
+import os
+import tempfile
+
+import bgzf
+
+
+class BedIndex(object):
+    """
+    The merged regions of a BED file.  Positions are 0-based and ranges are half-open, as in the BED format.
+    """
+
+    def __init__(self, bed_file):
+        """
+        This function reads the BED file and merges the overlapping and adjacent regions of each chromosome.
+
+        :param bed_file: The BED file
+        :type bed_file: str
+        """
+        intervals = dict()
+
+        with open(bed_file, 'r') as infile_obj:
+            for line in infile_obj:
+                if line.startswith('#') or line.startswith('track') or line.startswith('browser') or not line.strip():
+                    continue
+
+                line_items = line.split('\t', 3)
+                intervals.setdefault(line_items[0], list()).append((int(line_items[1]), int(line_items[2])))
+
+        self.starts = dict()
+        self.ends = dict()
+        self.offsets = dict()  # offsets[chrom][i] = number of bases in the regions before region i
+
+        for chrom, chrom_intervals in intervals.items():
+            starts = list()
+            ends = list()
+
+            for start, end in sorted(chrom_intervals):
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+
+            offsets = [0]
+
+            for start, end in zip(starts, ends):
+                offsets.append(offsets[-1] + end - start)
+
+            self.starts[chrom] = starts
+            self.ends[chrom] = ends
+            self.offsets[chrom] = offsets
+
+    def get_chroms(self):
+        """
+        This function returns the chromosomes that have regions.
+
+        :rtype: list
+        """
+        return sorted(self.starts)
+
+    def get_regions(self, chrom):
+        """
+        This function returns the merged regions of a chromosome.
+
+        :param chrom: The chromosome
+        :type chrom: str
+
+        :return: List of (start, end) tuples
+        :rtype: list
+        """
+        return list(zip(self.starts.get(chrom, []), self.ends.get(chrom, [])))
+
+    def get_length(self, chrom=None):
+        """
+        This function returns the number of bases in the regions of a chromosome, or of all the chromosomes.
+
+        :param chrom: The chromosome, or None
+        :type chrom: str
+
+        :rtype: int
+        """
+        if chrom is None:
+            return sum(offsets[-1] for offsets in self.offsets.values())
+        elif chrom in self.offsets:
+            return self.offsets[chrom][-1]
+        else:
+            return 0
+
+    def contains(self, chrom, pos):
+        """
+        This function returns True if the position is in a region.
+
+        :param chrom: The chromosome
+        :type chrom: str
+        :param pos: The 0-based position
+        :type pos: int
+
+        :rtype: bool
+        """
+        return self.overlaps(chrom, pos, pos + 1)
+
+    def overlaps(self, chrom, start, end):
+        """
+        This function returns True if the range overlaps a region.
+
+        :param chrom: The chromosome
+        :type chrom: str
+        :param start: The range start
+        :type start: int
+        :param end: The range end
+        :type end: int
+
+        :rtype: bool
+        """
+        starts = self.starts.get(chrom)
+
+        if starts is None or start >= end:
+            return False
+
+        index = bisect.bisect_left(starts, end) - 1
+
+        return index >= 0 and self.ends[chrom][index] > start
+
+    def get_overlap_length(self, chrom, start, end):
+        """
+        This function returns the number of bases of the range that are in the regions.
+
+        :param chrom: The chromosome
+        :type chrom: str
+        :param start: The range start
+        :type start: int
+        :param end: The range end
+        :type end: int
+
+        :rtype: int
+        """
+        starts = self.starts.get(chrom)
+
+        if starts is None or start >= end:
+            return 0
+
+        ends = self.ends[chrom]
+        offsets = self.offsets[chrom]
+        first = bisect.bisect_right(ends, start)  # the first region that ends after the range start
+        last = bisect.bisect_left(starts, end)  # the regions before this one start before the range end
+
+        if first >= last:
+            return 0
+
+        return offsets[last] - offsets[first] - max(0, start - starts[first]) - max(0, ends[last - 1] - end)
+
+
+def get_bed_length(bed_file, cache_dir=None):
+    """
+    This function returns the number of bases in the merged regions of a BED file.  With a cache directory, the number
+    is looked up by the content hash of the BED file first and stored there after it is computed.
+
+    :param bed_file: The BED file
+    :type bed_file: str
+    :param cache_dir: The cache directory, or None
+    :type cache_dir: str
+
+    :rtype: int
+    """
+    if cache_dir is None:
+        return BedIndex(bed_file).get_length()
+
+    cached_file = os.path.join(cache_dir, bgzf.get_file_hash(bed_file) + '_numberOfBases.txt')
+
+    if os.path.isfile(cached_file):
+        with open(cached_file, 'r') as infile_obj:
+            return int(infile_obj.read().strip())
+
+    length = BedIndex(bed_file).get_length()
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    # write then rename, so concurrent runs never see a partial cache entry
+    temp_fd, temp_file = tempfile.mkstemp(dir=cache_dir)
+
+    with os.fdopen(temp_fd, 'w') as outfile_obj:
+        outfile_obj.write('{}\n'.format(length))
+
+    os.rename(temp_file, cached_file)
+
+    return length
+
+
+def read_bed_manifest(manifest):
+    """
+    This function reads a manifest of BED files, which has three tab delimited columns: the case name, the whole exome
+    BED file and the coding exons BED file.  Relative paths are relative to the manifest.
+
+    :param manifest: The manifest file
+    :type manifest: str
+
+    :return: List of tuples of (case name, whole exome BED file, coding exons BED file)
+    :rtype: list
+    """
+    manifest_dir = os.path.dirname(manifest)
+    cases = list()
+
+    with open(manifest, 'r') as infile_obj:
+        for line in infile_obj:
+            if line.startswith('#') or not line.strip():
+                continue
+
+            line_items = line.strip().split('\t')
+            cases.append((line_items[0], os.path.join(manifest_dir, line_items[1]),
+                          os.path.join(manifest_dir, line_items[2])))
+
+    return cases
+
+
+def get_number_of_bases(manifest, cache_dir=None):
+    """
+    This function returns the number of bases of the whole exome and coding exons BED files of each case in the
+    manifest.  A BED file shared by several cases is read once.
+
+    :param manifest: The manifest file
+    :type manifest: str
+    :param cache_dir: The cache directory, or None
+    :type cache_dir: str
+
+    :return: Two dictionaries: one has key = case and value = number of bases in the whole exome; the other has
+    key = case and value = number of bases in coding exon
+    :rtype: tuple
+    """
+    lengths = dict()
+    num_bases_whole_exome_dict = dict()
+    num_bases_coding_exons_dict = dict()
+
+    for case, whole_exome_bed, coding_exons_bed in read_bed_manifest(manifest):
+        for bed_file in (whole_exome_bed, coding_exons_bed):
+            if bed_file not in lengths:
+                lengths[bed_file] = get_bed_length(bed_file, cache_dir)
+
+        num_bases_whole_exome_dict[case] = lengths[whole_exome_bed]
+        num_bases_coding_exons_dict[case] = lengths[coding_exons_bed]
+
+    return num_bases_whole_exome_dict, num_bases_coding_exons_dict
+
+
+def write_number_of_bases(num_bases_whole_exome_dict, num_bases_coding_exons_dict, output_file):
+    """
+    This function writes the number_of_bases file of benchmarking_truth_set.py.
+
+    :param num_bases_whole_exome_dict: Dictionary with key = case and value = number of bases in the whole exome
+    :type num_bases_whole_exome_dict: dict
+    :param num_bases_coding_exons_dict: Dictionary with key = case and value = number of bases in coding exon
+    :type num_bases_coding_exons_dict: dict
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    with open(output_file, 'w') as outfile_obj:
+        outfile_obj.write('#case\twe\tce\n')
+
+        for case in sorted(num_bases_whole_exome_dict):
+            outfile_obj.write('{}\t{}\t{}\n'.format(case, num_bases_whole_exome_dict[case],
+                                                    num_bases_coding_exons_dict[case]))
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It writes the number_of_bases file from a manifest of BED files, or prints the number
+    of bases of BED files.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-m", "--manifest", help="Tab delimited file with the case name, the whole exome BED file and "
+                                                "the coding exons BED file of each case")
+    group.add_argument("-b", "--bed", nargs='+', help="BED files; the number of bases of each is printed")
+    parser.add_argument("-o", "--output", default='number_of_bases.txt',
+                        help="The number_of_bases output file, with -m; default is number_of_bases.txt")
+    parser.add_argument("-c", "--cache-dir", help="The cache directory; default is no cache")
+
+    args = parser.parse_args()
+
+    if args.bed:
+        for bed_file in args.bed:
+            print '{}\t{}'.format(bed_file, get_bed_length(bed_file, args.cache_dir))
+    else:
+        num_bases_whole_exome_dict, num_bases_coding_exons_dict = get_number_of_bases(args.manifest, args.cache_dir)
+        write_number_of_bases(num_bases_whole_exome_dict, num_bases_coding_exons_dict, args.output)
+
+        print 'Output file created. It can be found at', args.output
+
+
+if __name__ == '__main__':
+    main()
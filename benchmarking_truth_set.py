@@ -2,115 +2,143 @@
 
 """
 This script creates a file with the benchmarking metrics for the NIST sample truth sets.
+
+It can also be imported: run() creates the output files from an input directory, and the functions that discover,
+parse and write the metrics take their options as arguments, so importing the module has no side effects.
+
+With --callable-bases, TN is computed from the callable reference bases of the query gVCF files (callable_bases.py)
+instead of the number of bases, and the TN column of the tab delimited output is renamed from
+'TN = TotalBases - (TP + FN + FP)' to 'TN = CallableReferenceBases - FN'.  Parsers of the output that key on the TN
+column name must accept both names.
+
+With --history, the metrics of each run are added to a SQLite history file, which metrics_history.py queries for the
+deltas between runs and the trend of a case.
+
+The extended.csv files are read by happy_outputs.py, which keeps the metrics of all their rows; with --subtypes, the
+metrics of the subtypes (Alleles.DEL, SNP.het, ...) are written from the same parse, and with --check-outputs, the
+other outputs of hap.py are checked against the extended.csv files.
 """
 
 import argparse
+import collections
+import csv
 import datetime
+import json
+import multiprocessing
 import os
 import sys
 
-create_date = str(datetime.date.today())
+import bed_index
+import happy_outputs
+import happy_vcf_metrics
+import instrumentation
+import metrics_engine
+import metrics_history
+import parse_cache
 
-parser = argparse.ArgumentParser()
-parser.add_argument("-i", "--input", help="The input directory; default is current directory", default='.')
-parser.add_argument("-o", "--output", help="The output directory; default is current directory", default='.')
+# The metrics of a case, region and variant class (see metrics_engine.py, where it is defined so that happy_outputs.py
+# can build the rows of the hap.py outputs without importing this script)
+MetricsRow = metrics_engine.MetricsRow
 
-args = parser.parse_args()
-input_dir = args.input
-output_dir = args.output
+LONG_FORM_COLUMNS = ['case', 'region', 'variant_class', 'size_bin', 'num_bases', 'truth_total', 'tp', 'fp', 'fn', 'tn',
+                     'total_negative', 'npa', 'precision', 'recall', 'precision_ci_low', 'precision_ci_high',
+                     'recall_ci_low', 'recall_ci_high', 'npa_ci_low', 'npa_ci_high', 'callable_bases']
 
-output_file = 'Final_benchmarking_metrics_' + create_date + '.txt'
+# change when the fields of MetricsRow, or the metrics parsed from an input file, change, so parse cache entries of the
+# previous format are parsed again
+CACHE_FORMAT_VERSION = 4
 
 
-def get_tn(num_bases, tp, fp, fn):
+def get_rate(numerator, denominator):
     """
-    This functions returns the number of true negatives.
+    This function returns 100 * numerator / denominator rounded to two decimals, or None if the denominator is zero.
 
-    :param num_bases: Number of bases
-    :type num_bases: int
-    :param tp: Number of true positives
-    :type tp: int
-    :param fp: Number of false positives
-    :type fp: int
-    :param fn: Number of false negatives
-    :type fn: int
+    :param numerator: The numerator
+    :type numerator: int
+    :param denominator: The denominator
+    :type denominator: int
 
-    :return: Number of true negatives
-    :rtype: int
+    :return: The percentage, or None
+    :rtype: float
     """
-    return num_bases - (tp + fp + fn)
+    if denominator == 0:
+        return None
+    else:
+        return round(100 * (float(numerator) / denominator), 2)
 
 
-def get_total_negative(fp, tn):
+def get_metrics_row(case_name, region, num_bases, size_bin, tp, fp, fn):
     """
-    This functions returns the number of total negatives.
+    This function returns the metrics of an indel size bin, computed from the TP, FP and FN counts.
 
+    :param case_name: The case name
+    :type case_name: str
+    :param region: WholeExome or CodingExons
+    :type region: str
+    :param num_bases: Number of bases
+    :type num_bases: int
+    :param size_bin: The indel size bin, e.g. '1 - 10'
+    :type size_bin: str
+    :param tp: Number of true positives
+    :type tp: int
     :param fp: Number of false positives
     :type fp: int
-    :param tn: Number of true negatives
-    :type tn: int
-
-    :return: Number of total negative
-    :rtype: int
-    """
-    return fp + tn
-
+    :param fn: Number of false negatives
+    :type fn: int
 
-def get_npa(fp, tn):
+    :return: The metrics of the indel size bin
+    :rtype: MetricsRow
     """
-    This functions returns the negative percent agreement.
+    return MetricsRow(case_name, region, 'INDEL', size_bin, num_bases, tp + fn, tp, fp, fn,
+                      get_rate(tp, tp + fp), get_rate(tp, tp + fn), None)
 
-    :param fp: Number of false positives
-    :type fp: int
-    :param tn: Number of true negatives
-    :type tn: int
 
-    :return: The negative percent agreement, NPA = (tn) / (fp+tn)
-    :rtype: float
+def get_indel_by_size_rows(indel_sizes, case_name, region, num_bases):
     """
-    if fp + tn == 0:
-        return 'NaN'
-    else:
-        return format(round(100 * (float(tn) / (fp + tn)), 2), '.2f')
+    This function generates the indel by size output data from the TP, FP and FN counts of each indel size bin.  The
+    bins 1, 2 - 5 and 6 - 10 are added into indels 1 - 10.
 
+    :param indel_sizes: Dictionary with key = size bin label (e.g. '2 - 5') and value = tuple of (tp, fp, fn)
+    :type indel_sizes: dict
+    :param case_name: The case name
+    :type case_name: str
+    :param region: WholeExome or CodingExons
+    :type region: str
+    :param num_bases: Number of bases
+    :type num_bases: int
 
-def get_precision(tp, fp):
+    :return: A list of the metrics of indels 1 - 10, 11 - 20 and 21 - 50 (None if the bin is missing)
+    :rtype: list
     """
-    This function returns the precision for indels by size.
+    indels_11_20 = None
+    indels_21_50 = None
 
-    :param tp: Number of true positives
-    :type tp: int
-    :param fp: Number of false positives
-    :type fp: int
+    tp_1_10 = 0
+    fp_1_10 = 0
+    fn_1_10 = 0
 
-    :return: The precision, (tp) / (tp+fp)
-    :rtype: float
-    """
-    if tp + fp == 0:
-        return 'NaN'
-    else:
-        return format(round(100 * (float(tp) / (tp + fp)), 2), '.2f')
+    for label in ['1', '2 - 5', '6 - 10']:
+        if label in indel_sizes:
+            tp, fp, fn = indel_sizes[label]
+            tp_1_10 += tp
+            fp_1_10 += fp
+            fn_1_10 += fn
 
+    if '11 - 20' in indel_sizes:
+        tp, fp, fn = indel_sizes['11 - 20']
+        indels_11_20 = get_metrics_row(case_name, region, num_bases, '11 - 20', tp, fp, fn)
 
-def get_recall(tp, fn):
-    """
-    This function returns the recall for indels by size.
+    if '21 - 50' in indel_sizes:
+        tp, fp, fn = indel_sizes['21 - 50']
+        indels_21_50 = get_metrics_row(case_name, region, num_bases, '21 - 50', tp, fp, fn)
 
-    :param tp: Number of true positives
-    :type tp: int
-    :param fn: Number of false negatives
-    :type fn: int
+    # do the calculations for indel size 1-10
+    indels_1_10 = get_metrics_row(case_name, region, num_bases, '1 - 10', tp_1_10, fp_1_10, fn_1_10)
 
-    :return: The recall, (tp) / (tp+fn)
-    :rtype: float
-    """
-    if tp + fn == 0:
-        return 'NaN'
-    else:
-        return format(round(100 * (float(tp) / (tp + fn)), 2), '.2f')
+    return [indels_1_10, indels_11_20, indels_21_50]
 
 
-def get_indel_by_size(path, filename, case_name, num_bases):
+def get_indel_by_size(path, filename, case_name, region, num_bases):
     """
     This function generates the output data from the indel by size text file.
 
@@ -120,21 +148,21 @@ def get_indel_by_size(path, filename, case_name, num_bases):
     :type filename: str
     :param case_name: The case name
     :type case_name: str
+    :param region: WholeExome or CodingExons
+    :type region: str
     :param num_bases: Number of bases
     :type num_bases: int
 
-    :return: A list of indel size values for the output file.
+    :return: A list of the metrics of the indel size bins
     :rtype: list
     """
-    indels_11_20 = list()
-    indels_21_50 = list()
-
-    tp_1_10_list = list()
-    fp_1_10_list = list()
-    fn_1_10_list = list()
+    indel_sizes = dict()
+    num_lines = 0
 
     with open(os.path.join(path, filename), 'r') as infile_obj:  # indel txt file
         for line in infile_obj:
+            num_lines += 1
+
             if line.startswith('I') or line.startswith('51'):
                 continue
             else:
@@ -143,123 +171,73 @@ def get_indel_by_size(path, filename, case_name, num_bases):
                 fp = int(line_items[3])
                 fn = int(line_items[4])
 
-                if line.startswith('1\t'):
-                    tp_1_10_list.append(tp)
-                    fp_1_10_list.append(fp)
-                    fn_1_10_list.append(fn)
-
-                elif line.startswith('2 - 5\t'):
-                    tp_1_10_list.append(tp)
-                    fp_1_10_list.append(fp)
-                    fn_1_10_list.append(fn)
-
-                elif line.startswith('6 - 10\t'):
-                    tp_1_10_list.append(tp)
-                    fp_1_10_list.append(fp)
-                    fn_1_10_list.append(fn)
-
-                elif line.startswith('11 - 20\t'):
-                    truth_total = tp + fn
-                    tn = get_tn(num_bases, tp, fp, fn)
-                    total_negative = get_total_negative(fp, tn)
-                    npa = get_npa(fp, tn)
-                    precision = get_precision(tp, fp)
-                    recall = get_recall(tp, fn)
-
-                    indels_11_20 = [case_name + ' - Indels 11 - 20', str(num_bases),
-                                    str(truth_total), str(tp), str(fp), str(fn), str(tn),
-                                    str(total_negative), str(npa), str(precision), str(recall)]
-
-                elif line.startswith('21 - 50\t'):
-                    truth_total = tp + fn
-                    tn = get_tn(num_bases, tp, fp, fn)
-                    total_negative = get_total_negative(fp, tn)
-                    npa = get_npa(fp, tn)
-                    precision = get_precision(tp, fp)
-                    recall = get_recall(tp, fn)
-
-                    indels_21_50 = [case_name + ' - Indels 21 - 50', str(num_bases),
-                                    str(truth_total), str(tp), str(fp), str(fn), str(tn),
-                                    str(total_negative), str(npa), str(precision), str(recall)]
-                else:
-                    continue
-
-        # add indel size 1, 2-5, and 6-10
-        tp_1_10 = sum(tp_1_10_list)
-        fp_1_10 = sum(fp_1_10_list)
-        fn_1_10 = sum(fn_1_10_list)
-
-        # do the calculations for indel size 1-10
-        truth_total = tp_1_10 + fn_1_10
-        tn = get_tn(num_bases, tp_1_10, fp_1_10, fn_1_10)
-        total_negative = get_total_negative(fp_1_10, tn)
-        npa = get_npa(fp_1_10, tn)
-        precision = get_precision(tp_1_10, fp_1_10)
-        recall = get_recall(tp_1_10, fn_1_10)
-
-        indels_1_10 = [case_name + ' - Indels 1 - 10', str(num_bases),
-                       str(truth_total), str(tp_1_10), str(fp_1_10), str(fn_1_10), str(tn),
-                       str(total_negative), str(npa), str(precision), str(recall)]
+                indel_sizes[line_items[0]] = (tp, fp, fn)
 
-    return [indels_1_10, indels_11_20, indels_21_50]
+    instrumentation.METRICS.count('lines_parsed', num_lines)
 
+    return get_indel_by_size_rows(indel_sizes, case_name, region, num_bases)
 
-def get_column_indexes(column_name_items):
+
+def get_count_data(counts, case_name, region, variant_type, num_bases):
     """
-    This function returns the indexes for the columns of interest from the CSV file.
+    This function returns the metrics computed from the TRUTH.TOTAL, QUERY.TP, QUERY.FP and TRUTH.FN counts.  Precision
+    and recall are computed the way hap.py computes METRIC.Precision and METRIC.Recall.
 
-    :param column_name_items: List of column names
-    :type column_name_items: list
+    :param counts: Dictionary with the keys TRUTH.TOTAL, TRUTH.TP, TRUTH.FN, QUERY.TP and QUERY.FP
+    :type counts: dict
+    :param case_name: The Truth Set name
+    :type case_name: str
+    :param region: WholeExome or CodingExons
+    :type region: str
+    :param variant_type: SNP or INDEL
+    :type variant_type: str
+    :param num_bases: Number of bases in the Truth Set
+    :type num_bases: int
 
-    :return: Column index for 'TRUTH.TOTAL', 'QUERY.TP', 'QUERY.FP', 'TRUTH.FN', 'METRIC.Precision' and 'METRIC.Recall'
-    :rtype: list
+    :return: The metrics that will go into the output file
+    :rtype: MetricsRow
     """
-    total_index = column_name_items.index('TRUTH.TOTAL')
-    tp_index = column_name_items.index('QUERY.TP')
-    fp_index = column_name_items.index('QUERY.FP')
-    fn_index = column_name_items.index('TRUTH.FN')
-    precision_index = column_name_items.index('METRIC.Precision')
-    recall_index = column_name_items.index('METRIC.Recall')
+    truth_total = counts['TRUTH.TOTAL']
+    tp = counts['QUERY.TP']
+    fp = counts['QUERY.FP']
+    fn = counts['TRUTH.FN']
 
-    return [total_index, tp_index, fp_index, fn_index, precision_index, recall_index]
+    return MetricsRow(case_name, region, variant_type, None, num_bases, truth_total, tp, fp, fn,
+                      get_rate(tp, tp + fp), get_rate(counts['TRUTH.TP'], truth_total), None)
 
 
-def get_csv_data(indexes, data_items, case_name, num_bases):
+def get_annotated_vcf_data(path, filename, case_name, region, num_bases):
     """
-    This function returns a list of the data from the CSV file that will go into the output file.
+    This function returns the InDel, SNP and indel by size output data from the annotated VCF file written by hap.py.
+    The annotated VCF file is read once, instead of reading the extended.csv file and the indel by size text file.
 
-    :param indexes: Column indexes for TRUTH.TOTAL, QUERY.TP, QUERY.FP, TRUTH.FN, METRIC.Precision and METRIC.Recall
-    :type indexes: list
-    :param data_items: Line items from the CSV file
-    :type data_items: list
-    :param case_name: The Truth Set name
+    :param path: The path to the annotated VCF file.
+    :type path: str
+    :param filename: The file name
+    :type filename: str
+    :param case_name: The case name
     :type case_name: str
-    :param num_bases: Number of bases in the Truth Set
+    :param region: WholeExome or CodingExons
+    :type region: str
+    :param num_bases: Number of bases
     :type num_bases: int
 
-    :return: The data from the CSV file that will go into the output file
-    :rtype: list
+    :return: A tuple of the indel metrics, the snp metrics and the list of the metrics of the indel size bins
+    :rtype: tuple
     """
-    total_index, tp_index, fp_index, fn_index, precision_index, recall_index = indexes
-    truth_total = int(float(data_items[total_index]))  # truth.total
-    tp = int(float(data_items[tp_index]))  # query.tp
-    fp = int(float(data_items[fp_index]))  # query.fp
-    fn = int(float(data_items[fn_index]))  # truth.fn
-    precision = round(float(data_items[precision_index]) * 100, 2)  # metric.precision
-    recall = round(float(data_items[recall_index]) * 100, 2)  # metric.recall
+    counts = happy_vcf_metrics.count_annotated_vcf(os.path.join(path, filename))
+    instrumentation.METRICS.count('lines_parsed', counts['records'])
 
-    tn = get_tn(num_bases, tp, fp, fn)
-    total_negative = get_total_negative(fp, tn)
-    npa = get_npa(fp, tn)
+    indel = get_count_data(counts['INDEL'], case_name, region, 'INDEL', num_bases)
+    snp = get_count_data(counts['SNP'], case_name, region, 'SNP', num_bases)
+    indel_by_size = get_indel_by_size_rows(counts['indel_sizes'], case_name, region, num_bases)
 
-    return [case_name, str(num_bases),
-            str(truth_total), str(tp), str(fp), str(fn),
-            str(tn), str(total_negative), str(npa), str(precision), str(recall)]
+    return indel, snp, indel_by_size
 
 
-def get_indel_and_snp(path, filename, case_name, num_bases):
+def get_extended_rows(path, filename, case_name, region, num_bases):
     """
-    This function returns a tuple of lists of the InDel and SNP output data from the CSV file.
+    This function returns the metrics of all the rows of the extended.csv file (see happy_outputs.py).
 
     :param path: The path to the input CSV file.
     :type path: str
@@ -267,33 +245,63 @@ def get_indel_and_snp(path, filename, case_name, num_bases):
     :type filename: str
     :param case_name: The case name
     :type case_name: str
+    :param region: WholeExome or CodingExons
+    :type region: str
     :param num_bases: Number of bases
     :type num_bases: int
 
-    :return: A tuple of the list of values for the indels and the list of values for the snps
+    :return: List of metrics, in the order of the file
+    :rtype: list
+    """
+    outputs = happy_outputs.HappyOutputs({'.extended.csv': os.path.join(path, filename)})
+    instrumentation.METRICS.count('lines_parsed', len(outputs.extended) + 2)  # with the header and hap.py lines
+
+    return outputs.get_metrics_rows(case_name, region, num_bases)
+
+
+def get_locations_rows(rows):
+    """
+    This function returns the InDel and SNP metrics of the rows of an extended.csv file: those of its Locations.INDEL
+    and Locations.SNP rows.
+
+    :param rows: List of metrics, as returned by get_extended_rows()
+    :type rows: list
+
+    :return: A tuple of the indel metrics and the snp metrics
     :rtype: tuple
+
+    :raises ValueError: If a row is missing
     """
-    with open(os.path.join(path, filename), 'r') as infile_obj:
-        column_name_items = list()
-        indel_items = list()
-        snp_items = list()
+    rows_by_type = dict((row.variant_type, row) for row in rows)
 
-        for line in infile_obj:
-            if line.strip().startswith(',METRIC.'):  # column header line
-                column_name_items = line.strip().split(',')
-            elif line.startswith('Locations.INDEL,'):
-                indel_items = line.strip().split(',')
-            elif line.startswith('Locations.SNP,'):
-                snp_items = line.strip().split(',')
-            else:
-                continue
+    for variant_type in ['INDEL', 'SNP']:
+        if variant_type not in rows_by_type:
+            raise ValueError('{} {}: the extended.csv file has no Locations.{} row'.format(rows[0].case, rows[0].region,
+                                                                                           variant_type)
+                             if rows else 'The extended.csv file has no rows')
 
-        indexes = get_column_indexes(column_name_items)
+    return rows_by_type['INDEL'], rows_by_type['SNP']
+
+
+def get_indel_and_snp(path, filename, case_name, region, num_bases):
+    """
+    This function returns a tuple of the InDel and SNP metrics from the CSV file.
 
-        indel = get_csv_data(indexes, indel_items, case_name, num_bases)
-        snp = get_csv_data(indexes, snp_items, case_name, num_bases)
+    :param path: The path to the input CSV file.
+    :type path: str
+    :param filename: The file name
+    :type filename: str
+    :param case_name: The case name
+    :type case_name: str
+    :param region: WholeExome or CodingExons
+    :type region: str
+    :param num_bases: Number of bases
+    :type num_bases: int
 
-    return indel, snp
+    :return: A tuple of the indel metrics and the snp metrics
+    :rtype: tuple
+    """
+    return get_locations_rows(get_extended_rows(path, filename, case_name, region, num_bases))
 
 
 def create_base_num_dicts(bases_file):
@@ -328,176 +336,947 @@ def create_base_num_dicts(bases_file):
     return num_bases_whole_exome_dict, num_bases_coding_exons_dict
 
 
-def verify_required_files_exists(files_list, case):
-    required = ['WholeExomeRegions.extended.csv', 'WholeExomeRegions_indelSizeDistribution.txt',
+def get_required_suffixes(annotated_vcf=False):
+    """
+    This function returns the suffixes of the input files required for each case.
+
+    :param annotated_vcf: True for the annotated VCF files, False for the extended.csv and indelSizeDistribution.txt
+    files
+    :type annotated_vcf: bool
+
+    :return: List of file name suffixes
+    :rtype: list
+    """
+    if annotated_vcf:
+        return ['WholeExomeRegions.vcf.gz', 'CodingExons.vcf.gz']
+    else:
+        return ['WholeExomeRegions.extended.csv', 'WholeExomeRegions_indelSizeDistribution.txt',
                 'CodingExons.extended.csv', 'CodingExons_indelSizeDistribution.txt']
 
+
+def get_case_name(dir_name):
+    """
+    This function returns the case name of a case directory.  Case directories are named after the case ('NA12878',
+    'HuRef') or, as in the results of the benchmarking workflow, 'benchmarking_' followed by the case.
+
+    :param dir_name: The directory name
+    :type dir_name: str
+
+    :return: The case name, or None if the directory is not a case directory
+    :rtype: str
+    """
+    if dir_name.startswith('benchmarking_'):
+        dir_name = dir_name[len('benchmarking_'):]
+
+    if dir_name.startswith('NA') or dir_name.startswith('HuRef'):
+        return dir_name
+    else:
+        return None
+
+
+def discover_cases(input_dir, required):
+    """
+    This function walks the input directory once and finds the number of bases file and the input files of each case.
+    The input files may be directly in the case directory or in its subdirectories, e.g.
+    benchmarking_NA12878/vcfComparison_by_Happy_CodingExons/benchmark_NA12878_CodingExons.extended.csv.  The case
+    directories and their subdirectories may be symbolic links.
+
+    :param input_dir: The input directory
+    :type input_dir: str
+    :param required: The suffixes of the input files of each case
+    :type required: list
+
+    :return: The number of bases file (None if missing) and a dictionary with key = case name and value = dictionary
+    with key = suffix and value = path of the input file
+    :rtype: tuple
+    """
+    num_bases_file = None
+    cases = dict()
+
+    for dir_path, dir_names, file_names in os.walk(input_dir, followlinks=True):
+        relative_path = os.path.relpath(dir_path, input_dir)
+
+        if relative_path == '.':
+            for filename in file_names:
+                if filename.startswith('number_of_bases') and filename.endswith('txt'):
+                    num_bases_file = os.path.join(input_dir, filename)
+
+            dir_names[:] = sorted(dir_name for dir_name in dir_names if get_case_name(dir_name))
+
+            for dir_name in dir_names:
+                cases.setdefault(get_case_name(dir_name), dict())
+
+            continue
+
+        case_files = cases[get_case_name(relative_path.split(os.sep)[0])]
+
+        for filename in sorted(file_names):
+            for suffix in required:
+                if filename.endswith(suffix) and suffix not in case_files:
+                    case_files[suffix] = os.path.join(dir_path, filename)
+
+    return num_bases_file, cases
+
+
+def parse_file(job):
+    """
+    This function parses one input file of a case.
+
+    :param job: Tuple of (path of the input file, case name, region, number of bases)
+    :type job: tuple
+
+    :return: List of metrics: the metrics of all the rows of an extended.csv file, the metrics of the indel size bins of
+    an indelSizeDistribution.txt file, or the indel metrics, the snp metrics and the metrics of the indel size bins of
+    an annotated VCF file
+    :rtype: list
+    """
+    file_path, case_name, region, num_bases = job
+    path, filename = os.path.split(file_path)
+
+    metrics = instrumentation.METRICS
+    metrics.count('files_parsed')
+
+    if metrics.enabled:
+        metrics.count('bytes_read', os.path.getsize(file_path))
+
+    with metrics.stage('parse_file'):
+        if filename.endswith('.vcf.gz'):
+            indel, snp, indel_by_size = get_annotated_vcf_data(path, filename, case_name, region, num_bases)
+            return [indel, snp] + indel_by_size
+        elif filename.endswith('.extended.csv'):
+            return get_extended_rows(path, filename, case_name, region, num_bases)
+        else:
+            return get_indel_by_size(path, filename, case_name, region, num_bases)
+
+
+def get_case_lines(case_files, region, parsed, annotated_vcf=False):
+    """
+    This function returns the indel metrics and the snp metrics of a case in a region, from its parsed input files.
+
+    :param case_files: Dictionary with key = suffix and value = path of the input file
+    :type case_files: dict
+    :param region: The file name part of the region, WholeExomeRegions or CodingExons
+    :type region: str
+    :param parsed: Dictionary with key = path of the input file and value = metrics returned by parse_file()
+    :type parsed: dict
+    :param annotated_vcf: True if the input files are the annotated VCF files
+    :type annotated_vcf: bool
+
+    :return: Tuple of the list of indel metrics (all indels, then by size) and the snp metrics
+    :rtype: tuple
+    """
+    if annotated_vcf:
+        lines = parsed[case_files[region + '.vcf.gz']]
+        return [lines[0]] + lines[2:], lines[1]
+    else:
+        indel, snp = get_locations_rows(parsed[case_files[region + '.extended.csv']])
+        return [indel] + parsed[case_files[region + '_indelSizeDistribution.txt']], snp
+
+
+def parse_files(jobs, cache=None, processes=1):
+    """
+    This function parses the input files, in parallel if more than one process is allowed.  With a cache, only the
+    files that are new or changed since they were cached are parsed.
+
+    :param jobs: List of tuples of (path of the input file, case name, region, number of bases)
+    :type jobs: list
+    :param cache: The parse cache, or None
+    :type cache: parse_cache.ParseCache
+    :param processes: The number of input files parsed in parallel
+    :type processes: int
+
+    :return: Dictionary with key = path of the input file and value = metrics returned by parse_file()
+    :rtype: dict
+    """
+    parsed = dict()
+    to_parse = list()
+
+    for job in jobs:
+        lines = None if cache is None else cache.get(job[0], get_cache_parameters(job))
+
+        if lines is None:
+            to_parse.append(job)
+        else:
+            parsed[job[0]] = [None if line is None else MetricsRow(*line) for line in lines]
+
+    if processes > 1 and len(to_parse) > 1:
+        pool = multiprocessing.Pool(min(processes, len(to_parse)))
+        results = list(instrumentation.map_counted(pool.map, parse_file, to_parse))
+        pool.close()
+        pool.join()
+    else:
+        results = [parse_file(job) for job in to_parse]
+
+    for job, lines in zip(to_parse, results):
+        parsed[job[0]] = lines
+
+        if cache is not None:
+            cache.put(job[0], get_cache_parameters(job), lines)
+
+    instrumentation.METRICS.count('files_cached', len(jobs) - len(to_parse))
+
+    if cache is not None:
+        print '{} input files parsed, {} read from the cache'.format(len(to_parse), len(jobs) - len(to_parse))
+
+    return parsed
+
+
+def get_cache_parameters(job):
+    """
+    This function returns the parameters the metrics of an input file depend on, as stored in the parse cache.
+
+    :param job: Tuple of (path of the input file, case name, region, number of bases)
+    :type job: tuple
+
+    :rtype: str
+    """
+    return '{}\t{}\t{}'.format(CACHE_FORMAT_VERSION, job[1], job[3])
+
+
+def get_missing_suffixes(files_list, annotated_vcf=False):
+    """
+    This function returns the suffixes of the required input files that are missing from the files of a case.
+
+    :param files_list: The input files of the case
+    :type files_list: list
+    :param annotated_vcf: True if the input files are the annotated VCF files
+    :type annotated_vcf: bool
+
+    :return: Set of file name suffixes
+    :rtype: set
+    """
+    required = get_required_suffixes(annotated_vcf)
+
     required_set = set(required)
 
     suffixes_set = set()
 
     for filename in files_list:
-        if filename.endswith('WholeExomeRegions.extended.csv'):
-            suffixes_set.add('WholeExomeRegions.extended.csv')
-        elif filename.endswith('WholeExomeRegions_indelSizeDistribution.txt'):
-            suffixes_set.add('WholeExomeRegions_indelSizeDistribution.txt')
-        elif filename.endswith('CodingExons.extended.csv'):
-            suffixes_set.add('CodingExons.extended.csv')
-        elif filename.endswith('CodingExons_indelSizeDistribution.txt'):
-            suffixes_set.add('CodingExons_indelSizeDistribution.txt')
-        else:
-            continue
+        for suffix in required:
+            if filename.endswith(suffix):
+                suffixes_set.add(suffix)
+
+    return required_set - suffixes_set
+
 
-    missing = required_set - suffixes_set
+def verify_required_files_exists(files_list, case, annotated_vcf=False):
+    """
+    This function checks that a case has all the required input files.
+
+    :param files_list: The input files of the case
+    :type files_list: list
+    :param case: The case name
+    :type case: str
+    :param annotated_vcf: True if the input files are the annotated VCF files
+    :type annotated_vcf: bool
+
+    :raises ValueError: If input files are missing; the message lists them
+    :rtype: void
+    """
+    missing = get_missing_suffixes(files_list, annotated_vcf)
 
     if missing:
-        print 'Error:'
         if len(missing) > 1:
-            print 'The following files are missing in {}:'.format(case)
+            message = 'The following files are missing in {}:'.format(case)
         else:
-            print 'The following file is missing in {}:'.format(case)
+            message = 'The following file is missing in {}:'.format(case)
 
-        for item in missing:
-            print '\t', item
+        raise ValueError('\n'.join([message] + ['\t ' + item for item in missing]))
 
-        sys.exit(1)
 
+def get_output_lines(rows):
+    """
+    This function returns the values of the output lines of the metrics.  The metrics of all the rows are computed at
+    once (metrics_engine.MetricsColumns).  The lines of the indel size bins are named '<case> - Indels <size bin>', and
+    their precision and recall always have two decimals.
+
+    :param rows: List of metrics, with None for an empty line
+    :type rows: list
+
+    :return: A list of lists of values for the output file
+    :rtype: list
+    """
+    metrics_rows = [row for row in rows if row is not None]
+    columns = metrics_engine.MetricsColumns(metrics_rows)
+    npa = metrics_engine.format_percentages(columns.npa, fixed_decimals=True)
+    bin_precision = metrics_engine.format_percentages(columns.precision, fixed_decimals=True)
+    bin_recall = metrics_engine.format_percentages(columns.recall, fixed_decimals=True)
+    precision = metrics_engine.format_percentages([row.precision for row in metrics_rows])
+    recall = metrics_engine.format_percentages([row.recall for row in metrics_rows])
+    lines = list()
+    index = 0
+
+    for row in rows:
+        if row is None:
+            lines.append([])
+            continue
+
+        if row.size_bin is None:
+            line = [row.case, precision[index], recall[index]]
+        else:
+            line = ['{} - Indels {}'.format(row.case, row.size_bin), bin_precision[index], bin_recall[index]]
+
+        lines.append([line[0], str(row.num_bases), str(row.truth_total), str(row.tp), str(row.fp), str(row.fn),
+                      str(columns.tn[index]), str(columns.total_negative[index]), npa[index], line[1], line[2]])
+        index += 1
+
+    return lines
+
+
+def get_long_form_rows(rows, confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function returns the typed values of the metrics for the long form outputs, one value per column of
+    LONG_FORM_COLUMNS, with the Wilson score confidence intervals of precision, recall and NPA.  Percentages that cannot
+    be computed are None.
+
+    :param rows: List of metrics
+    :type rows: list
+    :param confidence_level: The confidence level of the intervals
+    :type confidence_level: float
+
+    :return: List of ordered dictionaries with key = column name
+    :rtype: list
+    """
+    columns = metrics_engine.MetricsColumns(rows)
+    intervals = columns.get_confidence_intervals(confidence_level)
+    precision_low, precision_high = intervals['precision']
+    recall_low, recall_high = intervals['recall']
+    npa_low, npa_high = intervals['npa']
+    long_form_rows = list()
+
+    for index, row in enumerate(rows):
+        values = [row.case, row.region, row.variant_type, row.size_bin, row.num_bases, row.truth_total, row.tp, row.fp,
+                  row.fn, columns.tn[index], columns.total_negative[index], columns.npa[index], row.precision,
+                  row.recall, precision_low[index], precision_high[index], recall_low[index], recall_high[index],
+                  npa_low[index], npa_high[index], row.callable_bases]
+        long_form_rows.append(collections.OrderedDict(zip(LONG_FORM_COLUMNS, values)))
+
+    return long_form_rows
+
+
+def get_header_columns(rows):
+    """
+    This function returns the header columns of the sections of the tab delimited output file.  When the metrics have
+    callable bases, TN is computed from them, and the TN column is named accordingly.
+
+    :param rows: List of metrics, with None for an empty line
+    :type rows: list
 
-def create_output(whole_exome_indel_list, whole_exome_snp_list, coding_exons_indel_list, coding_exons_snp_list):
+    :rtype: list
+    """
+    if any(row is not None and row.callable_bases is not None for row in rows):
+        tn_column = 'TN = CallableReferenceBases - FN'
+    else:
+        tn_column = 'TN = TotalBases - (TP + FN + FP)'
+
+    return ['Case', 'Number of bases', 'Truth total', 'TP', 'FP', 'FN', tn_column, 'TotalNegative  = TN + FP',
+            'NPA = TN/(Total Negative)', 'Precision', 'Recall']
+
+
+def write_section(outfile_obj, title, header_columns, rows):
+    """
+    This function writes a section of the tab delimited output file: its title, the header line and the lines of the
+    metrics.
+
+    :param outfile_obj: The output file object
+    :type outfile_obj: file
+    :param title: The title of the section, e.g. Benchmarking SNPs Whole Exome
+    :type title: str
+    :param header_columns: The header columns, from get_header_columns()
+    :type header_columns: list
+    :param rows: List of metrics, with None for an empty line
+    :type rows: list
+
+    :rtype: void
+    """
+    outfile_obj.write('\t' + title + '\n')
+    outfile_obj.write('\t'.join(header_columns) + '\n')
+
+    for line in get_output_lines(rows):
+        outfile_obj.write('\t'.join(line) + '\n')
+
+
+def create_output(whole_exome_indel_list, whole_exome_snp_list, coding_exons_indel_list, coding_exons_snp_list,
+                  output_file):
     """
-    This function creates the output file.
+    This function creates the tab delimited output file.
 
-    :param whole_exome_indel_list: A list the values for a single output line.
+    :param whole_exome_indel_list: A list of the lists of indel metrics of each case.
     :type whole_exome_indel_list: list
-    :param whole_exome_snp_list: A list the values for a single output line.
+    :param whole_exome_snp_list: A list of the snp metrics of each case.
     :type whole_exome_snp_list: list
-    :param coding_exons_indel_list: A list the values for a single output line.
+    :param coding_exons_indel_list: A list of the lists of indel metrics of each case.
     :type coding_exons_indel_list: list
-    :param coding_exons_snp_list: A list the values for a single output line.
+    :param coding_exons_snp_list: A list of the snp metrics of each case.
     :type coding_exons_snp_list: list
+    :param output_file: The output file
+    :type output_file: str
 
     :rtype: void
     """
-    with open(os.path.join(output_dir, output_file), 'w') as outfile_obj:
-        header_columns = ['Case', 'Number of bases', 'Truth total', 'TP', 'FP', 'FN',
-                          'TN = TotalBases - (TP + FN + FP)', 'TotalNegative  = TN + FP', 'NPA = TN/(Total Negative)',
-                          'Precision', 'Recall']
+    whole_exome_indels = [indel for indels in whole_exome_indel_list for indel in indels]
+    coding_exons_indels = [indel for indels in coding_exons_indel_list for indel in indels]
+    header_columns = get_header_columns(whole_exome_snp_list + coding_exons_snp_list + whole_exome_indels +
+                                        coding_exons_indels)
 
-        # SNPs Whole Exome
-        outfile_obj.write('\tBenchmarking SNPs Whole Exome\n')
-        outfile_obj.write('\t'.join(header_columns) + '\n')
+    with open(output_file, 'w') as outfile_obj:
+        write_section(outfile_obj, 'Benchmarking SNPs Whole Exome', header_columns, whole_exome_snp_list)
+        write_section(outfile_obj, 'Benchmarking INDELs Whole Exome', header_columns, whole_exome_indels)
+        write_section(outfile_obj, 'Benchmarking SNPs Coding Exons', header_columns, coding_exons_snp_list)
+        write_section(outfile_obj, 'Benchmarking INDELs Coding Exons', header_columns, coding_exons_indels)
 
-        for snp in whole_exome_snp_list:
-            outfile_obj.write('\t'.join(snp) + '\n')
 
-        # INDELs Whole Exome
-        outfile_obj.write('\tBenchmarking INDELs Whole Exome\n')
-        outfile_obj.write('\t'.join(header_columns) + '\n')
+def create_csv_output(rows, csv_file):
+    """
+    This function creates the long form CSV output file: one line per case, region, variant class and indel size bin,
+    with the raw counts.  Empty cells are percentages that cannot be computed, or the size bin of all the variants.
 
-        for indels in whole_exome_indel_list:
-            for indel in indels:
-                outfile_obj.write('\t'.join(indel) + '\n')
+    :param rows: List of the long form metrics, as returned by get_long_form_rows()
+    :type rows: list
+    :param csv_file: The output file
+    :type csv_file: str
 
-        # SNPs  Coding Exons
-        outfile_obj.write('\tBenchmarking SNPs Coding Exons\n')
-        outfile_obj.write('\t'.join(header_columns) + '\n')
+    :rtype: void
+    """
+    with open(csv_file, 'wb') as outfile_obj:
+        writer = csv.writer(outfile_obj, lineterminator='\n')
+        writer.writerow(LONG_FORM_COLUMNS)
 
-        for snp in coding_exons_snp_list:
-            outfile_obj.write('\t'.join(snp) + '\n')
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row.values()])
 
-        # INDELs Coding Exons
-        outfile_obj.write('\tBenchmarking INDELs Coding Exons\n')
-        outfile_obj.write('\t'.join(header_columns) + '\n')
 
-        for indels in coding_exons_indel_list:
-            for indel in indels:
-                outfile_obj.write('\t'.join(indel) + '\n')
+def create_jsonl_output(rows, jsonl_file):
+    """
+    This function creates the long form JSON Lines output file: one JSON object per case, region, variant class and
+    indel size bin, with the raw counts.  Percentages that cannot be computed, and the size bin of all the variants, are
+    null.
 
-        # screen output
-        print 'Output file created. It can be found at', os.path.join(output_dir, output_file)
+    :param rows: List of the long form metrics, as returned by get_long_form_rows()
+    :type rows: list
+    :param jsonl_file: The output file
+    :type jsonl_file: str
 
+    :rtype: void
+    """
+    with open(jsonl_file, 'w') as outfile_obj:
+        for row in rows:
+            outfile_obj.write(json.dumps(row) + '\n')
 
-########################################################################################################################
-#
-#   MAIN
-#
-########################################################################################################################
-def main():
+
+def get_output_file(output_dir, create_date=None):
     """
-    This is the main function. It iterates over all the the subdirectories in the input directory with names starting
-    with 'NA' or 'HuRef'.  All CSV and TXT files with 'WholeExome' or 'CodingExons' in the file name are processed.
+    This function returns the path of the tab delimited output file, Final_benchmarking_metrics_YYYY-MM-DD.txt.
+
+    :param output_dir: The output directory
+    :type output_dir: str
+    :param create_date: The date in the file name (YYYY-MM-DD); default is today
+    :type create_date: str
 
-    A benchmarking metrics file is created.
+    :rtype: str
+    """
+    return os.path.join(output_dir, 'Final_benchmarking_metrics_{}.txt'.format(create_date or datetime.date.today()))
+
+
+def write_atomically(output_file, create_function, *data):
+    """
+    This function writes an output file to a temporary file in the same directory, and renames it to the output file,
+    so a reader of the output file never sees a partly written file.
+
+    :param output_file: The output file
+    :type output_file: str
+    :param create_function: The function that writes the file; its last argument is the file name
+    :type create_function: function
+    :param data: The other arguments of the function
+    :type data: object
 
     :rtype: void
     """
-    whole_exome_indel_list = list()
-    whole_exome_snp_list = list()
-    coding_exons_indel_list = list()
-    coding_exons_snp_list = list()
-    num_bases_whole_exome_dict = dict()
-    num_bases_coding_exons_dict = dict()
+    temp_file = '{}.{}.tmp'.format(output_file, os.getpid())
 
-    prefixes = [filename[:15] for filename in os.listdir(input_dir)]
+    try:
+        create_function(*(data + (temp_file,)))
+        os.rename(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
-    if 'number_of_bases' not in prefixes:
-        print 'Error:'
-        print 'The number of bases file is missing.'
-        sys.exit(1)
 
-    for filename in os.listdir(input_dir):
-        if filename.startswith('number_of_bases') and filename.endswith('txt'):
-            num_bases_file = os.path.join(input_dir, filename)
-            num_bases_whole_exome_dict, num_bases_coding_exons_dict = create_base_num_dicts(num_bases_file)
+def get_case_metrics(case_files, parsed, annotated_vcf=False):
+    """
+    This function returns the metrics of a case, from its parsed input files.
+
+    :param case_files: Dictionary with key = suffix and value = path of the input file
+    :type case_files: dict
+    :param parsed: Dictionary with key = path of the input file and value = metrics returned by parse_file()
+    :type parsed: dict
+    :param annotated_vcf: True if the input files are the annotated VCF files
+    :type annotated_vcf: bool
+
+    :return: Tuple of (whole exome indel metrics, whole exome snp metrics, coding exons indel metrics, coding exons snp
+    metrics); the indel metrics are lists (all indels, then by size)
+    :rtype: tuple
+    """
+    whole_exome_indels, whole_exome_snp = get_case_lines(case_files, 'WholeExomeRegions', parsed, annotated_vcf)
+    coding_exons_indels, coding_exons_snp = get_case_lines(case_files, 'CodingExons', parsed, annotated_vcf)
+
+    return whole_exome_indels, whole_exome_snp, coding_exons_indels, coding_exons_snp
+
+
+def apply_callable_bases(case_metrics, callable_whole_exome_dict, callable_coding_exons_dict):
+    """
+    This function sets the callable bases of the metrics of the cases, so their TN is computed from the callable
+    reference bases of the query gVCF file instead of the number of bases.
+
+    :param case_metrics: List of the metrics of each case, as returned by get_case_metrics()
+    :type case_metrics: list
+    :param callable_whole_exome_dict: Dictionary with key = case and value = callable bases in the whole exome
+    :type callable_whole_exome_dict: dict
+    :param callable_coding_exons_dict: Dictionary with key = case and value = callable bases in the coding exons
+    :type callable_coding_exons_dict: dict
+
+    :return: List of the metrics of each case, with their callable bases
+    :rtype: list
+
+    :raises ValueError: If the callable bases of a case are missing
+    """
+    updated_case_metrics = list()
+
+    def set_callable_bases(row, callable_bases):
+        return None if row is None else row._replace(callable_bases=callable_bases)
+
+    for whole_exome_indels, whole_exome_snp, coding_exons_indels, coding_exons_snp in case_metrics:
+        case_rows = [whole_exome_snp] + whole_exome_indels + [coding_exons_snp] + coding_exons_indels
+        case_name = [row for row in case_rows if row is not None][0].case
+
+        if case_name not in callable_whole_exome_dict or case_name not in callable_coding_exons_dict:
+            raise ValueError('The callable bases of {} are missing.'.format(case_name))
+
+        whole_exome = callable_whole_exome_dict[case_name]
+        coding_exons = callable_coding_exons_dict[case_name]
+
+        updated_case_metrics.append(([set_callable_bases(row, whole_exome) for row in whole_exome_indels],
+                                     set_callable_bases(whole_exome_snp, whole_exome),
+                                     [set_callable_bases(row, coding_exons) for row in coding_exons_indels],
+                                     set_callable_bases(coding_exons_snp, coding_exons)))
+
+    return updated_case_metrics
+
+
+def get_metrics_rows(case_metrics):
+    """
+    This function returns the metrics rows of the cases, in the order of the output files.
+
+    :param case_metrics: List of the metrics of each case, as returned by get_case_metrics()
+    :type case_metrics: list
+
+    :return: List of metrics, without the missing indel size bins
+    :rtype: list
+    """
+    rows = list()
+
+    for whole_exome_indels, whole_exome_snp, coding_exons_indels, coding_exons_snp in case_metrics:
+        for row in [whole_exome_snp] + whole_exome_indels + [coding_exons_snp] + coding_exons_indels:
+            if row is not None:
+                rows.append(row)
+
+    return rows
+
+
+def write_outputs(case_metrics, output_file, output_formats=('tsv',),
+                  confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function writes the output files from the metrics of the cases.  Each output file is replaced atomically.
+
+    :param case_metrics: List of the metrics of each case, as returned by get_case_metrics()
+    :type case_metrics: list
+    :param output_file: The tab delimited output file; the long form output files have the same name, with the
+    extension .csv or .jsonl
+    :type output_file: str
+    :param output_formats: The output formats: tsv, csv and/or jsonl
+    :type output_formats: list
+    :param confidence_level: The confidence level of the intervals of the long form outputs
+    :type confidence_level: float
+
+    :return: List of the output files
+    :rtype: list
+    """
+    whole_exome_indel_list = [metrics[0] for metrics in case_metrics]
+    whole_exome_snp_list = [metrics[1] for metrics in case_metrics]
+    coding_exons_indel_list = [metrics[2] for metrics in case_metrics]
+    coding_exons_snp_list = [metrics[3] for metrics in case_metrics]
+    rows = get_metrics_rows(case_metrics)
+
+    instrumentation.METRICS.count('metrics_rows', len(rows))
+
+    output_prefix = os.path.splitext(output_file)[0]
+    output_files = list()
+
+    if 'csv' in output_formats or 'jsonl' in output_formats:
+        with instrumentation.METRICS.stage('long_form_metrics'):
+            long_form_rows = get_long_form_rows(rows, confidence_level)
+
+    if 'tsv' in output_formats:
+        with instrumentation.METRICS.stage('write_tsv'):
+            write_atomically(output_file, create_output, whole_exome_indel_list, whole_exome_snp_list,
+                             coding_exons_indel_list, coding_exons_snp_list)
+
+        output_files.append(output_file)
+
+    if 'csv' in output_formats:
+        with instrumentation.METRICS.stage('write_csv'):
+            write_atomically(output_prefix + '.csv', create_csv_output, long_form_rows)
+
+        output_files.append(output_prefix + '.csv')
+
+    if 'jsonl' in output_formats:
+        with instrumentation.METRICS.stage('write_jsonl'):
+            write_atomically(output_prefix + '.jsonl', create_jsonl_output, long_form_rows)
+
+        output_files.append(output_prefix + '.jsonl')
+
+    return output_files
+
+
+def get_subtype_rows(cases, parsed):
+    """
+    This function returns the metrics of all the rows of the extended.csv files of the cases (Alleles.DEL,
+    SNP.het, ...), from their parsed input files.
+
+    :param cases: Dictionary with key = case name and value = dictionary with key = suffix and value = path of the input
+    file
+    :type cases: dict
+    :param parsed: Dictionary with key = path of the input file and value = metrics returned by parse_file()
+    :type parsed: dict
+
+    :return: List of metrics, by case, region and row of the extended.csv file
+    :rtype: list
+    """
+    return [row for case_name in sorted(cases) for region in ['WholeExomeRegions', 'CodingExons']
+            for row in parsed[cases[case_name][region + '.extended.csv']]]
+
+
+def write_subtype_outputs(rows, output_dir, output_formats=('csv',), create_date=None,
+                          confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function writes the long form tables of the metrics of all the rows of the extended.csv files,
+    Subtype_benchmarking_metrics_YYYY-MM-DD.csv and/or .jsonl.  Each output file is replaced atomically.
+
+    :param rows: List of metrics, as returned by get_subtype_rows()
+    :type rows: list
+    :param output_dir: The output directory
+    :type output_dir: str
+    :param output_formats: The output formats: csv and/or jsonl; the tsv format has no subtype table, so the csv table
+    is written if neither is given
+    :type output_formats: list
+    :param create_date: The date in the file names (YYYY-MM-DD); default is today
+    :type create_date: str
+    :param confidence_level: The confidence level of the intervals
+    :type confidence_level: float
+
+    :return: List of the output files
+    :rtype: list
+    """
+    output_prefix = os.path.join(output_dir, 'Subtype_benchmarking_metrics_{}'.format(create_date or
+                                                                                      datetime.date.today()))
+    long_form_rows = get_long_form_rows(rows, confidence_level)
+    output_files = list()
+
+    for output_format, create_function in [('csv', create_csv_output), ('jsonl', create_jsonl_output)]:
+        if output_format in output_formats or (output_format == 'csv' and 'jsonl' not in output_formats):
+            write_atomically(output_prefix + '.' + output_format, create_function, long_form_rows)
+            output_files.append(output_prefix + '.' + output_format)
+
+    return output_files
+
+
+def check_outputs(cases, annotated_vcf=False):
+    """
+    This function checks that the hap.py outputs of each case and region agree with each other (see happy_outputs.py).
+    The outputs are found next to the input files, by their hap.py output prefix.  The differences in the hap.py
+    command lines are printed as warnings.
+
+    :param cases: Dictionary with key = case name and value = dictionary with key = suffix and value = path of the input
+    file
+    :type cases: dict
+    :param annotated_vcf: True if the input files are the annotated VCF files
+    :type annotated_vcf: bool
+
+    :rtype: void
+
+    :raises ValueError: If the outputs of a case are missing or do not agree
+    """
+    suffix = '.vcf.gz' if annotated_vcf else '.extended.csv'
+    problems = list()
+
+    for case_name in sorted(cases):
+        for region in ['WholeExomeRegions', 'CodingExons']:
+            prefix = cases[case_name][region + suffix][:-len(suffix)]
+            files = happy_outputs.get_happy_files(prefix)
+
+            if not files:
+                raise ValueError('{} {}: there is no hap.py output file {}*.csv or *.json'.format(case_name, region,
+                                                                                                   prefix))
+
+            outputs = happy_outputs.HappyOutputs(files)
+            problems.extend('{} {}: {}'.format(case_name, region, problem) for problem in outputs.check())
+
+            for warning in outputs.get_warnings():
+                print 'Warning: {} {}: {}'.format(case_name, region, warning)
+
+    if problems:
+        raise ValueError('The hap.py outputs are not consistent:\n' + '\n'.join('\t ' + problem
+                                                                                 for problem in problems))
+
+
+def get_number_of_bases(num_bases_file, bed_manifest=None, bed_cache=None):
+    """
+    This function returns the number of bases of each case, from the BED files of the BED manifest if there is one, or
+    else from the number of bases file.
+
+    :param num_bases_file: The number of bases file, or None
+    :type num_bases_file: str
+    :param bed_manifest: The BED manifest, or None
+    :type bed_manifest: str
+    :param bed_cache: The cache directory of the number of bases of the BED files, or None
+    :type bed_cache: str
+
+    :return: Two dictionaries: one has key = case and value = number of bases in the whole exome; the other has
+    key = case and value = number of bases in coding exon
+    :rtype: tuple
+
+    :raises ValueError: If there is neither a BED manifest nor a number of bases file
+    """
+    if bed_manifest is not None:
+        return bed_index.get_number_of_bases(bed_manifest, bed_cache)
+    elif num_bases_file is None:
+        raise ValueError('The number of bases file is missing.')
+    else:
+        return create_base_num_dicts(num_bases_file)
+
+
+def get_jobs(case_files, case_name, num_bases_whole_exome_dict, num_bases_coding_exons_dict):
+    """
+    This function returns the parse jobs of the input files of a case.
+
+    :param case_files: Dictionary with key = suffix and value = path of the input file
+    :type case_files: dict
+    :param case_name: The case name
+    :type case_name: str
+    :param num_bases_whole_exome_dict: Dictionary with key = case and value = number of bases in the whole exome
+    :type num_bases_whole_exome_dict: dict
+    :param num_bases_coding_exons_dict: Dictionary with key = case and value = number of bases in coding exon
+    :type num_bases_coding_exons_dict: dict
+
+    :return: List of tuples of (path of the input file, case name, region, number of bases)
+    :rtype: list
+    """
+    jobs = list()
+
+    for suffix, file_path in sorted(case_files.items()):
+        if suffix.startswith('WholeExomeRegions'):
+            jobs.append((file_path, case_name, 'WholeExome', num_bases_whole_exome_dict[case_name]))
         else:
-            continue
+            jobs.append((file_path, case_name, 'CodingExons', num_bases_coding_exons_dict[case_name]))
+
+    return jobs
+
+
+def run(input_dir='.', output_dir='.', annotated_vcf=False, processes=1, cache_file=None, bed_manifest=None,
+        bed_cache=None, output_formats=('tsv',), create_date=None,
+        confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL, callable_bases_file=None, history_file=None,
+        run_label=None, subtypes=False, check=False):
+    """
+    This function finds all the subdirectories in the input directory with names starting with 'NA', 'HuRef',
+    'benchmarking_NA' or 'benchmarking_HuRef' in a single walk.  The CSV and TXT files (or the annotated VCF files) of
+    each case are found in the case directory or its subdirectories, and the input files are parsed in parallel.  With
+    a parse cache, only the input files that are new or changed are parsed.  The output files are then created, and with
+    a history file, the metrics of the run are added to it.  With subtypes, the metrics of all the rows of the
+    extended.csv files are written too, from the same parsed files.
+
+    :param input_dir: The input directory
+    :type input_dir: str
+    :param output_dir: The output directory
+    :type output_dir: str
+    :param annotated_vcf: True to read the annotated VCF files instead of the extended.csv and
+    indelSizeDistribution.txt files
+    :type annotated_vcf: bool
+    :param processes: The number of input files parsed in parallel
+    :type processes: int
+    :param cache_file: The parse cache file, or None
+    :type cache_file: str
+    :param bed_manifest: The BED manifest, or None to read the number of bases file of the input directory
+    :type bed_manifest: str
+    :param bed_cache: The cache directory of the number of bases of the BED files, or None
+    :type bed_cache: str
+    :param output_formats: The output formats: tsv, csv and/or jsonl
+    :type output_formats: list
+    :param create_date: The date in the output file names (YYYY-MM-DD); default is today
+    :type create_date: str
+    :param confidence_level: The confidence level of the intervals of the long form outputs
+    :type confidence_level: float
+    :param callable_bases_file: The callable bases file written by callable_bases.py, to compute TN from the callable
+    reference bases of the query gVCF files; None to compute it from the number of bases
+    :type callable_bases_file: str
+    :param history_file: The history file (SQLite, see metrics_history.py), or None
+    :type history_file: str
+    :param run_label: The label of the run in the history file, e.g. the pipeline version, or None
+    :type run_label: str
+    :param subtypes: True to write the long form tables of all the rows of the extended.csv files
+    (Subtype_benchmarking_metrics_YYYY-MM-DD.csv and/or .jsonl); not with annotated_vcf
+    :type subtypes: bool
+    :param check: True to check that the extended.csv, summary.csv, metrics.json and counts.json files of each case
+    agree before the metrics are computed
+    :type check: bool
+
+    :return: List of the output files
+    :rtype: list
+
+    :raises ValueError: If input files, or the callable bases of a case, are missing, or if the hap.py outputs do not
+    agree
+    """
+    if subtypes and annotated_vcf:
+        raise ValueError('The subtype metrics are read from the extended.csv files, not from the annotated VCF files.')
+
+    metrics = instrumentation.METRICS
 
-    for case_dir_file in os.listdir(input_dir):
-        if case_dir_file.startswith('NA') or case_dir_file.startswith('HuRef'):
-            files_list = os.listdir(os.path.join(input_dir, case_dir_file))
+    with metrics.stage('discover'):
+        num_bases_file, cases = discover_cases(input_dir, get_required_suffixes(annotated_vcf))
 
-            case_name = case_dir_file
+    metrics.count('cases_discovered', len(cases))
+    metrics.count('files_discovered', sum(len(case_files) for case_files in cases.values()))
 
-            verify_required_files_exists(files_list, case_name)
+    with metrics.stage('number_of_bases'):
+        num_bases_whole_exome_dict, num_bases_coding_exons_dict = get_number_of_bases(num_bases_file, bed_manifest,
+                                                                                      bed_cache)
 
-            whole_exome_indel = list()
-            coding_indel = list()
+    jobs = list()
 
-            for casefilename in os.listdir(os.path.join(input_dir, case_dir_file)):
-                path = os.path.join(input_dir, case_dir_file)
+    for case_name in sorted(cases):
+        verify_required_files_exists(cases[case_name].values(), case_name, annotated_vcf)
+        jobs.extend(get_jobs(cases[case_name], case_name, num_bases_whole_exome_dict, num_bases_coding_exons_dict))
 
-                if casefilename.endswith('WholeExomeRegions.extended.csv'):
-                    num_bases = num_bases_whole_exome_dict[case_name]
-                    whole_exome_indel, snp = get_indel_and_snp(path, casefilename, case_name, num_bases)
-                    whole_exome_snp_list.append(snp)
+    if check:
+        with metrics.stage('check'):
+            check_outputs(cases, annotated_vcf)
 
-                elif casefilename.endswith('CodingExons.extended.csv'):
-                    num_bases = num_bases_coding_exons_dict[case_name]
-                    coding_indel, snp = get_indel_and_snp(path, casefilename, case_name, num_bases)
-                    coding_exons_snp_list.append(snp)
+    with metrics.stage('parse'):
+        if cache_file is None:
+            parsed = parse_files(jobs, processes=processes)
+        else:
+            with parse_cache.ParseCache(cache_file) as cache:
+                parsed = parse_files(jobs, cache, processes)
+                cache.evict(input_dir)
 
-                else:  # skip all other files
-                    continue
+    with metrics.stage('aggregate'):
+        case_metrics = [get_case_metrics(cases[case_name], parsed, annotated_vcf) for case_name in sorted(cases)]
 
-            for casefilename in os.listdir(os.path.join(input_dir, case_dir_file)):
-                path = os.path.join(input_dir, case_dir_file)
+        if callable_bases_file is not None:
+            case_metrics = apply_callable_bases(case_metrics, *create_base_num_dicts(callable_bases_file))
 
-                if casefilename.endswith('WholeExomeRegions_indelSizeDistribution.txt'):
-                    num_bases = num_bases_whole_exome_dict[case_name]
-                    indel_by_size = get_indel_by_size(path, casefilename, case_name, num_bases)
-                    whole_exome_indel_list.append([whole_exome_indel] + indel_by_size)
+    output_files = write_outputs(case_metrics, get_output_file(output_dir, create_date), output_formats,
+                                 confidence_level)
 
-                elif casefilename.endswith('CodingExons_indelSizeDistribution.txt'):
-                    num_bases = num_bases_coding_exons_dict[case_name]
-                    indel_by_size = get_indel_by_size(path, casefilename, case_name, num_bases)
-                    coding_exons_indel_list.append([coding_indel] + indel_by_size)
+    if subtypes:
+        with metrics.stage('write_subtypes'):
+            output_files.extend(write_subtype_outputs(get_subtype_rows(cases, parsed), output_dir, output_formats,
+                                                      create_date, confidence_level))
+
+    if history_file is not None:
+        with metrics.stage('history'):
+            with metrics_history.MetricsHistory(history_file) as history:
+                history.add_run(get_metrics_rows(case_metrics), create_date, run_label)
+
+    return output_files
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It creates the benchmarking metrics file from the input directory (see run()).
 
-                else:  # skip all other files
-                    continue
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", help="The input directory; default is current directory", default='.')
+    parser.add_argument("-o", "--output", help="The output directory; default is current directory", default='.')
+    parser.add_argument("-a", "--annotated-vcf", action='store_true',
+                        help="Read the annotated VCF files written by hap.py instead of the extended.csv and "
+                             "indelSizeDistribution.txt files")
+    parser.add_argument("-p", "--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="The number of input files parsed in parallel; default is the number of CPUs")
+    parser.add_argument("-c", "--cache", help="The parse cache file (SQLite); only new or changed input files are "
+                                              "parsed. Default is no cache")
+    parser.add_argument("-b", "--bed-manifest",
+                        help="Tab delimited file with the case name, the whole exome BED file and the coding exons BED "
+                             "file of each case; the number of bases are computed from the BED files instead of read "
+                             "from the number_of_bases file")
+    parser.add_argument("--bed-cache", help="The cache directory of the number of bases of the BED files; default is "
+                                            "no cache")
+    parser.add_argument("-f", "--format", nargs='+', choices=['tsv', 'csv', 'jsonl'], default=['tsv'],
+                        help="The output formats: tsv (the benchmarking metrics file), csv and jsonl (long form tables "
+                             "with one line per case, region, variant class and indel size bin); default is tsv")
+    parser.add_argument("--confidence-level", type=float, default=metrics_engine.DEFAULT_CONFIDENCE_LEVEL,
+                        help="The confidence level of the Wilson score intervals of precision, recall and NPA in the "
+                             "long form tables; default is {}".format(metrics_engine.DEFAULT_CONFIDENCE_LEVEL))
+    parser.add_argument("--callable-bases",
+                        help="The callable bases file written by callable_bases.py: TN is computed from the callable "
+                             "reference bases of the query gVCF files instead of the number of bases, and the TN "
+                             "column is named 'TN = CallableReferenceBases - FN'")
+    parser.add_argument("--subtypes", action='store_true',
+                        help="Also write the metrics of every row of the extended.csv files (Alleles.DEL, SNP.het, "
+                             "INDEL.homalt, ...) to long form tables, in the csv and jsonl formats of --format (csv "
+                             "if neither)")
+    parser.add_argument("--check-outputs", action='store_true',
+                        help="Check that the extended.csv, summary.csv, metrics.json and counts.json files of hap.py "
+                             "agree before computing the metrics")
+    parser.add_argument("--history", help="Add the metrics of the run to this history file (SQLite), which "
+                                          "metrics_history.py queries; default is no history file")
+    parser.add_argument("--label", help="The label of the run in the history file, e.g. the pipeline version")
+    parser.add_argument("--metrics", help="Write the stage times and counters of the run to this file: Prometheus "
+                                          "text if it ends in .prom or .txt, JSON otherwise; default is no metrics "
+                                          "file")
+    parser.add_argument("--profile", action='store_true',
+                        help="Run under cProfile and write the profile (*.prof) and a report (*.profile.txt) next to "
+                             "the output file")
+
+    args = parser.parse_args()
+
+    if not 0 < args.confidence_level < 1:
+        parser.error('the confidence level must be between 0 and 1')
+
+    if args.subtypes and args.annotated_vcf:
+        parser.error('--subtypes reads the extended.csv files; it cannot be used with --annotated-vcf')
+
+    def run_args():
+        output_files = run(args.input, args.output, args.annotated_vcf, args.processes, args.cache,
+                           args.bed_manifest, args.bed_cache, args.format, confidence_level=args.confidence_level,
+                           callable_bases_file=args.callable_bases, history_file=args.history,
+                           run_label=args.label, subtypes=args.subtypes, check=args.check_outputs)
+
+        for output_file in output_files:
+            print 'Output file created. It can be found at', output_file
+
+    if args.metrics is not None:
+        instrumentation.METRICS.enable()
+
+    try:
+        if args.profile:
+            instrumentation.run_profiled(run_args, os.path.splitext(get_output_file(args.output))[0])
         else:
-            continue
+            run_args()
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
 
-    create_output(whole_exome_indel_list, whole_exome_snp_list, coding_exons_indel_list, coding_exons_snp_list)
+    if args.metrics is not None:
+        instrumentation.METRICS.write(args.metrics, 'benchmarking_truth_set')
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,708 @@
+"""
+This module reads and writes BGZF compressed files (bgzipped VCF files).  It also reads their tabix (.tbi) or CSI (.csi)
+indexes, so that only the compressed blocks that cover a genomic region have to be read and decompressed.
+
+The BGZF, tabix and CSI formats are described in the SAM/BAM and tabix specifications (https://samtools.github.io/hts-specs/).
+
+get_file_hash() returns the SHA-1 hash of the content of a file, the cache key of the caches of the other scripts.
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import struct
+import zlib
+
+TBI_MAGIC = b'TBI\x01'
+CSI_MAGIC = b'CSI\x01'
+
+TBI_MIN_SHIFT = 14
+TBI_DEPTH = 5
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+BGZF_BLOCK_SIZE = 0xff00  # uncompressed bytes per block, as written by bgzip
+BGZF_HEADER = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+BGZF_EOF = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+
+def is_bgzf(filename):
+    """
+    This function returns True if the file starts with a BGZF block header.
+
+    :param filename: The file name
+    :type filename: str
+
+    :rtype: bool
+    """
+    with open(filename, 'rb') as file_obj:
+        header = file_obj.read(14)
+
+    return header[:4] == BGZF_HEADER[:4] and header[12:14] == b'BC'
+
+
+def open_vcf(filename):
+    """
+    This function opens a VCF file for reading.  Files ending in '.gz' (gzip or bgzip compressed) are decompressed while
+    they are read, so the uncompressed file is never written to disk.  Bgzipped files are read block by block.
+
+    :param filename: The VCF file name
+    :type filename: str
+
+    :return: A file object that iterates over the lines of the VCF file
+    :rtype: file
+    """
+    if filename.endswith('.gz'):
+        if is_bgzf(filename):
+            return BgzfReader(filename)
+        else:
+            return io.BufferedReader(gzip.open(filename, 'rb'))
+    else:
+        return open(filename, 'r')
+
+
+def get_index_file(vcf_file):
+    """
+    This function returns the tabix or CSI index file of a bgzipped VCF file.
+
+    :param vcf_file: The VCF file name
+    :type vcf_file: str
+
+    :return: The index file name, or None if the VCF file is not compressed or has no index
+    :rtype: str
+    """
+    if not vcf_file.endswith('.gz'):
+        return None
+
+    for suffix in ['.tbi', '.csi']:
+        if os.path.isfile(vcf_file + suffix):
+            return vcf_file + suffix
+
+    return None
+
+
+def get_file_hash(filename):
+    """
+    This function returns the SHA-1 hash of the content of a file.
+
+    :param filename: The file name
+    :type filename: str
+
+    :return: The hexadecimal SHA-1 hash
+    :rtype: str
+    """
+    sha1 = hashlib.sha1()
+
+    with open(filename, 'rb') as file_obj:
+        chunk = file_obj.read(HASH_CHUNK_SIZE)
+
+        while chunk:
+            sha1.update(chunk)
+            chunk = file_obj.read(HASH_CHUNK_SIZE)
+
+    return sha1.hexdigest()
+
+
+def reg2bins(beg, end, min_shift, depth):
+    """
+    This function returns the bins that may contain records overlapping the 0-based, half-open region [beg, end).
+
+    :param beg: Region start (0-based)
+    :type beg: int
+    :param end: Region end (exclusive)
+    :type end: int
+    :param min_shift: Number of bits of the smallest bin (14 for tabix)
+    :type min_shift: int
+    :param depth: Number of levels of the binning index (5 for tabix)
+    :type depth: int
+
+    :return: List of bin numbers
+    :rtype: list
+    """
+    bins = list()
+    end -= 1
+    shift = min_shift + depth * 3
+    first_bin = 0
+
+    for level in range(depth + 1):
+        bins.extend(range(first_bin + (beg >> shift), first_bin + (end >> shift) + 1))
+        first_bin += 1 << (level * 3)
+        shift -= 3
+
+    return bins
+
+
+def reg2bin(beg, end, min_shift=TBI_MIN_SHIFT, depth=TBI_DEPTH):
+    """
+    This function returns the smallest bin that contains the 0-based, half-open region [beg, end).
+
+    :param beg: Region start (0-based)
+    :type beg: int
+    :param end: Region end (exclusive)
+    :type end: int
+    :param min_shift: Number of bits of the smallest bin (14 for tabix)
+    :type min_shift: int
+    :param depth: Number of levels of the binning index (5 for tabix)
+    :type depth: int
+
+    :rtype: int
+    """
+    end -= 1
+    shift = min_shift
+    first_bin = ((1 << (depth * 3)) - 1) // 7
+
+    for level in range(depth, 0, -1):
+        if beg >> shift == end >> shift:
+            return first_bin + (beg >> shift)
+
+        shift += 3
+        first_bin -= 1 << ((level - 1) * 3)
+
+    return 0
+
+
+class BinningIndex(object):
+    """
+    A tabix or CSI binning index.  For each sequence name it holds the chunks (pairs of BGZF virtual offsets) of every
+    bin, and for tabix indexes the linear index of 16 kb windows.
+    """
+
+    def __init__(self, index_file):
+        """
+        :param index_file: The .tbi or .csi file name
+        :type index_file: str
+        """
+        self.min_shift = TBI_MIN_SHIFT
+        self.depth = TBI_DEPTH
+        self.names = list()
+        self.bins = list()  # one dict per sequence: bin -> list of (chunk_beg, chunk_end)
+        self.linear = list()  # one list of virtual offsets per sequence (tabix only)
+
+        with BgzfReader(index_file) as index_obj:
+            data = index_obj.read_all()
+
+        magic = data[:4]
+
+        if magic == TBI_MAGIC:
+            self._parse_tbi(data)
+        elif magic == CSI_MAGIC:
+            self._parse_csi(data)
+        else:
+            raise ValueError('{} is not a tabix or CSI index'.format(index_file))
+
+        self.tid = dict((name, tid) for tid, name in enumerate(self.names))
+
+    def _parse_names(self, data, offset):
+        """
+        This function parses the tabix header (format, columns, meta character, skip, sequence names).
+
+        :return: The offset of the first byte after the header
+        :rtype: int
+        """
+        l_nm = struct.unpack_from('<i', data, offset + 24)[0]
+        offset += 28
+        self.names = [name.decode('ascii') if not isinstance(name, str) else name
+                      for name in data[offset:offset + l_nm].split(b'\x00') if name]
+
+        return offset + l_nm
+
+    def _parse_tbi(self, data):
+        n_ref = struct.unpack_from('<i', data, 4)[0]
+        offset = self._parse_names(data, 8)
+
+        for _ in range(n_ref):
+            ref_bins = dict()
+            n_bin = struct.unpack_from('<i', data, offset)[0]
+            offset += 4
+
+            for _ in range(n_bin):
+                bin_number, n_chunk = struct.unpack_from('<Ii', data, offset)
+                offset += 8
+                chunks = struct.unpack_from('<{}Q'.format(2 * n_chunk), data, offset)
+                offset += 16 * n_chunk
+                ref_bins[bin_number] = list(zip(chunks[0::2], chunks[1::2]))
+
+            n_intv = struct.unpack_from('<i', data, offset)[0]
+            offset += 4
+            self.linear.append(struct.unpack_from('<{}Q'.format(n_intv), data, offset))
+            offset += 8 * n_intv
+
+            self.bins.append(ref_bins)
+
+    def _parse_csi(self, data):
+        self.min_shift, self.depth, l_aux = struct.unpack_from('<iii', data, 4)
+        offset = 16
+
+        if l_aux >= 28:
+            self._parse_names(data, offset)
+
+        offset += l_aux
+        n_ref = struct.unpack_from('<i', data, offset)[0]
+        offset += 4
+
+        for _ in range(n_ref):
+            ref_bins = dict()
+            n_bin = struct.unpack_from('<i', data, offset)[0]
+            offset += 4
+
+            for _ in range(n_bin):
+                bin_number, _, n_chunk = struct.unpack_from('<IQi', data, offset)
+                offset += 16
+                chunks = struct.unpack_from('<{}Q'.format(2 * n_chunk), data, offset)
+                offset += 16 * n_chunk
+                ref_bins[bin_number] = list(zip(chunks[0::2], chunks[1::2]))
+
+            self.linear.append(())
+            self.bins.append(ref_bins)
+
+    def get_chunks(self, chrom, beg, end):
+        """
+        This function returns the merged chunks of the BGZF file that may hold records overlapping a region.
+
+        :param chrom: The sequence name
+        :type chrom: str
+        :param beg: Region start (0-based)
+        :type beg: int
+        :param end: Region end (exclusive)
+        :type end: int
+
+        :return: Sorted list of (start virtual offset, end virtual offset)
+        :rtype: list
+        """
+        tid = self.tid.get(chrom)
+
+        if tid is None:
+            return list()
+
+        ref_bins = self.bins[tid]
+        linear = self.linear[tid]
+        window = beg >> TBI_MIN_SHIFT
+        min_offset = linear[window] if window < len(linear) else 0
+
+        chunks = list()
+
+        for bin_number in reg2bins(beg, end, self.min_shift, self.depth):
+            for chunk_beg, chunk_end in ref_bins.get(bin_number, ()):
+                if chunk_end > min_offset:
+                    chunks.append((max(chunk_beg, min_offset), chunk_end))
+
+        chunks.sort()
+
+        merged = list()
+
+        for chunk_beg, chunk_end in chunks:
+            if merged and chunk_beg <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+            else:
+                merged.append((chunk_beg, chunk_end))
+
+        return merged
+
+
+class BgzfReader(object):
+    """
+    Random access to the lines of a BGZF compressed file by virtual offset.  The most recently decompressed block is
+    kept, so neighbouring queries do not decompress the same block twice.  Iterating over the reader yields all the
+    lines of the file.
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: The BGZF file name
+        :type filename: str
+        """
+        self.file_obj = open(filename, 'rb')
+        self.block_offset = None
+        self.block_data = b''
+        self.block_size = 0
+        self.bytes_read = 0  # compressed bytes of the blocks read
+
+    def close(self):
+        self.file_obj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def load_block(self, block_offset):
+        """
+        This function reads and decompresses the BGZF block that starts at the given file offset.
+
+        :param block_offset: The offset of the block in the compressed file
+        :type block_offset: int
+
+        :return: The size of the compressed block (0 at the end of the file)
+        :rtype: int
+        """
+        if block_offset == self.block_offset:
+            return self.block_size
+
+        self.file_obj.seek(block_offset)
+        header = self.file_obj.read(12)
+
+        if len(header) < 12:  # end of file
+            self.block_offset = block_offset
+            self.block_data = b''
+            self.block_size = 0
+            return 0
+
+        xlen = struct.unpack('<H', header[10:12])[0]
+        extra = self.file_obj.read(xlen)
+
+        block_size = None
+        position = 0
+
+        while position < xlen:
+            subfield_id = extra[position:position + 2]
+            subfield_len = struct.unpack('<H', extra[position + 2:position + 4])[0]
+
+            if subfield_id == b'BC':
+                block_size = struct.unpack('<H', extra[position + 4:position + 6])[0] + 1
+
+            position += 4 + subfield_len
+
+        if block_size is None:
+            raise IOError('Not a BGZF file: {}'.format(self.file_obj.name))
+
+        compressed = self.file_obj.read(block_size - 12 - xlen - 8)
+
+        self.block_offset = block_offset
+        self.block_data = zlib.decompress(compressed, -15)
+        self.block_size = block_size
+        self.bytes_read += block_size
+
+        return block_size
+
+    def __iter__(self):
+        """
+        This function yields the lines of the file, with their trailing newline, from the first block to the end of the
+        file.
+
+        :return: Generator of lines
+        :rtype: generator
+        """
+        block_offset = 0
+        pending = b''
+
+        while self.load_block(block_offset):
+            lines = (pending + self.block_data).splitlines(True)
+
+            if lines and not lines[-1].endswith(b'\n'):
+                pending = lines.pop()
+            else:
+                pending = b''
+
+            for line in lines:
+                yield line
+
+            block_offset += self.block_size
+
+        if pending:
+            yield pending
+
+    def iter_offsets(self):
+        """
+        This function yields the lines of the file with the virtual offsets where they start and end, as needed to
+        index the file.
+
+        :return: Generator of tuples of (start virtual offset, end virtual offset, line without the trailing newline)
+        :rtype: generator
+        """
+        block_offset = 0
+        pending = b''
+        pending_start = 0
+
+        while self.load_block(block_offset):
+            data = self.block_data
+            within = 0
+
+            while True:
+                newline = data.find(b'\n', within)
+
+                if newline == -1:
+                    if within < len(data):
+                        if not pending:
+                            pending_start = (block_offset << 16) | within
+
+                        pending += data[within:]
+
+                    break
+
+                start = pending_start if pending else (block_offset << 16) | within
+                line = pending + data[within:newline]
+                pending = b''
+                within = newline + 1
+
+                if within < len(data):
+                    end = (block_offset << 16) | within
+                else:
+                    end = (block_offset + self.block_size) << 16
+
+                yield start, end, line
+
+            block_offset += self.block_size
+
+        if pending:
+            yield pending_start, block_offset << 16, pending
+
+    def read_all(self):
+        """
+        This function decompresses every block of the file, from the first block to the end of the file.
+
+        :return: The decompressed file content
+        :rtype: str
+        """
+        blocks = list()
+        block_offset = 0
+
+        while self.load_block(block_offset):
+            blocks.append(self.block_data)
+            block_offset += self.block_size
+
+        return b''.join(blocks)
+
+    def iter_lines(self, start, end):
+        """
+        This function yields the lines that start at or after virtual offset `start` and before virtual offset `end`.
+
+        :param start: Start virtual offset (compressed block offset << 16 | offset in the uncompressed block)
+        :type start: int
+        :param end: End virtual offset
+        :type end: int
+
+        :return: Generator of lines, without the trailing newline
+        :rtype: generator
+        """
+        block_offset = start >> 16
+        within = start & 0xFFFF
+        pending = b''
+        line_start = start
+
+        while line_start < end:
+            if not self.load_block(block_offset):
+                break
+
+            data = self.block_data
+
+            while True:
+                newline = data.find(b'\n', within)
+
+                if newline == -1:
+                    pending += data[within:]
+                    break
+
+                yield pending + data[within:newline]
+
+                pending = b''
+                within = newline + 1
+
+                if within < len(data):
+                    line_start = (block_offset << 16) | within
+                else:
+                    line_start = (block_offset + self.block_size) << 16
+
+                if line_start >= end:
+                    return
+
+            block_offset += self.block_size
+            within = 0
+
+            if not pending:
+                line_start = block_offset << 16
+
+
+def query_lines(reader, index, chrom, beg, end):
+    """
+    This function yields the lines of a bgzipped, indexed VCF file that overlap the region.  Records are kept when
+    their sequence name matches and their POS column lies in [beg + 1, end].
+
+    :param reader: The BGZF reader of the VCF file
+    :type reader: BgzfReader
+    :param index: The binning index of the VCF file
+    :type index: BinningIndex
+    :param chrom: The sequence name
+    :type chrom: str
+    :param beg: Region start (0-based)
+    :type beg: int
+    :param end: Region end (exclusive)
+    :type end: int
+
+    :return: Generator of split lines (list of column values, the INFO column and beyond are not split)
+    :rtype: generator
+    """
+    for chunk_beg, chunk_end in index.get_chunks(chrom, beg, end):
+        for line in reader.iter_lines(chunk_beg, chunk_end):
+            if not isinstance(line, str):
+                line = line.decode('ascii')
+
+            line_items = line.split('\t', 7)
+
+            if line_items[0] != chrom:
+                continue
+
+            pos = int(line_items[1])
+
+            if pos > end:  # records are sorted by position within a chunk
+                break
+            elif pos > beg:
+                yield line_items
+
+
+class BgzfWriter(object):
+    """
+    Writes a BGZF compressed file that can be read by gzip, bgzip, tabix and bcftools.  Data is buffered and written as
+    blocks of at most 64 kb, and the empty end-of-file block is added when the writer is closed.
+    """
+
+    def __init__(self, filename, compress_level=6):
+        """
+        :param filename: The output file name
+        :type filename: str
+        :param compress_level: The zlib compression level
+        :type compress_level: int
+        """
+        self.file_obj = open(filename, 'wb')
+        self.compress_level = compress_level
+        self.buffer = list()
+        self.buffer_size = 0
+
+    def write(self, data):
+        """
+        This function buffers data and writes out every full block.
+
+        :param data: The data to write
+        :type data: str
+        """
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+
+        if self.buffer_size >= BGZF_BLOCK_SIZE:
+            data = b''.join(self.buffer)
+            position = 0
+
+            while len(data) - position >= BGZF_BLOCK_SIZE:
+                self._write_block(data[position:position + BGZF_BLOCK_SIZE])
+                position += BGZF_BLOCK_SIZE
+
+            self.buffer = [data[position:]]
+            self.buffer_size = len(data) - position
+
+    def tell(self):
+        """
+        This function returns the virtual offset of the next byte written, for indexing the file.
+
+        :rtype: int
+        """
+        return (self.file_obj.tell() << 16) | self.buffer_size
+
+    def _write_block(self, data):
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+
+        self.file_obj.write(BGZF_HEADER)
+        self.file_obj.write(struct.pack('<H', len(compressed) + 25))
+        self.file_obj.write(compressed)
+        self.file_obj.write(struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data)))
+
+    def close(self):
+        if self.buffer_size:
+            self._write_block(b''.join(self.buffer))
+
+        self.buffer = list()
+        self.buffer_size = 0
+        self.file_obj.write(BGZF_EOF)
+        self.file_obj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_tabix_index(vcf_file, index_file=None):
+    """
+    This function writes the tabix index of a bgzipped VCF file, like 'tabix -p vcf'.  The records must be sorted by
+    position and the records of each sequence must be together.
+
+    :param vcf_file: The bgzipped VCF file name
+    :type vcf_file: str
+    :param index_file: The index file name; default is the VCF file name with '.tbi' added
+    :type index_file: str
+
+    :return: The index file name
+    :rtype: str
+    """
+    if index_file is None:
+        index_file = vcf_file + '.tbi'
+
+    names = list()
+    bins = list()  # one dict per sequence: bin -> list of [chunk_beg, chunk_end]
+    linear = list()  # one dict per sequence: 16 kb window -> virtual offset of the first record in it
+    chrom = None
+    last_beg = 0
+
+    with BgzfReader(vcf_file) as reader:
+        for start, end, line in reader.iter_offsets():
+            if not line or line.startswith(b'#'):
+                continue
+
+            line_items = line.split(b'\t', 5)
+
+            if line_items[0] != chrom:
+                chrom = line_items[0]
+
+                if chrom in names:
+                    raise ValueError('{} is not sorted: the records of {} are not together'.format(vcf_file, chrom))
+
+                names.append(chrom)
+                bins.append(dict())
+                linear.append(dict())
+                last_beg = 0
+
+            beg = int(line_items[1]) - 1
+
+            if beg < last_beg:
+                raise ValueError('{} is not sorted at {}:{}'.format(vcf_file, chrom, beg + 1))
+
+            last_beg = beg
+            chunks = bins[-1].setdefault(reg2bin(beg, beg + max(1, len(line_items[3]))), list())
+
+            if chunks and chunks[-1][1] == start:
+                chunks[-1][1] = end
+            else:
+                chunks.append([start, end])
+
+            for window in range(beg >> TBI_MIN_SHIFT, (beg + max(1, len(line_items[3])) - 1 >> TBI_MIN_SHIFT) + 1):
+                linear[-1].setdefault(window, start)
+
+    names_data = b''.join(name + b'\x00' for name in names)
+    data = [TBI_MAGIC, struct.pack('<i', len(names)),
+            struct.pack('<iiiiii', 2, 1, 2, 0, ord('#'), 0),  # VCF format: sequence and position columns, '#' header
+            struct.pack('<i', len(names_data)), names_data]
+
+    for ref_bins, ref_linear in zip(bins, linear):
+        data.append(struct.pack('<i', len(ref_bins)))
+
+        for bin_number in sorted(ref_bins):
+            chunks = ref_bins[bin_number]
+            data.append(struct.pack('<Ii', bin_number, len(chunks)))
+            data.extend(struct.pack('<QQ', chunk_beg, chunk_end) for chunk_beg, chunk_end in chunks)
+
+        offsets = list()
+        offset = ref_linear[min(ref_linear)] if ref_linear else 0  # the windows before the first record
+
+        for window in range(max(ref_linear) + 1 if ref_linear else 0):
+            offset = ref_linear.get(window, offset)  # an empty window takes the offset of the window before it
+            offsets.append(offset)
+
+        data.append(struct.pack('<i', len(offsets)))
+        data.append(struct.pack('<{}Q'.format(len(offsets)), *offsets))
+
+    with BgzfWriter(index_file) as index_obj:
+        index_obj.write(b''.join(data))
+
+    return index_file
@@ -0,0 +1,306 @@
+#!/usr/bin/python
+
+"""
+This script computes the callable reference bases of each case in the whole exome and coding exons regions, from the
+reference blocks of the query gVCF file, for the true negatives of benchmarking_truth_set.py (--callable-bases).
+
+The number of bases of a region counts every base of the BED file as a true negative candidate, even the bases where
+the caller had no coverage, which inflates TN and NPA for low-coverage exomes.  The callable reference bases are the
+bases of the region that the gVCF file calls homozygous reference: the reference blocks (ALT <NON_REF>, <*> or '.',
+spanning POS to INFO/END) with a 0/0 genotype and, with -q, a GQ of at least the threshold.
+
+The gVCF file is swept once, together with the sorted, merged regions of the BED files: the regions of each chromosome
+are walked with a pointer that only moves forward, so the sweep is linear in the number of blocks and regions, and its
+memory does not depend on the size of the gVCF file.  Blocks that overlap a previous block are only counted once.  The
+gVCF file must be sorted, with the records of each chromosome together.
+
+The output file has the layout of the number_of_bases file: case name, callable bases in the whole exome, callable bases
+in the coding exons.  It is created from a manifest with one line per case, or for a single case:
+
+    #case   gVCF                                  whole exome BED             coding exons BED
+    NA12878 NA12878.recal.annotated.final.g.vcf.gz  NA12878_WholeExome.bed  NA12878_CodingExons.bed
+"""
+
+import argparse
+import multiprocessing
+import re
+import sys
+
+import bed_index
+import bgzf
+
+REFERENCE_ALTS = ('<NON_REF>', '<*>', '.')
+GT_SEPARATOR = re.compile(r'[/|]')
+
+
+def get_block_end(pos, ref, info):
+    """
+    This function returns the last position of a gVCF record: INFO/END, or the last base of REF.
+
+    :param pos: The POS column
+    :type pos: int
+    :param ref: The REF column
+    :type ref: str
+    :param info: The INFO column
+    :type info: str
+
+    :return: The 1-based last position
+    :rtype: int
+    """
+    if info.startswith('END='):
+        start = 4
+    else:
+        start = info.find(';END=')
+
+        if start == -1:
+            return pos + len(ref) - 1
+
+        start += 5
+
+    end = info.find(';', start)
+
+    return int(info[start:] if end == -1 else info[start:end])
+
+
+def iter_reference_blocks(gvcf_file, min_gq=0):
+    """
+    This function streams a gVCF file and yields its homozygous reference blocks: records with ALT <NON_REF>, <*> or
+    '.', FILTER PASS or '.', a 0/0 genotype in the first sample and a GQ of at least min_gq.  Variant records are
+    rejected on their ALT column, before the other columns are parsed.
+
+    :param gvcf_file: The gVCF file (plain text or gzip/bgzip compressed)
+    :type gvcf_file: str
+    :param min_gq: The minimum GQ of a block; 0 to keep all the blocks
+    :type min_gq: int
+
+    :return: Generator of tuples of (chrom, start, end), 0-based and half-open
+    :rtype: generator
+    """
+    format_indexes = dict()  # FORMAT column -> (index of GT, index of GQ or None)
+
+    with bgzf.open_vcf(gvcf_file) as gvcf_obj:
+        for line in gvcf_obj:
+            if line.startswith('#'):
+                continue
+
+            line_items = line.rstrip('\n').split('\t', 10)
+
+            if len(line_items) < 10 or line_items[4] not in REFERENCE_ALTS:
+                continue
+
+            if line_items[6] != 'PASS' and line_items[6] != '.':
+                continue
+
+            indexes = format_indexes.get(line_items[8])
+
+            if indexes is None:
+                format_keys = line_items[8].split(':')
+                indexes = (format_keys.index('GT') if 'GT' in format_keys else None,
+                           format_keys.index('GQ') if 'GQ' in format_keys else None)
+                format_indexes[line_items[8]] = indexes
+
+            gt_index, gq_index = indexes
+            sample_values = line_items[9].split(':')
+
+            if gt_index is None or gt_index >= len(sample_values) or \
+                    any(allele != '0' for allele in GT_SEPARATOR.split(sample_values[gt_index])):
+                continue
+
+            if min_gq:
+                if gq_index is None or gq_index >= len(sample_values) or not sample_values[gq_index].isdigit() or \
+                        int(sample_values[gq_index]) < min_gq:
+                    continue
+
+            pos = int(line_items[1])
+
+            yield line_items[0], pos - 1, get_block_end(pos, line_items[3], line_items[7])
+
+
+def sweep_callable_bases(blocks, regions_list):
+    """
+    This function sweeps the reference blocks of a gVCF file together with the regions of BED files, and returns the
+    number of bases of each BED file's regions that are in a block.
+
+    :param blocks: The reference blocks, as yielded by iter_reference_blocks(), sorted by chromosome and start
+    :type blocks: iterable
+    :param regions_list: The regions of each BED file
+    :type regions_list: list
+
+    :return: List of the callable bases of each BED file
+    :rtype: list
+
+    :raises ValueError: If the blocks are not sorted
+    """
+    totals = [0] * len(regions_list)
+    done_chroms = set()
+    chrom = None
+    region_lists = list()
+    pointers = list()
+    covered_end = 0
+    last_start = 0
+
+    for block_chrom, start, end in blocks:
+        if block_chrom != chrom:
+            done_chroms.add(chrom)
+            chrom = block_chrom
+
+            if chrom in done_chroms:
+                raise ValueError('The gVCF file is not sorted: the records of {} are not together'.format(chrom))
+
+            region_lists = [(regions.starts.get(chrom, []), regions.ends.get(chrom, [])) for regions in regions_list]
+            pointers = [0] * len(regions_list)
+            covered_end = 0
+            last_start = 0
+        elif start < last_start:
+            raise ValueError('The gVCF file is not sorted at {}:{}'.format(chrom, start + 1))
+
+        last_start = start
+        start = max(start, covered_end)  # count the bases of overlapping blocks once
+
+        if start >= end:
+            continue
+
+        covered_end = end
+
+        for number, (starts, ends) in enumerate(region_lists):
+            pointer = pointers[number]
+
+            while pointer < len(ends) and ends[pointer] <= start:  # regions before the block are done
+                pointer += 1
+
+            pointers[number] = pointer
+
+            while pointer < len(starts) and starts[pointer] < end:
+                totals[number] += min(ends[pointer], end) - max(starts[pointer], start)
+                pointer += 1
+
+    return totals
+
+
+def get_case_callable_bases(job):
+    """
+    This function returns the callable bases of a case in the whole exome and coding exons regions.
+
+    :param job: Tuple of (case name, gVCF file, whole exome BED file, coding exons BED file, minimum GQ)
+    :type job: tuple
+
+    :return: Tuple of (case name, callable bases in the whole exome, callable bases in the coding exons)
+    :rtype: tuple
+    """
+    case_name, gvcf_file, whole_exome_bed, coding_exons_bed, min_gq = job
+    regions_list = [bed_index.BedIndex(whole_exome_bed), bed_index.BedIndex(coding_exons_bed)]
+
+    try:
+        whole_exome, coding_exons = sweep_callable_bases(iter_reference_blocks(gvcf_file, min_gq), regions_list)
+    except ValueError as error:
+        raise ValueError('{}: {}'.format(gvcf_file, error))
+
+    return case_name, whole_exome, coding_exons
+
+
+def read_manifest(manifest):
+    """
+    This function reads a manifest of tab delimited lines: case name, gVCF file, whole exome BED file and coding exons
+    BED file.
+
+    :param manifest: The manifest file
+    :type manifest: str
+
+    :return: List of tuples of (case name, gVCF file, whole exome BED file, coding exons BED file)
+    :rtype: list
+    """
+    cases = list()
+
+    with open(manifest, 'r') as manifest_obj:
+        for line in manifest_obj:
+            if line.startswith('#') or not line.strip():
+                continue
+
+            line_items = line.strip().split('\t')
+
+            if len(line_items) < 4:
+                raise ValueError('The manifest line has less than four columns: {}'.format(line.strip()))
+
+            cases.append(tuple(line_items[:4]))
+
+    return cases
+
+
+def write_callable_bases(rows, output_file):
+    """
+    This function writes the callable bases file, with the layout of the number_of_bases file.
+
+    :param rows: List of tuples of (case name, callable bases in the whole exome, callable bases in the coding exons)
+    :type rows: list
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    with open(output_file, 'w') as outfile_obj:
+        outfile_obj.write('#case\tcallable bases whole exome\tcallable bases coding exons\n')
+
+        for row in rows:
+            outfile_obj.write('\t'.join(str(value) for value in row) + '\n')
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It creates the callable bases file of the cases.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--manifest",
+                        help="Tab delimited file with the case name, the gVCF file, the whole exome BED file and the "
+                             "coding exons BED file of each case")
+    parser.add_argument("-c", "--case", help="Single case: the case name")
+    parser.add_argument("-g", "--gvcf", help="Single case: the gVCF file")
+    parser.add_argument("-w", "--whole-exome-bed", help="Single case: the whole exome BED file")
+    parser.add_argument("-e", "--coding-exons-bed", help="Single case: the coding exons BED file")
+    parser.add_argument("-q", "--min-gq", type=int, default=0,
+                        help="The minimum GQ of a reference block; default is 0 (all the blocks)")
+    parser.add_argument("-p", "--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="The number of gVCF files swept in parallel; default is the number of CPUs")
+    parser.add_argument("-o", "--output", required=True, help="The callable bases file")
+
+    args = parser.parse_args()
+
+    if not args.manifest and not (args.case and args.gvcf and args.whole_exome_bed and args.coding_exons_bed):
+        parser.error('a manifest, or a case, a gVCF file and two BED files, are required')
+
+    try:
+        if args.manifest:
+            cases = read_manifest(args.manifest)
+        else:
+            cases = [(args.case, args.gvcf, args.whole_exome_bed, args.coding_exons_bed)]
+
+        jobs = [case + (args.min_gq,) for case in cases]
+
+        if args.processes > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(min(args.processes, len(jobs)))
+
+            try:
+                rows = pool.map(get_case_callable_bases, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            rows = [get_case_callable_bases(job) for job in jobs]
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+    write_callable_bases(rows, args.output)
+
+    print 'Output file created. It can be found at', args.output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,527 @@
+#!/usr/bin/python
+
+"""
+This module reads all the outputs of a hap.py comparison (benchmark_<case>_<region>.extended.csv, .summary.csv,
+.metrics.json and .counts.json) into one model, HappyOutputs, and checks that they agree.
+
+It is the reader of the hap.py outputs of benchmarking_truth_set.py: the metrics of every row of an extended.csv file
+(Alleles.DEL, Locations.SNP.het, Locations.INDEL.homalt, Nucleotides.INS, ...) are read at once, as MetricsRow values of
+metrics_engine.py, and kept in the parse cache.  The benchmarking metrics file uses the Locations.SNP and
+Locations.INDEL rows; benchmarking_truth_set.py --subtypes writes all of them from the same parse.  TN is only computed
+for the Locations.SNP and Locations.INDEL rows: the number of bases is the one of the variant records of these rows,
+whereas the Nucleotides rows count bases and the other rows are subsets of the records.  Precision and recall are
+computed from the counts, like those of the other inputs of benchmarking_truth_set.py, so a row without query or truth
+variants has no precision or recall.
+
+The files are checked for consistency (HappyOutputs.check(), benchmarking_truth_set.py --check-outputs):
+
+    - the extended.csv file and the all.metrics table of the metrics.json file have the same rows and values
+    - the summary.csv file and the summary.metrics table of the metrics.json file have the same rows and values, and
+      their values are those of the extended.csv file
+    - the counts.json file and the raw.counts table of the metrics.json file have the same counts, and the TP, FN and FP
+      counts of each allele type (al__s, al__d, al__i, nuc__s, ...) add up to the Alleles and Nucleotides rows
+    - in each row, TRUTH.TOTAL = TRUTH.TP + TRUTH.FN, QUERY.TOTAL = QUERY.TP + QUERY.FP + QUERY.UNK (except the Records
+      rows, where QUERY.TOTAL counts the homref and nocall records), and METRIC.Precision and METRIC.Recall are those of
+      the counts
+
+The hap.py version and command line of the files are compared too (HappyOutputs.get_warnings()), without the output
+prefix (-o), since the workflow may rename the outputs.  A difference is a warning, not an error: the outputs of the
+benchmarking_* directories have the same values, but the metrics.json files of the coding exons name another truth VCF
+file than the CSV files.
+
+The rows of the CSV files of hap.py 0.2 are named by their first column; later versions have several key columns
+(Type, Subtype, Subset, Filter), which are joined with '.' into the row name.  The last row of the CSV files of hap.py
+0.2 is the hap.py version and command line.
+"""
+
+import collections
+import csv
+import json
+import math
+import os
+
+import metrics_engine
+
+SUFFIXES = ['.extended.csv', '.summary.csv', '.metrics.json', '.counts.json']
+# the rows of the variant records of the benchmarking metrics file, whose TN is computed from the number of bases
+LOCATIONS_ROWS = ['Locations.SNP', 'Locations.INDEL']
+RUN_INFO_PREFIX = 'hap.py-'
+OUTPUT_OPTIONS = ('-o', '--report-prefix')  # the outputs may have been renamed since, e.g. by the workflow
+# the rows of the extended.csv file and the allele types of the counts.json file that are counted in them
+ALLELE_ROWS = [('Alleles.SNP', 'al__s'), ('Alleles.DEL', 'al__d'), ('Alleles.INS', 'al__i'),
+               ('Nucleotides.SNP', 'nuc__s'), ('Nucleotides.DEL', 'nuc__d'), ('Nucleotides.INS', 'nuc__i')]
+# the columns of the extended.csv file and the (decision, side) of the counts.json keys that add up to them
+COUNT_KEYS = [('TRUTH.TP', 'TP', 'TRUTH'), ('TRUTH.FN', 'FN', 'TRUTH'), ('QUERY.TP', 'TP', 'QUERY'),
+              ('QUERY.FP', 'FP', 'QUERY')]
+RELATIVE_TOLERANCE = 1e-9  # the CSV files have 12 significant digits, the JSON files 17
+
+
+def parse_value(value):
+    """
+    This function returns a value of a hap.py output as a float, or None if it is empty, null or not a number.
+
+    :param value: The value
+    :type value: str
+
+    :rtype: float
+    """
+    if value is None:
+        return None
+
+    try:
+        value = float(value)
+    except ValueError:
+        return None
+
+    return None if math.isnan(value) else value
+
+
+def is_close(value, other_value):
+    """
+    This function returns True if two values are both None, or are the same number up to the rounding of the CSV files.
+
+    :param value: A value
+    :type value: float
+    :param other_value: The other value
+    :type other_value: float
+
+    :rtype: bool
+    """
+    if value is None or other_value is None:
+        return value is None and other_value is None
+
+    return abs(value - other_value) <= RELATIVE_TOLERANCE * max(1.0, abs(value), abs(other_value))
+
+
+def get_run_info(run_info):
+    """
+    This function returns the hap.py version and command line of a run info row, without the output prefix option.
+
+    :param run_info: The run info row, e.g. hap.py-v0.2.10/opt/hap.py/bin/hap.py -V truth.vcf.gz query.vcf -o prefix
+    :type run_info: str
+
+    :rtype: str
+    """
+    items = run_info.split(' ')
+    kept_items = list()
+    index = 0
+
+    while index < len(items):
+        if items[index] in OUTPUT_OPTIONS:
+            index += 2
+        else:
+            kept_items.append(items[index])
+            index += 1
+
+    return ' '.join(kept_items)
+
+
+def read_csv_table(csv_file):
+    """
+    This function reads an extended.csv or summary.csv file of hap.py.
+
+    :param csv_file: The CSV file
+    :type csv_file: str
+
+    :return: Tuple of (ordered dictionary with key = row name and value = ordered dictionary with key = column and
+    value = float or None, the hap.py version and command line or None)
+    :rtype: tuple
+
+    :raises ValueError: If a row does not have a value for each column
+    """
+    rows = collections.OrderedDict()
+    run_info = None
+
+    with open(csv_file, 'rb') as infile_obj:
+        reader = csv.reader(infile_obj)
+        header = next(reader)
+        num_keys = 1
+
+        while num_keys < len(header) and '.' not in header[num_keys]:
+            num_keys += 1
+
+        columns = header[num_keys:]
+
+        for line_items in reader:
+            if not line_items:
+                continue
+
+            name = '.'.join(line_items[:num_keys])
+
+            if name.startswith(RUN_INFO_PREFIX):
+                run_info = get_run_info(name)
+                continue
+
+            if len(line_items) != len(header):
+                raise ValueError('{}: the row {} has {} columns instead of {}'.format(csv_file, name, len(line_items),
+                                                                                      len(header)))
+
+            rows[name] = collections.OrderedDict(zip(columns, [parse_value(value)
+                                                               for value in line_items[num_keys:]]))
+
+    return rows, run_info
+
+
+def read_metrics_json(json_file):
+    """
+    This function reads the metrics.json file of hap.py: the all.metrics table (the extended.csv file), the
+    summary.metrics table (the summary.csv file) and the raw.counts table (the counts.json file).
+
+    :param json_file: The metrics.json file
+    :type json_file: str
+
+    :return: Tuple of (dictionary with key = table id and value = rows, as returned by read_csv_table(), the raw counts,
+    as returned by read_counts_json(), the hap.py version and command line or None)
+    :rtype: tuple
+    """
+    with open(json_file, 'r') as infile_obj:
+        metrics = json.load(infile_obj)
+
+    tables = dict()
+    raw_counts = None
+    run_info = None
+
+    for table in metrics.get('metrics', []):
+        data = table['data']
+        names = [str(name) for name in data[0]['values']]
+        columns = [(str(column['id']), column['values']) for column in data[1:]]
+
+        if table['id'] == 'raw.counts':  # one column per counts key, one row per allele type
+            raw_counts = collections.OrderedDict(
+                (key, collections.OrderedDict((name, int(value)) for name, value in zip(names, values)
+                                              if value is not None))
+                for key, values in columns)
+        else:
+            rows = collections.OrderedDict()
+
+            for index, name in enumerate(names):
+                if name.startswith(RUN_INFO_PREFIX):  # as in the CSV files
+                    run_info = get_run_info(name)
+                else:
+                    rows[name] = collections.OrderedDict((column, parse_value(values[index]))
+                                                         for column, values in columns)
+
+            tables[str(table['id'])] = rows
+
+    return tables, raw_counts, run_info
+
+
+def read_counts_json(json_file):
+    """
+    This function reads the counts.json file of hap.py.
+
+    :param json_file: The counts.json file
+    :type json_file: str
+
+    :return: Ordered dictionary with key = counts key (decision:match kind:regions:TRUTH or QUERY, e.g.
+    FN:am:CONF:TRUTH) and value = ordered dictionary with key = allele type and value = count
+    :rtype: collections.OrderedDict
+    """
+    with open(json_file, 'r') as infile_obj:
+        counts = json.load(infile_obj)
+
+    return collections.OrderedDict((str(key), collections.OrderedDict((str(name), int(value))
+                                                                      for name, value in sorted(counts[key].items())))
+                                   for key in sorted(counts))
+
+
+def get_happy_files(prefix):
+    """
+    This function returns the hap.py output files of a comparison that exist.
+
+    :param prefix: The output prefix of hap.py (-o), e.g. results/benchmark_NA12878_CodingExons
+    :type prefix: str
+
+    :return: Dictionary with key = suffix and value = path of the file
+    :rtype: dict
+    """
+    return dict((suffix, prefix + suffix) for suffix in SUFFIXES if os.path.isfile(prefix + suffix))
+
+
+def compare_tables(rows, other_rows, source, other_source, same_rows=True):
+    """
+    This function compares the values of two tables of hap.py outputs, for the rows and columns they both have.
+
+    :param rows: The rows of a table, as returned by read_csv_table()
+    :type rows: dict
+    :param other_rows: The rows of the other table
+    :type other_rows: dict
+    :param source: The name of the table, for the messages
+    :type source: str
+    :param other_source: The name of the other table
+    :type other_source: str
+    :param same_rows: True if the tables must have the same rows
+    :type same_rows: bool
+
+    :return: List of the differences
+    :rtype: list
+    """
+    problems = list()
+
+    if same_rows and list(rows) != list(other_rows):
+        problems.append('{} and {} have different rows'.format(source, other_source))
+
+    for name, values in rows.items():
+        other_values = other_rows.get(name)
+
+        if other_values is None:
+            continue
+
+        for column, value in values.items():
+            if column in other_values and not is_close(value, other_values[column]):
+                problems.append('{} and {} differ at {} {}: {} != {}'.format(source, other_source, name, column, value,
+                                                                            other_values[column]))
+
+    return problems
+
+
+def check_row(name, values, source):
+    """
+    This function checks that the counts of a row of the extended.csv file add up, and that its precision and recall
+    are those of its counts.
+
+    :param name: The row name
+    :type name: str
+    :param values: The values of the row
+    :type values: dict
+    :param source: The name of the table, for the messages
+    :type source: str
+
+    :return: List of the problems
+    :rtype: list
+    """
+    def get(column):
+        return values.get(column) or 0.0
+
+    problems = list()
+    checks = [('TRUTH.TOTAL', get('TRUTH.TP') + get('TRUTH.FN'))]
+
+    if not name.startswith('Records.'):
+        checks.append(('QUERY.TOTAL', get('QUERY.TP') + get('QUERY.FP') + get('QUERY.UNK')))
+
+    if get('QUERY.TP') + get('QUERY.FP') > 0:
+        checks.append(('METRIC.Precision', get('QUERY.TP') / (get('QUERY.TP') + get('QUERY.FP'))))
+
+    if get('TRUTH.TOTAL') > 0:
+        checks.append(('METRIC.Recall', get('TRUTH.TP') / get('TRUTH.TOTAL')))
+
+    for column, expected in checks:
+        if column in values and values[column] is not None and not is_close(values[column], expected):
+            problems.append('{} {} {} is {}, not {}'.format(source, name, column, values[column], expected))
+
+    return problems
+
+
+def check_counts(rows, counts, source, counts_source):
+    """
+    This function checks that the TP, FN and FP counts of each allele type in the counts.json file add up to the
+    Alleles and Nucleotides rows of the extended.csv file.
+
+    :param rows: The rows of the extended.csv file
+    :type rows: dict
+    :param counts: The counts, as returned by read_counts_json()
+    :type counts: dict
+    :param source: The name of the table, for the messages
+    :type source: str
+    :param counts_source: The name of the counts file, for the messages
+    :type counts_source: str
+
+    :return: List of the problems
+    :rtype: list
+    """
+    problems = list()
+
+    for name, allele_type in ALLELE_ROWS:
+        if name not in rows:
+            continue
+
+        for column, decision, side in COUNT_KEYS:
+            total = sum(key_counts.get(allele_type, 0) for key, key_counts in counts.items()
+                        if key.split(':')[0] == decision and key.split(':')[-1] == side)
+
+            if rows[name].get(column) is not None and not is_close(rows[name][column], total):
+                problems.append('{} {} {} is {}, but {} counts {} {}'.format(source, name, column, rows[name][column],
+                                                                             counts_source, total, allele_type))
+
+    return problems
+
+
+class HappyOutputs(object):
+    """
+    The outputs of a hap.py comparison, each file read once.
+    """
+
+    def __init__(self, files):
+        """
+        This function reads the hap.py output files.
+
+        :param files: Dictionary with key = suffix (.extended.csv, .summary.csv, .metrics.json or .counts.json) and
+        value = path of the file, as returned by get_happy_files()
+        :type files: dict
+
+        :raises ValueError: If there is no file, or a file cannot be read
+        """
+        if not files:
+            raise ValueError('There is no hap.py output file.')
+
+        self.files = files
+        self.extended = None
+        self.summary = None
+        self.tables = dict()
+        self.raw_counts = None
+        self.counts = None
+        self.run_infos = dict()  # file name -> hap.py version and command line
+
+        for suffix, path in sorted(files.items()):
+            try:
+                if suffix == '.extended.csv':
+                    self.extended, run_info = read_csv_table(path)
+                elif suffix == '.summary.csv':
+                    self.summary, run_info = read_csv_table(path)
+                elif suffix == '.metrics.json':
+                    self.tables, self.raw_counts, run_info = read_metrics_json(path)
+                elif suffix == '.counts.json':
+                    self.counts, run_info = read_counts_json(path), None
+                else:
+                    raise ValueError('{}: not a hap.py output file'.format(path))
+            except (KeyError, IndexError, TypeError, StopIteration) as error:
+                raise ValueError('{}: not a hap.py output file ({})'.format(path, error))
+
+            if run_info is not None:
+                self.run_infos[os.path.basename(path)] = run_info
+
+    def get_name(self, suffix):
+        """
+        This function returns the file name of an output, for the messages.
+
+        :param suffix: The suffix
+        :type suffix: str
+
+        :rtype: str
+        """
+        return os.path.basename(self.files[suffix])
+
+    def get_rows(self):
+        """
+        This function returns the rows of the extended.csv file, or of the all.metrics table of the metrics.json file.
+
+        :return: Ordered dictionary with key = row name and value = ordered dictionary with key = column and value =
+        float or None
+        :rtype: collections.OrderedDict
+        """
+        if self.extended is not None:
+            return self.extended
+
+        return self.tables.get('all.metrics', collections.OrderedDict())
+
+    def get_metrics_row(self, name, case_name, region, num_bases):
+        """
+        This function returns the metrics of a row, e.g. Locations.SNP.het.  The variant class of the metrics is the
+        row name without 'Locations.', so Locations.SNP and Locations.INDEL are the SNP and INDEL metrics of
+        benchmarking_truth_set.py.  Only these two rows have the number of bases, to compute TN.
+
+        :param name: The row name
+        :type name: str
+        :param case_name: The case name
+        :type case_name: str
+        :param region: WholeExome or CodingExons
+        :type region: str
+        :param num_bases: Number of bases
+        :type num_bases: int
+
+        :rtype: metrics_engine.MetricsRow
+
+        :raises ValueError: If the row is missing
+        """
+        values = self.get_rows().get(name)
+
+        if values is None:
+            raise ValueError('The hap.py outputs have no {} row.'.format(name))
+
+        def get_count(column):
+            return int(values.get(column) or 0)
+
+        variant_type = name[len('Locations.'):] if name.startswith('Locations.') else name
+        truth_total = get_count('TRUTH.TOTAL')
+        tp = get_count('QUERY.TP')
+        fp = get_count('QUERY.FP')
+        precision, recall = metrics_engine.get_percentages([tp, get_count('TRUTH.TP')], [tp + fp, truth_total])
+
+        return metrics_engine.MetricsRow(case_name, region, variant_type, None,
+                                         num_bases if name in LOCATIONS_ROWS else None, truth_total, tp, fp,
+                                         get_count('TRUTH.FN'), precision, recall, None)
+
+    def get_metrics_rows(self, case_name, region, num_bases):
+        """
+        This function returns the metrics of all the rows, in the order of the extended.csv file.
+
+        :param case_name: The case name
+        :type case_name: str
+        :param region: WholeExome or CodingExons
+        :type region: str
+        :param num_bases: Number of bases
+        :type num_bases: int
+
+        :rtype: list
+        """
+        return [self.get_metrics_row(name, case_name, region, num_bases) for name in self.get_rows()]
+
+    def check(self):
+        """
+        This function checks that the hap.py outputs agree with each other, and that the counts of each row add up.
+
+        :return: List of the problems; empty if the outputs are consistent
+        :rtype: list
+        """
+        problems = list()
+        all_metrics = self.tables.get('all.metrics')
+        summary_metrics = self.tables.get('summary.metrics')
+
+        if self.extended is not None and all_metrics is not None:
+            problems.extend(compare_tables(self.extended, all_metrics, self.get_name('.extended.csv'),
+                                           self.get_name('.metrics.json') + ' all.metrics'))
+
+        if self.summary is not None and summary_metrics is not None:
+            problems.extend(compare_tables(self.summary, summary_metrics, self.get_name('.summary.csv'),
+                                           self.get_name('.metrics.json') + ' summary.metrics'))
+
+        if self.summary is not None:
+            summary, summary_source = self.summary, self.get_name('.summary.csv')
+        elif summary_metrics is not None:
+            summary, summary_source = summary_metrics, self.get_name('.metrics.json') + ' summary.metrics'
+        else:
+            summary, summary_source = None, None
+
+        if summary is not None and self.get_rows():
+            problems.extend(compare_tables(summary, self.get_rows(), summary_source, 'the extended metrics',
+                                           same_rows=False))
+
+        if self.counts is not None and self.raw_counts is not None and self.counts != self.raw_counts:
+            problems.append('{} and {} raw.counts have different counts'.format(self.get_name('.counts.json'),
+                                                                                self.get_name('.metrics.json')))
+
+        if self.counts is not None:
+            counts, counts_source = self.counts, self.get_name('.counts.json')
+        else:
+            counts, counts_source = self.raw_counts, self.get_name('.metrics.json') if self.raw_counts else None
+        source = 'the extended metrics'
+
+        for name, values in self.get_rows().items():
+            problems.extend(check_row(name, values, source))
+
+        if counts is not None:
+            problems.extend(check_counts(self.get_rows(), counts, source, counts_source))
+
+        return problems
+
+    def get_warnings(self):
+        """
+        This function compares the hap.py version and command line of the files, without the output prefix.
+
+        :return: List of the differences
+        :rtype: list
+        """
+        if len(set(self.run_infos.values())) > 1:
+            return ['The hap.py version or command line differs between {}'.format(', '.join(sorted(self.run_infos)))]
+
+        return []
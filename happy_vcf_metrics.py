@@ -0,0 +1,250 @@
+#!/usr/bin/python
+
+"""
+This script counts the TP, FP and FN calls of a hap.py comparison directly from the annotated VCF file written by hap.py
+(*_CodingExons.vcf.gz, *_WholeExomeRegions.vcf.gz), in a single pass.  It counts at the same time:
+
+    - SNP and INDEL locations, as in the Locations.SNP and Locations.INDEL rows of the hap.py extended.csv file
+    - SNP and INDEL locations by genotype class (FORMAT/BLT: het, homalt, hetalt, ...)
+    - indel records by size, as split_annotated_vcf.py and indel_size_distribution.py would
+
+benchmarking_truth_set.py uses these counts in place of the extended.csv and indelSizeDistribution.txt files when it
+runs with --annotated-vcf, so the split and indel size steps of the workflow are not needed.
+"""
+
+import argparse
+import collections
+
+import bgzf
+import indel_size_distribution
+import split_annotated_vcf
+
+VARIANT_TYPES = ['SNP', 'INDEL']
+TRUTH_DECISIONS = ['TP', 'FN']
+QUERY_DECISIONS = ['TP', 'FP']
+COUNT_COLUMNS = ['TRUTH.TOTAL', 'TRUTH.TP', 'TRUTH.FN', 'QUERY.TP', 'QUERY.FP']
+# hap.py counts the query calls of these genotype classes in the Records.homref and Records.nocall rows of the
+# extended.csv file, not in the Locations rows
+NON_VARIANT_GENOTYPES = ('homref', 'nocall')
+FIRST_GROUP = (0,)
+
+
+def new_counts():
+    """
+    This function returns zero counts for the columns TRUTH.TOTAL, TRUTH.TP, TRUTH.FN, QUERY.TP and QUERY.FP.
+
+    :rtype: dict
+    """
+    return dict((column, 0) for column in COUNT_COLUMNS)
+
+
+def get_format_indexes(format_column, format_cache):
+    """
+    This function returns the indexes of the BD, BVT and BLT subfields of a FORMAT column, cached per FORMAT string.
+
+    :param format_column: The FORMAT column, e.g. GT:BD:BK:BI:BVT:BLT:QQ
+    :type format_column: str
+    :param format_cache: Dictionary with key = FORMAT column and value = (BD, BVT, BLT index, number of splits)
+    :type format_cache: dict
+
+    :return: Tuple of (BD index, BVT index, BLT index, number of splits), or None if BD or BVT is missing
+    :rtype: tuple
+    """
+    indexes = format_cache.get(format_column, False)
+
+    if indexes is False:
+        keys = format_column.split(':')
+
+        if 'BD' in keys and 'BVT' in keys:
+            bd_index = keys.index('BD')
+            bvt_index = keys.index('BVT')
+            blt_index = keys.index('BLT') if 'BLT' in keys else None
+            num_splits = max(bd_index, bvt_index, blt_index if blt_index is not None else 0) + 1
+            indexes = (bd_index, bvt_index, blt_index, num_splits)
+        else:
+            indexes = None
+
+        format_cache[format_column] = indexes
+
+    return indexes
+
+
+def count_annotated_vcf(annotated_vcf, bin_starts=None):
+    """
+    This function streams the annotated VCF file once and counts the TP, FP and FN calls by variant type, genotype class
+    and indel size.
+
+    TRUTH.TP and TRUTH.FN are counted from the TRUTH column, QUERY.TP and QUERY.FP from the QUERY column.  As in the
+    Locations rows of hap.py, query calls with a homref or nocall genotype class (BLT) are not counted, e.g. a 0/0 query
+    call that hap.py matched to a truth variant with BD=TP.  The indel size bins count records, like the TP/FP/FN
+    split: a record is counted as TP (FP, FN) if a sample column has BVT=INDEL and BD=TP (FP, FN) and the record has no
+    SNP allele.
+
+    :param annotated_vcf: The annotated VCF file written by hap.py
+    :type annotated_vcf: str
+    :param bin_starts: Sorted list of the first indel size of each bin; default is 1, 2, 6, 11, 21, 51
+    :type bin_starts: list
+
+    :return: Dictionary with the keys:
+        'SNP', 'INDEL': counts by column (TRUTH.TOTAL, TRUTH.TP, TRUTH.FN, QUERY.TP, QUERY.FP)
+        'genotypes': dictionary with key = (variant type, genotype class) and value = counts by column
+        'indel_sizes': ordered dictionary with key = size bin label and value = (TP, FP, FN)
+        'records': the number of records
+    :rtype: dict
+    """
+    return count_annotated_vcf_groups(annotated_vcf, 1, None, bin_starts)[0]
+
+
+def count_annotated_vcf_groups(annotated_vcf, num_groups, get_groups, bin_starts=None):
+    """
+    This function streams the annotated VCF file once and counts the calls of its records (as count_annotated_vcf()
+    does) in groups of records, such as the BED strata of stratified_metrics.py.  A record is counted in each of its
+    groups.
+
+    :param annotated_vcf: The annotated VCF file written by hap.py
+    :type annotated_vcf: str
+    :param num_groups: The number of groups
+    :type num_groups: int
+    :param get_groups: Function of (chrom, 0-based start, end) of a record that returns the indexes of its groups; None
+    to count all the records in group 0
+    :type get_groups: function
+    :param bin_starts: Sorted list of the first indel size of each bin; default is 1, 2, 6, 11, 21, 51
+    :type bin_starts: list
+
+    :return: List of the counts of each group, as returned by count_annotated_vcf()
+    :rtype: list
+    """
+    bin_starts = bin_starts or indel_size_distribution.DEFAULT_BIN_STARTS
+
+    type_counts = [dict((variant_type, new_counts()) for variant_type in VARIANT_TYPES) for _ in range(num_groups)]
+    genotype_counts = [collections.defaultdict(new_counts) for _ in range(num_groups)]
+    size_counts = [dict((decision, collections.Counter()) for decision in split_annotated_vcf.DECISIONS)
+                   for _ in range(num_groups)]
+    num_records = [0] * num_groups
+    size_decisions = frozenset(split_annotated_vcf.DECISIONS)
+    format_cache = dict()
+    truth_index = 9
+    query_index = 10
+
+    with bgzf.open_vcf(annotated_vcf) as vcf_obj:
+        for line in vcf_obj:
+            if line.startswith('#'):
+                if line.startswith('#CHROM'):
+                    columns = line.rstrip('\n').split('\t')
+                    truth_index = columns.index('TRUTH') if 'TRUTH' in columns else 9
+                    query_index = columns.index('QUERY') if 'QUERY' in columns else 10
+                continue
+
+            line_items = line.rstrip('\n').split('\t')
+
+            if get_groups is None:
+                groups = FIRST_GROUP
+                num_records[0] += 1
+            else:
+                start = int(line_items[1]) - 1
+                groups = get_groups(line_items[0], start, start + len(line_items[3]))
+
+                for group in groups:
+                    num_records[group] += 1
+
+            indexes = get_format_indexes(line_items[8], format_cache)
+
+            if indexes is None or not groups:
+                continue
+
+            bd_index, bvt_index, blt_index, num_splits = indexes
+            indel_decisions = set()
+
+            for sample_index, prefix, decisions in [(truth_index, 'TRUTH.', TRUTH_DECISIONS),
+                                                    (query_index, 'QUERY.', QUERY_DECISIONS)]:
+                subfields = line_items[sample_index].split(':', num_splits)
+
+                if len(subfields) < num_splits:
+                    continue
+
+                decision = subfields[bd_index]
+                variant_type = subfields[bvt_index]
+
+                if variant_type == 'INDEL':
+                    indel_decisions.add(decision)
+
+                if blt_index is not None and prefix == 'QUERY.' and subfields[blt_index] in NON_VARIANT_GENOTYPES:
+                    continue
+
+                if decision in decisions and variant_type in VARIANT_TYPES:
+                    column = prefix + decision
+                    genotype_key = (variant_type, subfields[blt_index]) if blt_index is not None else None
+
+                    for group in groups:
+                        type_counts[group][variant_type][column] += 1
+
+                        if genotype_key is not None:
+                            genotype_counts[group][genotype_key][column] += 1
+
+            if indel_decisions and not split_annotated_vcf.has_snp_allele(line_items[3], line_items[4]):
+                size = indel_size_distribution.get_indel_size(line_items[3], line_items[4])
+
+                for decision in indel_decisions:
+                    if decision in size_decisions:
+                        for group in groups:
+                            size_counts[group][decision][size] += 1
+
+    labels = indel_size_distribution.get_bin_labels(bin_starts)
+    results = list()
+
+    for group in range(num_groups):
+        for counts in list(type_counts[group].values()) + list(genotype_counts[group].values()):
+            counts['TRUTH.TOTAL'] = counts['TRUTH.TP'] + counts['TRUTH.FN']
+
+        binned = [indel_size_distribution.histogram(size_counts[group][decision], bin_starts)
+                  for decision in split_annotated_vcf.DECISIONS]
+        indel_sizes = collections.OrderedDict()
+
+        for label, tp, fp, fn in zip(labels, *binned):
+            indel_sizes[label] = (tp, fp, fn)
+
+        result = dict(type_counts[group])
+        result['genotypes'] = dict(genotype_counts[group])
+        result['indel_sizes'] = indel_sizes
+        result['records'] = num_records[group]
+        results.append(result)
+
+    return results
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It prints the counts of the annotated VCF file as a tab delimited table.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", required=True, help="The annotated VCF file written by hap.py")
+
+    args = parser.parse_args()
+
+    counts = count_annotated_vcf(args.input)
+
+    print '\t'.join(['Type', 'Subtype', 'TP', 'FP', 'FN'])
+
+    for variant_type in VARIANT_TYPES:
+        type_counts = counts[variant_type]
+        print '\t'.join([variant_type, '*', str(type_counts['QUERY.TP']), str(type_counts['QUERY.FP']),
+                         str(type_counts['TRUTH.FN'])])
+
+        for (genotype_type, genotype), genotype_counts in sorted(counts['genotypes'].items()):
+            if genotype_type == variant_type:
+                print '\t'.join([variant_type, genotype, str(genotype_counts['QUERY.TP']),
+                                 str(genotype_counts['QUERY.FP']), str(genotype_counts['TRUTH.FN'])])
+
+    for label, (tp, fp, fn) in counts['indel_sizes'].items():
+        print '\t'.join(['INDEL', label, str(tp), str(fp), str(fn)])
+
+
+if __name__ == '__main__':
+    main()
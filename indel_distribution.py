@@ -0,0 +1,146 @@
+#!/usr/bin/python
+
+"""
+This script creates the indel length distribution of a truth VCF file in one pass.  It replaces the three
+'bcftools stats' runs of the indelDistribution steps of the benchmarking workflow and writes the same
+'InDel distribution' (IDD) section:
+
+    # IDD, InDel distribution:
+    # IDD	[2]id	[3]length (deletions negative)	[4]count
+    IDD	0	-3	29
+    ...
+
+As in bcftools stats, every indel ALT allele is counted, its length is the length of ALT minus the length of REF, and
+lengths beyond 60 bases are counted as 60.
+
+The distribution only depends on the truth VCF file, so it can be cached by the truth file's content hash (-c); repeat
+benchmarks against the same truth set then copy the cached result instead of reading the truth VCF file.
+"""
+
+import argparse
+import collections
+import os
+import shutil
+import tempfile
+
+import bgzf
+
+MAX_INDEL_LENGTH = 60
+
+
+def get_indel_lengths(vcf_file):
+    """
+    This function streams a VCF file and counts its indel alleles by length (deletions negative).
+
+    :param vcf_file: The VCF file (plain text or gzip/bgzip compressed)
+    :type vcf_file: str
+
+    :return: Dictionary with key = indel length and value = number of indel alleles
+    :rtype: collections.Counter
+    """
+    length_counts = collections.Counter()
+
+    with bgzf.open_vcf(vcf_file) as vcf_obj:
+        for line in vcf_obj:
+            if line.startswith('#'):
+                continue
+
+            line_items = line.split('\t', 5)
+            ref_length = len(line_items[3])
+
+            for alt in line_items[4].split(','):
+                length = len(alt) - ref_length
+
+                if length == 0 or alt.startswith('<') or alt in ('*', '.'):
+                    continue
+
+                length_counts[max(-MAX_INDEL_LENGTH, min(MAX_INDEL_LENGTH, length))] += 1
+
+    return length_counts
+
+
+def write_indel_distribution(length_counts, output_file):
+    """
+    This function writes the indel distribution in the 'bcftools stats' format, from the longest deletion to the
+    longest insertion.
+
+    :param length_counts: Dictionary with key = indel length and value = number of indel alleles
+    :type length_counts: dict
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    with open(output_file, 'w') as outfile_obj:
+        outfile_obj.write('# IDD, InDel distribution:\n')
+        outfile_obj.write('# IDD\t[2]id\t[3]length (deletions negative)\t[4]count\n')
+
+        for length in sorted(length_counts):
+            outfile_obj.write('IDD\t0\t{}\t{}\n'.format(length, length_counts[length]))
+
+
+def create_indel_distribution(truth_vcf, output_file, cache_dir=None):
+    """
+    This function writes the indel distribution of the truth VCF file.  With a cache directory, the result is looked up
+    by the content hash of the truth VCF file first and stored there after it is computed.
+
+    :param truth_vcf: The truth VCF file
+    :type truth_vcf: str
+    :param output_file: The output file
+    :type output_file: str
+    :param cache_dir: The cache directory, or None
+    :type cache_dir: str
+
+    :return: True if the result was copied from the cache
+    :rtype: bool
+    """
+    if cache_dir is None:
+        write_indel_distribution(get_indel_lengths(truth_vcf), output_file)
+        return False
+
+    cached_file = os.path.join(cache_dir, bgzf.get_file_hash(truth_vcf) + '_indelDistribution.txt')
+
+    if os.path.isfile(cached_file):
+        shutil.copyfile(cached_file, output_file)
+        return True
+
+    write_indel_distribution(get_indel_lengths(truth_vcf), output_file)
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    # copy then rename, so concurrent runs never see a partial cache entry
+    temp_fd, temp_file = tempfile.mkstemp(dir=cache_dir)
+    os.close(temp_fd)
+    shutil.copyfile(output_file, temp_file)
+    os.rename(temp_file, cached_file)
+
+    return False
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It writes the indel distribution file.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", required=True, help="The truth VCF file")
+    parser.add_argument("-o", "--output", required=True, help="The output file (*_indelDistribution_Frombcftools.txt)")
+    parser.add_argument("-c", "--cache-dir", help="The cache directory; default is no cache")
+
+    args = parser.parse_args()
+
+    if create_indel_distribution(args.input, args.output, args.cache_dir):
+        print 'Output file copied from the cache. It can be found at', args.output
+    else:
+        print 'Output file created. It can be found at', args.output
+
+
+if __name__ == '__main__':
+    main()
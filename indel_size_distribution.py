@@ -0,0 +1,252 @@
+#!/usr/bin/python
+
+"""
+This script creates the indel size distribution file from the TP, FP and FN indel VCF files of a hap.py comparison.  It
+replaces indelSizeDistribution_Detailed.R and writes the same text output, which benchmarking_truth_set.py reads.
+
+The indel size of a record is:
+    - the length of REF if ALT is <DEL>
+    - |length of REF - length of the first ALT| if ALT has several alleles
+    - |length of REF - length of ALT| otherwise (and when the first ALT of several has the length of REF)
+
+The FREQUENCY column is the number of truth indels of each size, from the 'bcftools stats' indel distribution of the
+truth VCF file.  As in the R script, the frequency of the last bin only counts indels of up to 100 bases.
+"""
+
+import argparse
+import bisect
+import collections
+
+import bgzf
+
+DEFAULT_BIN_STARTS = [1, 2, 6, 11, 21, 51]
+FREQUENCY_MAX_SIZE = 100
+
+
+def get_indel_size(ref, alt):
+    """
+    This function returns the indel size of a record, computed the same way as in indelSizeDistribution_Detailed.R.
+
+    :param ref: The REF column
+    :type ref: str
+    :param alt: The ALT column
+    :type alt: str
+
+    :return: The indel size
+    :rtype: int
+    """
+    if alt == '<DEL>':
+        return len(ref)
+
+    size = 0
+
+    if ',' in alt:
+        size = abs(len(ref) - alt.index(','))
+
+    if size == 0:
+        size = abs(len(ref) - len(alt))
+
+    return size
+
+
+def count_indel_sizes(vcf_file):
+    """
+    This function streams a VCF file and counts its records by indel size.
+
+    :param vcf_file: The VCF file (plain text or gzip/bgzip compressed)
+    :type vcf_file: str
+
+    :return: Dictionary with key = indel size and value = number of records
+    :rtype: collections.Counter
+    """
+    size_counts = collections.Counter()
+
+    with bgzf.open_vcf(vcf_file) as vcf_obj:
+        for line in vcf_obj:
+            if line.startswith('#'):
+                continue
+
+            line_items = line.split('\t', 5)
+            size_counts[get_indel_size(line_items[3], line_items[4])] += 1
+
+    return size_counts
+
+
+def read_indel_distribution(indel_distribution_file):
+    """
+    This function reads the 'bcftools stats' indel distribution (IDD) of the truth VCF file.
+
+    :param indel_distribution_file: The *_indelDistribution_Frombcftools.txt file
+    :type indel_distribution_file: str
+
+    :return: Dictionary with key = indel size (deletions and insertions together) and value = number of indels
+    :rtype: collections.Counter
+    """
+    size_counts = collections.Counter()
+
+    with open(indel_distribution_file, 'r') as infile_obj:
+        for line in infile_obj:
+            if line.startswith('#') or not line.strip():
+                continue
+
+            line_items = line.strip().split('\t')
+            size_counts[abs(int(line_items[2]))] += int(line_items[3])
+
+    return size_counts
+
+
+def histogram(size_counts, bin_starts, max_size=None):
+    """
+    This function sums the counts of each size into bins.  Bin i holds the sizes from bin_starts[i] to
+    bin_starts[i + 1] - 1, and the last bin holds every size from its start (up to max_size, if given).  Sizes below the
+    first bin are not counted.
+
+    :param size_counts: Dictionary with key = size and value = count
+    :type size_counts: dict
+    :param bin_starts: Sorted list of the first size of each bin
+    :type bin_starts: list
+    :param max_size: The largest size counted, or None
+    :type max_size: int
+
+    :return: List of counts, one per bin
+    :rtype: list
+    """
+    bins = [0] * len(bin_starts)
+
+    for size, count in size_counts.items():
+        if size < bin_starts[0] or (max_size is not None and size > max_size):
+            continue
+
+        bins[bisect.bisect_right(bin_starts, size) - 1] += count
+
+    return bins
+
+
+def get_bin_labels(bin_starts):
+    """
+    This function returns the labels of the bins, e.g. '1', '2 - 5', ..., '51 and greater'.
+
+    :param bin_starts: Sorted list of the first size of each bin
+    :type bin_starts: list
+
+    :return: List of labels
+    :rtype: list
+    """
+    labels = list()
+
+    for start, next_start in zip(bin_starts, bin_starts[1:]):
+        if next_start - start == 1:
+            labels.append(str(start))
+        else:
+            labels.append('{} - {}'.format(start, next_start - 1))
+
+    labels.append('{} and greater'.format(bin_starts[-1]))
+
+    return labels
+
+
+def format_percent(numerator, denominator):
+    """
+    This function returns 100 * numerator / denominator rounded to two decimals, formatted the way R prints it (no
+    trailing zeros), or 'NaN' if the denominator is zero.
+
+    :param numerator: The numerator
+    :type numerator: int
+    :param denominator: The denominator
+    :type denominator: int
+
+    :return: The formatted percentage
+    :rtype: str
+    """
+    if denominator == 0:
+        return 'NaN'
+    else:
+        return '%.15g' % round(100 * (float(numerator) / denominator), 2)
+
+
+def get_indel_size_distribution(indel_distribution_file, tp_vcf, fp_vcf, fn_vcf, bin_starts=None):
+    """
+    This function returns the rows of the indel size distribution file.
+
+    :param indel_distribution_file: The 'bcftools stats' indel distribution of the truth VCF file
+    :type indel_distribution_file: str
+    :param tp_vcf: The TP indel VCF file
+    :type tp_vcf: str
+    :param fp_vcf: The FP indel VCF file
+    :type fp_vcf: str
+    :param fn_vcf: The FN indel VCF file
+    :type fn_vcf: str
+    :param bin_starts: Sorted list of the first size of each bin; default is 1, 2, 6, 11, 21, 51
+    :type bin_starts: list
+
+    :return: List of rows of [label, frequency, TP, FP, FN, precision, recall], all str
+    :rtype: list
+    """
+    bin_starts = bin_starts or DEFAULT_BIN_STARTS
+
+    frequencies = histogram(read_indel_distribution(indel_distribution_file), bin_starts, FREQUENCY_MAX_SIZE)
+    tp_counts = histogram(count_indel_sizes(tp_vcf), bin_starts)
+    fp_counts = histogram(count_indel_sizes(fp_vcf), bin_starts)
+    fn_counts = histogram(count_indel_sizes(fn_vcf), bin_starts)
+
+    rows = list()
+
+    for label, frequency, tp, fp, fn in zip(get_bin_labels(bin_starts), frequencies, tp_counts, fp_counts, fn_counts):
+        rows.append([label, str(frequency), str(tp), str(fp), str(fn),
+                     format_percent(tp, tp + fp), format_percent(tp, tp + fn)])
+
+    return rows
+
+
+def write_indel_size_distribution(rows, output_file):
+    """
+    This function writes the indel size distribution file.
+
+    :param rows: Rows returned by get_indel_size_distribution()
+    :type rows: list
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    with open(output_file, 'w') as outfile_obj:
+        outfile_obj.write('Indel Size distribution\n')
+        outfile_obj.write('INDEL SIZE\t FREQUENCY\t #TP\t #FP\t #FN\t PRECISION(%)\t RECALL(%)\n')
+
+        for row in rows:
+            outfile_obj.write('\t'.join(row) + '\n')
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It writes the indel size distribution file.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--indel-distribution", required=True,
+                        help="The 'bcftools stats' indel distribution of the truth VCF (*_indelDistribution_Frombcftools.txt)")
+    parser.add_argument("--tp", required=True, help="The TP indel VCF file (*_TPonly.vcf.gz)")
+    parser.add_argument("--fp", required=True, help="The FP indel VCF file (*_FPonly.vcf.gz)")
+    parser.add_argument("--fn", required=True, help="The FN indel VCF file (*_FNonly.vcf.gz)")
+    parser.add_argument("-o", "--output", required=True, help="The output file (*_indelSizeDistribution.txt)")
+    parser.add_argument("-b", "--bins", default=','.join(str(start) for start in DEFAULT_BIN_STARTS),
+                        help="Comma separated first size of each bin; default is 1,2,6,11,21,51")
+
+    args = parser.parse_args()
+
+    bin_starts = sorted(int(start) for start in args.bins.split(','))
+
+    rows = get_indel_size_distribution(args.indel_distribution, args.tp, args.fp, args.fn, bin_starts)
+    write_indel_size_distribution(rows, args.output)
+
+    print 'Output file created. It can be found at', args.output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/python
+
+"""
+This module times the stages of the scripts of this repository and counts what they process (files discovered, bytes
+read, lines parsed, records matched), and writes these metrics as a JSON file or as a Prometheus text file.
+
+The scripts share one Metrics object, METRICS, which is disabled unless the script is asked for a metrics file.  While
+it is disabled, a stage is a shared context manager that does nothing and a count returns at once, so the scripts can
+be instrumented without slowing them down.  The counts are made once per file, not once per line.
+
+Work done in a process pool is counted in the worker processes: map_counted() sends the metrics of each job back with
+its result, and adds them to the metrics of the main process.  The stage times of the worker processes are added up,
+so they can exceed the wall time of the run.
+
+run_profiled() runs a function under cProfile, and writes the profile (*.prof, for pstats or snakeviz) and a text
+report of the functions with the largest cumulative time and the peak memory.
+"""
+
+import collections
+import cProfile
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+
+PROFILE_LINES = 40
+
+
+class Stage(object):
+    """
+    A context manager that adds its wall time to a stage of the metrics.
+    """
+
+    def __init__(self, metrics, name):
+        """
+        :param metrics: The metrics
+        :type metrics: Metrics
+        :param name: The stage name
+        :type name: str
+        """
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_stage(self.name, time.time() - self.start)
+
+
+class NullStage(object):
+    """
+    The stage of disabled metrics: it does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Metrics(object):
+    """
+    The stage times and the counters of a run.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.start = None
+        self.stages = collections.OrderedDict()  # stage name -> [seconds, calls]
+        self.counters = collections.OrderedDict()
+
+    def enable(self):
+        """
+        This function enables the metrics, and starts the clock of the run.
+
+        :rtype: void
+        """
+        self.enabled = True
+        self.start = time.time()
+
+    def reset(self):
+        """
+        This function clears the stage times and the counters.
+
+        :rtype: void
+        """
+        self.stages = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+
+    def stage(self, name):
+        """
+        This function returns a context manager that times a stage.
+
+        :param name: The stage name, e.g. 'discover'
+        :type name: str
+
+        :rtype: Stage
+        """
+        if not self.enabled:
+            return NULL_STAGE
+
+        return Stage(self, name)
+
+    def add_stage(self, name, seconds, calls=1):
+        """
+        This function adds the wall time of a stage.
+
+        :param name: The stage name
+        :type name: str
+        :param seconds: The wall time
+        :type seconds: float
+        :param calls: The number of times the stage ran
+        :type calls: int
+
+        :rtype: void
+        """
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += calls
+
+    def count(self, name, value=1):
+        """
+        This function adds to a counter.
+
+        :param name: The counter name, e.g. 'bytes_read'
+        :type name: str
+        :param value: The value to add
+        :type value: int
+
+        :rtype: void
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """
+        This function returns the stage times and the counters, to send them from a worker process.
+
+        :return: Tuple of (list of (stage name, seconds, calls), list of (counter name, value))
+        :rtype: tuple
+        """
+        return ([(name, seconds, calls) for name, (seconds, calls) in self.stages.items()],
+                list(self.counters.items()))
+
+    def merge(self, snapshot):
+        """
+        This function adds the stage times and the counters of a worker process.
+
+        :param snapshot: The snapshot() of the worker process
+        :type snapshot: tuple
+
+        :rtype: void
+        """
+        stages, counters = snapshot
+
+        for name, seconds, calls in stages:
+            self.add_stage(name, seconds, calls)
+
+        for name, value in counters:
+            self.count(name, value)
+
+    def to_dict(self, tool):
+        """
+        This function returns the metrics of the run, with the elapsed time and the peak memory.
+
+        :param tool: The script name, e.g. 'benchmarking_truth_set'
+        :type tool: str
+
+        :return: Dictionary with the keys tool, elapsed_seconds, peak_rss_bytes, peak_rss_children_bytes, stages (with
+        key = stage name and value = dictionary with the keys seconds and calls) and counters
+        :rtype: dict
+        """
+        return {'tool': tool,
+                'elapsed_seconds': round(time.time() - self.start, 6) if self.start is not None else None,
+                'peak_rss_bytes': get_peak_rss(resource.RUSAGE_SELF),
+                'peak_rss_children_bytes': get_peak_rss(resource.RUSAGE_CHILDREN),
+                'stages': collections.OrderedDict((name, {'seconds': round(seconds, 6), 'calls': calls})
+                                                  for name, (seconds, calls) in self.stages.items()),
+                'counters': collections.OrderedDict(self.counters)}
+
+    def write(self, output_file, tool):
+        """
+        This function writes the metrics file: Prometheus text if the file name ends in '.prom' or '.txt', JSON
+        otherwise.
+
+        :param output_file: The output file
+        :type output_file: str
+        :param tool: The script name, used as the prefix of the Prometheus metric names
+        :type tool: str
+
+        :rtype: void
+        """
+        metrics = self.to_dict(tool)
+
+        with open(output_file, 'w') as outfile_obj:
+            if output_file.endswith('.prom') or output_file.endswith('.txt'):
+                outfile_obj.write(get_prometheus_text(metrics))
+            else:
+                json.dump(metrics, outfile_obj, indent=2)
+                outfile_obj.write('\n')
+
+        print 'Output file created. It can be found at', output_file
+
+
+METRICS = Metrics()
+
+
+class CountedCall(object):
+    """
+    A function run in a worker process of a process pool, that returns the metrics of the worker with its result.
+    """
+
+    def __init__(self, function):
+        """
+        :param function: The function; it must be defined at the top level of a module, to be sent to the workers
+        :type function: function
+        """
+        self.function = function
+
+    def __call__(self, job):
+        METRICS.enabled = True
+        METRICS.reset()
+        result = self.function(job)
+
+        return result, METRICS.snapshot()
+
+
+def merge_result(counted_result):
+    """
+    This function adds the metrics of a worker process to METRICS and returns the result of the job.
+
+    :param counted_result: Tuple of (result, snapshot) returned by a CountedCall
+    :type counted_result: tuple
+
+    :rtype: object
+    """
+    result, snapshot = counted_result
+    METRICS.merge(snapshot)
+
+    return result
+
+
+def map_counted(map_function, function, jobs):
+    """
+    This function maps a function over jobs with the map function of a process pool (map or imap).  When the metrics are
+    enabled, the metrics of the worker processes are added to METRICS.
+
+    :param map_function: The map function, e.g. pool.imap
+    :type map_function: function
+    :param function: The function, defined at the top level of a module
+    :type function: function
+    :param jobs: The jobs
+    :type jobs: list
+
+    :return: The results, in the order of the jobs
+    :rtype: iterable
+    """
+    if not METRICS.enabled:
+        return map_function(function, jobs)
+
+    return (merge_result(counted_result) for counted_result in map_function(CountedCall(function), jobs))
+
+
+def get_peak_rss(who):
+    """
+    This function returns the peak resident set size of the process, or of its finished child processes.
+
+    :param who: resource.RUSAGE_SELF or resource.RUSAGE_CHILDREN
+    :type who: int
+
+    :return: The peak RSS in bytes (for RUSAGE_CHILDREN, of the largest child process)
+    :rtype: int
+    """
+    max_rss = resource.getrusage(who).ru_maxrss
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def get_prometheus_text(metrics):
+    """
+    This function returns the metrics in the Prometheus text exposition format.
+
+    :param metrics: The metrics, as returned by Metrics.to_dict()
+    :type metrics: dict
+
+    :rtype: str
+    """
+    prefix = metrics['tool']
+    lines = list()
+
+    def add_metric(name, metric_type, help_text, samples):
+        lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+        lines.append('# TYPE {}_{} {}'.format(prefix, name, metric_type))
+
+        for labels, value in samples:
+            lines.append('{}_{}{} {}'.format(prefix, name, labels, value))
+
+    if metrics['elapsed_seconds'] is not None:
+        add_metric('elapsed_seconds', 'gauge', 'Wall time of the run.', [('', metrics['elapsed_seconds'])])
+
+    add_metric('peak_rss_bytes', 'gauge', 'Peak resident set size of the main process.',
+               [('', metrics['peak_rss_bytes'])])
+    add_metric('peak_rss_children_bytes', 'gauge', 'Peak resident set size of the largest worker process.',
+               [('', metrics['peak_rss_children_bytes'])])
+
+    if metrics['stages']:
+        add_metric('stage_seconds', 'gauge', 'Wall time of each stage, added up over the worker processes.',
+                   [('{{stage="{}"}}'.format(name), stage['seconds']) for name, stage in metrics['stages'].items()])
+        add_metric('stage_calls', 'gauge', 'Number of times each stage ran.',
+                   [('{{stage="{}"}}'.format(name), stage['calls']) for name, stage in metrics['stages'].items()])
+
+    for name, value in metrics['counters'].items():
+        add_metric(name + '_total', 'counter', 'The {} counter.'.format(name), [('', value)])
+
+    return '\n'.join(lines) + '\n'
+
+
+def run_profiled(function, report_prefix):
+    """
+    This function runs a function under cProfile, and writes <report_prefix>.prof (the profile, for pstats) and
+    <report_prefix>.profile.txt (the functions with the largest cumulative time, and the peak memory).  The reports are
+    written even if the function exits with sys.exit().
+
+    :param function: The function, without arguments
+    :type function: function
+    :param report_prefix: The path prefix of the reports
+    :type report_prefix: str
+
+    :rtype: void
+    """
+    profiler = cProfile.Profile()
+
+    try:
+        profiler.runcall(function)
+    finally:
+        profile_file = report_prefix + '.prof'
+        report_file = report_prefix + '.profile.txt'
+        report_dir = os.path.dirname(report_file)
+
+        if report_dir and not os.path.isdir(report_dir):
+            os.makedirs(report_dir)
+
+        profiler.dump_stats(profile_file)
+
+        with open(report_file, 'w') as outfile_obj:
+            outfile_obj.write('Peak RSS of the main process: {} bytes\n'.format(get_peak_rss(resource.RUSAGE_SELF)))
+            outfile_obj.write('Peak RSS of the largest worker process: {} bytes\n\n'.format(
+                get_peak_rss(resource.RUSAGE_CHILDREN)))
+
+            stats = pstats.Stats(profiler, stream=outfile_obj)
+            stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+
+        print 'Output files created. They can be found at', profile_file, 'and', report_file
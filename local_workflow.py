@@ -0,0 +1,495 @@
+#!/usr/bin/python
+
+"""
+This script runs a Loom workflow file, such as Benchmarking.yaml, on the local machine.
+
+The steps are read from the workflow file, and a step is ready when the steps that write its input channels are done.
+Ready steps run concurrently as long as the sum of their resources (cores and memory) fits in the budget given on the
+command line, so the CodingExons and WholeExome branches of Benchmarking.yaml run side by side.
+
+Each step is memoized: its cache key is the hash of its command, with every file input replaced by the SHA-1 hash of
+the file content, of the SHA-1 hash of every file input, named in the command or not (e.g. bgzf.py, which the scripts
+import), and of its output file names.  When a step with the same key ran before, its outputs are copied from the
+cache directory instead of running it again.  Re-running a sample with a new query VCF file only runs the steps that
+read the query VCF file (or their outputs); the steps that only read the truth files are taken from the cache.
+
+The workflow inputs are given on the command line as channel=value, as with 'loom run'.  The commands run on the local
+machine in the work directory; the docker_image of each step is not used, so the tools of the steps (hap.py, Rscript,
+python) must be installed locally.  This script needs PyYAML.
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import Queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+import yaml
+
+import bgzf
+
+TEMPLATE_PATTERN = re.compile(r'{{\s*([A-Za-z0-9_]+)\s*}}')
+
+
+def render(template, values):
+    """
+    This function replaces the {{channel}} placeholders of a template with the channel values.
+
+    :param template: The template, e.g. "{{outputFile_commonPrefix}}{{codingExonsPrefix}}.vcf.gz"
+    :type template: str
+    :param values: Dictionary with key = channel and value = str
+    :type values: dict
+
+    :return: The rendered template
+    :rtype: str
+    """
+    def replace(match):
+        if match.group(1) not in values:
+            raise ValueError('Unknown channel {{{{{}}}}} in: {}'.format(match.group(1), template))
+
+        return values[match.group(1)]
+
+    return TEMPLATE_PATTERN.sub(replace, template)
+
+
+def read_workflow(workflow_file):
+    """
+    This function reads the workflow file.
+
+    :param workflow_file: The workflow file (YAML)
+    :type workflow_file: str
+
+    :return: Tuple of (dictionary with key = input channel and value = input type, dictionary with key = channel and
+    value = fixed input value (None for fixed files), list of steps).  Each step is a dictionary with the keys name,
+    inputs (list of channels), outputs (list of (channel, file name template)), command, cores and memory (GB).
+    :rtype: tuple
+    """
+    with open(workflow_file, 'r') as infile_obj:
+        workflow = yaml.safe_load(infile_obj)
+
+    inputs = dict((item['channel'], item.get('type', 'string')) for item in workflow.get('inputs') or [])
+    fixed_inputs = dict()
+
+    for item in workflow.get('fixed_inputs') or []:
+        inputs[item['channel']] = item.get('type', 'string')
+
+        if item.get('type') == 'string':
+            fixed_inputs[item['channel']] = str(item['data']['contents'])
+        else:  # fixed files are given as hash values in Loom, so they must be given on the command line here
+            fixed_inputs[item['channel']] = None
+
+    steps = list()
+
+    for item in workflow['steps']:
+        resources = item.get('resources') or dict()
+
+        steps.append({'name': item['name'],
+                      'inputs': [step_input['channel'] for step_input in item.get('inputs') or []],
+                      'outputs': [(output['channel'], output['source']['filename'])
+                                  for output in item.get('outputs') or []],
+                      'command': item['command'],
+                      'cores': int(resources.get('cores', 1)),
+                      'memory': float(resources.get('memory', 0))})
+
+    return inputs, fixed_inputs, steps
+
+
+def get_input_values(inputs, fixed_inputs, assignments):
+    """
+    This function returns the values of the workflow inputs, from the fixed inputs and the channel=value assignments of
+    the command line.  File paths are made absolute.
+
+    :param inputs: Dictionary with key = input channel and value = input type
+    :type inputs: dict
+    :param fixed_inputs: Dictionary with key = channel and value = fixed input value, or None
+    :type fixed_inputs: dict
+    :param assignments: List of channel=value strings
+    :type assignments: list
+
+    :return: Dictionary with key = input channel and value = str
+    :rtype: dict
+    """
+    values = dict((channel, value) for channel, value in fixed_inputs.items() if value is not None)
+
+    for assignment in assignments:
+        if '=' not in assignment:
+            raise ValueError('Inputs must be given as channel=value: {}'.format(assignment))
+
+        channel, value = assignment.split('=', 1)
+
+        if channel not in inputs:
+            raise ValueError('Unknown input channel: {}'.format(channel))
+
+        values[channel] = value
+
+    missing = sorted(channel for channel in inputs if channel not in values)
+
+    if missing:
+        raise ValueError('Missing inputs: {}'.format(', '.join(missing)))
+
+    for channel, input_type in inputs.items():
+        if input_type == 'file':
+            if not os.path.isfile(values[channel]):
+                raise ValueError('The file of input {} does not exist: {}'.format(channel, values[channel]))
+
+            values[channel] = os.path.abspath(values[channel])
+
+    return values
+
+
+def get_step_dependencies(steps):
+    """
+    This function returns the steps that each step waits for: the steps that write its input channels.
+
+    :param steps: List of steps returned by read_workflow()
+    :type steps: list
+
+    :return: Dictionary with key = step name and value = set of step names
+    :rtype: dict
+    """
+    producers = dict()
+
+    for step in steps:
+        for channel, filename in step['outputs']:
+            producers[channel] = step['name']
+
+    dependencies = dict()
+
+    for step in steps:
+        dependencies[step['name']] = set(producers[channel] for channel in step['inputs'] if channel in producers)
+
+    return dependencies
+
+
+class WorkflowRunner(object):
+    """
+    Runs the steps of a workflow in a work directory, concurrently within a cores and memory budget, with a cache of the
+    step outputs.
+    """
+
+    def __init__(self, steps, values, file_channels, work_dir, cache_dir, cores, memory):
+        """
+        :param steps: List of steps returned by read_workflow()
+        :type steps: list
+        :param values: Dictionary with key = input channel and value = str
+        :type values: dict
+        :param file_channels: The file input channels
+        :type file_channels: set
+        :param work_dir: The work directory, where the steps run and write their outputs
+        :type work_dir: str
+        :param cache_dir: The cache directory
+        :type cache_dir: str
+        :param cores: The number of cores of the budget
+        :type cores: int
+        :param memory: The memory of the budget in GB, or None for no memory budget
+        :type memory: float
+        """
+        self.steps = dict((step['name'], step) for step in steps)
+        self.order = [step['name'] for step in steps]
+        self.dependencies = get_step_dependencies(steps)
+        self.work_dir = work_dir
+        self.cache_dir = cache_dir
+        self.cores = cores
+        self.memory = memory
+        self.file_channels = set(file_channels)
+        self.values = dict(values)
+        self.file_hashes = dict()
+        self.hash_lock = threading.Lock()
+
+        for step in steps:  # the output file names of every step, so later steps can refer to them
+            for channel, filename in step['outputs']:
+                self.values[channel] = render(filename, values)
+                self.file_channels.add(channel)
+
+    def get_path(self, channel):
+        """
+        This function returns the path of a file channel.
+
+        :param channel: The channel
+        :type channel: str
+
+        :rtype: str
+        """
+        return os.path.join(self.work_dir, self.values[channel])
+
+    def get_file_hash(self, path):
+        """
+        This function returns the content hash of a file, computed once per run.
+
+        :param path: The file
+        :type path: str
+
+        :rtype: str
+        """
+        with self.hash_lock:
+            file_hash = self.file_hashes.get(path)
+
+        if file_hash is None:
+            file_hash = bgzf.get_file_hash(path)
+
+            with self.hash_lock:
+                self.file_hashes[path] = file_hash
+
+        return file_hash
+
+    def get_step_key(self, step):
+        """
+        This function returns the cache key of a step: the hash of its command with the file inputs replaced by their
+        content hash, of the content hash of every file input, and of its output file names.  File inputs that the
+        command does not name, such as bgzf.py, which the scripts of the steps import, are part of the key too.
+
+        :param step: The step
+        :type step: dict
+
+        :rtype: str
+        """
+        key_values = dict(self.values)
+        outputs = set(channel for channel, filename in step['outputs'])
+        input_hashes = list()
+
+        for channel in step['inputs']:
+            if channel in self.file_channels and channel not in outputs:
+                key_values[channel] = 'sha1:' + self.get_file_hash(self.get_path(channel))
+                input_hashes.append((channel, key_values[channel]))
+
+        key = json.dumps([render(step['command'], key_values), sorted(input_hashes),
+                          sorted(self.values[channel] for channel in outputs)])
+
+        return hashlib.sha1(key).hexdigest()
+
+    def restore_outputs(self, step, key):
+        """
+        This function copies the outputs of a step from the cache to the work directory.
+
+        :param step: The step
+        :type step: dict
+        :param key: The cache key of the step
+        :type key: str
+
+        :return: True if the step was in the cache
+        :rtype: bool
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+
+        if not os.path.isdir(entry_dir):
+            return False
+
+        for channel, filename in step['outputs']:
+            shutil.copyfile(os.path.join(entry_dir, self.values[channel]), self.get_path(channel))
+
+        return True
+
+    def store_outputs(self, step, key):
+        """
+        This function copies the outputs of a step to the cache.  The entry is written to a temporary directory and
+        renamed, so concurrent runs never see a partial cache entry.
+
+        :param step: The step
+        :type step: dict
+        :param key: The cache key of the step
+        :type key: str
+
+        :rtype: void
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+
+        if os.path.isdir(entry_dir):
+            return
+
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+
+        for channel, filename in step['outputs']:
+            shutil.copyfile(self.get_path(channel), os.path.join(temp_dir, self.values[channel]))
+
+        try:
+            os.rename(temp_dir, entry_dir)
+        except OSError:  # another run stored the same step
+            shutil.rmtree(temp_dir)
+
+    def run_step(self, step):
+        """
+        This function runs a step, or restores its outputs from the cache.
+
+        :param step: The step
+        :type step: dict
+
+        :return: Tuple of (step name, 'cached', 'done' or an error message)
+        :rtype: tuple
+        """
+        try:
+            key = self.get_step_key(step)
+
+            if self.restore_outputs(step, key):
+                return step['name'], 'cached'
+
+            return_code = subprocess.call(render(step['command'], self.values), shell=True, cwd=self.work_dir)
+
+            if return_code != 0:
+                return step['name'], 'exit status {}'.format(return_code)
+
+            missing = [self.values[channel] for channel, filename in step['outputs']
+                       if not os.path.isfile(self.get_path(channel))]
+
+            if missing:
+                return step['name'], 'missing outputs: {}'.format(', '.join(missing))
+
+            self.store_outputs(step, key)
+
+            return step['name'], 'done'
+        except (IOError, OSError, ValueError) as error:
+            return step['name'], str(error)
+
+    def get_resources(self, step):
+        """
+        This function returns the cores and memory of a step, limited to the budget so every step can run.
+
+        :param step: The step
+        :type step: dict
+
+        :rtype: tuple
+        """
+        memory = step['memory'] if self.memory is None else min(step['memory'], self.memory)
+
+        return min(step['cores'], self.cores), memory
+
+    def run(self):
+        """
+        This function runs the steps.  Ready steps are started in the order of the workflow file while they fit in the
+        budget.  After a failed step, no new step is started.
+
+        :return: Dictionary with key = step name and value = 'cached', 'done' or an error message
+        :rtype: dict
+        """
+        for directory in (self.work_dir, self.cache_dir):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+        results = dict()
+        running = set()
+        finished = Queue.Queue()
+        free_cores = self.cores
+        free_memory = self.memory
+        failed = False
+
+        def worker(step):
+            finished.put(self.run_step(step))
+
+        while True:
+            for name in self.order:
+                if failed or name in results or name in running or not self.dependencies[name] <= set(results):
+                    continue
+
+                cores, memory = self.get_resources(self.steps[name])
+
+                if running and (cores > free_cores or (free_memory is not None and memory > free_memory)):
+                    continue
+
+                running.add(name)
+                free_cores -= cores
+                free_memory = None if free_memory is None else free_memory - memory
+
+                print 'Started:', name
+                thread = threading.Thread(target=worker, args=(self.steps[name],))
+                thread.daemon = True
+                thread.start()
+
+            if not running:
+                break
+
+            name, result = finished.get()
+            running.remove(name)
+            results[name] = result
+
+            cores, memory = self.get_resources(self.steps[name])
+            free_cores += cores
+            free_memory = None if free_memory is None else free_memory + memory
+
+            print '{}: {}'.format(name, result)
+
+            if result not in ('cached', 'done'):
+                failed = True
+
+        return results
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It runs the workflow and prints the result of each step.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("workflow", help="The workflow file, e.g. Benchmarking.yaml")
+    parser.add_argument("assignments", nargs='*', metavar='channel=value',
+                        help="The workflow inputs, and the fixed file inputs such as referenceFasta")
+    parser.add_argument("-w", "--work-dir", default='.', help="The work directory; default is current directory")
+    parser.add_argument("-c", "--cache-dir",
+                        help="The cache directory; default is .workflow_cache in the work directory")
+    parser.add_argument("--cores", type=int, default=multiprocessing.cpu_count(),
+                        help="The number of cores the steps may use together; default is the number of CPUs")
+    parser.add_argument("--memory", type=float, help="The memory (GB) the steps may use together; default is no limit")
+    parser.add_argument("-n", "--dry-run", action='store_true', help="Print the commands of the steps, in order")
+
+    # the options can be anywhere among the channel=value assignments, e.g. Benchmarking.yaml -n a=b
+    args, extra_args = parser.parse_known_args()
+    unknown_args = [arg for arg in extra_args if arg.startswith('-') or '=' not in arg]
+
+    if unknown_args:
+        parser.error('unrecognized arguments: {}'.format(' '.join(unknown_args)))
+
+    args.assignments.extend(extra_args)
+
+    inputs, fixed_inputs, steps = read_workflow(args.workflow)
+
+    try:
+        values = get_input_values(inputs, fixed_inputs, args.assignments)
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+    work_dir = os.path.abspath(args.work_dir)
+    cache_dir = os.path.abspath(args.cache_dir or os.path.join(work_dir, '.workflow_cache'))
+    file_channels = set(channel for channel, input_type in inputs.items() if input_type == 'file')
+
+    runner = WorkflowRunner(steps, values, file_channels, work_dir, cache_dir, args.cores, args.memory)
+
+    if args.dry_run:
+        for step in steps:
+            print '{}:\n\t{}'.format(step['name'], render(step['command'], runner.values))
+        return
+
+    results = runner.run()
+
+    failed = [step['name'] for step in steps if results.get(step['name']) not in (None, 'cached', 'done')]
+    not_run = [step['name'] for step in steps if step['name'] not in results]
+
+    if failed:
+        print 'Error:'
+        print 'The workflow did not complete.'
+
+        for name in failed:
+            print '\t{} failed: {}'.format(name, results[name])
+
+        for name in not_run:
+            print '\t{} was not run'.format(name)
+
+        sys.exit(1)
+
+    print 'Workflow completed. The outputs can be found in', work_dir
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/python
+
+"""
+This module computes the benchmarking metrics of many rows at once: TN, total negative, NPA, precision and recall, and
+their Wilson score confidence intervals, for all the cases, regions and indel size bins of a run.  TN is computed from
+the number of bases of the region, or from its callable reference bases when the row has them (see callable_bases.py).
+Rows without either, such as the subtype rows of the hap.py outputs (see happy_outputs.py), have no TN and NPA.
+
+The counts of the rows are held in columns, one list per count, and each metric is computed for a whole column in one
+pass, instead of calling a function per row and per metric.  Percentages are rounded to two decimals, and are None when
+their denominator is zero; they are formatted only when the output files are written (format_percentages()), where
+None becomes 'NaN', as in the benchmarking metrics file.
+
+The Wilson score interval of a proportion of s successes in n trials, at the normal quantile z of the confidence level,
+is (p + z^2/2n -/+ z * sqrt(p(1 - p)/n + z^2/4n^2)) / (1 + z^2/n) with p = s/n.  Unlike the normal approximation, it
+stays within [0, 1] and is meaningful for the small counts of the long indel bins.
+"""
+
+import collections
+import math
+
+DEFAULT_CONFIDENCE_LEVEL = 0.95
+
+# The metrics of a case, region and variant class; size_bin is None for all the variants of the class.  Precision and
+# recall are percentages rounded to two decimals, or None if they cannot be computed.  num_bases is None when TN cannot
+# be computed, e.g. for the nucleotide counts of hap.py.  callable_bases is the number of callable reference bases of
+# the region in the query gVCF file (see callable_bases.py), or None.
+MetricsRow = collections.namedtuple('MetricsRow', ['case', 'region', 'variant_type', 'size_bin', 'num_bases',
+                                                   'truth_total', 'tp', 'fp', 'fn', 'precision', 'recall',
+                                                   'callable_bases'])
+
+
+def get_normal_quantile(confidence_level):
+    """
+    This function returns the z value of a two-sided confidence level: the standard normal quantile of
+    (1 + confidence_level) / 2, e.g. 1.96 for 0.95.
+
+    :param confidence_level: The confidence level, between 0 and 1
+    :type confidence_level: float
+
+    :rtype: float
+    """
+    if not 0 < confidence_level < 1:
+        raise ValueError('The confidence level must be between 0 and 1: {}'.format(confidence_level))
+
+    # solve erf(z / sqrt(2)) = confidence_level by bisection; erf is increasing
+    low = 0.0
+    high = 40.0
+
+    for _ in range(100):
+        middle = (low + high) / 2
+
+        if math.erf(middle / math.sqrt(2)) < confidence_level:
+            low = middle
+        else:
+            high = middle
+
+    return (low + high) / 2
+
+
+def get_percentages(numerators, denominators):
+    """
+    This function returns 100 * numerator / denominator of each row, rounded to two decimals, or None if the
+    denominator is zero or None.
+
+    :param numerators: The numerators
+    :type numerators: list
+    :param denominators: The denominators
+    :type denominators: list
+
+    :rtype: list
+    """
+    return [None if not denominator else round(100 * (float(numerator) / denominator), 2)
+            for numerator, denominator in zip(numerators, denominators)]
+
+
+def get_wilson_intervals(successes, totals, confidence_level=DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function returns the Wilson score confidence interval of the proportion successes / total of each row, as
+    percentages rounded to two decimals, or None if the total is zero or None.
+
+    :param successes: The numbers of successes
+    :type successes: list
+    :param totals: The numbers of trials
+    :type totals: list
+    :param confidence_level: The confidence level
+    :type confidence_level: float
+
+    :return: Tuple of (list of lower bounds, list of upper bounds)
+    :rtype: tuple
+    """
+    z = get_normal_quantile(confidence_level)
+    z2 = z * z
+    lows = list()
+    highs = list()
+
+    for success, total in zip(successes, totals):
+        if not total:
+            lows.append(None)
+            highs.append(None)
+            continue
+
+        total = float(total)
+        proportion = success / total
+        denominator = 1 + z2 / total
+        center = proportion + z2 / (2 * total)
+        margin = z * math.sqrt(max(0.0, proportion * (1 - proportion) / total + z2 / (4 * total * total)))
+
+        lows.append(round(100 * max(0.0, (center - margin) / denominator), 2))
+        highs.append(round(100 * min(1.0, (center + margin) / denominator), 2))
+
+    return lows, highs
+
+
+def format_percentages(values, fixed_decimals=False):
+    """
+    This function formats a column of percentages for the output file: 'NaN' for None, and the value with two decimals
+    (fixed_decimals) or as Python prints it.
+
+    :param values: The percentages
+    :type values: list
+    :param fixed_decimals: True to always write two decimals, e.g. 50.00
+    :type fixed_decimals: bool
+
+    :rtype: list
+    """
+    if fixed_decimals:
+        return ['NaN' if value is None else format(value, '.2f') for value in values]
+    else:
+        return ['NaN' if value is None else str(value) for value in values]
+
+
+class MetricsColumns(object):
+    """
+    The counts of a list of metrics rows, by column, and the metrics computed from them.
+    """
+
+    def __init__(self, rows):
+        """
+        This function computes the metrics of the rows.
+
+        :param rows: List of metrics rows (MetricsRow), with the fields case, region, num_bases, truth_total, tp, fp,
+        fn and callable_bases
+        :type rows: list
+
+        :raises ValueError: If a row has more FN than callable bases
+        """
+        self.num_bases = [row.num_bases for row in rows]
+        self.callable_bases = [row.callable_bases for row in rows]
+        self.truth_total = [row.truth_total for row in rows]
+        self.tp = [row.tp for row in rows]
+        self.fp = [row.fp for row in rows]
+        self.fn = [row.fn for row in rows]
+
+        # TN = TotalBases - (TP + FN + FP), or with the callable reference bases of a gVCF file,
+        # TN = CallableReferenceBases - FN: TP and FP are variant records, outside the reference blocks, and the FN the
+        # caller called reference are in them.  TotalNegative = TN + FP
+        self.tn = list()
+
+        for row, num_bases, callable_bases, tp, fp, fn in zip(rows, self.num_bases, self.callable_bases, self.tp,
+                                                              self.fp, self.fn):
+            if callable_bases is None and num_bases is None:
+                self.tn.append(None)
+            elif callable_bases is None:
+                self.tn.append(num_bases - (tp + fp + fn))
+            elif fn > callable_bases:
+                raise ValueError('{} {} has more FN ({}) than callable bases ({}): the gVCF or BED file of the '
+                                 'callable bases is not the one of the case'.format(row.case, row.region, fn,
+                                                                                    callable_bases))
+            else:
+                self.tn.append(callable_bases - fn)
+
+        self.total_negative = [None if tn is None else fp + tn for fp, tn in zip(self.fp, self.tn)]
+        self.query_total = [tp + fp for tp, fp in zip(self.tp, self.fp)]
+        self.truth_tp = [truth_total - fn for truth_total, fn in zip(self.truth_total, self.fn)]
+
+        self.npa = get_percentages(self.tn, self.total_negative)
+        self.precision = get_percentages(self.tp, self.query_total)
+        self.recall = get_percentages(self.truth_tp, self.truth_total)
+
+    def get_confidence_intervals(self, confidence_level=DEFAULT_CONFIDENCE_LEVEL):
+        """
+        This function returns the Wilson score confidence intervals of NPA, precision and recall.
+
+        :param confidence_level: The confidence level
+        :type confidence_level: float
+
+        :return: Dictionary with key = 'npa', 'precision' or 'recall' and value = tuple of (list of lower bounds, list
+        of upper bounds)
+        :rtype: dict
+        """
+        return {'npa': get_wilson_intervals(self.tn, self.total_negative, confidence_level),
+                'precision': get_wilson_intervals(self.tp, self.query_total, confidence_level),
+                'recall': get_wilson_intervals(self.truth_tp, self.truth_total, confidence_level)}
@@ -0,0 +1,515 @@
+#!/usr/bin/python
+
+"""
+This script keeps the benchmarking metrics of every run of benchmarking_truth_set.py (--history) in a SQLite database,
+and queries them: the runs, the deltas between two runs, and the trend of a case across the runs.
+
+The database is append-only: a run adds a row to the runs table and its metrics rows to the metrics table, and rows are
+never changed or deleted.  The metrics are indexed by case, region, variant class, size bin and run, and the runs by
+date, so a comparison or a trend is an index lookup, whatever the number of runs in the database.
+
+A change of precision (recall) is flagged as a significant drop when the Wilson score interval of the new run is below
+the interval of the base run, without overlap (metrics_engine.get_wilson_intervals()).  Precision is QUERY.TP out of
+QUERY.TP + QUERY.FP, and recall TRUTH.TP out of TRUTH.TOTAL, with TRUTH.TP = TRUTH.TOTAL - TRUTH.FN.  Non-overlapping
+intervals is a conservative test: a drop that is flagged is a drop, but a small drop of a large case may not be flagged.
+"""
+
+import argparse
+import collections
+import datetime
+import os
+import sqlite3
+import sys
+import time
+
+import metrics_engine
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_date TEXT NOT NULL,
+    label TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    case_name TEXT NOT NULL,
+    region TEXT NOT NULL,
+    variant_type TEXT NOT NULL,
+    size_bin TEXT NOT NULL,
+    num_bases INTEGER NOT NULL,
+    truth_total INTEGER NOT NULL,
+    tp INTEGER NOT NULL,
+    fp INTEGER NOT NULL,
+    fn INTEGER NOT NULL,
+    precision REAL,
+    recall REAL,
+    callable_bases INTEGER
+);
+CREATE INDEX IF NOT EXISTS metrics_key ON metrics (case_name, region, variant_type, size_bin, run_id);
+CREATE INDEX IF NOT EXISTS metrics_run ON metrics (run_id);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (run_date, run_id);
+"""
+
+# The fields of benchmarking_truth_set.MetricsRow, in order; the rows of a run are stored and read in this order
+ROW_COLUMNS = ['case', 'region', 'variant_type', 'size_bin', 'num_bases', 'truth_total', 'tp', 'fp', 'fn', 'precision',
+               'recall', 'callable_bases']
+SELECT_COLUMNS = ('runs.run_id, runs.run_date, runs.label, case_name, region, variant_type, size_bin, num_bases, '
+                  'truth_total, tp, fp, fn, precision, recall, callable_bases')
+ALL_SIZES = ''  # the size bin stored for all the variants of a class (size_bin None)
+
+# A metrics row of a run
+HistoryRow = collections.namedtuple('HistoryRow', ['run_id', 'run_date', 'label'] + ROW_COLUMNS)
+
+# The change of the metrics of a case, region, variant class and size bin between two runs; base or new is None when
+# the row is only in one run
+Delta = collections.namedtuple('Delta', ['key', 'base', 'new', 'precision_delta', 'recall_delta', 'flags'])
+
+DELTA_COLUMNS = ['case', 'region', 'variant_class', 'size_bin', 'base_run', 'new_run', 'base_precision',
+                 'new_precision', 'precision_delta', 'base_recall', 'new_recall', 'recall_delta', 'flags']
+TREND_COLUMNS = ['run_id', 'run_date', 'label', 'case', 'region', 'variant_class', 'size_bin', 'num_bases',
+                 'truth_total', 'tp', 'fp', 'fn', 'precision', 'recall', 'flags']
+
+
+def get_key(row):
+    """
+    This function returns the key of a metrics row: (case, region, variant type, size bin).
+
+    :param row: The metrics row
+    :type row: HistoryRow
+
+    :rtype: tuple
+    """
+    return row.case, row.region, row.variant_type, row.size_bin
+
+
+class MetricsHistory(object):
+    """
+    The metrics of the runs, stored in a SQLite database file.
+    """
+
+    def __init__(self, history_file, create=True):
+        """
+        This function opens the database file, and creates it if it does not exist and create is True.
+
+        :param history_file: The SQLite database file
+        :type history_file: str
+        :param create: True to create the database file if it does not exist (when a run is added), False to only open
+        an existing one (for the queries, so a mistyped file name is an error instead of an empty history)
+        :type create: bool
+
+        :raises ValueError: If create is False and the database file does not exist
+        """
+        if not create and not os.path.isfile(history_file):
+            raise ValueError('{} does not exist'.format(history_file))
+
+        self.connection = sqlite3.connect(history_file)
+
+        if create:
+            self.connection.executescript(SCHEMA)
+            self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        This function commits the changes and closes the database file.
+
+        :rtype: void
+        """
+        self.connection.commit()
+        self.connection.close()
+
+    def add_run(self, rows, run_date=None, label=None):
+        """
+        This function adds a run and its metrics rows, in one transaction.
+
+        :param rows: List of metrics (benchmarking_truth_set.MetricsRow)
+        :type rows: list
+        :param run_date: The date of the run (YYYY-MM-DD); default is today
+        :type run_date: str
+        :param label: A label of the run, e.g. the pipeline version, or None
+        :type label: str
+
+        :return: The run id
+        :rtype: int
+        """
+        with self.connection:
+            cursor = self.connection.execute('INSERT INTO runs (run_date, label, created) VALUES (?, ?, ?)',
+                                             (str(run_date or datetime.date.today()), label, time.time()))
+            run_id = cursor.lastrowid
+            values = list()
+
+            for row in rows:
+                row = list(row)
+                row[3] = ALL_SIZES if row[3] is None else row[3]
+                values.append([run_id] + row)
+
+            self.connection.executemany('INSERT INTO metrics VALUES ({})'.format(', '.join(['?'] * 13)), values)
+
+        return run_id
+
+    def get_runs(self):
+        """
+        This function returns the runs, oldest first.
+
+        :return: List of tuples of (run id, run date, label, number of metrics rows)
+        :rtype: list
+        """
+        return [tuple(str(value) if isinstance(value, unicode) else value for value in run)
+                for run in self.connection.execute(
+                    'SELECT runs.run_id, run_date, label, (SELECT COUNT(*) FROM metrics WHERE metrics.run_id = '
+                    'runs.run_id) FROM runs ORDER BY run_date, runs.run_id').fetchall()]
+
+    def get_run_id(self, run):
+        """
+        This function returns the id of a run given by its id, by its date (the last run of the date), or as 'latest'
+        or 'previous'.
+
+        :param run: The run id, the run date (YYYY-MM-DD), latest or previous
+        :type run: str
+
+        :rtype: int
+
+        :raises ValueError: If there is no such run
+        """
+        if run in ('latest', 'previous'):
+            run_ids = [run_id for (run_id,) in self.connection.execute(
+                'SELECT run_id FROM runs ORDER BY run_date DESC, run_id DESC LIMIT 2').fetchall()]
+            run_number = 0 if run == 'latest' else 1
+
+            if len(run_ids) <= run_number:
+                raise ValueError('The history has no {} run'.format(run))
+
+            return run_ids[run_number]
+
+        if str(run).isdigit():
+            entry = self.connection.execute('SELECT run_id FROM runs WHERE run_id = ?', (int(run),)).fetchone()
+        else:
+            entry = self.connection.execute('SELECT run_id FROM runs WHERE run_date = ? ORDER BY run_id DESC LIMIT 1',
+                                            (run,)).fetchone()
+
+        if entry is None:
+            raise ValueError('The history has no run {}'.format(run))
+
+        return entry[0]
+
+    def get_rows(self, run_id=None, case=None, region=None, variant_type=None, size_bin=False):
+        """
+        This function returns the metrics rows of a run, or of all the runs, that match the filters, ordered by run
+        date and run.
+
+        :param run_id: The run id, or None for all the runs
+        :type run_id: int
+        :param case: The case, or None for all the cases
+        :type case: str
+        :param region: The region, or None for all the regions
+        :type region: str
+        :param variant_type: The variant class (SNP or INDEL), or None for all the classes
+        :type variant_type: str
+        :param size_bin: The size bin, None for all the variants of a class, or False for all the size bins
+        :type size_bin: str
+
+        :rtype: list
+        """
+        conditions = list()
+        parameters = list()
+
+        for column, value in [('metrics.run_id', run_id), ('case_name', case), ('region', region),
+                              ('variant_type', variant_type)]:
+            if value is not None:
+                conditions.append(column + ' = ?')
+                parameters.append(value)
+
+        if size_bin is not False:
+            conditions.append('size_bin = ?')
+            parameters.append(ALL_SIZES if size_bin is None else size_bin)
+
+        query = 'SELECT {} FROM metrics JOIN runs ON runs.run_id = metrics.run_id'.format(SELECT_COLUMNS)
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        rows = list()
+
+        for values in self.connection.execute(query + ' ORDER BY runs.run_date, runs.run_id, metrics.rowid',
+                                              parameters):
+            values = [str(value) if isinstance(value, unicode) else value for value in values]
+            values[6] = None if values[6] == ALL_SIZES else values[6]
+            rows.append(HistoryRow(*values))
+
+        return rows
+
+
+def get_flags(base_rows, new_rows, confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function flags the significant precision and recall drops from the base rows to the new rows: the Wilson score
+    interval of the new row is below the interval of the base row.
+
+    :param base_rows: The base metrics rows
+    :type base_rows: list
+    :param new_rows: The new metrics rows, in the order of the base rows
+    :type new_rows: list
+    :param confidence_level: The confidence level of the intervals
+    :type confidence_level: float
+
+    :return: List of the flags of each pair of rows, e.g. ['PRECISION_DROP']
+    :rtype: list
+    """
+    rows = base_rows + new_rows
+    precision_low, precision_high = metrics_engine.get_wilson_intervals([row.tp for row in rows],
+                                                                        [row.tp + row.fp for row in rows],
+                                                                        confidence_level)
+    recall_low, recall_high = metrics_engine.get_wilson_intervals([row.truth_total - row.fn for row in rows],
+                                                                  [row.truth_total for row in rows], confidence_level)
+    flags = list()
+
+    for index in range(len(base_rows)):
+        new_index = index + len(base_rows)
+        row_flags = list()
+
+        for flag, lows, highs in [('PRECISION_DROP', precision_low, precision_high),
+                                  ('RECALL_DROP', recall_low, recall_high)]:
+            if lows[index] is not None and highs[new_index] is not None and highs[new_index] < lows[index]:
+                row_flags.append(flag)
+
+        flags.append(row_flags)
+
+    return flags
+
+
+def get_change(base_value, new_value):
+    """
+    This function returns the change of a percentage, rounded to two decimals, or None if a percentage is None.
+
+    :param base_value: The base percentage
+    :type base_value: float
+    :param new_value: The new percentage
+    :type new_value: float
+
+    :rtype: float
+    """
+    if base_value is None or new_value is None:
+        return None
+
+    return round(new_value - base_value, 2)
+
+
+def compare_rows(base_rows, new_rows, confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function returns the deltas of the metrics rows of two runs, matched by case, region, variant class and size
+    bin.  Rows of only one run are flagged ONLY_BASE or ONLY_NEW.
+
+    :param base_rows: The metrics rows of the base run
+    :type base_rows: list
+    :param new_rows: The metrics rows of the new run
+    :type new_rows: list
+    :param confidence_level: The confidence level of the intervals
+    :type confidence_level: float
+
+    :rtype: list
+    """
+    new_by_key = collections.OrderedDict((get_key(row), row) for row in new_rows)
+    base_by_key = collections.OrderedDict((get_key(row), row) for row in base_rows)
+    common_keys = [key for key in base_by_key if key in new_by_key]
+    flags = dict(zip(common_keys, get_flags([base_by_key[key] for key in common_keys],
+                                            [new_by_key[key] for key in common_keys], confidence_level)))
+    deltas = list()
+
+    for key, base in base_by_key.items():
+        new = new_by_key.get(key)
+
+        if new is None:
+            deltas.append(Delta(key, base, None, None, None, ['ONLY_BASE']))
+        else:
+            deltas.append(Delta(key, base, new, get_change(base.precision, new.precision),
+                                get_change(base.recall, new.recall), flags[key]))
+
+    for key, new in new_by_key.items():
+        if key not in base_by_key:
+            deltas.append(Delta(key, None, new, None, None, ['ONLY_NEW']))
+
+    return deltas
+
+
+def get_trend_flags(rows, confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function flags the significant precision and recall drops of each metrics row from the previous run of the
+    same case, region, variant class and size bin.
+
+    :param rows: The metrics rows, ordered by run
+    :type rows: list
+    :param confidence_level: The confidence level of the intervals
+    :type confidence_level: float
+
+    :return: List of the flags of each row
+    :rtype: list
+    """
+    previous = dict()
+    pairs = list()
+
+    for index, row in enumerate(rows):
+        key = get_key(row)
+
+        if key in previous:
+            pairs.append((index, previous[key]))
+
+        previous[key] = row
+
+    pair_flags = get_flags([base for _, base in pairs], [rows[index] for index, _ in pairs], confidence_level)
+    flags = [[] for _ in rows]
+
+    for (index, _), row_flags in zip(pairs, pair_flags):
+        flags[index] = row_flags
+
+    return flags
+
+
+def format_value(value):
+    """
+    This function formats a value of a query output line, with NaN for a missing value, as in the benchmarking metrics
+    file.
+
+    :param value: The value
+    :type value: object
+
+    :rtype: str
+    """
+    if value is None:
+        return 'NaN'
+
+    return str(value)
+
+
+def get_delta_lines(deltas):
+    """
+    This function returns the values of the output lines of the deltas of two runs.
+
+    :param deltas: The deltas, as returned by compare_rows()
+    :type deltas: list
+
+    :rtype: list
+    """
+    lines = list()
+
+    for delta in deltas:
+        base = delta.base
+        new = delta.new
+        case, region, variant_type, size_bin = delta.key
+        lines.append([case, region, variant_type, size_bin or 'all',
+                      format_value(base.run_id if base else None), format_value(new.run_id if new else None),
+                      format_value(base.precision if base else None), format_value(new.precision if new else None),
+                      format_value(delta.precision_delta), format_value(base.recall if base else None),
+                      format_value(new.recall if new else None), format_value(delta.recall_delta),
+                      ','.join(delta.flags)])
+
+    return lines
+
+
+def get_trend_lines(rows, flags):
+    """
+    This function returns the values of the output lines of a trend.
+
+    :param rows: The metrics rows, ordered by run
+    :type rows: list
+    :param flags: The flags of each row, as returned by get_trend_flags()
+    :type flags: list
+
+    :rtype: list
+    """
+    return [[str(row.run_id), row.run_date, row.label or '', row.case, row.region, row.variant_type,
+             row.size_bin or 'all', str(row.num_bases), str(row.truth_total), str(row.tp), str(row.fp), str(row.fn),
+             format_value(row.precision), format_value(row.recall), ','.join(row_flags)]
+            for row, row_flags in zip(rows, flags)]
+
+
+def print_lines(columns, lines):
+    """
+    This function prints tab delimited lines, with a header line.
+
+    :param columns: The column names
+    :type columns: list
+    :param lines: The lines, as lists of values
+    :type lines: list
+
+    :rtype: void
+    """
+    print '\t'.join(columns)
+
+    for line in lines:
+        print '\t'.join(line)
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It prints the runs of the history, the deltas between two runs, or the trend of a case.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--history", required=True,
+                        help="The history file (SQLite) written by benchmarking_truth_set.py --history")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--runs", action='store_true', help="Print the runs")
+    group.add_argument("--compare", nargs=2, metavar=('BASE', 'NEW'),
+                       help="Print the deltas between two runs, given by run id, by date (the last run of the date), "
+                            "or as latest or previous")
+    group.add_argument("--trend", metavar='CASE', help="Print the metrics of a case in all the runs")
+    parser.add_argument("-r", "--region", help="Only this region, e.g. WholeExome")
+    parser.add_argument("-t", "--variant-class", choices=['SNP', 'INDEL'], help="Only this variant class")
+    parser.add_argument("-b", "--size-bin",
+                        help="Only this size bin: 'all' for all the variants of the class, or an indel size bin, e.g. "
+                             "'1 - 10'")
+    parser.add_argument("--significant", action='store_true', help="Only print the lines with a flag")
+    parser.add_argument("--confidence-level", type=float, default=metrics_engine.DEFAULT_CONFIDENCE_LEVEL,
+                        help="The confidence level of the Wilson score intervals of the significant drops; default is "
+                             "{}".format(metrics_engine.DEFAULT_CONFIDENCE_LEVEL))
+
+    args = parser.parse_args()
+
+    if not 0 < args.confidence_level < 1:
+        parser.error('the confidence level must be between 0 and 1')
+
+    if args.size_bin is None:
+        size_bin = False
+    else:
+        size_bin = None if args.size_bin == 'all' else args.size_bin
+
+    try:
+        with MetricsHistory(args.history, create=False) as history:
+            if args.runs:
+                print_lines(['run_id', 'run_date', 'label', 'rows'],
+                            [[str(run_id), run_date, label or '', str(num_rows)]
+                             for run_id, run_date, label, num_rows in history.get_runs()])
+                return
+            elif args.compare:
+                base_rows, new_rows = [history.get_rows(history.get_run_id(run), None, args.region,
+                                                        args.variant_class, size_bin) for run in args.compare]
+                columns = DELTA_COLUMNS
+                lines = get_delta_lines(compare_rows(base_rows, new_rows, args.confidence_level))
+            else:
+                rows = history.get_rows(None, args.trend, args.region, args.variant_class, size_bin)
+                columns = TREND_COLUMNS
+                lines = get_trend_lines(rows, get_trend_flags(rows, args.confidence_level))
+
+            if args.significant:
+                lines = [line for line in lines if line[-1]]  # the flags are the last column
+
+            print_lines(columns, lines)
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+
+"""
+This module keeps the parsed rows of the input files of benchmarking_truth_set.py in a SQLite database, so repeat
+aggregations only parse the input files that are new or changed.
+
+An entry is keyed by the path of the input file and is valid while the file has the same size and modification time, or
+the same SHA-1 content hash (a file that was copied or touched without being changed is not parsed again).  The rows of
+an input file also depend on the case name and the number of bases, which are stored with the entry as its parameters.
+"""
+
+import json
+import os
+import sqlite3
+
+import bgzf
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parsed_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha1 TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    rows TEXT NOT NULL
+)
+"""
+
+
+def decode(value):
+    """
+    This function converts the unicode strings of a decoded JSON value to str.
+
+    :param value: The decoded JSON value
+    :type value: object
+
+    :return: The value with str instead of unicode strings
+    :rtype: object
+    """
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    elif isinstance(value, unicode):
+        return str(value)
+    else:
+        return value
+
+
+class ParseCache(object):
+    """
+    Cache of the parsed rows of input files, stored in a SQLite database file.
+    """
+
+    def __init__(self, cache_file):
+        """
+        This function opens the cache file, and creates it if it does not exist.
+
+        :param cache_file: The SQLite database file
+        :type cache_file: str
+        """
+        self.connection = sqlite3.connect(cache_file)
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        This function commits the changes and closes the cache file.
+
+        :rtype: void
+        """
+        self.connection.commit()
+        self.connection.close()
+
+    def get(self, path, parameters):
+        """
+        This function returns the cached rows of an input file, or None if the file is not in the cache, was parsed
+        with other parameters or has changed since it was parsed.
+
+        :param path: The input file
+        :type path: str
+        :param parameters: The parameters the rows depend on, e.g. the case name and the number of bases
+        :type parameters: str
+
+        :return: List of rows, or None
+        :rtype: list
+        """
+        path = os.path.abspath(path)
+        entry = self.connection.execute('SELECT size, mtime, sha1, parameters, rows FROM parsed_files WHERE path = ?',
+                                        (path,)).fetchone()
+
+        if entry is None:
+            return None
+
+        size, mtime, sha1, cached_parameters, rows = entry
+
+        if cached_parameters != parameters:
+            return None
+
+        stat = os.stat(path)
+
+        if stat.st_size != size:
+            return None
+
+        if stat.st_mtime != mtime:
+            if bgzf.get_file_hash(path) != sha1:
+                return None
+
+            self.connection.execute('UPDATE parsed_files SET mtime = ? WHERE path = ?', (stat.st_mtime, path))
+
+        return decode(json.loads(rows))
+
+    def put(self, path, parameters, rows):
+        """
+        This function stores the rows of an input file, replacing the previous entry of the file.
+
+        :param path: The input file
+        :type path: str
+        :param parameters: The parameters the rows depend on
+        :type parameters: str
+        :param rows: List of rows, each a list of values (or None)
+        :type rows: list
+
+        :rtype: void
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+
+        self.connection.execute('INSERT OR REPLACE INTO parsed_files VALUES (?, ?, ?, ?, ?, ?)',
+                                (path, stat.st_size, stat.st_mtime, bgzf.get_file_hash(path),
+                                 parameters, json.dumps(rows)))
+
+    def evict(self, directory):
+        """
+        This function removes the entries of the input files in a directory that no longer exist, e.g. files that were
+        deleted or renamed.  Entries of changed files are replaced when the files are parsed again.
+
+        :param directory: The input directory
+        :type directory: str
+
+        :return: The number of entries removed
+        :rtype: int
+        """
+        prefix = os.path.join(os.path.abspath(directory), '')
+        evicted = 0
+
+        for (path,) in self.connection.execute('SELECT path FROM parsed_files').fetchall():
+            if path.startswith(prefix) and not os.path.isfile(path):
+                self.connection.execute('DELETE FROM parsed_files WHERE path = ?', (path,))
+                evicted += 1
+
+        return evicted
@@ -0,0 +1,408 @@
+#!/usr/bin/python
+
+"""
+This script measures how the scripts of this repository scale, on synthetic data sets written by synthetic_data.py.
+
+For each data set size it times these stages:
+
+    verify_variants        verify_variants.py in batch mode, on the query VCF file of every case
+    truth_set_csv          benchmarking_truth_set.py, on the extended.csv and indelSizeDistribution.txt files
+    truth_set_annotated    benchmarking_truth_set.py --annotated-vcf, on the annotated VCF files
+    indel_size             the indel size steps of the workflow on the whole exome files of the first case:
+                           indel_distribution.py, split_annotated_vcf.py and indel_size_distribution.py
+
+and records the wall time, the peak resident set size (RSS) and the throughput (records, or files, per second).  Each
+stage runs in a forked child process that runs the scripts, so the peak RSS of a stage is that of its largest process.
+Each stage runs three times by default (--repeat), and the shortest wall time and the largest peak RSS of the runs are
+kept: the first run of a stage reads its data set from disk, and a single run is too noisy to compare with a baseline.
+
+The data sets are written in the data directory, one directory per size, and reused by later runs with the same size.
+The results can be saved as a baseline, and compared with a baseline: a stage is a regression when its wall time or
+peak RSS exceeds the baseline by more than the tolerance (plus a small absolute slack, so stages of a few milliseconds
+do not fail on noise).  The baseline must come from the same machine, and both the baseline and the runs compared with
+it keep the best of at least three runs of each stage.
+"""
+
+import argparse
+import collections
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import synthetic_data
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name: (number of cases, number of records of the whole exome annotated VCF file of each case)
+SIZES = collections.OrderedDict([('smoke', (5, 2000)),
+                                 ('exome_5', (5, 60000)),
+                                 ('exome_50', (50, 60000)),
+                                 ('wgs_5', (5, 4000000)),
+                                 ('cases_500', (500, 2000)),
+                                 ('cases_5000', (5000, 2000))])
+DEFAULT_SIZES = ['smoke', 'exome_5', 'cases_500']
+STAGES = ['verify_variants', 'truth_set_csv', 'truth_set_annotated', 'indel_size']
+DEFAULT_REPEAT = 3
+MIN_BASELINE_REPEAT = 3  # the best of fewer runs fails the baseline on the machine that recorded it
+SECONDS_SLACK = 0.1
+RSS_SLACK_MB = 5.0
+
+
+def parse_size(size):
+    """
+    This function returns the number of cases and of records of a data set size: a name of SIZES, or CASESxRECORDS
+    (e.g. 20x10000).
+
+    :param size: The size
+    :type size: str
+
+    :return: Tuple of (number of cases, number of records)
+    :rtype: tuple
+    """
+    if size in SIZES:
+        return SIZES[size]
+
+    try:
+        num_cases, num_records = [int(value) for value in size.lower().split('x')]
+    except ValueError:
+        raise ValueError('Unknown size {} (use one of {} or CASESxRECORDS)'.format(size, ', '.join(SIZES)))
+
+    return num_cases, num_records
+
+
+def get_data_set(data_dir, num_cases, num_records, seed):
+    """
+    This function returns the synthetic data set of a size, and writes it first if the data directory does not have it.
+
+    :param data_dir: The directory of the data set
+    :type data_dir: str
+    :param num_cases: The number of cases
+    :type num_cases: int
+    :param num_records: The number of records of the whole exome annotated VCF file of each case
+    :type num_records: int
+    :param seed: The seed of the random number generator
+    :type seed: int
+
+    :return: The content of the synthetic_data.json file of the data set
+    :rtype: dict
+    """
+    data_set_file = os.path.join(data_dir, 'synthetic_data.json')
+
+    if os.path.isfile(data_set_file):
+        with open(data_set_file, 'r') as infile_obj:
+            data_set = json.load(infile_obj)
+
+        if (data_set['cases'], data_set['records'], data_set['seed']) == (num_cases, num_records, seed):
+            return data_set
+
+    if os.path.isdir(data_dir):
+        shutil.rmtree(data_dir)
+
+    print 'Writing the data set of {} cases of {} records at {}'.format(num_cases, num_records, data_dir)
+
+    # in a separate process, so this process stays small: the child processes of the stages start as copies of it
+    subprocess.check_call([sys.executable, os.path.join(SCRIPT_DIR, 'synthetic_data.py'), '-o', data_dir,
+                           '-n', str(num_cases), '-r', str(num_records), '-s', str(seed)], stdout=open(os.devnull, 'w'))
+
+    with open(data_set_file, 'r') as infile_obj:
+        return json.load(infile_obj)
+
+
+def get_stage(stage, data_dir, data_set, work_dir, processes):
+    """
+    This function returns the commands of a stage, and the number of records (or files) the stage processes.
+
+    :param stage: The stage, one of STAGES
+    :type stage: str
+    :param data_dir: The directory of the data set
+    :type data_dir: str
+    :param data_set: The content of the synthetic_data.json file of the data set
+    :type data_set: dict
+    :param work_dir: The directory of the outputs of the stage
+    :type work_dir: str
+    :param processes: The number of processes of the scripts that run in parallel
+    :type processes: int
+
+    :return: Tuple of (list of commands, count, unit of the count)
+    :rtype: tuple
+    """
+    python = sys.executable
+    records_by_kind = data_set['records_by_kind']
+
+    if stage == 'verify_variants':
+        commands = [[python, os.path.join(SCRIPT_DIR, 'verify_variants.py'),
+                     '-m', os.path.join(data_dir, 'verify_manifest.txt'), '-o', os.path.join(work_dir, 'verify.txt'),
+                     '-p', str(processes)]]
+
+        return commands, records_by_kind['query'], 'records'
+
+    if stage in ('truth_set_csv', 'truth_set_annotated'):
+        command = [python, os.path.join(SCRIPT_DIR, 'benchmarking_truth_set.py'), '-i', data_dir, '-o', work_dir,
+                   '-p', str(processes)]
+
+        if stage == 'truth_set_csv':
+            # an extended.csv and an indelSizeDistribution.txt file per case and region
+            return [command], data_set['cases'] * len(synthetic_data.REGIONS) * 2, 'files'
+
+        return [command + ['-a']], sum(records_by_kind[region + '.annotated'] for region in synthetic_data.REGIONS), \
+            'records'
+
+    if stage == 'indel_size':
+        first_case = data_set['first_case']
+        distribution_file = os.path.join(work_dir, 'indelDistribution_Frombcftools.txt')
+        prefix = os.path.join(work_dir, 'benchmark')
+        commands = [[python, os.path.join(SCRIPT_DIR, 'indel_distribution.py'),
+                     '-i', first_case['WholeExomeRegions.truth'], '-o', distribution_file],
+                    [python, os.path.join(SCRIPT_DIR, 'split_annotated_vcf.py'),
+                     '-i', first_case['WholeExomeRegions.annotated'], '-p', prefix],
+                    [python, os.path.join(SCRIPT_DIR, 'indel_size_distribution.py'), '-d', distribution_file,
+                     '--tp', prefix + '_TPonly.vcf.gz', '--fp', prefix + '_FPonly.vcf.gz',
+                     '--fn', prefix + '_FNonly.vcf.gz', '-o', os.path.join(work_dir, 'indelSizeDistribution.txt')]]
+
+        return commands, data_set['records'], 'records'
+
+    raise ValueError('Unknown stage ' + stage)
+
+
+def run_commands(commands, log_file):
+    """
+    This function runs the commands of a stage in a forked child process, and returns the wall time and the peak RSS
+    of the child processes of the stage.
+
+    :param commands: The commands
+    :type commands: list
+    :param log_file: The file of the output of the commands
+    :type log_file: str
+
+    :return: Tuple of (wall time in seconds, peak RSS in MB)
+    :rtype: tuple
+    """
+    read_fd, write_fd = os.pipe()
+    start = time.time()
+    pid = os.fork()
+
+    if pid == 0:
+        # the child: RUSAGE_CHILDREN of a fresh process only covers the commands of this stage
+        os.close(read_fd)
+        status = 0
+
+        with open(log_file, 'w') as log_obj:
+            for command in commands:
+                status = subprocess.call(command, stdout=log_obj, stderr=subprocess.STDOUT)
+
+                if status:
+                    break
+
+        os.write(write_fd, str(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+        os.close(write_fd)
+        os._exit(1 if status else 0)
+
+    os.close(write_fd)
+    max_rss = ''
+
+    while True:
+        data = os.read(read_fd, 64)
+
+        if not data:
+            break
+
+        max_rss += data
+
+    os.close(read_fd)
+    _, status = os.waitpid(pid, 0)
+    seconds = time.time() - start
+
+    if status:
+        raise RuntimeError('A command failed; see ' + log_file)
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    divisor = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+
+    return seconds, int(max_rss) / divisor
+
+
+def run_benchmarks(sizes, data_dir, work_dir, processes=1, repeat=1, seed=0, stages=None):
+    """
+    This function runs the stages on the data set of each size.
+
+    :param sizes: The sizes, names of SIZES or CASESxRECORDS
+    :type sizes: list
+    :param data_dir: The directory of the data sets
+    :type data_dir: str
+    :param work_dir: The directory of the outputs of the stages
+    :type work_dir: str
+    :param processes: The number of processes of the scripts that run in parallel
+    :type processes: int
+    :param repeat: The number of runs of each stage
+    :type repeat: int
+    :param seed: The seed of the random number generator of the data sets
+    :type seed: int
+    :param stages: The stages; default is all
+    :type stages: list
+
+    :return: List of dictionaries with the keys size, cases, records, stage, seconds, peak_rss_mb, count, unit and
+    throughput (count per second)
+    :rtype: list
+    """
+    results = list()
+
+    for size in sizes:
+        num_cases, num_records = parse_size(size)
+        size_data_dir = os.path.join(data_dir, size)
+        data_set = get_data_set(size_data_dir, num_cases, num_records, seed)
+
+        for stage in stages or STAGES:
+            stage_work_dir = os.path.join(work_dir, size, stage)
+            synthetic_data.make_dirs(stage_work_dir)
+            commands, count, unit = get_stage(stage, size_data_dir, data_set, stage_work_dir, processes)
+            seconds = None
+            peak_rss_mb = 0.0
+
+            for _ in range(repeat):
+                run_seconds, run_peak_rss_mb = run_commands(commands, os.path.join(stage_work_dir, 'log.txt'))
+                seconds = run_seconds if seconds is None else min(seconds, run_seconds)
+                peak_rss_mb = max(peak_rss_mb, run_peak_rss_mb)
+
+            result = {'size': size, 'cases': num_cases, 'records': num_records, 'stage': stage,
+                      'seconds': round(seconds, 3), 'peak_rss_mb': round(peak_rss_mb, 1), 'count': count,
+                      'unit': unit, 'throughput': round(count / max(seconds, 1e-6), 1)}
+            results.append(result)
+
+            print '{size:<12} {stage:<20} {seconds:>9.3f} s {peak_rss_mb:>9.1f} MB {throughput:>12.1f} {unit}/s'.format(
+                **result)
+
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    This function compares the results with a baseline.
+
+    :param results: The results of run_benchmarks
+    :type results: list
+    :param baseline: The results of the baseline
+    :type baseline: list
+    :param tolerance: The allowed relative increase of the wall time and the peak RSS, e.g. 0.25
+    :type tolerance: float
+
+    :return: List of the regressions, as messages
+    :rtype: list
+    """
+    baseline_results = dict(((result['size'], result['stage']), result) for result in baseline)
+    regressions = list()
+
+    for result in results:
+        baseline_result = baseline_results.get((result['size'], result['stage']))
+
+        if baseline_result is None or baseline_result['records'] != result['records'] or \
+                baseline_result['cases'] != result['cases']:
+            continue
+
+        for key, slack, unit in [('seconds', SECONDS_SLACK, 's'), ('peak_rss_mb', RSS_SLACK_MB, 'MB')]:
+            if result[key] > baseline_result[key] * (1 + tolerance) + slack:
+                regressions.append('{} {}: {} {} {}, baseline {} {}'.format(result['size'], result['stage'], key,
+                                                                           result[key], unit, baseline_result[key],
+                                                                           unit))
+
+    return regressions
+
+
+def write_results(results, processes, repeat, output_file):
+    """
+    This function writes the results as JSON, with the machine they were measured on and the number of runs of each
+    stage.
+
+    :param results: The results of run_benchmarks
+    :type results: list
+    :param processes: The number of processes of the scripts that run in parallel
+    :type processes: int
+    :param repeat: The number of runs of each stage
+    :type repeat: int
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    with open(output_file, 'w') as outfile_obj:
+        json.dump({'python': platform.python_version(), 'machine': platform.platform(), 'processes': processes,
+                   'repeat': repeat, 'results': results}, outfile_obj, indent=2, sort_keys=True)
+        outfile_obj.write('\n')
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It runs the benchmarks, and compares them with a baseline.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--sizes", nargs='+', default=DEFAULT_SIZES,
+                        help="The data set sizes: {} or CASESxRECORDS; default is {}".format(', '.join(SIZES),
+                                                                                            ' '.join(DEFAULT_SIZES)))
+    parser.add_argument("--stages", nargs='+', choices=STAGES, help="The stages; default is all")
+    parser.add_argument("-d", "--data-dir", default='benchmark_data',
+                        help="The directory of the data sets; default is benchmark_data")
+    parser.add_argument("-w", "--work-dir", default='benchmark_work',
+                        help="The directory of the outputs of the stages; default is benchmark_work")
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="The number of processes of the scripts that run in parallel; default is 1")
+    parser.add_argument("-n", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="The number of runs of each stage, of which the best is kept; at least {} with "
+                             "--save-baseline or --baseline. Default is {}".format(MIN_BASELINE_REPEAT, DEFAULT_REPEAT))
+    parser.add_argument("-o", "--output", help="The results file (JSON); default is screen output only")
+    parser.add_argument("--save-baseline", help="Save the results as the baseline file")
+    parser.add_argument("-b", "--baseline", help="The baseline file; the results are checked for regressions")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.25,
+                        help="The allowed relative increase of the wall time and the peak RSS; default is 0.25")
+
+    args = parser.parse_args()
+
+    if (args.save_baseline or args.baseline) and args.repeat < MIN_BASELINE_REPEAT:
+        parser.error('a baseline is recorded and compared with the best of at least {0} runs of each stage '
+                     '(-n {0})'.format(MIN_BASELINE_REPEAT))
+
+    try:
+        for size in args.sizes:
+            parse_size(size)
+    except ValueError as error:
+        print 'Error:', error
+        sys.exit(1)
+
+    results = run_benchmarks(args.sizes, args.data_dir, args.work_dir, args.processes, args.repeat,
+                             stages=args.stages)
+
+    for output_file in [args.output, args.save_baseline]:
+        if output_file:
+            write_results(results, args.processes, args.repeat, output_file)
+
+            print 'Output file created. It can be found at', output_file
+
+    if args.baseline:
+        with open(args.baseline, 'r') as infile_obj:
+            baseline = json.load(infile_obj)
+
+        regressions = compare_with_baseline(results, baseline['results'], args.tolerance)
+
+        if regressions:
+            print 'Error: performance regressions against', args.baseline
+
+            for regression in regressions:
+                print '   ', regression
+
+            sys.exit(1)
+
+        print 'No regressions against', args.baseline
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,695 @@
+#!/usr/bin/python
+
+"""
+This script runs hap.py on each contig of the BED file separately, in a process pool, and merges the outputs of the
+contigs into the outputs of one hap.py run.  It is a drop-in replacement for the vcfComparison_by_Happy_* steps of the
+benchmarking workflow on whole genome callsets, where one hap.py process over all the contigs is the longest step.
+
+The truth and query VCF files and the BED file are split by contig.  A bgzipped VCF file with a tabix or CSI index is
+read one contig at a time through its index, in the process that runs hap.py on the contig; other VCF files are split
+in one pass before hap.py is run.
+
+The outputs of the contigs are merged as follows:
+    - extended.csv: the count columns (TRUTH.TOTAL, TRUTH.TP, TRUTH.FN, QUERY.TOTAL, QUERY.TP, QUERY.FP, ...) are added
+      up, and METRIC.Precision, METRIC.Recall, METRIC.Recall2 and METRIC.Frac_NA are computed from the added counts.
+      The *_ratio columns can not be computed from the ratios of the contigs, so they are left empty.
+    - summary.csv: the columns of the summary.csv file, taken from the merged extended.csv file
+    - counts.csv and counts.json: the counts are added up
+    - the annotated VCF file (.vcf.gz): the records of the contigs, in the order of the reference (.fai) file, are
+      written to one bgzipped VCF file, which is indexed with tabix
+The metrics.json file of hap.py is not merged.
+
+The merged extended.csv file can be read by benchmarking_truth_set.py, and the merged annotated VCF file by
+split_annotated_vcf.py, happy_vcf_metrics.py and indel_size_distribution.py.
+
+The comparator command is a template with the fields {truth}, {query}, {bed}, {reference} and {prefix}, so another
+comparator can stand in for hap.py, e.g. vcf_comparator.py, which only writes the extended.csv file:
+    -c "python vcf_comparator.py -t {truth} -q {query} -b {bed} -o {prefix}.extended.csv"
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import bed_index
+import bgzf
+import vcf_comparator
+
+HAPPY_COMMAND = '/opt/hap.py/bin/hap.py -V {truth} {query} -f {bed} -T {bed} -r {reference} -o {prefix}'
+METRIC_COLUMNS = {'METRIC.Precision': ('QUERY.TP', ['QUERY.TP', 'QUERY.FP']),
+                  'METRIC.Recall': ('TRUTH.TP', ['TRUTH.TP', 'TRUTH.FN']),
+                  'METRIC.Recall2': ('TRUTH.TP', ['TRUTH.TOTAL']),
+                  'METRIC.Frac_NA': ('QUERY.UNK', ['QUERY.TOTAL'])}
+SUMMARY_ROWS = ['Locations.INDEL', 'Locations.SNP']
+
+
+def get_contig_order(reference, contigs):
+    """
+    This function returns the contigs in the order of the reference index (.fai) file, or in the natural order 1, 2,
+    ..., 22, X, Y, M if there is no reference index file.
+
+    :param reference: The reference FASTA file, or None
+    :type reference: str
+    :param contigs: The contigs
+    :type contigs: list
+
+    :rtype: list
+    """
+    if reference is not None and os.path.isfile(reference + '.fai'):
+        with open(reference + '.fai', 'r') as infile_obj:
+            ranks = dict((line.split('\t', 1)[0], rank) for rank, line in enumerate(infile_obj))
+
+        return sorted(contigs, key=lambda contig: (ranks.get(contig, len(ranks)),
+                                                   vcf_comparator.get_natural_rank(contig)))
+    else:
+        return sorted(contigs, key=vcf_comparator.get_natural_rank)
+
+
+def read_vcf_header(vcf_file):
+    """
+    This function returns the header lines of a VCF file.
+
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+
+    :return: The header lines, with their trailing newline
+    :rtype: list
+    """
+    header = list()
+
+    with bgzf.open_vcf(vcf_file) as infile_obj:
+        for line in infile_obj:
+            if not line.startswith('#'):
+                break
+
+            header.append(line)
+
+            if line.startswith('#CHROM'):
+                break
+
+    return header
+
+
+def split_vcf(vcf_file, shard_files):
+    """
+    This function writes the records of each contig of a VCF file to the shard file of the contig, in one pass over the
+    VCF file.  Every shard file gets the header of the VCF file.  The records of the other contigs are skipped.
+
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+    :param shard_files: Dictionary with key = contig and value = shard file
+    :type shard_files: dict
+
+    :return: Dictionary with key = contig and value = number of records
+    :rtype: dict
+    """
+    outfile_objs = dict((contig, open(shard_file, 'w')) for contig, shard_file in shard_files.items())
+    num_records = dict((contig, 0) for contig in shard_files)
+
+    try:
+        with bgzf.open_vcf(vcf_file) as infile_obj:
+            for line in infile_obj:
+                if line.startswith('#'):
+                    for outfile_obj in outfile_objs.values():
+                        outfile_obj.write(line)
+
+                    continue
+
+                outfile_obj = outfile_objs.get(line.split('\t', 1)[0])
+
+                if outfile_obj is not None:
+                    outfile_obj.write(line)
+                    num_records[line.split('\t', 1)[0]] += 1
+    finally:
+        for outfile_obj in outfile_objs.values():
+            outfile_obj.close()
+
+    return num_records
+
+
+def extract_contig(vcf_file, index_file, contig, shard_file):
+    """
+    This function writes the header and the records of one contig of a bgzipped, indexed VCF file to the shard file.
+    Only the compressed blocks of the contig are read.
+
+    :param vcf_file: The bgzipped VCF file
+    :type vcf_file: str
+    :param index_file: The tabix or CSI index of the VCF file
+    :type index_file: str
+    :param contig: The contig
+    :type contig: str
+    :param shard_file: The shard file
+    :type shard_file: str
+
+    :return: The number of records
+    :rtype: int
+    """
+    num_records = 0
+    index = bgzf.BinningIndex(index_file)
+
+    with open(shard_file, 'w') as outfile_obj:
+        outfile_obj.writelines(read_vcf_header(vcf_file))
+
+        with bgzf.BgzfReader(vcf_file) as reader:
+            for line_items in bgzf.query_lines(reader, index, contig, 0, 1 << 29):
+                outfile_obj.write('\t'.join(line_items) + '\n')
+                num_records += 1
+
+    return num_records
+
+
+def write_shard_bed(regions, contig, shard_file):
+    """
+    This function writes the merged regions of one contig to the BED file of the shard.
+
+    :param regions: The regions of the BED file
+    :type regions: bed_index.BedIndex
+    :param contig: The contig
+    :type contig: str
+    :param shard_file: The BED file of the shard
+    :type shard_file: str
+
+    :rtype: void
+    """
+    with open(shard_file, 'w') as outfile_obj:
+        for start, end in regions.get_regions(contig):
+            outfile_obj.write('{}\t{}\t{}\n'.format(contig, start, end))
+
+
+def run_shard(job):
+    """
+    This function runs the comparator on one contig.  The truth and query records of the contig are first extracted
+    through the index of the VCF file, if they were not split before.
+
+    :param job: Tuple of (contig, shard directory, truth VCF file, truth index file or None, query VCF file, query index
+    file or None, number of records already split, comparator command, reference FASTA file)
+    :type job: tuple
+
+    :return: Tuple of (contig, output prefix of the shard, exit status of the comparator or None if the contig has no
+    records)
+    :rtype: tuple
+    """
+    contig, shard_dir, truth_vcf, truth_index, query_vcf, query_index, num_records, command, reference = job
+
+    truth_shard = os.path.join(shard_dir, 'truth.vcf')
+    query_shard = os.path.join(shard_dir, 'query.vcf')
+    prefix = os.path.join(shard_dir, 'happy')
+
+    if truth_index is not None:
+        num_records += extract_contig(truth_vcf, truth_index, contig, truth_shard)
+
+    if query_index is not None:
+        num_records += extract_contig(query_vcf, query_index, contig, query_shard)
+
+    if num_records == 0:
+        return contig, prefix, None
+
+    with open(prefix + '_ConsoleOutput.txt', 'w') as console_obj:
+        status = subprocess.call(command.format(truth=truth_shard, query=query_shard,
+                                                bed=os.path.join(shard_dir, 'regions.bed'), reference=reference,
+                                                prefix=prefix),
+                                 shell=True, stdout=console_obj, stderr=subprocess.STDOUT)
+
+    return contig, prefix, status
+
+
+def is_count_column(column):
+    """
+    This function returns True if the values of the extended.csv column can be added up across contigs.
+
+    :param column: The column name
+    :type column: str
+
+    :rtype: bool
+    """
+    return bool(column) and not column.startswith('METRIC.') and not column.endswith('_ratio')
+
+
+def add_value(total, value):
+    """
+    This function adds a count of an output file to the total.  Empty counts are not added.
+
+    :param total: The total, or None if no count was added yet
+    :type total: float
+    :param value: The count, e.g. '7934.0' or ''
+    :type value: str
+
+    :rtype: float
+    """
+    if value == '':
+        return total
+    else:
+        return (total or 0.0) + float(value)
+
+
+def format_count(total, integer=False):
+    """
+    This function returns a total count the way hap.py writes it.
+
+    :param total: The total, or None
+    :type total: float
+    :param integer: True to write the count without decimals
+    :type integer: bool
+
+    :rtype: str
+    """
+    if total is None:
+        return ''
+    elif integer:
+        return str(int(total))
+    else:
+        return str(total)
+
+
+def read_csv_table(csv_file):
+    """
+    This function reads an output CSV file of hap.py (extended.csv, summary.csv, counts.csv).
+
+    :param csv_file: The CSV file
+    :type csv_file: str
+
+    :return: Tuple of the columns, a dictionary with key = row name and value = list of values, the row names in order,
+    and the lines that are not rows of the table (the hap.py version and command line)
+    :rtype: tuple
+    """
+    columns = list()
+    rows = dict()
+    row_names = list()
+    other_lines = list()
+
+    with open(csv_file, 'r') as infile_obj:
+        for line in infile_obj:
+            line_items = line.rstrip('\n').split(',')
+
+            if not columns:
+                columns = line_items
+            elif len(line_items) == len(columns) and not line.startswith('hap.py'):
+                rows[line_items[0]] = line_items
+                row_names.append(line_items[0])
+            else:
+                other_lines.append(line)
+
+    return columns, rows, row_names, other_lines
+
+
+def merge_extended_csv(csv_files):
+    """
+    This function adds up the count columns of the extended.csv files of the contigs and computes the METRIC columns
+    from the added counts.
+
+    :param csv_files: The extended.csv files of the contigs
+    :type csv_files: list
+
+    :return: Tuple of the columns, the merged rows (key = row name, value = list of values), the row names in order and
+    the other lines of the first file
+    :rtype: tuple
+    """
+    columns = None
+    totals = dict()
+    row_names = list()
+    other_lines = list()
+
+    for csv_file in csv_files:
+        file_columns, rows, file_row_names, file_other_lines = read_csv_table(csv_file)
+
+        if columns is None:
+            columns = file_columns
+            other_lines = file_other_lines
+        elif file_columns != columns:
+            raise ValueError('{} does not have the columns of the other extended.csv files'.format(csv_file))
+
+        for row_name in file_row_names:
+            if row_name not in totals:
+                totals[row_name] = dict()
+                row_names.append(row_name)
+
+            for column, value in zip(columns, rows[row_name]):
+                if is_count_column(column):
+                    totals[row_name][column] = add_value(totals[row_name].get(column), value)
+
+    merged = dict()
+
+    for row_name in row_names:
+        counts = totals[row_name]
+        values = [row_name]
+
+        for column in columns[1:]:
+            if is_count_column(column):
+                values.append(format_count(counts.get(column)))
+            elif column in METRIC_COLUMNS:
+                numerator, denominator = METRIC_COLUMNS[column]
+                values.append(vcf_comparator.format_ratio(counts.get(numerator) or 0,
+                                                          sum(counts.get(name) or 0 for name in denominator)))
+            else:
+                values.append('')
+
+        merged[row_name] = values
+
+    return columns, merged, row_names, other_lines
+
+
+def write_csv_table(columns, rows, row_names, other_lines, output_file):
+    """
+    This function writes a CSV table the way hap.py writes it.
+
+    :param columns: The columns
+    :type columns: list
+    :param rows: Dictionary with key = row name and value = list of values
+    :type rows: dict
+    :param row_names: The row names in order
+    :type row_names: list
+    :param other_lines: The lines after the rows
+    :type other_lines: list
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    with open(output_file, 'w') as outfile_obj:
+        outfile_obj.write(','.join(columns) + '\n')
+
+        for row_name in row_names:
+            outfile_obj.write(','.join(rows[row_name]) + '\n')
+
+        outfile_obj.writelines(other_lines)
+
+
+def write_summary_csv(summary_file, extended, output_file):
+    """
+    This function writes the summary.csv file from the merged extended.csv table.  The columns and rows are those of
+    the summary.csv file of a contig.
+
+    :param summary_file: The summary.csv file of a contig
+    :type summary_file: str
+    :param extended: The merged extended.csv table, from merge_extended_csv()
+    :type extended: tuple
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    columns, rows, row_names, other_lines = read_csv_table(summary_file)
+    extended_columns, extended_rows, extended_row_names, _ = extended
+
+    summary_rows = dict()
+
+    for row_name in extended_row_names:
+        values = dict(zip(extended_columns, extended_rows[row_name]))
+        summary_rows[row_name] = [row_name] + [values.get(column, '') for column in columns[1:]]
+
+    write_csv_table(columns, summary_rows, extended_row_names, other_lines, output_file)
+
+
+def merge_counts_csv(csv_files, output_file):
+    """
+    This function adds up the counts of the counts.csv files of the contigs.
+
+    :param csv_files: The counts.csv files of the contigs
+    :type csv_files: list
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    columns = None
+    totals = dict()
+    integer_columns = set()
+    row_names = list()
+
+    for csv_file in csv_files:
+        file_columns, rows, file_row_names, _ = read_csv_table(csv_file)
+
+        if columns is None:
+            columns = file_columns
+
+        for row_name in file_row_names:
+            if row_name not in totals:
+                totals[row_name] = dict()
+                row_names.append(row_name)
+
+            for column, value in zip(columns[1:], rows[row_name][1:]):
+                totals[row_name][column] = add_value(totals[row_name].get(column), value)
+
+                if value and '.' not in value:  # the all:* columns are written without decimals
+                    integer_columns.add(column)
+
+    rows = dict((row_name, [row_name] + [format_count(totals[row_name].get(column), column in integer_columns)
+                                         for column in columns[1:]])
+                for row_name in row_names)
+
+    write_csv_table(columns, rows, row_names, [], output_file)
+
+
+def add_json_counts(total, counts):
+    """
+    This function adds the counts of a counts.json file to the total, recursively.
+
+    :param total: The total
+    :type total: dict
+    :param counts: The counts
+    :type counts: dict
+
+    :rtype: void
+    """
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            add_json_counts(total.setdefault(key, dict()), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def merge_counts_json(json_files, output_file):
+    """
+    This function adds up the counts of the counts.json files of the contigs.
+
+    :param json_files: The counts.json files of the contigs
+    :type json_files: list
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    total = dict()
+
+    for json_file in json_files:
+        with open(json_file, 'r') as infile_obj:
+            add_json_counts(total, json.load(infile_obj))
+
+    with open(output_file, 'w') as outfile_obj:
+        json.dump(total, outfile_obj, sort_keys=True, separators=(',', ':'))
+
+
+def concatenate_vcfs(vcf_files, output_file):
+    """
+    This function writes the header of the first VCF file and the records of all the VCF files, in order, to a bgzipped
+    VCF file, and indexes it with tabix.
+
+    :param vcf_files: The annotated VCF files of the contigs, in the order of the contigs
+    :type vcf_files: list
+    :param output_file: The output file (*.vcf.gz)
+    :type output_file: str
+
+    :rtype: void
+    """
+    with bgzf.BgzfWriter(output_file) as outfile_obj:
+        for file_number, vcf_file in enumerate(vcf_files):
+            with bgzf.open_vcf(vcf_file) as infile_obj:
+                for line in infile_obj:
+                    if not line.startswith('#') or file_number == 0:
+                        outfile_obj.write(line)
+
+    bgzf.write_tabix_index(output_file)
+
+
+def merge_outputs(prefixes, output_prefix):
+    """
+    This function merges the outputs of the contigs.  An output is merged if at least one contig has it.
+
+    :param prefixes: The output prefixes of the contigs that have records, in the order of the contigs
+    :type prefixes: list
+    :param output_prefix: The output prefix
+    :type output_prefix: str
+
+    :return: The merged extended.csv table, from merge_extended_csv(), or None
+    :rtype: tuple
+    """
+    def get_files(suffix):
+        return [prefix + suffix for prefix in prefixes if os.path.isfile(prefix + suffix)]
+
+    extended = None
+
+    if get_files('.extended.csv'):
+        extended = merge_extended_csv(get_files('.extended.csv'))
+        write_csv_table(*extended, output_file=output_prefix + '.extended.csv')
+
+        if get_files('.summary.csv'):
+            write_summary_csv(get_files('.summary.csv')[0], extended, output_prefix + '.summary.csv')
+
+    if get_files('.counts.csv'):
+        merge_counts_csv(get_files('.counts.csv'), output_prefix + '.counts.csv')
+
+    if get_files('.counts.json'):
+        merge_counts_json(get_files('.counts.json'), output_prefix + '.counts.json')
+
+    if get_files('.vcf.gz'):
+        concatenate_vcfs(get_files('.vcf.gz'), output_prefix + '.vcf.gz')
+
+    return extended
+
+
+def print_summary(extended):
+    """
+    This function prints the Locations.INDEL and Locations.SNP rows of the merged extended.csv table, as hap.py prints
+    its benchmarking summary.
+
+    :param extended: The merged extended.csv table, from merge_extended_csv()
+    :type extended: tuple
+
+    :rtype: void
+    """
+    columns, rows, _, _ = extended
+    summary_columns = [column for column in ['TRUTH.TOTAL', 'TRUTH.TP', 'TRUTH.FN', 'QUERY.TOTAL', 'QUERY.TP',
+                                             'QUERY.FP', 'METRIC.Recall', 'METRIC.Precision'] if column in columns]
+
+    print 'Benchmarking Summary:'
+    print '\t'.join([''] + summary_columns)
+
+    for row_name in SUMMARY_ROWS:
+        if row_name in rows:
+            values = dict(zip(columns, rows[row_name]))
+            print '\t'.join([row_name] + [values[column] for column in summary_columns])
+
+
+def run(truth, query, bed, output_prefix, reference=None, processes=1, comparator=HAPPY_COMMAND, work_dir=None):
+    """
+    This function splits the inputs by contig, runs the comparator on the contigs in a process pool and merges their
+    outputs.
+
+    :param truth: The truth VCF file (hap.py -V), sorted
+    :type truth: str
+    :param query: The query VCF file, sorted
+    :type query: str
+    :param bed: The BED file of the regions (hap.py -f and -T); its contigs are the shards
+    :type bed: str
+    :param output_prefix: The output prefix (hap.py -o)
+    :type output_prefix: str
+    :param reference: The reference FASTA file (hap.py -r), or None
+    :type reference: str
+    :param processes: The number of contigs compared at the same time
+    :type processes: int
+    :param comparator: The comparator command, with the fields {truth}, {query}, {bed}, {reference} and {prefix}
+    :type comparator: str
+    :param work_dir: The directory of the shards, or None for a temporary directory next to the outputs, removed at
+    the end
+    :type work_dir: str
+
+    :return: The merged extended.csv table, from merge_extended_csv()
+    :rtype: tuple
+
+    :raises ValueError: If the comparator fails on a contig, or writes no extended.csv file
+    """
+    regions = bed_index.BedIndex(bed)
+    contigs = get_contig_order(reference, regions.get_chroms())
+
+    shard_root = work_dir or tempfile.mkdtemp(prefix='shards_', dir=os.path.dirname(output_prefix) or '.')
+    shard_dirs = dict((contig, os.path.join(shard_root, 'shard_{:04d}'.format(shard)))
+                      for shard, contig in enumerate(contigs))
+
+    for contig in contigs:
+        if not os.path.isdir(shard_dirs[contig]):
+            os.makedirs(shard_dirs[contig])
+
+        write_shard_bed(regions, contig, os.path.join(shard_dirs[contig], 'regions.bed'))
+
+    num_records = dict((contig, 0) for contig in contigs)
+    vcf_indexes = list()
+
+    for vcf_file, shard_name in [(truth, 'truth.vcf'), (query, 'query.vcf')]:
+        index_file = bgzf.get_index_file(vcf_file)
+
+        if index_file is None or not bgzf.is_bgzf(vcf_file):
+            index_file = None
+            split_records = split_vcf(vcf_file, dict((contig, os.path.join(shard_dirs[contig], shard_name))
+                                                     for contig in contigs))
+
+            for contig in contigs:
+                num_records[contig] += split_records[contig]
+
+        vcf_indexes.append(index_file)
+
+    jobs = [(contig, shard_dirs[contig], truth, vcf_indexes[0], query, vcf_indexes[1], num_records[contig],
+             comparator, reference) for contig in contigs]
+
+    if processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(processes, len(jobs)))
+        results = pool.map(run_shard, jobs)
+        pool.close()
+        pool.join()
+    else:
+        results = [run_shard(job) for job in jobs]
+
+    failed = [(contig, prefix) for contig, prefix, status in results if status]
+
+    if failed:
+        raise ValueError('\n'.join('the comparator failed on contig {}. Its output can be found at {}'.format(
+            contig, prefix + '_ConsoleOutput.txt') for contig, prefix in failed))
+
+    extended = merge_outputs([prefix for contig, prefix, status in results if status is not None], output_prefix)
+
+    if not work_dir:
+        shutil.rmtree(shard_root)
+
+    if extended is None:
+        raise ValueError('the comparator wrote no extended.csv file')
+
+    return extended
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It splits the inputs by contig, runs the comparator on the contigs in a process pool and
+    merges their outputs.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--truth", required=True, help="The truth VCF file (hap.py -V), sorted")
+    parser.add_argument("-q", "--query", required=True, help="The query VCF file, sorted")
+    parser.add_argument("-b", "--bed", required=True, help="The BED file of the regions (hap.py -f and -T); its "
+                                                           "contigs are the shards")
+    parser.add_argument("-r", "--reference", help="The reference FASTA file (hap.py -r)")
+    parser.add_argument("-o", "--output-prefix", required=True, help="The output prefix (hap.py -o)")
+    parser.add_argument("-p", "--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="The number of contigs compared at the same time; default is the number of CPUs")
+    parser.add_argument("-c", "--comparator", default=HAPPY_COMMAND,
+                        help="The comparator command, with the fields {truth}, {query}, {bed}, {reference} and "
+                             "{prefix}; default is hap.py: " + HAPPY_COMMAND)
+    parser.add_argument("-w", "--work-dir", help="The directory of the shards; default is a temporary directory next "
+                                                 "to the outputs, removed at the end")
+
+    args = parser.parse_args()
+
+    try:
+        extended = run(args.truth, args.query, args.bed, args.output_prefix, args.reference, args.processes,
+                       args.comparator, args.work_dir)
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+    print_summary(extended)
+    print 'Output files created. They can be found at', args.output_prefix + '.*'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/python
+
+"""
+This script splits the annotated VCF file written by hap.py into TP, FP and FN VCF files in a single pass.  It replaces
+the three 'bcftools view' runs of the splittingAnnotatedVCF steps of the benchmarking workflow:
+
+    bcftools view -O z -V snps -i 'FMT/BVT="INDEL" & FMT/BD="TP"' annotated.vcf.gz > TPonly.vcf.gz
+    bcftools view -O z -V snps -i 'FMT/BVT="INDEL" & FMT/BD="FP"' annotated.vcf.gz > FPonly.vcf.gz
+    bcftools view -O z -V snps -i 'FMT/BVT="INDEL" & FMT/BD="FN"' annotated.vcf.gz > FNonly.vcf.gz
+
+A record is written to the TP (FP, FN) output when at least one sample column has BVT equal to the variant type and BD
+equal to TP (FP, FN).  For indels, records with a SNP allele are left out, as with 'bcftools view -V snps'.  The three
+outputs are bgzip compressed.
+"""
+
+import argparse
+
+import bgzf
+
+DECISIONS = ['TP', 'FP', 'FN']
+
+
+def is_snp_allele(ref, alt):
+    """
+    This function returns True if the ALT allele is a single nucleotide substitution of the REF allele.
+
+    :param ref: The REF allele
+    :type ref: str
+    :param alt: The ALT allele
+    :type alt: str
+
+    :return: True for a SNP allele
+    :rtype: bool
+    """
+    if len(ref) != len(alt) or alt.startswith('<') or alt in ('*', '.'):
+        return False
+
+    mismatches = 0
+
+    for ref_base, alt_base in zip(ref, alt):
+        if ref_base != alt_base:
+            mismatches += 1
+
+    return mismatches == 1
+
+
+def has_snp_allele(ref, alts):
+    """
+    This function returns True if any of the comma separated ALT alleles is a SNP.
+
+    :param ref: The REF allele
+    :type ref: str
+    :param alts: The ALT column
+    :type alts: str
+
+    :return: True if the record has a SNP allele
+    :rtype: bool
+    """
+    if len(ref) == 1 and len(alts) == 1:  # the most common case, a biallelic SNP or a monomorphic site
+        return alts != ref and alts not in ('*', '.')
+
+    for alt in alts.split(','):
+        if is_snp_allele(ref, alt):
+            return True
+
+    return False
+
+
+def get_format_indexes(format_column, format_cache):
+    """
+    This function returns the indexes of the BD and BVT subfields of a FORMAT column.  The indexes are cached per FORMAT
+    string, since hap.py writes the same FORMAT column on every record.
+
+    :param format_column: The FORMAT column, e.g. GT:BD:BK:BI:BVT:BLT:QQ
+    :type format_column: str
+    :param format_cache: Dictionary with key = FORMAT column and value = (BD index, BVT index, number of splits)
+    :type format_cache: dict
+
+    :return: Tuple of (BD index, BVT index, number of splits), or None if BD or BVT is missing
+    :rtype: tuple
+    """
+    indexes = format_cache.get(format_column, False)
+
+    if indexes is False:
+        keys = format_column.split(':')
+
+        if 'BD' in keys and 'BVT' in keys:
+            bd_index = keys.index('BD')
+            bvt_index = keys.index('BVT')
+            indexes = (bd_index, bvt_index, max(bd_index, bvt_index) + 1)
+        else:
+            indexes = None
+
+        format_cache[format_column] = indexes
+
+    return indexes
+
+
+def get_record_decisions(line_items, variant_type, format_cache):
+    """
+    This function returns the BD values of the sample columns whose BVT matches the variant type.
+
+    :param line_items: The record split into the first nine columns and the rest of the line (the sample columns)
+    :type line_items: list
+    :param variant_type: The BVT value to keep, INDEL or SNP
+    :type variant_type: str
+    :param format_cache: Cache of the FORMAT indexes, see get_format_indexes()
+    :type format_cache: dict
+
+    :return: Set of BD values, e.g. set(['TP'])
+    :rtype: set
+    """
+    decisions = set()
+    indexes = get_format_indexes(line_items[8], format_cache)
+
+    if indexes is None:
+        return decisions
+
+    bd_index, bvt_index, num_splits = indexes
+
+    for sample in line_items[9].rstrip('\n').split('\t'):
+        subfields = sample.split(':', num_splits)
+
+        if len(subfields) >= num_splits and subfields[bvt_index] == variant_type:
+            decisions.add(subfields[bd_index])
+
+    return decisions
+
+
+def split_annotated_vcf(annotated_vcf, output_files, variant_type='INDEL'):
+    """
+    This function streams the annotated VCF file once and writes each record to the TP, FP and FN outputs it belongs
+    to.  The header is copied to every output.
+
+    :param annotated_vcf: The annotated VCF file written by hap.py
+    :type annotated_vcf: str
+    :param output_files: Dictionary with key = TP, FP or FN and value = output file name
+    :type output_files: dict
+    :param variant_type: The BVT value to keep, INDEL or SNP
+    :type variant_type: str
+
+    :return: Dictionary with key = TP, FP or FN and value = number of records written
+    :rtype: dict
+    """
+    counts = dict((decision, 0) for decision in output_files)
+    writers = dict((decision, bgzf.BgzfWriter(filename)) for decision, filename in output_files.items())
+    format_cache = dict()
+    exclude_snps = variant_type != 'SNP'
+
+    try:
+        with bgzf.open_vcf(annotated_vcf) as vcf_obj:
+            for line in vcf_obj:
+                if line.startswith('#'):
+                    for writer in writers.values():
+                        writer.write(line)
+                    continue
+
+                line_items = line.split('\t', 9)
+
+                if len(line_items) < 10:  # no sample columns
+                    continue
+
+                if exclude_snps and has_snp_allele(line_items[3], line_items[4]):
+                    continue
+
+                for decision in get_record_decisions(line_items, variant_type, format_cache):
+                    writer = writers.get(decision)
+
+                    if writer is not None:
+                        writer.write(line)
+                        counts[decision] += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return counts
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It writes the TP, FP and FN VCF files and prints the number of records in each.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", required=True, help="The annotated VCF file written by hap.py")
+    parser.add_argument("--tp", help="The TP output file; default is <prefix>_TPonly.vcf.gz")
+    parser.add_argument("--fp", help="The FP output file; default is <prefix>_FPonly.vcf.gz")
+    parser.add_argument("--fn", help="The FN output file; default is <prefix>_FNonly.vcf.gz")
+    parser.add_argument("-p", "--prefix", help="The output file prefix; default is the input file name without .vcf.gz")
+    parser.add_argument("-t", "--type", default='INDEL', choices=['INDEL', 'SNP'],
+                        help="The variant type (FORMAT/BVT) to keep; default is INDEL")
+
+    args = parser.parse_args()
+
+    prefix = args.prefix
+
+    if prefix is None:
+        prefix = args.input[:-len('.vcf.gz')] if args.input.endswith('.vcf.gz') else args.input
+
+    output_files = {'TP': args.tp or prefix + '_TPonly.vcf.gz',
+                    'FP': args.fp or prefix + '_FPonly.vcf.gz',
+                    'FN': args.fn or prefix + '_FNonly.vcf.gz'}
+
+    counts = split_annotated_vcf(args.input, output_files, args.type)
+
+    for decision in DECISIONS:
+        print '{}: {} records written to {}'.format(decision, counts[decision], output_files[decision])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/python
+
+"""
+This script computes the benchmarking metrics of the cases in many BED strata (homopolymers, low complexity regions, GC
+bins, segmental duplications, ...) from the annotated VCF file written by hap.py, in a single pass over each file.
+
+The strata are read into one combined index: the regions of all the BED files of a chromosome are cut into elementary
+segments, each with the tuple of the strata that cover it.  The annotated VCF file is then streamed once, with a pointer
+into the segments that only moves forward, and the calls of each record are counted (as happy_vcf_metrics.py counts
+them) in every stratum that the record overlaps.  Adding a stratum adds segments to the index, not a pass over the VCF
+file, and the hap.py, split and indel size steps are not run again for each stratum.  The annotated VCF file must be
+sorted, with the records of each chromosome together.
+
+The strata manifest has one line per stratum, its name and its BED file; relative paths are relative to the manifest:
+
+    #stratum          BED file
+    homopolymers      GRCh37_SimpleRepeat_homopolymer_gt10_slop5.bed
+    segmental_dups    GRCh37_segdups.bed
+
+The cases are given by a manifest with one line per case: case name, annotated VCF file and, optionally, the BED file of
+the confident regions of the comparison.  The number of bases of a stratum is the number of bases of its BED file, or of
+its intersection with the confident regions when these are given; TN is computed from it as in
+benchmarking_truth_set.py.
+
+The output file has the layout of the benchmarking metrics file of benchmarking_truth_set.py: a SNP section and an
+INDEL section for each stratum, with the same columns, and with -f csv/jsonl the long form tables, with the stratum
+name as region.
+"""
+
+import argparse
+import datetime
+import multiprocessing
+import os
+import sys
+
+import bed_index
+import benchmarking_truth_set
+import happy_vcf_metrics
+import metrics_engine
+
+worker_index = None  # the strata index of a worker process, set by set_worker_index()
+
+
+class StrataIndex(object):
+    """
+    The regions of the BED files of the strata, cut into elementary segments.  Positions are 0-based and ranges are
+    half-open, as in the BED format.
+    """
+
+    def __init__(self, strata):
+        """
+        This function reads the BED files of the strata and cuts the regions of each chromosome into the segments
+        between the starts and ends of all the regions.  Only segments covered by a stratum are kept, and adjacent
+        segments covered by the same strata are merged.
+
+        :param strata: List of tuples of (stratum name, BED file)
+        :type strata: list
+        """
+        self.names = [name for name, _ in strata]
+        self.regions = [bed_index.BedIndex(bed_file) for _, bed_file in strata]
+        self.segments = dict()  # chrom -> (segment starts, segment ends, tuple of the stratum indexes of each segment)
+        interned = dict()
+        chroms = set(chrom for regions in self.regions for chrom in regions.starts)
+
+        for chrom in chroms:
+            events = list()
+
+            for number, regions in enumerate(self.regions):
+                for start, end in regions.get_regions(chrom):
+                    events.append((start, 1, number))
+                    events.append((end, -1, number))
+
+            events.sort()
+            starts = list()
+            ends = list()
+            segment_strata = list()
+            active = set()
+            position = 0
+
+            for event_position, change, number in events:
+                if event_position > position and active:
+                    covering = tuple(sorted(active))
+                    covering = interned.setdefault(covering, covering)
+
+                    if ends and ends[-1] == position and segment_strata[-1] is covering:
+                        ends[-1] = event_position
+                    else:
+                        starts.append(position)
+                        ends.append(event_position)
+                        segment_strata.append(covering)
+
+                position = event_position
+
+                if change == 1:
+                    active.add(number)
+                else:
+                    active.discard(number)
+
+            self.segments[chrom] = (starts, ends, segment_strata)
+
+    def get_num_bases(self, confident_regions=None):
+        """
+        This function returns the number of bases of each stratum, or of its intersection with the confident regions.
+
+        :param confident_regions: The confident regions, or None
+        :type confident_regions: bed_index.BedIndex
+
+        :return: List of the number of bases of each stratum
+        :rtype: list
+        """
+        if confident_regions is None:
+            return [regions.get_length() for regions in self.regions]
+
+        return [sum(confident_regions.get_overlap_length(chrom, start, end)
+                    for chrom in regions.get_chroms() for start, end in regions.get_regions(chrom))
+                for regions in self.regions]
+
+
+class StrataCursor(object):
+    """
+    A forward-only cursor into the segments of a strata index, for the records of a sorted VCF file.
+    """
+
+    def __init__(self, strata_index):
+        """
+        :param strata_index: The strata index
+        :type strata_index: StrataIndex
+        """
+        self.strata_index = strata_index
+        self.done_chroms = set()
+        self.chrom = None
+        self.starts = list()
+        self.ends = list()
+        self.segment_strata = list()
+        self.pointer = 0
+        self.last_start = 0
+
+    def get_strata(self, chrom, start, end):
+        """
+        This function returns the strata that a record overlaps.  The records must be sorted by chromosome and start.
+
+        :param chrom: The chromosome of the record
+        :type chrom: str
+        :param start: The 0-based start of the record
+        :type start: int
+        :param end: The end of the record
+        :type end: int
+
+        :return: Tuple of the stratum indexes
+        :rtype: tuple
+
+        :raises ValueError: If the records are not sorted
+        """
+        if chrom != self.chrom:
+            self.done_chroms.add(self.chrom)
+            self.chrom = chrom
+
+            if chrom in self.done_chroms:
+                raise ValueError('The VCF file is not sorted: the records of {} are not together'.format(chrom))
+
+            self.starts, self.ends, self.segment_strata = self.strata_index.segments.get(chrom, ([], [], []))
+            self.pointer = 0
+        elif start < self.last_start:
+            raise ValueError('The VCF file is not sorted at {}:{}'.format(chrom, start + 1))
+
+        self.last_start = start
+        starts = self.starts
+        ends = self.ends
+        pointer = self.pointer
+
+        while pointer < len(ends) and ends[pointer] <= start:  # segments before the record are done
+            pointer += 1
+
+        self.pointer = pointer
+
+        if pointer == len(starts) or starts[pointer] >= end:
+            return ()
+
+        if pointer + 1 == len(starts) or starts[pointer + 1] >= end:
+            return self.segment_strata[pointer]
+
+        # the record spans several segments, e.g. a deletion across a stratum boundary
+        strata = set()
+
+        while pointer < len(starts) and starts[pointer] < end:
+            strata.update(self.segment_strata[pointer])
+            pointer += 1
+
+        return tuple(sorted(strata))
+
+
+def count_strata(annotated_vcf, strata_index, bin_starts=None):
+    """
+    This function streams the annotated VCF file once and counts the calls of each stratum.
+
+    :param annotated_vcf: The annotated VCF file written by hap.py
+    :type annotated_vcf: str
+    :param strata_index: The strata index
+    :type strata_index: StrataIndex
+    :param bin_starts: Sorted list of the first indel size of each bin; default is 1, 2, 6, 11, 21, 51
+    :type bin_starts: list
+
+    :return: List of the counts of each stratum, as returned by happy_vcf_metrics.count_annotated_vcf()
+    :rtype: list
+
+    :raises ValueError: If the VCF file is not sorted
+    """
+    cursor = StrataCursor(strata_index)
+
+    try:
+        return happy_vcf_metrics.count_annotated_vcf_groups(annotated_vcf, len(strata_index.names),
+                                                            cursor.get_strata, bin_starts)
+    except ValueError as error:
+        raise ValueError('{}: {}'.format(annotated_vcf, error))
+
+
+def get_strata_rows(strata_counts, case_name, names, num_bases):
+    """
+    This function returns the metrics of a case in each stratum.
+
+    :param strata_counts: List of the counts of each stratum, as returned by count_strata()
+    :type strata_counts: list
+    :param case_name: The case name
+    :type case_name: str
+    :param names: The stratum names
+    :type names: list
+    :param num_bases: The number of bases of each stratum
+    :type num_bases: list
+
+    :return: List of tuples of (snp metrics, list of the indel metrics: all indels, then by size) of each stratum
+    :rtype: list
+    """
+    strata_rows = list()
+
+    for counts, name, stratum_bases in zip(strata_counts, names, num_bases):
+        snp = benchmarking_truth_set.get_count_data(counts['SNP'], case_name, name, 'SNP', stratum_bases)
+        indel = benchmarking_truth_set.get_count_data(counts['INDEL'], case_name, name, 'INDEL', stratum_bases)
+        indel_by_size = benchmarking_truth_set.get_indel_by_size_rows(counts['indel_sizes'], case_name, name,
+                                                                      stratum_bases)
+        strata_rows.append((snp, [indel] + indel_by_size))
+
+    return strata_rows
+
+
+def set_worker_index(strata_index):
+    """
+    This function sets the strata index of a worker process, so it is sent to each worker once rather than with each
+    case.
+
+    :param strata_index: The strata index
+    :type strata_index: StrataIndex
+
+    :rtype: void
+    """
+    global worker_index
+    worker_index = strata_index
+
+
+def get_case_strata_rows(job):
+    """
+    This function returns the metrics of a case in each stratum of the strata index of the worker process.
+
+    :param job: Tuple of (case name, annotated VCF file, number of bases of each stratum)
+    :type job: tuple
+
+    :return: List of tuples of (snp metrics, list of the indel metrics) of each stratum
+    :rtype: list
+    """
+    case_name, annotated_vcf, num_bases = job
+
+    return get_strata_rows(count_strata(annotated_vcf, worker_index), case_name, worker_index.names, num_bases)
+
+
+def read_strata_manifest(manifest):
+    """
+    This function reads a manifest of strata, which has two tab delimited columns: the stratum name and its BED file.
+    Relative paths are relative to the manifest.
+
+    :param manifest: The manifest file
+    :type manifest: str
+
+    :return: List of tuples of (stratum name, BED file)
+    :rtype: list
+
+    :raises ValueError: If a line has less than two columns, or a stratum name is repeated
+    """
+    manifest_dir = os.path.dirname(manifest)
+    strata = list()
+
+    with open(manifest, 'r') as infile_obj:
+        for line in infile_obj:
+            if line.startswith('#') or not line.strip():
+                continue
+
+            line_items = line.strip().split('\t')
+
+            if len(line_items) < 2:
+                raise ValueError('The strata manifest line has less than two columns: {}'.format(line.strip()))
+
+            if line_items[0] in [name for name, _ in strata]:
+                raise ValueError('The stratum {} is in the strata manifest twice'.format(line_items[0]))
+
+            strata.append((line_items[0], os.path.join(manifest_dir, line_items[1])))
+
+    return strata
+
+
+def read_manifest(manifest):
+    """
+    This function reads a manifest of cases, which has two or three tab delimited columns: the case name, the annotated
+    VCF file and, optionally, the BED file of the confident regions.
+
+    :param manifest: The manifest file
+    :type manifest: str
+
+    :return: List of tuples of (case name, annotated VCF file, confident regions BED file or None)
+    :rtype: list
+
+    :raises ValueError: If a line has less than two columns
+    """
+    cases = list()
+
+    with open(manifest, 'r') as infile_obj:
+        for line in infile_obj:
+            if line.startswith('#') or not line.strip():
+                continue
+
+            line_items = line.strip().split('\t')
+
+            if len(line_items) < 2:
+                raise ValueError('The manifest line has less than two columns: {}'.format(line.strip()))
+
+            cases.append((line_items[0], line_items[1], line_items[2] if len(line_items) > 2 else None))
+
+    return cases
+
+
+def create_stratified_output(names, case_strata_rows, output_file):
+    """
+    This function creates the tab delimited output file, with a SNP section and an INDEL section for each stratum.
+
+    :param names: The stratum names
+    :type names: list
+    :param case_strata_rows: List of the metrics of each case, as returned by get_strata_rows()
+    :type case_strata_rows: list
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    header_columns = benchmarking_truth_set.get_header_columns([])
+
+    with open(output_file, 'w') as outfile_obj:
+        for number, name in enumerate(names):
+            snp_rows = [strata_rows[number][0] for strata_rows in case_strata_rows]
+            indel_rows = [row for strata_rows in case_strata_rows for row in strata_rows[number][1]]
+
+            benchmarking_truth_set.write_section(outfile_obj, 'Benchmarking SNPs ' + name, header_columns, snp_rows)
+            benchmarking_truth_set.write_section(outfile_obj, 'Benchmarking INDELs ' + name, header_columns,
+                                                 indel_rows)
+
+
+def run(cases, strata, output_file, output_formats=('tsv',), processes=1,
+        confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL):
+    """
+    This function computes the metrics of the cases in the strata and writes the output files.  Each output file is
+    replaced atomically.
+
+    :param cases: List of tuples of (case name, annotated VCF file, confident regions BED file or None)
+    :type cases: list
+    :param strata: List of tuples of (stratum name, BED file)
+    :type strata: list
+    :param output_file: The tab delimited output file; the long form output files have the same name, with the
+    extension .csv or .jsonl
+    :type output_file: str
+    :param output_formats: The output formats: tsv, csv and/or jsonl
+    :type output_formats: list
+    :param processes: The number of annotated VCF files counted in parallel
+    :type processes: int
+    :param confidence_level: The confidence level of the intervals of the long form outputs
+    :type confidence_level: float
+
+    :return: List of the output files
+    :rtype: list
+    """
+    strata_index = StrataIndex(strata)
+    confident_regions = dict()
+    jobs = list()
+
+    for case_name, annotated_vcf, regions_bed in cases:
+        if regions_bed is not None and regions_bed not in confident_regions:
+            confident_regions[regions_bed] = strata_index.get_num_bases(bed_index.BedIndex(regions_bed))
+
+        num_bases = confident_regions[regions_bed] if regions_bed is not None else strata_index.get_num_bases()
+        jobs.append((case_name, annotated_vcf, num_bases))
+
+    if processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(processes, len(jobs)), set_worker_index, (strata_index,))
+
+        try:
+            case_strata_rows = pool.map(get_case_strata_rows, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        set_worker_index(strata_index)
+        case_strata_rows = [get_case_strata_rows(job) for job in jobs]
+
+    output_prefix = os.path.splitext(output_file)[0]
+    output_files = list()
+
+    if 'tsv' in output_formats:
+        benchmarking_truth_set.write_atomically(output_file, create_stratified_output, strata_index.names,
+                                                case_strata_rows)
+        output_files.append(output_file)
+
+    if 'csv' in output_formats or 'jsonl' in output_formats:
+        rows = [row for strata_rows in case_strata_rows for snp, indel_rows in strata_rows
+                for row in [snp] + indel_rows if row is not None]
+        long_form_rows = benchmarking_truth_set.get_long_form_rows(rows, confidence_level)
+
+        for output_format, create_function in [('csv', benchmarking_truth_set.create_csv_output),
+                                               ('jsonl', benchmarking_truth_set.create_jsonl_output)]:
+            if output_format in output_formats:
+                benchmarking_truth_set.write_atomically(output_prefix + '.' + output_format, create_function,
+                                                        long_form_rows)
+                output_files.append(output_prefix + '.' + output_format)
+
+    return output_files
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It creates the stratified benchmarking metrics file of the cases.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--strata", required=True,
+                        help="Tab delimited file with the name and the BED file of each stratum")
+    parser.add_argument("-m", "--manifest",
+                        help="Tab delimited file with the case name, the annotated VCF file and, optionally, the "
+                             "confident regions BED file of each case")
+    parser.add_argument("-c", "--case", help="Single case: the case name")
+    parser.add_argument("-i", "--annotated-vcf", help="Single case: the annotated VCF file written by hap.py")
+    parser.add_argument("-r", "--regions", help="Single case: the confident regions BED file; default is none")
+    parser.add_argument("-o", "--output", default='.', help="The output directory; default is current directory")
+    parser.add_argument("-f", "--format", nargs='+', choices=['tsv', 'csv', 'jsonl'], default=['tsv'],
+                        help="The output formats: tsv (the stratified benchmarking metrics file), csv and jsonl (long "
+                             "form tables); default is tsv")
+    parser.add_argument("-p", "--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="The number of annotated VCF files counted in parallel; default is the number of CPUs")
+    parser.add_argument("--confidence-level", type=float, default=metrics_engine.DEFAULT_CONFIDENCE_LEVEL,
+                        help="The confidence level of the Wilson score intervals of precision, recall and NPA in the "
+                             "long form tables; default is {}".format(metrics_engine.DEFAULT_CONFIDENCE_LEVEL))
+
+    args = parser.parse_args()
+
+    if not args.manifest and not (args.case and args.annotated_vcf):
+        parser.error('a manifest, or a case and an annotated VCF file, are required')
+
+    if not 0 < args.confidence_level < 1:
+        parser.error('the confidence level must be between 0 and 1')
+
+    output_file = os.path.join(args.output, 'Stratified_benchmarking_metrics_{}.txt'.format(datetime.date.today()))
+
+    try:
+        if args.manifest:
+            cases = read_manifest(args.manifest)
+        else:
+            cases = [(args.case, args.annotated_vcf, args.regions)]
+
+        run(cases, read_strata_manifest(args.strata), output_file, args.format, args.processes, args.confidence_level)
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+    print 'Output file created. It can be found at', output_file
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,528 @@
+#!/usr/bin/python
+
+"""
+This script writes a synthetic benchmarking data set, laid out like the benchmarking_NA* directories of the benchmarking
+workflow, for measuring how the scripts of this repository scale.  For each case (NA90001, NA90002, ...) it writes:
+
+    benchmarking_<case>/vcfComparison_by_Happy_<region>/benchmark_<case>_<region>.vcf.gz (+ .tbi)
+                                                         the hap.py annotated VCF file, with TRUTH and QUERY columns
+    benchmarking_<case>/vcfComparison_by_Happy_<region>/benchmark_<case>_<region>.extended.csv
+    benchmarking_<case>/indelDistribution_<region>_HappyResults/*_indelDistribution_Frombcftools.txt
+    benchmarking_<case>/indelSizeDistribution_<region>_HappyResults/*_indelSizeDistribution.txt
+    truth/<case>_<region>.vcf.gz                         the truth VCF file (TP and FN calls)
+    beds/<case>_<region>.bed                             the regions of the truth set
+    query/<case>.vcf.gz                                  the query VCF file (TP and FP calls of the whole exome)
+    verify/<case>_truth.txt                              a verify_variants.py truth file of query variants
+with <region> WholeExomeRegions (all the records of the case) and CodingExons (every eighth record), and at the top:
+
+    number_of_bases.txt                                  the number of bases of the BED files
+    bed_manifest.txt                                     the BED files of each case, for bed_index.py
+    verify_manifest.txt                                  the truth file and query VCF file of each case
+    synthetic_data.json                                  the parameters, the number of records of each kind of file
+                                                         and the files of the first case
+
+The calls are random but deterministic: the same seed, number of cases and number of records always give the same
+files.  The counts in the extended.csv and indelSizeDistribution.txt files are those of the annotated VCF file, so
+benchmarking_truth_set.py gives the same output with and without --annotated-vcf.
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+
+import bed_index
+import bgzf
+import indel_distribution
+import indel_size_distribution
+import vcf_comparator
+
+CHROM_LENGTHS = [('1', 249250621), ('2', 243199373), ('3', 198022430), ('4', 191154276), ('5', 180915260),
+                 ('6', 171115067), ('7', 159138663), ('8', 146364022), ('9', 141213431), ('10', 135534747),
+                 ('11', 135006516), ('12', 133851895), ('13', 115169878), ('14', 107349540), ('15', 102531392),
+                 ('16', 90354753), ('17', 81195210), ('18', 78077248), ('19', 59128983), ('20', 63025520),
+                 ('21', 48129895), ('22', 51304566), ('X', 155270560)]
+REGIONS = ['WholeExomeRegions', 'CodingExons']
+CODING_EXONS_EVERY = 8  # every eighth record of the whole exome is also in the coding exons
+BED_PADDING = 25
+VERIFY_VARIANTS = 10
+
+INDEL_FRACTION = 0.1
+DEL_ALLELE_FRACTION = 0.05  # deletions written as <DEL> in the annotated VCF file, as hap.py does
+HOMALT_FRACTION = 0.4
+DECISION_FRACTIONS = {'SNP': [('TP', 0.97), ('FN', 0.015), ('FP', 0.015)],
+                      'INDEL': [('TP', 0.9), ('FN', 0.05), ('FP', 0.05)]}
+INDEL_SIZE_WEIGHTS = [(1, 45), (2, 15), (3, 10), (4, 8), (5, 5), (6, 4), (8, 4), (10, 3), (15, 3), (25, 2), (40, 1),
+                      (75, 1)]
+MAX_INDEL_SIZE = max(size for size, _ in INDEL_SIZE_WEIGHTS)
+
+EXTENDED_COLUMNS = ['METRIC.Frac_NA', 'METRIC.Precision', 'METRIC.Recall', 'METRIC.Recall2', 'QUERY.FN', 'QUERY.FP',
+                    'QUERY.FP.AL', 'QUERY.FP.GT', 'QUERY.FP.TiTv_ratio', 'QUERY.FP.het_hom_ratio',
+                    'QUERY.FP.hethetalt_hom_ratio', 'QUERY.IGN', 'QUERY.TOTAL', 'QUERY.TOTAL.TiTv_ratio',
+                    'QUERY.TOTAL.het_hom_ratio', 'QUERY.TOTAL.hethetalt_hom_ratio', 'QUERY.TP', 'QUERY.TP.TiTv_ratio',
+                    'QUERY.TP.het_hom_ratio', 'QUERY.TP.hethetalt_hom_ratio', 'QUERY.UNK', 'TRUTH.FN',
+                    'TRUTH.FN.TiTv_ratio', 'TRUTH.FN.het_hom_ratio', 'TRUTH.FN.hethetalt_hom_ratio', 'TRUTH.FP',
+                    'TRUTH.IGN', 'TRUTH.TOTAL', 'TRUTH.TOTAL.TiTv_ratio', 'TRUTH.TOTAL.het_hom_ratio',
+                    'TRUTH.TOTAL.hethetalt_hom_ratio', 'TRUTH.TP', 'TRUTH.TP.TiTv_ratio', 'TRUTH.TP.het_hom_ratio',
+                    'TRUTH.TP.hethetalt_hom_ratio', 'TRUTH.UNK']
+FORMAT_LINES = ['##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n']
+ANNOTATED_FORMAT_LINES = FORMAT_LINES + [
+    '##FORMAT=<ID=BD,Number=1,Type=String,Description="Decision for call (TP/FP/FN/N)">\n',
+    '##FORMAT=<ID=BK,Number=1,Type=String,Description="Sub-type for decision (match/mismatch type)">\n',
+    '##FORMAT=<ID=BI,Number=1,Type=String,Description="Additional comparison information">\n',
+    '##FORMAT=<ID=BVT,Number=1,Type=String,Description="High-level variant type in truth (SNP|INDEL).">\n',
+    '##FORMAT=<ID=BLT,Number=1,Type=String,Description="High-level variant type in query (SNP|INDEL).">\n',
+    '##FORMAT=<ID=QQ,Number=1,Type=Float,Description="Variant quality for ROC creation.">\n',
+    '##INFO=<ID=Regions,Number=.,Type=String,Description="Tags for regions.">\n']
+NOCALL = './.:.:.:.:NOCALL:nocall:0'
+TRANSITIONS = set(['AG', 'GA', 'CT', 'TC'])
+
+
+def get_header(format_lines, samples):
+    """
+    This function returns the header lines of a synthetic VCF file.
+
+    :param format_lines: The ##FORMAT and ##INFO lines
+    :type format_lines: list
+    :param samples: The sample names
+    :type samples: list
+
+    :rtype: list
+    """
+    header = ['##fileformat=VCFv4.1\n', '##FILTER=<ID=PASS,Description="All filters passed">\n',
+              '##source=synthetic_data.py\n']
+    header.extend('##contig=<ID={},length={},assembly=b37>\n'.format(chrom, length) for chrom, length in CHROM_LENGTHS)
+    header.extend(format_lines)
+    header.append('\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT'] + samples) + '\n')
+
+    return header
+
+
+def choose(rng, weights):
+    """
+    This function returns a random item of a list of (item, weight) pairs.
+
+    :param rng: The random number generator
+    :type rng: random.Random
+    :param weights: List of (item, weight)
+    :type weights: list
+
+    :rtype: object
+    """
+    value = rng.random() * sum(weight for _, weight in weights)
+
+    for item, weight in weights:
+        value -= weight
+
+        if value < 0:
+            return item
+
+    return weights[-1][0]
+
+
+def get_random_bases(rng, length):
+    """
+    This function returns random bases.
+
+    :param rng: The random number generator
+    :type rng: random.Random
+    :param length: The number of bases
+    :type length: int
+
+    :rtype: str
+    """
+    return ''.join(rng.choice('ACGT') for _ in range(length))
+
+
+def iter_calls(rng, num_records):
+    """
+    This function yields random calls, sorted by chromosome and position.  The records are spread over the chromosomes
+    in proportion to their length, one in each of the equal slots of a chromosome, so they do not overlap.
+
+    :param rng: The random number generator
+    :type rng: random.Random
+    :param num_records: The number of records
+    :type num_records: int
+
+    :return: Generator of tuples of (chrom, pos, REF, ALT, variant type, genotype class, decision)
+    :rtype: generator
+    """
+    genome_length = sum(length for _, length in CHROM_LENGTHS)
+    remaining = num_records
+
+    for chrom_number, (chrom, length) in enumerate(CHROM_LENGTHS):
+        if chrom_number == len(CHROM_LENGTHS) - 1:
+            chrom_records = remaining
+        else:
+            chrom_records = min(remaining, num_records * length // genome_length)
+
+        remaining -= chrom_records
+        slot_length = max(MAX_INDEL_SIZE + 2, length // (chrom_records + 1))
+
+        for slot in range(chrom_records):
+            pos = slot * slot_length + rng.randint(1, slot_length - MAX_INDEL_SIZE - 1)
+
+            if rng.random() < INDEL_FRACTION:
+                variant_type = 'INDEL'
+                size = choose(rng, INDEL_SIZE_WEIGHTS)
+                bases = get_random_bases(rng, size + 1)
+
+                if rng.random() < 0.5:
+                    ref, alt = bases, bases[0]
+                else:
+                    ref, alt = bases[0], bases
+            else:
+                variant_type = 'SNP'
+                ref = rng.choice('ACGT')
+                alt = rng.choice([base for base in 'ACGT' if base != ref])
+
+            genotype_class = 'homalt' if rng.random() < HOMALT_FRACTION else 'het'
+
+            yield chrom, pos, ref, alt, variant_type, genotype_class, choose(rng, DECISION_FRACTIONS[variant_type])
+
+
+def get_annotated_record(rng, call):
+    """
+    This function returns the annotated VCF record of a call, as hap.py writes it.
+
+    :param rng: The random number generator
+    :type rng: random.Random
+    :param call: Tuple of (chrom, pos, REF, ALT, variant type, genotype class, decision)
+    :type call: tuple
+
+    :rtype: str
+    """
+    chrom, pos, ref, alt, variant_type, genotype_class, decision = call
+    genotype = '1/1' if genotype_class == 'homalt' else '0/1'
+    qual = '{:.2f}'.format(rng.uniform(30, 5000))
+
+    if variant_type == 'SNP':
+        info = 'ti' if ref + alt in TRANSITIONS else 'tv'
+    else:
+        info = '.'
+
+        if len(alt) == 1 and rng.random() < DEL_ALLELE_FRACTION:
+            pos, ref, alt = pos + 1, ref[1:], '<DEL>'
+
+    kind = 'gm' if decision == 'TP' else '.'
+    sample = ':'.join([genotype, decision, kind, info, variant_type, genotype_class, qual])
+    truth = sample if decision != 'FP' else NOCALL
+    query = sample if decision != 'FN' else NOCALL
+
+    return '\t'.join([chrom, str(pos), '.', ref, alt, qual, '.', 'Regions=CONF', 'GT:BD:BK:BI:BVT:BLT:QQ', truth,
+                      query]) + '\n'
+
+
+def get_extended_row(row_name, counts):
+    """
+    This function returns a row of the extended.csv file.
+
+    :param row_name: The row name, e.g. Locations.INDEL
+    :type row_name: str
+    :param counts: Dictionary with the keys TP, FP and FN
+    :type counts: dict
+
+    :rtype: str
+    """
+    tp = counts['TP']
+    fp = counts['FP']
+    fn = counts['FN']
+
+    values = {'METRIC.Frac_NA': '0.0',
+              'METRIC.Precision': vcf_comparator.format_ratio(tp, tp + fp),
+              'METRIC.Recall': vcf_comparator.format_ratio(tp, tp + fn),
+              'METRIC.Recall2': vcf_comparator.format_ratio(tp, tp + fn),
+              'QUERY.FN': '0.0', 'QUERY.FP': str(float(fp)), 'QUERY.TOTAL': str(float(tp + fp)),
+              'QUERY.TP': str(float(tp)), 'QUERY.UNK': '0.0', 'TRUTH.FN': str(float(fn)), 'TRUTH.FP': '0.0',
+              'TRUTH.TOTAL': str(float(tp + fn)), 'TRUTH.TP': str(float(tp)), 'TRUTH.UNK': '0.0'}
+
+    return ','.join([row_name] + [values.get(column, '') for column in EXTENDED_COLUMNS]) + '\n'
+
+
+def write_extended_csv(type_counts, output_file):
+    """
+    This function writes the Locations rows of the extended.csv file.
+
+    :param type_counts: Dictionary with key = variant type and value = counts by decision
+    :type type_counts: dict
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    total = collections.Counter()
+
+    for counts in type_counts.values():
+        total.update(counts)
+
+    with open(output_file, 'w') as outfile_obj:
+        outfile_obj.write(',' + ','.join(EXTENDED_COLUMNS) + '\n')
+        outfile_obj.write(get_extended_row('Locations', total))
+        outfile_obj.write(get_extended_row('Locations.INDEL', type_counts['INDEL']))
+        outfile_obj.write(get_extended_row('Locations.SNP', type_counts['SNP']))
+
+
+def write_indel_files(size_counts, length_counts, indel_distribution_file, indel_size_file):
+    """
+    This function writes the indel distribution and the indel size distribution files.
+
+    :param size_counts: Dictionary with key = decision and value = counts by indel size
+    :type size_counts: dict
+    :param length_counts: Counts of the truth indels by length (deletions negative)
+    :type length_counts: collections.Counter
+    :param indel_distribution_file: The indel distribution output file
+    :type indel_distribution_file: str
+    :param indel_size_file: The indel size distribution output file
+    :type indel_size_file: str
+
+    :rtype: void
+    """
+    indel_distribution.write_indel_distribution(length_counts, indel_distribution_file)
+
+    bin_starts = indel_size_distribution.DEFAULT_BIN_STARTS
+    frequencies = indel_size_distribution.histogram(indel_size_distribution.read_indel_distribution(
+        indel_distribution_file), bin_starts, indel_size_distribution.FREQUENCY_MAX_SIZE)
+    tp_counts, fp_counts, fn_counts = [indel_size_distribution.histogram(size_counts[decision], bin_starts)
+                                       for decision in ['TP', 'FP', 'FN']]
+    rows = list()
+
+    for label, frequency, tp, fp, fn in zip(indel_size_distribution.get_bin_labels(bin_starts), frequencies,
+                                            tp_counts, fp_counts, fn_counts):
+        rows.append([label, str(frequency), str(tp), str(fp), str(fn),
+                     indel_size_distribution.format_percent(tp, tp + fp),
+                     indel_size_distribution.format_percent(tp, tp + fn)])
+
+    indel_size_distribution.write_indel_size_distribution(rows, indel_size_file)
+
+
+def make_dirs(*dir_names):
+    """
+    This function creates the directories that do not exist.
+
+    :param dir_names: The directories
+    :type dir_names: str
+
+    :rtype: void
+    """
+    for dir_name in dir_names:
+        if not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+
+
+def write_case(output_dir, case_name, num_records, seed):
+    """
+    This function writes the files of one case.
+
+    :param output_dir: The output directory
+    :type output_dir: str
+    :param case_name: The case name
+    :type case_name: str
+    :param num_records: The number of records of the whole exome annotated VCF file
+    :type num_records: int
+    :param seed: The seed of the random number generator of the case
+    :type seed: int
+
+    :return: Tuple of a dictionary with key = kind of file (e.g. 'query', 'WholeExomeRegions.annotated') and value =
+    file name, and a dictionary with key = kind of file and value = number of records
+    :rtype: tuple
+    """
+    rng = random.Random(seed)
+    case_dir = os.path.join(output_dir, 'benchmarking_' + case_name)
+    files = dict()
+    outputs = dict()
+
+    for region in REGIONS:
+        happy_dir = os.path.join(case_dir, 'vcfComparison_by_Happy_' + region)
+        distribution_dir = os.path.join(case_dir, 'indelDistribution_{}_HappyResults'.format(region))
+        size_dir = os.path.join(case_dir, 'indelSizeDistribution_{}_HappyResults'.format(region))
+        make_dirs(happy_dir, distribution_dir, size_dir, os.path.join(output_dir, 'truth'),
+                  os.path.join(output_dir, 'beds'))
+
+        prefix = 'benchmark_{}_{}'.format(case_name, region)
+        files[region] = {'annotated': os.path.join(happy_dir, prefix + '.vcf.gz'),
+                         'extended': os.path.join(happy_dir, prefix + '.extended.csv'),
+                         'distribution': os.path.join(distribution_dir, prefix + '_indelDistribution_Frombcftools.txt'),
+                         'size': os.path.join(size_dir, prefix + '_indelSizeDistribution.txt'),
+                         'truth': os.path.join(output_dir, 'truth', '{}_{}.vcf.gz'.format(case_name, region)),
+                         'bed': os.path.join(output_dir, 'beds', '{}_{}.bed'.format(case_name, region))}
+        outputs[region] = {'annotated': bgzf.BgzfWriter(files[region]['annotated']),
+                           'truth': bgzf.BgzfWriter(files[region]['truth']),
+                           'bed': open(files[region]['bed'], 'w'),
+                           'type_counts': dict((variant_type, collections.Counter())
+                                               for variant_type in ['SNP', 'INDEL']),
+                           'size_counts': dict((decision, collections.Counter()) for decision in ['TP', 'FP', 'FN']),
+                           'length_counts': collections.Counter()}
+        outputs[region]['annotated'].write(''.join(get_header(ANNOTATED_FORMAT_LINES, ['TRUTH', 'QUERY'])))
+        outputs[region]['truth'].write(''.join(get_header(FORMAT_LINES, [case_name])))
+
+    make_dirs(os.path.join(output_dir, 'query'), os.path.join(output_dir, 'verify'))
+
+    query_vcf = os.path.join(output_dir, 'query', case_name + '.vcf.gz')
+    verify_file = os.path.join(output_dir, 'verify', case_name + '_truth.txt')
+    query_obj = bgzf.BgzfWriter(query_vcf)
+    query_obj.write(''.join(get_header(FORMAT_LINES, [case_name])))
+    verify_step = max(1, num_records // VERIFY_VARIANTS)
+    verify_calls = list()
+    last_query_call = None
+    num_query_records = 0
+
+    for record_number, call in enumerate(iter_calls(rng, num_records)):
+        chrom, pos, ref, alt, variant_type, genotype_class, decision = call
+        genotype = '1/1' if genotype_class == 'homalt' else '0/1'
+        record = '\t'.join([chrom, str(pos), '.', ref, alt, '50', 'PASS', '.', 'GT', genotype]) + '\n'
+        annotated_record = get_annotated_record(rng, call)
+
+        if decision != 'FN':
+            query_obj.write(record)
+            num_query_records += 1
+
+            last_query_call = (chrom, pos, ref, alt)
+
+            if num_query_records % verify_step == 0:
+                verify_calls.append(last_query_call)
+
+        for region in REGIONS:
+            if region == 'CodingExons' and record_number % CODING_EXONS_EVERY:
+                continue
+
+            region_outputs = outputs[region]
+            region_outputs['annotated'].write(annotated_record)
+            region_outputs['bed'].write('{}\t{}\t{}\n'.format(chrom, max(0, pos - 1 - BED_PADDING),
+                                                              pos - 1 + len(ref) + BED_PADDING))
+            region_outputs['type_counts'][variant_type][decision] += 1
+
+            if variant_type == 'INDEL':
+                annotated_items = annotated_record.split('\t', 5)
+                size = indel_size_distribution.get_indel_size(annotated_items[3], annotated_items[4])
+                region_outputs['size_counts'][decision][size] += 1
+
+            if decision != 'FP':
+                region_outputs['truth'].write(record)
+
+                if variant_type == 'INDEL':
+                    length = len(alt) - len(ref)
+                    region_outputs['length_counts'][max(-indel_distribution.MAX_INDEL_LENGTH,
+                                                        min(indel_distribution.MAX_INDEL_LENGTH, length))] += 1
+
+    query_obj.close()
+
+    for region in REGIONS:
+        region_outputs = outputs[region]
+        region_outputs['annotated'].close()
+        region_outputs['truth'].close()
+        region_outputs['bed'].close()
+        bgzf.write_tabix_index(files[region]['annotated'])
+
+        write_extended_csv(region_outputs['type_counts'], files[region]['extended'])
+        write_indel_files(region_outputs['size_counts'], region_outputs['length_counts'],
+                          files[region]['distribution'], files[region]['size'])
+
+    # the verified variants are spread over the query VCF file and include its last record, so it is read to the end
+    if last_query_call is not None and last_query_call not in verify_calls:
+        verify_calls = verify_calls[-(VERIFY_VARIANTS - 1):] + [last_query_call]
+
+    with open(verify_file, 'w') as outfile_obj:
+        outfile_obj.write('#chrom\tpos\tref\talt\tfilter\n')
+
+        for chrom, pos, ref, alt in verify_calls:
+            outfile_obj.write('{}\t{}\t{}\t{}\tPASS\n'.format(chrom, pos, ref, alt))
+
+    case_files = {'query': query_vcf, 'verify': verify_file}
+    record_counts = {'query': num_query_records}
+
+    for region in REGIONS:
+        for kind in ['annotated', 'truth', 'bed', 'extended', 'distribution', 'size']:
+            case_files['{}.{}'.format(region, kind)] = files[region][kind]
+
+        type_counts = outputs[region]['type_counts']
+        record_counts[region + '.annotated'] = sum(sum(counts.values()) for counts in type_counts.values())
+        record_counts[region + '.truth'] = sum(counts['TP'] + counts['FN'] for counts in type_counts.values())
+
+    return case_files, record_counts
+
+
+def generate(output_dir, num_cases, num_records, seed=0):
+    """
+    This function writes the synthetic data set.
+
+    :param output_dir: The output directory
+    :type output_dir: str
+    :param num_cases: The number of cases
+    :type num_cases: int
+    :param num_records: The number of records of the whole exome annotated VCF file of each case
+    :type num_records: int
+    :param seed: The seed of the random number generator
+    :type seed: int
+
+    :return: The content of the synthetic_data.json file: the parameters, the total number of records of each kind of
+    file and the files of the first case
+    :rtype: dict
+    """
+    make_dirs(output_dir)
+
+    case_names = ['NA{}'.format(90001 + case_number) for case_number in range(num_cases)]
+    bed_lines = list()
+    verify_lines = list()
+    total_counts = collections.Counter()
+    first_case_files = None
+
+    for case_number, case_name in enumerate(case_names):
+        case_files, record_counts = write_case(output_dir, case_name, num_records, seed * 1000003 + case_number)
+        total_counts.update(record_counts)
+        first_case_files = first_case_files or case_files
+
+        bed_lines.append('\t'.join([case_name, os.path.relpath(case_files['WholeExomeRegions.bed'], output_dir),
+                                    os.path.relpath(case_files['CodingExons.bed'], output_dir)]) + '\n')
+        verify_lines.append('\t'.join([case_files['verify'], case_files['query']]) + '\n')
+
+    with open(os.path.join(output_dir, 'bed_manifest.txt'), 'w') as outfile_obj:
+        outfile_obj.write('#case\twhole exome BED\tcoding exons BED\n')
+        outfile_obj.writelines(bed_lines)
+
+    with open(os.path.join(output_dir, 'verify_manifest.txt'), 'w') as outfile_obj:
+        outfile_obj.writelines(verify_lines)
+
+    num_bases_whole_exome_dict, num_bases_coding_exons_dict = bed_index.get_number_of_bases(
+        os.path.join(output_dir, 'bed_manifest.txt'))
+    bed_index.write_number_of_bases(num_bases_whole_exome_dict, num_bases_coding_exons_dict,
+                                    os.path.join(output_dir, 'number_of_bases.txt'))
+
+    data_set = {'cases': num_cases, 'records': num_records, 'seed': seed, 'records_by_kind': dict(total_counts),
+                'first_case': first_case_files}
+
+    with open(os.path.join(output_dir, 'synthetic_data.json'), 'w') as outfile_obj:
+        json.dump(data_set, outfile_obj, indent=2, sort_keys=True)
+
+    return data_set
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It writes the synthetic data set.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", required=True, help="The output directory")
+    parser.add_argument("-n", "--cases", type=int, default=5, help="The number of cases; default is 5")
+    parser.add_argument("-r", "--records", type=int, default=60000,
+                        help="The number of records of the whole exome annotated VCF file of each case; default is "
+                             "60000 (an exome), use about 4000000 for a whole genome")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="The seed of the random number generator; default "
+                                                                  "is 0")
+
+    args = parser.parse_args()
+
+    generate(args.output, args.cases, args.records, args.seed)
+
+    print 'Output files created. They can be found at', args.output
+
+
+if __name__ == '__main__':
+    main()
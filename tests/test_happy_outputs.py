@@ -0,0 +1,190 @@
+"""
+Tests of happy_outputs.py with the hap.py outputs of the benchmarking_* directories.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmarking_truth_set
+import happy_outputs
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = ['NA12878', 'NA24143', 'NA24149', 'NA24385', 'NA24631']
+REGIONS = ['WholeExomeRegions', 'CodingExons']
+
+
+def get_prefix(case_name, region):
+    """
+    This function returns the hap.py output prefix of a case and region.
+
+    :param case_name: The case name, e.g. NA24149
+    :type case_name: str
+    :param region: CodingExons or WholeExomeRegions
+    :type region: str
+
+    :rtype: str
+    """
+    return os.path.join(REPO_DIR, 'benchmarking_' + case_name, 'vcfComparison_by_Happy_' + region,
+                        'benchmark_{}_{}'.format(case_name, region))
+
+
+class HappyOutputsTest(unittest.TestCase):
+    """
+    The hap.py outputs read into one record model, and their consistency checks.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def copy_outputs(self, case_name, region):
+        files = dict()
+
+        for suffix, path in happy_outputs.get_happy_files(get_prefix(case_name, region)).items():
+            files[suffix] = os.path.join(self.temp_dir, os.path.basename(path))
+            shutil.copy(path, files[suffix])
+
+        return files
+
+    def test_shipped_outputs_are_consistent(self):
+        for case_name in CASES:
+            for region in REGIONS:
+                files = happy_outputs.get_happy_files(get_prefix(case_name, region))
+                outputs = happy_outputs.HappyOutputs(files)
+
+                self.assertEqual(sorted(files), sorted(happy_outputs.SUFFIXES))
+                self.assertEqual(outputs.check(), [], (case_name, region))
+
+        # The metrics.json files of the coding exons name another truth VCF file than the CSV files
+        outputs = happy_outputs.HappyOutputs(happy_outputs.get_happy_files(get_prefix('NA24149', 'CodingExons')))
+
+        self.assertEqual(len(outputs.get_warnings()), 1)
+        self.assertEqual(happy_outputs.HappyOutputs(happy_outputs.get_happy_files(
+            get_prefix('NA24149', 'WholeExomeRegions'))).get_warnings(), [])
+
+    def test_metrics_rows_match_csv_values(self):
+        for case_name in ['NA12878', 'NA24149']:
+            outputs = happy_outputs.HappyOutputs(happy_outputs.get_happy_files(get_prefix(case_name, 'CodingExons')))
+
+            for name in happy_outputs.LOCATIONS_ROWS:
+                values = outputs.extended[name]
+                row = outputs.get_metrics_row(name, case_name, 'CodingExons', 30000000)
+
+                self.assertEqual(row.num_bases, 30000000)
+                self.assertEqual(row.precision, round(values['METRIC.Precision'] * 100, 2))
+                self.assertEqual(row.recall, round(values['METRIC.Recall'] * 100, 2))
+
+    def test_subtype_rows(self):
+        outputs = happy_outputs.HappyOutputs(happy_outputs.get_happy_files(get_prefix('NA24149', 'CodingExons')))
+        rows = dict((row.variant_type, row) for row in outputs.get_metrics_rows('NA24149', 'CodingExons', 30000000))
+        het = rows['SNP.het']
+
+        self.assertEqual(het.truth_total, 4602)
+        self.assertEqual((het.tp, het.fp, het.fn), (4596, 19, 5))
+        self.assertEqual(len(rows), len(outputs.extended))
+        self.assertIn('Alleles.DEL', rows)
+        self.assertEqual([row.variant_type for row in rows.values() if row.num_bases is not None], ['INDEL', 'SNP'])
+        self.assertEqual((rows['Records.nocall'].precision, rows['Records.nocall'].recall), (None, None))
+
+        with self.assertRaises(ValueError):
+            outputs.get_metrics_row('Locations.MNP.het', 'NA24149', 'CodingExons', 30000000)
+
+    def test_tampered_outputs_are_reported(self):
+        files = self.copy_outputs('NA24149', 'CodingExons')
+
+        with open(files['.summary.csv']) as infile_obj:
+            lines = infile_obj.readlines()
+
+        lines[1] = lines[1].replace(',', ',1', 3)
+
+        with open(files['.summary.csv'], 'w') as outfile_obj:
+            outfile_obj.writelines(lines)
+
+        self.assertNotEqual(happy_outputs.HappyOutputs(files).check(), [])
+
+        files = self.copy_outputs('NA24149', 'CodingExons')
+
+        with open(files['.counts.json']) as infile_obj:
+            counts = json.load(infile_obj)
+
+        key = sorted(key for key in counts if key.startswith('TP:') and 'al__s' in counts[key])[0]
+        counts[key]['al__s'] += 1
+
+        with open(files['.counts.json'], 'w') as outfile_obj:
+            json.dump(counts, outfile_obj)
+
+        problems = happy_outputs.HappyOutputs(files).check()
+
+        self.assertTrue(any('raw.counts' in problem for problem in problems))
+        self.assertTrue(any('Alleles.SNP' in problem for problem in problems))
+
+    def test_extended_csv_only(self):
+        files = self.copy_outputs('NA24631', 'WholeExomeRegions')
+        outputs = happy_outputs.HappyOutputs({'.extended.csv': files['.extended.csv']})
+
+        self.assertEqual(outputs.check(), [])
+        self.assertEqual(outputs.get_warnings(), [])
+
+        with self.assertRaises(ValueError):
+            happy_outputs.HappyOutputs({})
+
+
+class SubtypeOutputsTest(unittest.TestCase):
+    """
+    benchmarking_truth_set.py writes the subtype metrics from the rows it parses for the benchmarking metrics file.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, 'input')
+        os.mkdir(self.input_dir)
+
+        for case_name in CASES:  # the case directories of a results tree may be symbolic links
+            os.symlink(os.path.join(REPO_DIR, 'benchmarking_' + case_name),
+                       os.path.join(self.input_dir, 'benchmarking_' + case_name))
+
+        with open(os.path.join(self.input_dir, 'number_of_bases.txt'), 'w') as outfile_obj:
+            outfile_obj.writelines('{}\t50000000\t30000000\n'.format(case_name) for case_name in CASES)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_subtype_outputs(self):
+        cache_file = os.path.join(self.temp_dir, 'cache.db')
+        subtype_file = os.path.join(self.temp_dir, 'Subtype_benchmarking_metrics_2019-05-17.jsonl')
+        contents = list()
+
+        for _ in range(2):  # the second run reads the rows from the parse cache
+            output_files = benchmarking_truth_set.run(self.input_dir, self.temp_dir, cache_file=cache_file,
+                                                      output_formats=['tsv', 'jsonl'], create_date='2019-05-17',
+                                                      subtypes=True, check=True)
+
+            self.assertIn(subtype_file, output_files)
+
+            with open(subtype_file) as infile_obj:
+                contents.append(infile_obj.read())
+
+        self.assertEqual(contents[0], contents[1])
+
+        rows = dict(((row['case'], row['region'], row['variant_class']), row)
+                    for row in (json.loads(line) for line in contents[0].splitlines()))
+        num_rows = sum(len(happy_outputs.HappyOutputs({'.extended.csv': get_prefix(case_name, region) +
+                                                       '.extended.csv'}).extended)
+                       for case_name in CASES for region in REGIONS)
+
+        self.assertEqual(len(rows), num_rows)
+        snp = rows[('NA24149', 'CodingExons', 'SNP')]
+
+        self.assertEqual(snp['tn'], 30000000 - (snp['tp'] + snp['fp'] + snp['fn']))
+        self.assertEqual((rows[('NA24149', 'CodingExons', 'Alleles.DEL')]['tn'],
+                          rows[('NA24149', 'CodingExons', 'Alleles.DEL')]['npa']), (None, None))
+        self.assertEqual(rows[('NA24149', 'CodingExons', 'SNP.het')]['truth_total'], 4602)
+
+
+if __name__ == '__main__':
+    unittest.main()
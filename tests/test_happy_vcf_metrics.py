@@ -0,0 +1,65 @@
+"""
+Tests of happy_vcf_metrics.py against the hap.py outputs of the benchmarking_* directories.
+"""
+
+import os
+import unittest
+
+import benchmarking_truth_set
+import happy_vcf_metrics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = ['NA12878', 'NA24143', 'NA24149', 'NA24385', 'NA24631']
+REGIONS = ['CodingExons', 'WholeExomeRegions']
+
+
+def get_happy_dir(case_name, region):
+    """
+    This function returns the hap.py output directory of a case and region.
+
+    :param case_name: The case name, e.g. NA24149
+    :type case_name: str
+    :param region: CodingExons or WholeExomeRegions
+    :type region: str
+
+    :rtype: str
+    """
+    return os.path.join(REPO_DIR, 'benchmarking_' + case_name, 'vcfComparison_by_Happy_' + region)
+
+
+class AnnotatedVcfTest(unittest.TestCase):
+    """
+    The counts of the annotated VCF files are those of the extended.csv and indelSizeDistribution.txt files.
+    """
+
+    def test_annotated_vcf_matches_csv(self):
+        for case_name in CASES:
+            for region in REGIONS:
+                happy_dir = get_happy_dir(case_name, region)
+                prefix = 'benchmark_{}_{}'.format(case_name, region)
+
+                indel, snp, indel_by_size = benchmarking_truth_set.get_annotated_vcf_data(
+                    happy_dir, prefix + '.vcf.gz', case_name, region, 1000000)
+                csv_indel, csv_snp = benchmarking_truth_set.get_indel_and_snp(
+                    happy_dir, prefix + '.extended.csv', case_name, region, 1000000)
+                csv_indel_by_size = benchmarking_truth_set.get_indel_by_size(
+                    os.path.join(REPO_DIR, 'benchmarking_' + case_name,
+                                 'indelSizeDistribution_{}_HappyResults'.format(region)),
+                    prefix + '_indelSizeDistribution.txt', case_name, region, 1000000)
+
+                self.assertEqual(indel, csv_indel, '{} {}'.format(case_name, region))
+                self.assertEqual(snp, csv_snp, '{} {}'.format(case_name, region))
+                self.assertEqual(indel_by_size, csv_indel_by_size, '{} {}'.format(case_name, region))
+
+    def test_homref_query_call_is_not_counted(self):
+        # NA24149 WholeExomeRegions has a 0/0 query call with BD=TP, in the Records.homref row of hap.py
+        happy_dir = get_happy_dir('NA24149', 'WholeExomeRegions')
+        counts = happy_vcf_metrics.count_annotated_vcf(os.path.join(happy_dir,
+                                                                    'benchmark_NA24149_WholeExomeRegions.vcf.gz'))
+
+        self.assertEqual(counts['INDEL']['QUERY.TP'], 4763)
+        self.assertNotIn(('INDEL', 'homref'), counts['genotypes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+Tests of the step cache keys of local_workflow.py.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import local_workflow
+
+
+class StepKeyTest(unittest.TestCase):
+    """
+    The cache key of a step changes when any of its file inputs changes.
+    """
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.step = {'name': 'split', 'inputs': ['annotatedVCF', 'Pyscript_split', 'Pymodule_bgzf'],
+                     'outputs': [('splitVCF', 'split.vcf')], 'command': 'python {{Pyscript_split}} -i {{annotatedVCF}}',
+                     'cores': 1, 'memory': 0}
+        values = {'annotatedVCF': 'annotated.vcf', 'Pyscript_split': 'split.py', 'Pymodule_bgzf': 'bgzf.py'}
+
+        for filename in values.values():
+            self.write_file(filename, filename)
+
+        self.runner = local_workflow.WorkflowRunner([self.step], values, set(values), self.work_dir,
+                                                    os.path.join(self.work_dir, 'cache'), 1, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def write_file(self, filename, content):
+        with open(os.path.join(self.work_dir, filename), 'w') as outfile_obj:
+            outfile_obj.write(content)
+
+    def get_key(self):
+        self.runner.file_hashes.clear()  # file hashes are computed once per run
+
+        return self.runner.get_step_key(self.step)
+
+    def test_input_in_command(self):
+        key = self.get_key()
+        self.write_file('annotated.vcf', 'changed')
+
+        self.assertNotEqual(self.get_key(), key)
+
+    def test_input_not_in_command(self):
+        key = self.get_key()
+        self.write_file('bgzf.py', 'changed')
+
+        self.assertNotEqual(self.get_key(), key)
+
+    def test_same_inputs(self):
+        self.assertEqual(self.get_key(), self.get_key())
+
+
+if __name__ == '__main__':
+    unittest.main()
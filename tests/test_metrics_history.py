@@ -0,0 +1,122 @@
+"""
+Tests of metrics_history.py with the metrics of the hap.py outputs of the benchmarking_* directories.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmarking_truth_set
+import metrics_history
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_case_rows(case_name):
+    """
+    This function returns the metrics rows of a case, parsed from its extended.csv and indelSizeDistribution.txt files.
+
+    :param case_name: The case name, e.g. NA24149
+    :type case_name: str
+
+    :rtype: list
+    """
+    rows = list()
+
+    for region, region_name, num_bases in [('WholeExomeRegions', 'WholeExome', 50000000),
+                                           ('CodingExons', 'CodingExons', 30000000)]:
+        prefix = 'benchmark_{}_{}'.format(case_name, region)
+        indel, snp = benchmarking_truth_set.get_indel_and_snp(
+            os.path.join(REPO_DIR, 'benchmarking_' + case_name, 'vcfComparison_by_Happy_' + region),
+            prefix + '.extended.csv', case_name, region_name, num_bases)
+        indel_by_size = benchmarking_truth_set.get_indel_by_size(
+            os.path.join(REPO_DIR, 'benchmarking_' + case_name, 'indelSizeDistribution_{}_HappyResults'.format(region)),
+            prefix + '_indelSizeDistribution.txt', case_name, region_name, num_bases)
+        rows.extend([snp, indel] + [row for row in indel_by_size if row is not None])
+
+    return rows
+
+
+class MetricsHistoryTest(unittest.TestCase):
+    """
+    The runs of the history, their deltas and trends.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.history = metrics_history.MetricsHistory(os.path.join(self.temp_dir, 'history.db'))
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_row_columns_are_metrics_row_fields(self):
+        self.assertEqual(tuple(metrics_history.ROW_COLUMNS), benchmarking_truth_set.MetricsRow._fields)
+
+    def test_rows_are_stored(self):
+        rows = get_case_rows('NA24149') + get_case_rows('NA24631')
+        run_id = self.history.add_run(rows, '2019-05-17', 'v1')
+        stored = self.history.get_rows(run_id)
+
+        self.assertEqual([benchmarking_truth_set.MetricsRow(*row[3:]) for row in stored], rows)
+        self.assertEqual([(row.run_id, row.run_date, row.label) for row in stored[:1]], [(run_id, '2019-05-17', 'v1')])
+        self.assertEqual(len(self.history.get_rows(run_id, 'NA24149', 'WholeExome', 'INDEL', None)), 1)
+        self.assertEqual(len(self.history.get_rows(run_id, 'NA24149', 'WholeExome', 'INDEL')), 4)
+
+    def test_runs_are_appended(self):
+        rows = get_case_rows('NA24149')
+        first = self.history.add_run(rows, '2019-05-17', 'v1')
+        second = self.history.add_run(rows, '2019-06-01', 'v2')
+        third = self.history.add_run(rows, '2019-05-20')
+
+        self.assertEqual([run[0] for run in self.history.get_runs()], [first, third, second])
+        self.assertEqual(self.history.get_run_id('latest'), second)
+        self.assertEqual(self.history.get_run_id('previous'), third)
+        self.assertEqual(self.history.get_run_id('2019-05-17'), first)
+        self.assertEqual(self.history.get_run_id(str(third)), third)
+
+        with self.assertRaises(ValueError):
+            self.history.get_run_id('2019-01-01')
+
+    def test_queries_do_not_create_the_history(self):
+        missing_file = os.path.join(self.temp_dir, 'mistyped.db')
+
+        with self.assertRaises(ValueError):
+            metrics_history.MetricsHistory(missing_file, create=False)
+
+        self.assertFalse(os.path.exists(missing_file))
+
+        self.history.add_run(get_case_rows('NA24149'), '2019-05-17')
+        self.history.close()
+
+        with metrics_history.MetricsHistory(os.path.join(self.temp_dir, 'history.db'), create=False) as history:
+            self.assertEqual(len(history.get_runs()), 1)
+
+        self.history = metrics_history.MetricsHistory(os.path.join(self.temp_dir, 'history.db'))
+
+    def test_significant_drops_are_flagged(self):
+        rows = get_case_rows('NA24149')
+        indel = rows[1]  # WholeExome INDEL: TP 4763, FP 651, FN 545
+        indels_1_10 = rows[2]  # WholeExome INDEL 1 - 10: TP 4578, FP 628, FN 518
+        new_rows = [rows[0]._replace(fp=rows[0].fp + 10), indel._replace(fp=indel.fp + 300),
+                    indels_1_10._replace(tp=indels_1_10.tp - 300, fn=indels_1_10.fn + 300)]
+        self.history.add_run(rows, '2019-05-17')
+        self.history.add_run(new_rows, '2019-06-01')
+
+        deltas = metrics_history.compare_rows(self.history.get_rows(self.history.get_run_id('previous')),
+                                              self.history.get_rows(self.history.get_run_id('latest')))
+        flags = dict((delta.key, delta.flags) for delta in deltas)
+
+        self.assertEqual(flags[('NA24149', 'WholeExome', 'SNP', None)], [])
+        self.assertEqual(flags[('NA24149', 'WholeExome', 'INDEL', None)], ['PRECISION_DROP'])
+        self.assertEqual(flags[('NA24149', 'WholeExome', 'INDEL', '1 - 10')], ['RECALL_DROP'])
+        self.assertEqual(flags[('NA24149', 'CodingExons', 'SNP', None)], ['ONLY_BASE'])
+        self.assertEqual(len(deltas), len(rows))
+
+        trend = self.history.get_rows(None, 'NA24149', 'WholeExome', 'INDEL', None)
+        self.assertEqual(metrics_history.get_trend_flags(trend), [[], ['PRECISION_DROP']])
+
+
+if __name__ == '__main__':
+    unittest.main()
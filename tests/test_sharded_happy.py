@@ -0,0 +1,228 @@
+"""
+Tests of sharded_happy.py, with a stub comparator in place of hap.py.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import bgzf
+import sharded_happy
+import vcf_comparator
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTIGS = ['2', '1', 'X']  # the order of the reference index, not the natural order
+
+# Writes the outputs of hap.py from the truth and query VCF files of a shard: a record of both files is a TP, a record
+# of the truth file only a FN, and a record of the query file only a FP.  The METRIC and ratio columns are wrong on
+# purpose, since they are computed again when the outputs are merged.  The annotated VCF file is the truth VCF file.
+STUB_COMPARATOR = '''
+import gzip
+import json
+import sys
+
+truth_vcf, query_vcf, prefix = sys.argv[1:4]
+
+
+def read_records(vcf_file):
+    with open(vcf_file) as infile_obj:
+        return [tuple(line.split('\\t')[:5]) for line in infile_obj if not line.startswith('#')]
+
+
+truth = set(read_records(truth_vcf))
+query = set(read_records(query_vcf))
+counts = dict()
+
+for decision, records in [('TP', truth & query), ('FN', truth - query), ('FP', query - truth)]:
+    for record in records:
+        variant_type = 'SNP' if len(record[3]) == len(record[4]) == 1 else 'INDEL'
+        type_counts = counts.setdefault(variant_type, {'TP': 0, 'FN': 0, 'FP': 0})
+        type_counts[decision] += 1
+
+rows = [(name, counts.get(variant_type, {'TP': 0, 'FN': 0, 'FP': 0}))
+        for name, variant_type in [('Locations.INDEL', 'INDEL'), ('Locations.SNP', 'SNP')]]
+
+with open(prefix + '.extended.csv', 'w') as outfile_obj:
+    outfile_obj.write(',TRUTH.TOTAL,TRUTH.TP,TRUTH.FN,QUERY.TOTAL,QUERY.TP,QUERY.FP,QUERY.UNK,METRIC.Recall,'
+                      'METRIC.Precision,METRIC.Frac_NA,TRUTH.TOTAL.TiTv_ratio\\n')
+
+    for name, row in rows:
+        outfile_obj.write('{},{}.0,{}.0,{}.0,{}.0,{}.0,{}.0,0.0,0.5,0.5,0.5,2.0\\n'.format(
+            name, row['TP'] + row['FN'], row['TP'], row['FN'], row['TP'] + row['FP'], row['TP'], row['FP']))
+
+    outfile_obj.write('hap.py-stub {}\\n'.format(prefix))
+
+with open(prefix + '.summary.csv', 'w') as outfile_obj:
+    outfile_obj.write(',TRUTH.TOTAL,QUERY.TOTAL,METRIC.Recall,METRIC.Precision\\n')
+
+    for name, row in rows:
+        outfile_obj.write('{},{}.0,{}.0,0.5,0.5\\n'.format(name, row['TP'] + row['FN'], row['TP'] + row['FP']))
+
+with open(prefix + '.counts.csv', 'w') as outfile_obj:
+    outfile_obj.write('Type,TP,FN,FP\\n')
+
+    for variant_type in sorted(counts):
+        outfile_obj.write('{},{TP},{FN},{FP}\\n'.format(variant_type, **counts[variant_type]))
+
+with open(prefix + '.counts.json', 'w') as outfile_obj:
+    json.dump(counts, outfile_obj)
+
+with open(truth_vcf) as infile_obj:
+    with gzip.open(prefix + '.vcf.gz', 'wb') as outfile_obj:
+        outfile_obj.write(infile_obj.read())
+'''
+
+
+def write_vcf(path, records):
+    """
+    This function writes a VCF file with one sample, with the ##contig lines in the order of CONTIGS.
+
+    :param path: The VCF file
+    :type path: str
+    :param records: List of tuples of (chrom, pos, ref, alt), in the order of CONTIGS
+    :type records: list
+
+    :rtype: void
+    """
+    with open(path, 'w') as outfile_obj:
+        outfile_obj.write('##fileformat=VCFv4.2\n')
+
+        for contig in CONTIGS:
+            outfile_obj.write('##contig=<ID={},length=1000000>\n'.format(contig))
+
+        outfile_obj.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE\n')
+
+        for chrom, pos, ref, alt in records:
+            outfile_obj.write('\t'.join([chrom, str(pos), '.', ref, alt, '50', 'PASS', '.', 'GT', '0/1']) + '\n')
+
+
+class ShardedHappyTest(unittest.TestCase):
+    """
+    The outputs of the contigs are merged into the outputs of one run over all the contigs.
+    """
+
+    truth_records = [('2', 100, 'A', 'G'), ('2', 200, 'AT', 'A'), ('2', 300, 'C', 'T'),
+                     ('1', 100, 'G', 'C'), ('1', 150, 'T', 'TAA'), ('1', 400, 'A', 'T'),
+                     ('X', 50, 'C', 'A'), ('X', 60, 'G', 'GT')]
+    query_records = [('2', 100, 'A', 'G'), ('2', 200, 'AT', 'A'), ('2', 250, 'G', 'A'),
+                     ('1', 100, 'G', 'C'), ('1', 150, 'T', 'TAA'), ('1', 500, 'C', 'CT'),
+                     ('X', 50, 'C', 'A')]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.truth = os.path.join(self.temp_dir, 'truth.vcf')
+        self.query = os.path.join(self.temp_dir, 'query.vcf')
+        self.bed = os.path.join(self.temp_dir, 'regions.bed')
+        self.reference = os.path.join(self.temp_dir, 'reference.fa')
+        self.output_prefix = os.path.join(self.temp_dir, 'output', 'benchmark')
+        os.mkdir(os.path.dirname(self.output_prefix))
+
+        write_vcf(self.truth, self.truth_records)
+        write_vcf(self.query, self.query_records)
+
+        with open(self.bed, 'w') as outfile_obj:
+            outfile_obj.writelines('{}\t0\t1000\n'.format(contig) for contig in reversed(CONTIGS))
+
+        with open(self.reference + '.fai', 'w') as outfile_obj:
+            outfile_obj.writelines('{}\t1000000\t0\t60\t61\n'.format(contig) for contig in CONTIGS)
+
+        self.stub = os.path.join(self.temp_dir, 'stub_comparator.py')
+
+        with open(self.stub, 'w') as outfile_obj:
+            outfile_obj.write(STUB_COMPARATOR)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def get_expected_counts(self):
+        truth = set(self.truth_records)
+        query = set(self.query_records)
+        counts = dict()
+
+        for decision, records in [('TP', truth & query), ('FN', truth - query), ('FP', query - truth)]:
+            for record in records:
+                variant_type = 'SNP' if len(record[2]) == len(record[3]) == 1 else 'INDEL'
+                type_counts = counts.setdefault(variant_type, {'TP': 0, 'FN': 0, 'FP': 0})
+                type_counts[decision] += 1
+
+        return counts
+
+    def test_stub_outputs_are_merged(self):
+        command = '{} {} {{truth}} {{query}} {{prefix}}'.format(sys.executable, self.stub)
+        columns, rows, row_names, other_lines = sharded_happy.run(self.truth, self.query, self.bed, self.output_prefix,
+                                                                  self.reference, 2, command)
+        expected = self.get_expected_counts()
+
+        self.assertEqual(row_names, ['Locations.INDEL', 'Locations.SNP'])
+
+        for row_name, variant_type in [('Locations.INDEL', 'INDEL'), ('Locations.SNP', 'SNP')]:
+            values = dict(zip(columns, rows[row_name]))
+            tp, fn, fp = [expected[variant_type][decision] for decision in ['TP', 'FN', 'FP']]
+
+            self.assertEqual([float(values[column]) for column in ['TRUTH.TOTAL', 'TRUTH.TP', 'TRUTH.FN', 'QUERY.TP',
+                                                                   'QUERY.FP']], [tp + fn, tp, fn, tp, fp])
+            self.assertAlmostEqual(float(values['METRIC.Precision']), float(tp) / (tp + fp))
+            self.assertAlmostEqual(float(values['METRIC.Recall']), float(tp) / (tp + fn))
+            self.assertEqual(values['TRUTH.TOTAL.TiTv_ratio'], '')
+
+        self.assertEqual(len(other_lines), 1)
+
+        with open(self.output_prefix + '.summary.csv') as infile_obj:
+            summary = [line.rstrip('\n').split(',') for line in infile_obj]
+
+        self.assertEqual([row[0] for row in summary[1:]], ['Locations.INDEL', 'Locations.SNP'])
+        self.assertEqual(summary[1][1:3], [rows['Locations.INDEL'][1], rows['Locations.INDEL'][4]])
+
+        with open(self.output_prefix + '.counts.csv') as infile_obj:
+            self.assertEqual(infile_obj.read(), 'Type,TP,FN,FP\n' + ''.join(
+                '{},{TP},{FN},{FP}\n'.format(variant_type, **expected[variant_type])
+                for variant_type in ['INDEL', 'SNP']))
+
+        with open(self.output_prefix + '.counts.json') as infile_obj:
+            self.assertEqual(json.load(infile_obj), expected)
+
+        # the annotated VCF files of the contigs are concatenated in the order of the reference index
+        with open(self.truth) as infile_obj:
+            truth_lines = infile_obj.read()
+
+        with bgzf.open_vcf(self.output_prefix + '.vcf.gz') as infile_obj:
+            self.assertEqual(''.join(infile_obj), truth_lines)
+
+        index = bgzf.BinningIndex(self.output_prefix + '.vcf.gz.tbi')
+
+        with bgzf.BgzfReader(self.output_prefix + '.vcf.gz') as reader:
+            for contig in CONTIGS:
+                self.assertEqual([(line_items[0], int(line_items[1]), line_items[3], line_items[4])
+                                  for line_items in bgzf.query_lines(reader, index, contig, 0, 1000)],
+                                 [record for record in self.truth_records if record[0] == contig])
+
+        # the shards are removed
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.output_prefix))),
+                         sorted('benchmark' + suffix for suffix in ['.extended.csv', '.summary.csv', '.counts.csv',
+                                                                    '.counts.json', '.vcf.gz', '.vcf.gz.tbi']))
+
+    def test_vcf_comparator_matches_unsharded(self):
+        command = '{} {} -t {{truth}} -q {{query}} -b {{bed}} -o {{prefix}}.extended.csv'.format(
+            sys.executable, os.path.join(REPO_DIR, 'vcf_comparator.py'))
+        sharded_happy.run(self.truth, self.query, self.bed, self.output_prefix, self.reference, 1, command)
+
+        unsharded_file = os.path.join(self.temp_dir, 'unsharded.extended.csv')
+        vcf_comparator.write_output(vcf_comparator.compare_vcfs(self.truth, self.query, self.bed), unsharded_file)
+
+        with open(unsharded_file) as infile_obj:
+            unsharded = infile_obj.read()
+
+        with open(self.output_prefix + '.extended.csv') as infile_obj:
+            self.assertEqual(infile_obj.read(), unsharded)
+
+    def test_failed_contig_raises(self):
+        with self.assertRaises(ValueError):
+            sharded_happy.run(self.truth, self.query, self.bed, self.output_prefix, self.reference, 1, 'exit 1',
+                              os.path.join(self.temp_dir, 'shards'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Tests of stratified_metrics.py against the hap.py outputs of the benchmarking_* directories.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import bed_index
+import benchmarking_truth_set
+import bgzf
+import happy_vcf_metrics
+import stratified_metrics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHROMS = [str(number) for number in range(1, 23)] + ['X', 'Y']
+CHROM_LENGTH = 300000000
+
+
+def get_happy_file(case_name, region, suffix):
+    """
+    This function returns a hap.py output file of a case and region.
+
+    :param case_name: The case name, e.g. NA24149
+    :type case_name: str
+    :param region: CodingExons or WholeExomeRegions
+    :type region: str
+    :param suffix: The file suffix, e.g. .vcf.gz
+    :type suffix: str
+
+    :rtype: str
+    """
+    return os.path.join(REPO_DIR, 'benchmarking_' + case_name, 'vcfComparison_by_Happy_' + region,
+                        'benchmark_{}_{}{}'.format(case_name, region, suffix))
+
+
+class StratifiedMetricsTest(unittest.TestCase):
+    """
+    The counts of each stratum are those of the records of the annotated VCF file that overlap the stratum.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, lines):
+        path = os.path.join(self.temp_dir, name)
+
+        with open(path, 'w') as outfile_obj:
+            outfile_obj.writelines(lines)
+
+        return path
+
+    def test_whole_genome_stratum_matches_csv(self):
+        whole_genome = self.write_file('whole_genome.bed', ['{}\t0\t{}\n'.format(chrom, CHROM_LENGTH)
+                                                            for chrom in CHROMS])
+        strata_index = stratified_metrics.StrataIndex([('WholeGenome', whole_genome)])
+
+        for case_name in ['NA12878', 'NA24149']:
+            region = 'WholeExomeRegions'
+            strata_counts = stratified_metrics.count_strata(get_happy_file(case_name, region, '.vcf.gz'),
+                                                            strata_index)
+            [(snp, indel_rows)] = stratified_metrics.get_strata_rows(strata_counts, case_name, strata_index.names,
+                                                                     [1000000])
+
+            happy_dir = os.path.dirname(get_happy_file(case_name, region, ''))
+            csv_indel, csv_snp = benchmarking_truth_set.get_indel_and_snp(
+                happy_dir, 'benchmark_{}_{}.extended.csv'.format(case_name, region), case_name, 'WholeGenome', 1000000)
+            csv_indel_by_size = benchmarking_truth_set.get_indel_by_size(
+                os.path.join(REPO_DIR, 'benchmarking_' + case_name, 'indelSizeDistribution_{}_HappyResults'.format(
+                    region)), 'benchmark_{}_{}_indelSizeDistribution.txt'.format(case_name, region), case_name,
+                'WholeGenome', 1000000)
+
+            self.assertEqual(snp, csv_snp)
+            self.assertEqual(indel_rows, [csv_indel] + csv_indel_by_size)
+
+    def test_strata_match_filtered_records(self):
+        annotated_vcf = get_happy_file('NA24149', 'CodingExons', '.vcf.gz')
+        strata = [('odd_chroms', self.write_file('odd.bed', ['{}\t0\t{}\n'.format(chrom, CHROM_LENGTH)
+                                                             for chrom in CHROMS[::2]])),
+                  ('windows', self.write_file('windows.bed', ['{}\t{}\t{}\n'.format(chrom, start, start + 250000)
+                                                              for chrom in CHROMS[:4]
+                                                              for start in range(0, CHROM_LENGTH, 1000000)])),
+                  ('small', self.write_file('small.bed', ['1\t{}\t{}\n'.format(start, start + 3)
+                                                          for start in range(0, CHROM_LENGTH, 1000)])),
+                  ('empty', self.write_file('empty.bed', []))]
+        strata_index = stratified_metrics.StrataIndex(strata)
+        strata_counts = stratified_metrics.count_strata(annotated_vcf, strata_index)
+
+        for (name, bed_file), counts in zip(strata, strata_counts):
+            regions = bed_index.BedIndex(bed_file)
+            lines = list()
+
+            with bgzf.open_vcf(annotated_vcf) as vcf_obj:
+                for line in vcf_obj:
+                    line_items = line.split('\t', 4)
+
+                    if line.startswith('#') or regions.overlaps(line_items[0], int(line_items[1]) - 1,
+                                                                int(line_items[1]) - 1 + len(line_items[3])):
+                        lines.append(line)
+
+            expected = happy_vcf_metrics.count_annotated_vcf(self.write_file(name + '.vcf', lines))
+
+            self.assertEqual(counts, expected, name)
+
+        self.assertEqual(strata_counts[3]['records'], 0)
+        self.assertGreater(strata_counts[2]['records'], 0)
+
+    def test_segments(self):
+        strata_index = stratified_metrics.StrataIndex([('a', self.write_file('a.bed', ['1\t10\t20\n', '1\t30\t40\n'])),
+                                                       ('b', self.write_file('b.bed', ['1\t15\t35\n']))])
+
+        self.assertEqual(strata_index.segments['1'], ([10, 15, 20, 30, 35], [15, 20, 30, 35, 40],
+                                                      [(0,), (0, 1), (1,), (0, 1), (0,)]))
+        self.assertEqual(strata_index.get_num_bases(), [20, 20])
+        self.assertEqual(strata_index.get_num_bases(bed_index.BedIndex(self.write_file('c.bed', ['1\t0\t12\n']))),
+                         [2, 0])
+
+        cursor = stratified_metrics.StrataCursor(strata_index)
+
+        self.assertEqual(cursor.get_strata('1', 5, 10), ())
+        self.assertEqual(cursor.get_strata('1', 12, 13), (0,))
+        self.assertEqual(cursor.get_strata('1', 12, 16), (0, 1))
+        self.assertEqual(cursor.get_strata('1', 20, 21), (1,))
+        self.assertEqual(cursor.get_strata('2', 20, 21), ())
+
+    def test_unsorted_vcf_raises(self):
+        header = '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tTRUTH\tQUERY\n'
+        record = '{}\t{}\t.\tA\tG\t.\t.\t.\tGT:BD:BVT\t0/1:TP:SNP\t0/1:TP:SNP\n'
+        whole_genome = self.write_file('whole_genome.bed', ['{}\t0\t{}\n'.format(chrom, CHROM_LENGTH)
+                                                            for chrom in CHROMS])
+        strata_index = stratified_metrics.StrataIndex([('WholeGenome', whole_genome)])
+
+        for positions in [[('1', 100), ('2', 100), ('1', 200)], [('1', 200), ('1', 100)]]:
+            annotated_vcf = self.write_file('unsorted.vcf', [header] + [record.format(chrom, pos)
+                                                                        for chrom, pos in positions])
+
+            with self.assertRaises(ValueError):
+                stratified_metrics.count_strata(annotated_vcf, strata_index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests of the contig order of the sort-merge join of vcf_comparator.py.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import vcf_comparator
+
+CONTIGS = ['1', '10', '2']  # lexicographic order, as written by sort without -V
+
+
+def write_vcf(path, records, contigs=CONTIGS):
+    """
+    This function writes a VCF file with one sample.
+
+    :param path: The VCF file
+    :type path: str
+    :param records: List of tuples of (chrom, pos, ref, alt, GT)
+    :type records: list
+    :param contigs: The contigs of the ##contig lines
+    :type contigs: list
+
+    :rtype: void
+    """
+    with open(path, 'w') as outfile_obj:
+        outfile_obj.write('##fileformat=VCFv4.2\n')
+
+        for contig in contigs:
+            outfile_obj.write('##contig=<ID={},length=1000000>\n'.format(contig))
+
+        outfile_obj.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE\n')
+
+        for chrom, pos, ref, alt, gt in records:
+            outfile_obj.write('\t'.join([chrom, str(pos), '.', ref, alt, '50', 'PASS', '.', 'GT', gt]) + '\n')
+
+
+class ContigOrderTest(unittest.TestCase):
+    """
+    The chromosomes of the VCF files are merged in the order of the ##contig lines or of the .fai file.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.truth = os.path.join(self.temp_dir, 'truth.vcf')
+        self.query = os.path.join(self.temp_dir, 'query.vcf')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_chromosome_missing_in_query(self):
+        write_vcf(self.truth, [('1', 100, 'A', 'G', '0/1'), ('10', 100, 'C', 'T', '0/1'),
+                               ('2', 100, 'G', 'A', '1/1')])
+        write_vcf(self.query, [('1', 100, 'A', 'G', '0/1'), ('2', 100, 'G', 'A', '1/1')])
+
+        counts = vcf_comparator.compare_vcfs(self.truth, self.query)
+
+        self.assertEqual(counts['SNP'], {'TRUTH.TP': 2, 'TRUTH.FN': 1, 'QUERY.TP': 2, 'QUERY.FP': 0})
+
+    def test_fai_order(self):
+        write_vcf(self.truth, [('1', 100, 'A', 'G', '0/1'), ('10', 100, 'C', 'T', '0/1'),
+                               ('2', 100, 'G', 'A', '1/1')], contigs=[])
+        write_vcf(self.query, [('1', 100, 'A', 'G', '0/1'), ('2', 100, 'G', 'A', '1/1')], contigs=[])
+        fai_file = os.path.join(self.temp_dir, 'reference.fa.fai')
+
+        with open(fai_file, 'w') as outfile_obj:
+            for contig in CONTIGS:
+                outfile_obj.write('{}\t1000000\t0\t60\t61\n'.format(contig))
+
+        counts = vcf_comparator.compare_vcfs(self.truth, self.query, fai_file=fai_file)
+
+        self.assertEqual(counts['SNP'], {'TRUTH.TP': 2, 'TRUTH.FN': 1, 'QUERY.TP': 2, 'QUERY.FP': 0})
+
+    def test_no_contig_order(self):
+        write_vcf(self.truth, [('1', 100, 'A', 'G', '0/1'), ('10', 100, 'C', 'T', '0/1')], contigs=[])
+        write_vcf(self.query, [('1', 100, 'A', 'G', '0/1'), ('2', 100, 'G', 'A', '1/1')], contigs=[])
+
+        self.assertRaises(ValueError, vcf_comparator.compare_vcfs, self.truth, self.query)
+
+    def test_different_contig_orders(self):
+        write_vcf(self.truth, [('1', 100, 'A', 'G', '0/1')])
+        write_vcf(self.query, [('1', 100, 'A', 'G', '0/1')], contigs=['1', '2', '10'])
+
+        self.assertRaises(ValueError, vcf_comparator.compare_vcfs, self.truth, self.query)
+
+    def test_different_chromosome_orders(self):
+        write_vcf(self.truth, [('1', 100, 'A', 'G', '0/1'), ('2', 100, 'G', 'A', '1/1')], contigs=[])
+        write_vcf(self.query, [('2', 100, 'G', 'A', '1/1'), ('1', 100, 'A', 'G', '0/1')], contigs=[])
+
+        self.assertRaises(ValueError, vcf_comparator.compare_vcfs, self.truth, self.query)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests of the genotype mode of verify_variants.py.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import verify_variants
+
+
+class TestGenotypesTest(unittest.TestCase):
+    """
+    Every variant of a truth file of the genotype mode has expected genotypes.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.truth = os.path.join(self.temp_dir, 'truth.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_truth(self, lines):
+        with open(self.truth, 'w') as outfile_obj:
+            outfile_obj.write(''.join(lines))
+
+    def test_genotypes(self):
+        self.write_truth(['1\t100\tA\tG\tPASS\tNA12878=0|1\tNA12891=1/1\n'])
+
+        genotypes = verify_variants.get_test_genotypes(self.truth)
+
+        self.assertEqual(genotypes.keys(), [('1', '100', 'A', 'G', 'PASS')])
+        self.assertEqual(genotypes[('1', '100', 'A', 'G', 'PASS')].keys(), ['NA12878', 'NA12891'])
+
+    def test_no_genotype_columns(self):
+        self.write_truth(['1\t100\tA\tG\tPASS\tNA12878=0/1\n', '1\t200\tC\tT\tPASS\n'])
+
+        self.assertRaises(ValueError, verify_variants.get_test_genotypes, self.truth)
+
+    def test_not_sample_genotype(self):
+        self.write_truth(['1\t100\tA\tG\tPASS\t0/1\n'])
+
+        self.assertRaises(ValueError, verify_variants.get_test_genotypes, self.truth)
+
+
+class VerifyVcfGenotypesTest(unittest.TestCase):
+    """
+    The genotypes of each truth file are checked against one read of the VCF file.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, lines):
+        path = os.path.join(self.temp_dir, name)
+
+        with open(path, 'w') as outfile_obj:
+            outfile_obj.write(''.join(lines))
+
+        return path
+
+    def test_truth_files_sharing_a_variant(self):
+        vcf_file = self.write_file('trio.vcf', [
+            '##fileformat=VCFv4.2\n',
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tKID\tMOM\n',
+            '1\t100\t.\tA\tG\t.\tPASS\t.\tGT\t0/1\t0/0\n'])
+        truth_files = [self.write_file('a.txt', ['1\t100\tA\tG\tPASS\tKID=0/1\n']),
+                       self.write_file('b.txt', ['1\t100\tA\tG\tPASS\tMOM=0/0\n'])]
+
+        results = verify_variants.verify_vcf_genotypes(
+            (vcf_file, dict((truth_file, verify_variants.get_test_genotypes(truth_file))
+                            for truth_file in truth_files)))
+
+        self.assertEqual([result[1:] for result in results], [[truth_files[0], 'KID', 'Pass', 1, 1, []],
+                                                              [truth_files[1], 'MOM', 'Pass', 1, 1, []]])
+
+
+if __name__ == '__main__':
+    unittest.main()
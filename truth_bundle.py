@@ -0,0 +1,527 @@
+#!/usr/bin/python
+
+"""
+This script compiles a truth VCF file (or a truth file of verify_variants.py), and optionally the BED file of its
+high-confidence regions, into a truth bundle: a compact binary file that verify_variants.py memory-maps to check a VCF
+file against a full truth set of millions of variants.
+
+Each ALT allele of the PASS (or '.') truth records is a variant of the bundle.  Its REF and ALT are trimmed of their
+common suffix, then of their common prefix (as in vcf_comparator.py), so the same variant written with different padding
+in the truth file and the VCF file is found.  With a BED file, only the variants that overlap its regions are kept.
+
+The variants of each chromosome are sorted by position, and the bundle holds, for all the variants:
+    - the positions, as little-endian int32
+    - a 64-bit hash of the trimmed 'REF<tab>ALT', as little-endian uint64
+    - the offsets of the trimmed 'REF<tab>ALT' in a text block, to confirm a hash match and report missing variants
+
+A variant of a VCF record is looked up with a binary search of the positions of its chromosome, then a comparison of
+the hashes of the variants at that position.  The arrays are read in place from the memory-mapped file, so opening a
+bundle takes no time and no memory, whatever its size, and the verification processes that use the same bundle share
+its pages in the page cache.  The records of a sorted VCF file are looked up in order: each search starts where the
+previous one stopped (a galloping search), so a whole VCF file is checked in one sweep of the bundle.
+
+The truth file must have the records of each chromosome together, as a sorted VCF file does.  Positions must fit in a
+signed 32-bit integer.
+"""
+
+import argparse
+import bisect
+import collections
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import bed_index
+import bgzf
+import vcf_comparator
+
+MAGIC = b'TRUTHBDL'
+VERSION = 1
+
+# magic, version, number of chromosomes, number of variants, offsets of the positions, hashes, allele offsets and
+# alleles sections
+HEADER = struct.Struct('<8sIIQQQQQ')
+CONTIG = struct.Struct('<QQH')  # first variant, number of variants, length of the name that follows
+POSITION = struct.Struct('<i')
+HASH = struct.Struct('<Q')
+OFFSET = struct.Struct('<Q')
+MAX_POSITION = 2 ** 31 - 1
+
+
+def is_truth_bundle(filename):
+    """
+    This function returns True if the file is a truth bundle.
+
+    :param filename: The file name
+    :type filename: str
+
+    :rtype: bool
+    """
+    try:
+        with open(filename, 'rb') as file_obj:
+            return file_obj.read(len(MAGIC)) == MAGIC
+    except IOError:
+        return False
+
+
+def get_allele_hash(ref, alt):
+    """
+    This function returns the 64-bit hash of trimmed REF and ALT alleles: the first 8 bytes of their MD5 digest.  The
+    built-in hash() is not used, since it differs between platforms.
+
+    :param ref: The trimmed REF allele
+    :type ref: str
+    :param alt: The trimmed ALT allele
+    :type alt: str
+
+    :rtype: int
+    """
+    return HASH.unpack(hashlib.md5(ref + '\t' + alt).digest()[:8])[0]
+
+
+def get_allele_keys(pos, ref, alts):
+    """
+    This function returns the trimmed alleles of the ALT alleles of a record.  Symbolic alleles (except <DEL>, a
+    deletion of all of REF, as written by hap.py), '*' and '.' are left out.
+
+    :param pos: The POS column
+    :type pos: int
+    :param ref: The REF column
+    :type ref: str
+    :param alts: The ALT column
+    :type alts: str
+
+    :return: List of tuples of (position, REF, ALT)
+    :rtype: list
+    """
+    keys = list()
+
+    for alt in alts.split(','):
+        if alt == '<DEL>':
+            alt = ''
+
+        if alt.startswith('<') or alt in ('*', '.') or '[' in alt or ']' in alt:
+            continue
+
+        keys.append(vcf_comparator.trim_alleles(pos, ref, alt))
+
+    return keys
+
+
+def iter_truth_records(truth_file):
+    """
+    This function yields the records of a truth VCF file, or of a tab delimited truth file of verify_variants.py (chrom,
+    pos, ref, alt, filter).  Both may be gzip/bgzip compressed.
+
+    :param truth_file: The truth file
+    :type truth_file: str
+
+    :return: Generator of tuples of (chrom, pos, ref, alts, filter)
+    :rtype: generator
+    """
+    vcf_format = None
+
+    with bgzf.open_vcf(truth_file) as truth_obj:
+        for line in truth_obj:
+            if line.startswith('##fileformat=VCF'):
+                vcf_format = True
+
+            if line.startswith('#') or not line.strip():
+                continue
+
+            line_items = line.rstrip('\n').split('\t', 7)
+
+            if vcf_format:
+                yield line_items[0], int(line_items[1]), line_items[3], line_items[4], line_items[6]
+            else:
+                yield line_items[0], int(line_items[1]), line_items[2], line_items[3], line_items[4]
+
+
+class BundleWriter(object):
+    """
+    Writes the sections of a truth bundle to temporary files, one chromosome at a time, and assembles the bundle.
+    """
+
+    def __init__(self, temp_dir):
+        """
+        :param temp_dir: The directory of the temporary files
+        :type temp_dir: str
+        """
+        self.positions = tempfile.TemporaryFile(dir=temp_dir)
+        self.hashes = tempfile.TemporaryFile(dir=temp_dir)
+        self.offsets = tempfile.TemporaryFile(dir=temp_dir)
+        self.alleles = tempfile.TemporaryFile(dir=temp_dir)
+        self.contigs = list()  # (name, first variant, number of variants)
+        self.num_variants = 0
+        self.alleles_size = 0
+
+    def add_contig(self, chrom, variants):
+        """
+        This function sorts the variants of a chromosome, removes the duplicates and writes them.
+
+        :param chrom: The chromosome
+        :type chrom: str
+        :param variants: List of tuples of (position, hash, 'REF<tab>ALT')
+        :type variants: list
+
+        :rtype: void
+        """
+        variants = sorted(set(variants))
+        offsets = list()
+
+        for _, _, alleles in variants:
+            offsets.append(OFFSET.pack(self.alleles_size))
+            self.alleles_size += len(alleles)
+
+        self.positions.write(b''.join(POSITION.pack(variant[0]) for variant in variants))
+        self.hashes.write(b''.join(HASH.pack(variant[1]) for variant in variants))
+        self.offsets.write(b''.join(offsets))
+        self.alleles.write(b''.join(variant[2] for variant in variants))
+
+        self.contigs.append((chrom, self.num_variants, len(variants)))
+        self.num_variants += len(variants)
+
+    def write(self, output_file):
+        """
+        This function writes the bundle: the header, the chromosome table and the sections.
+
+        :param output_file: The output file
+        :type output_file: str
+
+        :rtype: void
+        """
+        contig_table = b''.join(CONTIG.pack(first, count, len(name)) + name for name, first, count in self.contigs)
+        positions_offset = HEADER.size + len(contig_table)
+        hashes_offset = positions_offset + POSITION.size * self.num_variants
+        offsets_offset = hashes_offset + HASH.size * self.num_variants
+        alleles_offset = offsets_offset + OFFSET.size * (self.num_variants + 1)
+
+        with open(output_file, 'wb') as outfile_obj:
+            outfile_obj.write(HEADER.pack(MAGIC, VERSION, len(self.contigs), self.num_variants, positions_offset,
+                                          hashes_offset, offsets_offset, alleles_offset))
+            outfile_obj.write(contig_table)
+
+            for section in (self.positions, self.hashes, self.offsets):
+                section.seek(0)
+                shutil.copyfileobj(section, outfile_obj)
+
+            outfile_obj.write(OFFSET.pack(self.alleles_size))
+            self.alleles.seek(0)
+            shutil.copyfileobj(self.alleles, outfile_obj)
+
+    def close(self):
+        for section in (self.positions, self.hashes, self.offsets, self.alleles):
+            section.close()
+
+
+def compile_bundle(truth_file, output_file, bed_file=None):
+    """
+    This function compiles a truth file into a truth bundle.  The bundle is written to a temporary file and renamed, so
+    the verification processes that use it never see a partly written bundle.
+
+    :param truth_file: The truth VCF file, or a truth file of verify_variants.py
+    :type truth_file: str
+    :param output_file: The truth bundle
+    :type output_file: str
+    :param bed_file: The BED file of the high-confidence regions, or None to keep all the variants
+    :type bed_file: str
+
+    :return: Dictionary with the keys records, filtered (records that are not PASS), outside_regions (variants outside
+    the BED regions), variants and contigs
+    :rtype: dict
+
+    :raises ValueError: If the records of a chromosome are not together, or a position does not fit in 32 bits
+    """
+    regions = bed_index.BedIndex(bed_file) if bed_file else None
+    counts = collections.OrderedDict([('records', 0), ('filtered', 0), ('outside_regions', 0)])
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    temp_file = '{}.{}.tmp'.format(output_file, os.getpid())
+    writer = BundleWriter(output_dir)
+    done_chroms = set()
+    chrom = None
+    variants = list()
+
+    try:
+        for record_chrom, pos, ref, alts, vcf_filter in iter_truth_records(truth_file):
+            counts['records'] += 1
+
+            if vcf_filter != 'PASS' and vcf_filter != '.':
+                counts['filtered'] += 1
+                continue
+
+            if record_chrom != chrom:
+                if chrom is not None:
+                    writer.add_contig(chrom, variants)
+
+                done_chroms.add(chrom)
+                chrom = record_chrom
+                variants = list()
+
+                if chrom in done_chroms:
+                    raise ValueError('{} is not sorted: the records of {} are not together'.format(truth_file, chrom))
+
+            for key_pos, key_ref, key_alt in get_allele_keys(pos, ref, alts):
+                if key_pos > MAX_POSITION:
+                    raise ValueError('{}:{} does not fit in a truth bundle'.format(chrom, key_pos))
+
+                if regions is not None and not regions.overlaps(chrom, key_pos - 1, key_pos - 1 + max(1, len(key_ref))):
+                    counts['outside_regions'] += 1
+                    continue
+
+                variants.append((key_pos, get_allele_hash(key_ref, key_alt), key_ref + '\t' + key_alt))
+
+        if chrom is not None:
+            writer.add_contig(chrom, variants)
+
+        writer.write(temp_file)
+        os.rename(temp_file, output_file)
+    finally:
+        writer.close()
+
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    counts['variants'] = writer.num_variants
+    counts['contigs'] = len(writer.contigs)
+
+    return counts
+
+
+class PositionColumn(object):
+    """
+    The positions of a truth bundle as a read-only sequence, for bisect.
+    """
+
+    def __init__(self, data, offset, length):
+        self.data = data
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return POSITION.unpack_from(self.data, self.offset + POSITION.size * index)[0]
+
+
+class TruthBundle(object):
+    """
+    A memory-mapped truth bundle.
+    """
+
+    def __init__(self, bundle_file):
+        """
+        :param bundle_file: The truth bundle
+        :type bundle_file: str
+
+        :raises ValueError: If the file is not a truth bundle of this version
+        """
+        self.bundle_file = bundle_file
+        self.file_obj = open(bundle_file, 'rb')
+        self.data = mmap.mmap(self.file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise ValueError('{} is not a truth bundle'.format(bundle_file))
+
+        (magic, version, num_contigs, self.num_variants, self.positions_offset, self.hashes_offset,
+         self.offsets_offset, self.alleles_offset) = HEADER.unpack_from(self.data, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a truth bundle of version {}'.format(bundle_file, VERSION))
+
+        self.contigs = collections.OrderedDict()  # chromosome -> (first variant, number of variants)
+        offset = HEADER.size
+
+        for _ in range(num_contigs):
+            first, count, name_length = CONTIG.unpack_from(self.data, offset)
+            offset += CONTIG.size
+            self.contigs[self.data[offset:offset + name_length]] = (first, count)
+            offset += name_length
+
+        self.positions = PositionColumn(self.data, self.positions_offset, self.num_variants)
+
+    def close(self):
+        self.data.close()
+        self.file_obj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.num_variants
+
+    def get_hash(self, index):
+        """
+        This function returns the allele hash of a variant.
+
+        :param index: The variant index
+        :type index: int
+
+        :rtype: int
+        """
+        return HASH.unpack_from(self.data, self.hashes_offset + HASH.size * index)[0]
+
+    def get_alleles(self, index):
+        """
+        This function returns the trimmed alleles of a variant.
+
+        :param index: The variant index
+        :type index: int
+
+        :return: Tuple of (REF, ALT)
+        :rtype: tuple
+        """
+        start, end = struct.unpack_from('<QQ', self.data, self.offsets_offset + OFFSET.size * index)
+
+        return tuple(self.data[self.alleles_offset + start:self.alleles_offset + end].split('\t'))
+
+    def search_position(self, pos, lo, hi):
+        """
+        This function returns the index of the first variant in [lo, hi) at or after a position.  The search gallops
+        from lo, so it is fast when the variant is close to lo.
+
+        :param pos: The position
+        :type pos: int
+        :param lo: The first index
+        :type lo: int
+        :param hi: The index after the last
+        :type hi: int
+
+        :rtype: int
+        """
+        bound = lo
+        step = 1
+
+        while bound < hi and self.positions[bound] < pos:
+            lo = bound + 1
+            bound = lo + step
+            step *= 2
+
+        return bisect.bisect_left(self.positions, pos, lo, min(bound, hi))
+
+    def iter_missing(self, found):
+        """
+        This function yields the variants that were not found.
+
+        :param found: One byte per variant, non-zero if the variant was found
+        :type found: bytearray
+
+        :return: Generator of tuples of (chrom, pos, ref, alt)
+        :rtype: generator
+        """
+        for chrom, (first, count) in self.contigs.items():
+            index = found.find(b'\x00', first, first + count)
+
+            while index != -1:
+                ref, alt = self.get_alleles(index)
+                yield chrom, str(self.positions[index]), ref, alt
+                index = found.find(b'\x00', index + 1, first + count)
+
+
+class BundleCursor(object):
+    """
+    Looks up the variants of the records of a VCF file in a truth bundle.  The records of a sorted VCF file are looked
+    up in one sweep: the search for a record starts where the search for the previous record stopped.
+    """
+
+    def __init__(self, bundle):
+        """
+        :param bundle: The truth bundle
+        :type bundle: TruthBundle
+        """
+        self.bundle = bundle
+        self.chrom = None
+        self.lower = 0
+        self.end = 0
+        self.last_pos = 0
+
+    def find(self, chrom, pos, keys):
+        """
+        This function returns the indexes of the variants of a record that are in the truth bundle.
+
+        :param chrom: The CHROM column
+        :type chrom: str
+        :param pos: The POS column
+        :type pos: int
+        :param keys: The trimmed alleles of the record, as returned by get_allele_keys()
+        :type keys: list
+
+        :return: List of variant indexes
+        :rtype: list
+        """
+        bundle = self.bundle
+
+        if chrom != self.chrom or pos < self.last_pos:  # a new chromosome, or records out of order
+            self.chrom = chrom
+            self.lower, count = bundle.contigs.get(chrom, (0, 0))
+            self.end = self.lower + count
+
+        self.last_pos = pos
+
+        if self.lower == self.end:
+            return []
+
+        # trimming only moves a variant after the position of its record, so no later record has a variant before here
+        self.lower = bundle.search_position(pos, self.lower, self.end)
+        indexes = list()
+
+        for key_pos, key_ref, key_alt in keys:
+            index = bundle.search_position(key_pos, self.lower, self.end)
+            allele_hash = None
+
+            while index < self.end and bundle.positions[index] == key_pos:
+                if allele_hash is None:
+                    allele_hash = get_allele_hash(key_ref, key_alt)
+
+                if bundle.get_hash(index) == allele_hash and bundle.get_alleles(index) == (key_ref, key_alt):
+                    indexes.append(index)
+                    break
+
+                index += 1
+
+        return indexes
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It compiles the truth file into a truth bundle.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--truth", required=True,
+                        help="The truth VCF file, or a truth file of verify_variants.py (chrom, pos, ref, alt, filter)")
+    parser.add_argument("-r", "--regions", help="The BED file of the high-confidence regions; default is all the "
+                                                "variants of the truth file")
+    parser.add_argument("-o", "--output", required=True, help="The truth bundle")
+
+    args = parser.parse_args()
+
+    try:
+        counts = compile_bundle(args.truth, args.output, args.regions)
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+    print 'Records: {records}, not PASS: {filtered}, variants outside the regions: {outside_regions}, variants: ' \
+          '{variants} on {contigs} chromosomes'.format(**counts)
+    print 'Output file created. It can be found at', args.output
+
+
+if __name__ == '__main__':
+    main()
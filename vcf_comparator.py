@@ -0,0 +1,580 @@
+#!/usr/bin/python
+
+"""
+This script is a fast exact match comparison of a query VCF file against a truth VCF file, to run as a pre-check before
+hap.py.  Both VCF files are streamed once, side by side, and joined on their sorted variant keys (sort-merge join), so
+memory use does not depend on the size of the VCF files.
+
+The variant key of each called ALT allele is (chrom, pos, ref, alt, genotype class), where:
+    - REF and ALT are trimmed of their common suffix, then of their common prefix (keeping one base), so the same
+      variant written with different padding has the same key.  Alleles are not shifted through repeats, since that
+      needs the reference sequence.
+    - multi-base substitutions (MNPs) are split into SNPs, and <DEL> alleles (as in the annotated VCF files written by
+      hap.py) are deletions of all of REF
+    - the genotype class is het, homalt or hetalt
+
+Only PASS (or '.') records are compared.  With a BED file, only the variants that overlap its regions are counted, as
+with the -f and -T options of hap.py.
+
+Both VCF files must be sorted in the same contig order, which is taken from the reference index (.fai) file (--fai), or
+from the ##contig header lines of the VCF files.  The contig order is needed when a chromosome has variants in only one
+of the files, and the contigs can be sorted in any order (1, 2, ..., 22 or 1, 10, 11, ..., 2).  If the ##contig lines of
+the two files list their common contigs in different orders, the files cannot be merged and the comparison stops.
+
+The output file has the Locations, Locations.SNP and Locations.INDEL rows of the hap.py extended.csv file (TRUTH.TOTAL,
+TRUTH.TP, TRUTH.FN, QUERY.TOTAL, QUERY.TP, QUERY.FP, METRIC.Precision and METRIC.Recall), so benchmarking_truth_set.py
+can read it like an extended.csv file.  Variants are counted per ALT allele rather than per record, and a variant
+written differently in the truth and query files is a FN and a FP, so the counts are a close, not exact, match of the
+hap.py counts.
+"""
+
+import argparse
+import heapq
+import re
+import sys
+
+import bed_index
+import bgzf
+
+VARIANT_TYPES = ['SNP', 'INDEL']
+OUTPUT_COLUMNS = ['METRIC.Precision', 'METRIC.Recall', 'QUERY.FP', 'QUERY.TOTAL', 'QUERY.TP', 'TRUTH.FN',
+                  'TRUTH.TOTAL', 'TRUTH.TP']
+GT_SEPARATOR = re.compile(r'[/|]')
+CONTIG_ID = re.compile(r'^##contig=<(?:.*,)?ID=([^,>]+)')
+
+
+def read_header(lines):
+    """
+    This function reads the header lines of a VCF file, up to and including the #CHROM line.
+
+    :param lines: Iterator over the lines of the VCF file
+    :type lines: iterator
+
+    :return: Tuple of (list of sample names, list of the contigs of the ##contig lines, in their order)
+    :rtype: tuple
+    """
+    contigs = list()
+
+    for line in lines:
+        if line.startswith('#CHROM'):
+            return line.rstrip('\n').split('\t')[9:], contigs
+        elif line.startswith('##contig='):
+            match = CONTIG_ID.match(line)
+
+            if match:
+                contigs.append(match.group(1))
+        elif not line.startswith('#'):
+            break
+
+    raise ValueError('The #CHROM header line is missing')
+
+
+def get_natural_rank(chrom):
+    """
+    This function returns the sort key of a chromosome in the natural order 1, 2, ..., 22, X, Y, M, then the other
+    contigs by name, with or without the 'chr' prefix.
+
+    :param chrom: The chromosome name
+    :type chrom: str
+
+    :rtype: tuple
+    """
+    name = chrom[3:] if chrom.startswith('chr') else chrom
+
+    if name.isdigit():
+        return 0, int(name), ''
+    elif name in ('X', 'Y', 'M', 'MT'):
+        return 1, ['X', 'Y', 'M', 'MT'].index(name), ''
+    else:
+        return 2, 0, name
+
+
+def read_fai(fai_file):
+    """
+    This function returns the contigs of a reference index (.fai) file, in their order.
+
+    :param fai_file: The reference index file
+    :type fai_file: str
+
+    :rtype: list
+    """
+    with open(fai_file, 'r') as infile_obj:
+        return [line.split('\t', 1)[0] for line in infile_obj if line.strip()]
+
+
+def get_contig_ranks(truth_contigs, query_contigs, fai_file=None):
+    """
+    This function returns the rank of each contig in the contig order of the comparison: the order of the reference
+    index file, or of the ##contig lines of the truth VCF file, else of the query VCF file.
+
+    :param truth_contigs: The contigs of the ##contig lines of the truth VCF file
+    :type truth_contigs: list
+    :param query_contigs: The contigs of the ##contig lines of the query VCF file
+    :type query_contigs: list
+    :param fai_file: The reference index file, or None
+    :type fai_file: str
+
+    :return: Dictionary with key = contig and value = rank, empty if there is no contig order
+    :rtype: dict
+
+    :raises ValueError: If the ##contig lines of the two VCF files list their common contigs in different orders
+    """
+    truth_common = [contig for contig in truth_contigs if contig in set(query_contigs)]
+    query_common = [contig for contig in query_contigs if contig in set(truth_contigs)]
+
+    if truth_common != query_common:
+        raise ValueError('The ##contig lines of the truth and query VCF files have the contigs in different orders')
+
+    if fai_file is not None:
+        contigs = read_fai(fai_file)
+    else:
+        contigs = truth_contigs or query_contigs
+
+    return dict((contig, rank) for rank, contig in enumerate(contigs))
+
+
+def trim_alleles(pos, ref, alt):
+    """
+    This function trims the common suffix, then the common prefix of REF and ALT, keeping at least one base in each.
+
+    :param pos: The position of REF
+    :type pos: int
+    :param ref: The REF allele
+    :type ref: str
+    :param alt: The ALT allele
+    :type alt: str
+
+    :return: Tuple of (position, REF, ALT)
+    :rtype: tuple
+    """
+    while len(ref) > 1 and len(alt) > 1 and ref[-1] == alt[-1]:
+        ref = ref[:-1]
+        alt = alt[:-1]
+
+    while len(ref) > 1 and len(alt) > 1 and ref[0] == alt[0]:
+        ref = ref[1:]
+        alt = alt[1:]
+        pos += 1
+
+    return pos, ref, alt
+
+
+def get_genotype_class(alleles, allele):
+    """
+    This function returns the genotype class of an ALT allele in a genotype.
+
+    :param alleles: The allele indexes of the genotype, e.g. [0, 1]
+    :type alleles: list
+    :param allele: The ALT allele index
+    :type allele: int
+
+    :return: het, homalt or hetalt
+    :rtype: str
+    """
+    if all(other == allele for other in alleles):
+        return 'homalt'
+    elif 0 in alleles:
+        return 'het'
+    else:
+        return 'hetalt'
+
+
+def get_record_keys(chrom, pos, ref, alts, gt):
+    """
+    This function returns the variant keys of the called ALT alleles of a record.
+
+    :param chrom: The CHROM column
+    :type chrom: str
+    :param pos: The POS column
+    :type pos: int
+    :param ref: The REF column
+    :type ref: str
+    :param alts: The ALT column
+    :type alts: str
+    :param gt: The GT subfield of the sample column
+    :type gt: str
+
+    :return: List of keys (chromosome, position, REF, ALT, genotype class, variant type)
+    :rtype: list
+    """
+    alleles = list()
+
+    for allele in GT_SEPARATOR.split(gt):
+        if allele.isdigit():
+            alleles.append(int(allele))
+
+    keys = list()
+    alt_list = alts.split(',')
+
+    for allele in set(alleles):
+        if allele == 0 or allele > len(alt_list):
+            continue
+
+        alt = alt_list[allele - 1]
+
+        if alt == '<DEL>':  # hap.py writes deletions as <DEL> with all the deleted bases in REF
+            alt = ''
+
+        if alt.startswith('<') or alt in ('*', '.') or '[' in alt or ']' in alt:
+            continue
+
+        genotype_class = get_genotype_class(alleles, allele)
+        key_pos, key_ref, key_alt = trim_alleles(pos, ref, alt)
+
+        if len(key_ref) != len(key_alt):
+            keys.append((chrom, key_pos, key_ref, key_alt, genotype_class, 'INDEL'))
+        else:
+            for offset, (ref_base, alt_base) in enumerate(zip(key_ref, key_alt)):
+                if ref_base != alt_base:
+                    keys.append((chrom, key_pos + offset, ref_base, alt_base, genotype_class, 'SNP'))
+
+    return keys
+
+
+def iter_variant_keys(lines, sample_index, regions, vcf_name):
+    """
+    This function yields the variant keys of the records of a VCF file, chromosome by chromosome and sorted by position
+    within each chromosome.  Trimming can only move a key after the position of its record, so the keys are held in a
+    heap only until a record at a later position is read.
+
+    :param lines: Iterator over the lines of the VCF file, after the header
+    :type lines: iterator
+    :param sample_index: The column index of the sample
+    :type sample_index: int
+    :param regions: The regions, or None for no region filter
+    :type regions: bed_index.BedIndex
+    :param vcf_name: The VCF file name, for error messages
+    :type vcf_name: str
+
+    :return: Generator of keys (chromosome, position, REF, ALT, genotype class, variant type)
+    :rtype: generator
+    """
+    pending = list()
+    done_chroms = set()
+    chrom = None
+    last_pos = 0
+
+    for line in lines:
+        line_items = line.rstrip('\n').split('\t', sample_index + 1)
+
+        if len(line_items) <= sample_index:
+            continue
+
+        if line_items[6] != 'PASS' and line_items[6] != '.':
+            continue
+
+        pos = int(line_items[1])
+
+        if line_items[0] != chrom:
+            while pending:
+                yield heapq.heappop(pending)
+
+            done_chroms.add(chrom)
+            chrom = line_items[0]
+
+            if chrom in done_chroms:
+                raise ValueError('{} is not sorted: the records of {} are not together'.format(vcf_name, chrom))
+        elif pos < last_pos:
+            raise ValueError('{} is not sorted at {}:{}'.format(vcf_name, chrom, pos))
+
+        last_pos = pos
+
+        while pending and pending[0][1] < pos:
+            yield heapq.heappop(pending)
+
+        gt = line_items[sample_index].split(':', 1)[0]
+
+        for key in get_record_keys(chrom, pos, line_items[3], line_items[4], gt):
+            if regions is None or regions.overlaps(chrom, key[1] - 1, key[1] - 1 + max(1, len(key[2]))):
+                heapq.heappush(pending, key)
+
+    while pending:
+        yield heapq.heappop(pending)
+
+
+def new_counts():
+    """
+    This function returns zero counts for the columns TRUTH.TP, TRUTH.FN, QUERY.TP and QUERY.FP.
+
+    :rtype: dict
+    """
+    return {'TRUTH.TP': 0, 'TRUTH.FN': 0, 'QUERY.TP': 0, 'QUERY.FP': 0}
+
+
+def get_contig_rank(contig_ranks, chrom):
+    """
+    This function returns the rank of a chromosome in the contig order.
+
+    :param contig_ranks: Dictionary with key = contig and value = rank
+    :type contig_ranks: dict
+    :param chrom: The chromosome
+    :type chrom: str
+
+    :rtype: int
+
+    :raises ValueError: If the chromosome is not in the contig order
+    """
+    if not contig_ranks:
+        raise ValueError('The contig order is needed to compare chromosome {}, which has variants in only one VCF '
+                         'file: add ##contig lines to the VCF files or give the reference index (.fai) '
+                         'file'.format(chrom))
+    elif chrom not in contig_ranks:
+        raise ValueError('Chromosome {} is not in the contig order'.format(chrom))
+
+    return contig_ranks[chrom]
+
+
+def compare_keys(truth_keys, query_keys, contig_ranks=None):
+    """
+    This function joins two streams of variant keys and counts the matches by variant type.  Both streams must have the
+    chromosomes in the same order; when the two streams are on chromosomes that the other stream has not reached yet
+    (a chromosome with no variants in one of the files), the chromosome first in the contig order is taken first.
+
+    :param truth_keys: Variant keys of the truth VCF file, from iter_variant_keys()
+    :type truth_keys: iterator
+    :param query_keys: Variant keys of the query VCF file, from iter_variant_keys()
+    :type query_keys: iterator
+    :param contig_ranks: Dictionary with key = contig and value = rank in the contig order, from get_contig_ranks()
+    :type contig_ranks: dict
+
+    :return: Dictionary with key = variant type and value = counts by column
+    :rtype: dict
+
+    :raises ValueError: If the contig order is needed and unknown, or a stream is not in the contig order
+    """
+    counts = dict((variant_type, new_counts()) for variant_type in VARIANT_TYPES)
+    truth_chroms = set()
+    query_chroms = set()
+
+    truth_key = next(truth_keys, None)
+    query_key = next(query_keys, None)
+
+    while truth_key is not None or query_key is not None:
+        if query_key is None:
+            truth_first = True
+        elif truth_key is None:
+            truth_first = False
+        elif truth_key[0] == query_key[0]:
+            truth_first = truth_key < query_key if truth_key != query_key else None
+        elif query_key[0] in truth_chroms:  # the truth stream is past this chromosome
+            truth_first = False
+        elif truth_key[0] in query_chroms:  # the query stream is past this chromosome
+            truth_first = True
+        else:
+            truth_first = get_contig_rank(contig_ranks, truth_key[0]) < get_contig_rank(contig_ranks, query_key[0])
+
+        if truth_first is None:
+            counts[truth_key[-1]]['TRUTH.TP'] += 1
+            counts[query_key[-1]]['QUERY.TP'] += 1
+        elif truth_first:
+            counts[truth_key[-1]]['TRUTH.FN'] += 1
+        else:
+            counts[query_key[-1]]['QUERY.FP'] += 1
+
+        if truth_first is not False:
+            truth_chroms.add(truth_key[0])
+            truth_key = next(truth_keys, None)
+
+            if truth_key is not None and truth_key[0] not in truth_chroms and truth_key[0] in query_chroms and \
+                    (query_key is None or query_key[0] != truth_key[0]):  # the query stream is past this chromosome
+                raise ValueError('The truth and query VCF files have the chromosomes in different orders at '
+                                 '{}'.format(truth_key[0]))
+
+        if truth_first is not True:
+            query_chroms.add(query_key[0])
+            query_key = next(query_keys, None)
+
+            if query_key is not None and query_key[0] not in query_chroms and query_key[0] in truth_chroms and \
+                    (truth_key is None or truth_key[0] != query_key[0]):  # the truth stream is past this chromosome
+                raise ValueError('The truth and query VCF files have the chromosomes in different orders at '
+                                 '{}'.format(query_key[0]))
+
+    return counts
+
+
+def get_sample_index(sample_names, sample_name, vcf_name):
+    """
+    This function returns the column index of a sample, or of the first sample if no sample name is given.
+
+    :param sample_names: The sample names of the VCF file
+    :type sample_names: list
+    :param sample_name: The sample name, or None
+    :type sample_name: str
+    :param vcf_name: The VCF file name, for error messages
+    :type vcf_name: str
+
+    :rtype: int
+    """
+    if not sample_names:
+        raise ValueError('{} has no sample column'.format(vcf_name))
+
+    if sample_name is None:
+        return 9
+    elif sample_name in sample_names:
+        return 9 + sample_names.index(sample_name)
+    else:
+        raise ValueError('Sample {} is not in {}'.format(sample_name, vcf_name))
+
+
+def compare_vcfs(truth_vcf, query_vcf, bed_file=None, truth_sample=None, query_sample=None, fai_file=None):
+    """
+    This function compares the query VCF file to the truth VCF file.
+
+    :param truth_vcf: The truth VCF file, sorted
+    :type truth_vcf: str
+    :param query_vcf: The query VCF file, sorted with the chromosomes in the same order
+    :type query_vcf: str
+    :param bed_file: The BED file of the regions to compare, or None
+    :type bed_file: str
+    :param truth_sample: The truth sample name; default is the first sample
+    :type truth_sample: str
+    :param query_sample: The query sample name; default is the first sample
+    :type query_sample: str
+    :param fai_file: The reference index (.fai) file of the contig order; default is the ##contig lines
+    :type fai_file: str
+
+    :return: Dictionary with key = variant type and value = counts by column
+    :rtype: dict
+
+    :raises ValueError: If the VCF files are not sorted in the same contig order
+    """
+    regions = None if bed_file is None else bed_index.BedIndex(bed_file)
+
+    with bgzf.open_vcf(truth_vcf) as truth_obj, bgzf.open_vcf(query_vcf) as query_obj:
+        truth_lines = iter(truth_obj)
+        query_lines = iter(query_obj)
+
+        truth_samples, truth_contigs = read_header(truth_lines)
+        query_samples, query_contigs = read_header(query_lines)
+        contig_ranks = get_contig_ranks(truth_contigs, query_contigs, fai_file)
+
+        truth_keys = iter_variant_keys(truth_lines, get_sample_index(truth_samples, truth_sample, truth_vcf), regions,
+                                       truth_vcf)
+        query_keys = iter_variant_keys(query_lines, get_sample_index(query_samples, query_sample, query_vcf), regions,
+                                       query_vcf)
+
+        return compare_keys(truth_keys, query_keys, contig_ranks)
+
+
+def format_ratio(numerator, denominator):
+    """
+    This function returns numerator / denominator the way hap.py writes it, or an empty string if the denominator is
+    zero.
+
+    :param numerator: The numerator
+    :type numerator: int
+    :param denominator: The denominator
+    :type denominator: int
+
+    :rtype: str
+    """
+    if denominator == 0:
+        return ''
+    else:
+        return str(float(numerator) / denominator)
+
+
+def get_output_rows(counts):
+    """
+    This function returns the Locations, Locations.SNP and Locations.INDEL rows of the output file.
+
+    :param counts: Dictionary with key = variant type and value = counts by column
+    :type counts: dict
+
+    :return: List of rows, each a list of str
+    :rtype: list
+    """
+    total = new_counts()
+
+    for variant_type in VARIANT_TYPES:
+        for column in total:
+            total[column] += counts[variant_type][column]
+
+    rows = list()
+
+    for row_name, row_counts in [('Locations', total), ('Locations.INDEL', counts['INDEL']),
+                                 ('Locations.SNP', counts['SNP'])]:
+        truth_tp = row_counts['TRUTH.TP']
+        truth_fn = row_counts['TRUTH.FN']
+        query_tp = row_counts['QUERY.TP']
+        query_fp = row_counts['QUERY.FP']
+
+        values = {'METRIC.Precision': format_ratio(query_tp, query_tp + query_fp),
+                  'METRIC.Recall': format_ratio(truth_tp, truth_tp + truth_fn),
+                  'QUERY.FP': str(float(query_fp)),
+                  'QUERY.TOTAL': str(float(query_tp + query_fp)),
+                  'QUERY.TP': str(float(query_tp)),
+                  'TRUTH.FN': str(float(truth_fn)),
+                  'TRUTH.TOTAL': str(float(truth_tp + truth_fn)),
+                  'TRUTH.TP': str(float(truth_tp))}
+
+        rows.append([row_name] + [values[column] for column in OUTPUT_COLUMNS])
+
+    return rows
+
+
+def write_output(counts, output_file):
+    """
+    This function writes the counts in the extended.csv format.
+
+    :param counts: Dictionary with key = variant type and value = counts by column
+    :type counts: dict
+    :param output_file: The output file
+    :type output_file: str
+
+    :rtype: void
+    """
+    with open(output_file, 'w') as outfile_obj:
+        outfile_obj.write(',' + ','.join(OUTPUT_COLUMNS) + '\n')
+
+        for row in get_output_rows(counts):
+            outfile_obj.write(','.join(row) + '\n')
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It compares the VCF files, writes the output file and prints the counts.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--truth", required=True, help="The truth VCF file, sorted")
+    parser.add_argument("-q", "--query", required=True, help="The query VCF file, sorted")
+    parser.add_argument("-b", "--bed", help="The BED file of the regions to compare; default is all variants")
+    parser.add_argument("-o", "--output", required=True, help="The output file (*.extended.csv)")
+    parser.add_argument("--truth-sample", help="The truth sample name; default is the first sample")
+    parser.add_argument("--query-sample", help="The query sample name; default is the first sample")
+    parser.add_argument("--fai", help="The reference index (.fai) file, for the contig order of the VCF files; default "
+                                      "is the order of their ##contig header lines")
+
+    args = parser.parse_args()
+
+    try:
+        counts = compare_vcfs(args.truth, args.query, args.bed, args.truth_sample, args.query_sample, args.fai)
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+    write_output(counts, args.output)
+
+    print '\t'.join(['Type', 'TRUTH.TOTAL', 'TRUTH.TP', 'TRUTH.FN', 'QUERY.TOTAL', 'QUERY.TP', 'QUERY.FP'])
+
+    for variant_type in VARIANT_TYPES:
+        type_counts = counts[variant_type]
+        print '\t'.join(str(value) for value in [variant_type,
+                                                 type_counts['TRUTH.TP'] + type_counts['TRUTH.FN'],
+                                                 type_counts['TRUTH.TP'], type_counts['TRUTH.FN'],
+                                                 type_counts['QUERY.TP'] + type_counts['QUERY.FP'],
+                                                 type_counts['QUERY.TP'], type_counts['QUERY.FP']])
+
+    print 'Output file created. It can be found at', args.output
+
+
+if __name__ == '__main__':
+    main()
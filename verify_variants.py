@@ -4,33 +4,52 @@
 This script will verify that the expected variants in the truth file are in the corresponding VCF file.  If all the
 variants in the truth file are found in the VCF file, then this VCF file passes validation.  Otherwise, the VCF file
 fails validation.
+
+In batch mode, many truth files are checked against many VCF files.  Each VCF file is read once for all the truth files
+that are checked against it, and the VCF files are processed in parallel.
+
+A truth file can also be a truth bundle compiled by truth_bundle.py from a full truth VCF file, e.g. a GIAB
+high-confidence truth set.  The bundle is memory-mapped rather than read into a set, and the VCF file is streamed once
+for all the truth bundles that are checked against it.  The variants of a bundle are matched by their trimmed REF and
+ALT alleles, one ALT allele at a time.
+
+In genotype mode (-g), the truth files also give the expected genotype of each member of a family (or of any samples
+of a multi-sample VCF file), and the multi-sample VCF file is read once for all the members: only the GT subfield of
+each sample column is parsed, and each member passes or fails on its own genotypes.
+
+It can also be imported: verify() runs a verification, and verify_vcf() checks the truth sets of one VCF file.
 """
 
 import argparse
+import collections
+import glob
+import multiprocessing
+import os
 import re
 
-parser = argparse.ArgumentParser()
-parser.add_argument("-t", "--truth", help="The truth file")
-parser.add_argument("-v", "--vcf", help="The vcf file")
+import bgzf
+import instrumentation
+import truth_bundle
 
-args = parser.parse_args()
-test_file = args.truth
-vcf_file = args.vcf
+MAX_MISSING_PRINTED = 10
+GT_SEPARATOR = re.compile(r'[/|]')
 
 
-def get_test_variants():
+def get_test_variants(test_file):
     """
-    This function returns a tuple of a set of tuples of the test variants and the chromosome.
+    This function returns a set of tuples of the test variants.
+
+    :param test_file: The truth file
+    :type test_file: str
 
-    :return: Set of tuples of (chrom, pos, ref alt, filter) and the chromosome
-    :rtype: tuple of set and str
+    :return: Set of tuples of (chrom, pos, ref alt, filter)
+    :rtype: set
     """
     test_variant_set = set()
-    chromosome = ''
 
     with open(test_file, 'r') as test_obj:
         for line in test_obj:
-            if not re.search('^#', line):
+            if not line.startswith('#'):
                 line_items = line.strip().split('\t')
 
                 chrom = line_items[0]
@@ -39,65 +58,787 @@ def get_test_variants():
                 alt = line_items[3]
                 vcf_filter = line_items[4]
 
-                chromosome = chrom + '\t'
                 var = (chrom, pos, ref, alt, vcf_filter)
                 test_variant_set.add(var)
             else:
                 continue
 
-    return test_variant_set, chromosome
+    return test_variant_set
+
+
+def normalize_genotype(gt):
+    """
+    This function returns a genotype with its alleles sorted and separated by '/', so that genotypes that differ only
+    by their phasing or allele order are equal, e.g. '1|0' and '0/1'.
+
+    :param gt: The genotype, e.g. '0|1'
+    :type gt: str
+
+    :rtype: str
+    """
+    return '/'.join(sorted(GT_SEPARATOR.split(gt), key=lambda allele: (not allele.isdigit(), len(allele), allele)))
+
+
+def get_test_genotypes(test_file):
+    """
+    This function returns the expected genotypes of the test variants.  The columns after chrom, pos, ref, alt and
+    filter are sample=GT, one per member, e.g. NA12878=0/1.
+
+    :param test_file: The truth file
+    :type test_file: str
+
+    :return: Dictionary with key = tuple of (chrom, pos, ref alt, filter) and value = ordered dictionary with
+    key = sample and value = normalized genotype
+    :rtype: dict
+
+    :raises ValueError: If a line has no column after the filter column, or one that is not sample=GT
+    """
+    test_genotypes = dict()
+
+    with open(test_file, 'r') as test_obj:
+        for line in test_obj:
+            if line.startswith('#') or not line.strip():
+                continue
+
+            line_items = line.strip().split('\t')
+
+            if len(line_items) < 6:  # the variant would pass without any genotype being checked
+                raise ValueError('{}: the line has no sample=GT column after the filter column: {}'.format(
+                    test_file, line.strip()))
+
+            genotypes = test_genotypes.setdefault(tuple(line_items[:5]), collections.OrderedDict())
+
+            for item in line_items[5:]:
+                sample, separator, gt = item.partition('=')
+
+                if not separator or not sample or not gt:
+                    raise ValueError('{}: the columns after the filter column must be sample=GT: {}'.format(test_file,
+                                                                                                          item))
+
+                genotypes[sample] = normalize_genotype(gt)
+
+    return test_genotypes
+
+
+def get_test_positions(test_variant_set):
+    """
+    This function returns the positions of the test variants indexed by chromosome.
+
+    :param test_variant_set: Set of tuples of (chrom, pos, ref alt, filter) of the test variants
+    :type test_variant_set: set
+
+    :return: Dictionary with key = chromosome and value = set of positions (str)
+    :rtype: dict
+    """
+    test_positions = dict()
+
+    for var in test_variant_set:
+        test_positions.setdefault(var[0], set()).add(var[1])
+
+    return test_positions
 
 
-def get_vcf_variants(chromosome):
+def get_vcf_variants(vcf_file, test_variant_set):
     """
-    This function returns a set of variants with the specified chromosome from the VCF file.
+    This function returns the set of PASS variants from the VCF file that are at the positions of the test variants.
 
-    :param chromosome: The variants' chromosome
-    :type chromosome: str
+    The VCF file is streamed one line at a time.  Only records whose (chrom, pos) matches a test variant are split into
+    a tuple, so the memory used depends on the size of the truth file rather than the size of the VCF file.  Reading
+    stops as soon as every test variant has been found.
+
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+    :param test_variant_set: Set of tuples of (chrom, pos, ref alt, filter) of the test variants
+    :type test_variant_set: set
 
     :return: Set of tuples of (chrom, pos, ref alt, filter)
     :rtype: set
     """
     vcf_variant_set = set()
+    remaining_set = set(test_variant_set)
+    test_positions = get_test_positions(test_variant_set)
+    num_records = 0
 
-    with open(vcf_file, 'r') as vcf_obj:
+    with bgzf.open_vcf(vcf_file) as vcf_obj:
         for line in vcf_obj:
-            if re.search('^' + chromosome, line) and not re.search('^#', line):
-                line_items = line.strip().split('\t')
+            if line.startswith('#'):
+                continue
+
+            line_items = line.split('\t', 7)
+            positions = test_positions.get(line_items[0])
+
+            if positions is None or line_items[1] not in positions:
+                continue
+
+            num_records += 1
+            vcf_filter = line_items[6]
+
+            if vcf_filter == 'PASS':
+                chrom = line_items[0]
+                pos = line_items[1]
+                ref = line_items[3]
+                alt = line_items[4]
+
+                var = (chrom, pos, ref, alt, vcf_filter)
+                vcf_variant_set.add(var)
+                remaining_set.discard(var)
+
+                if not remaining_set:  # every test variant has been found
+                    break
+            else:
+                continue
+
+    count_vcf_reads(vcf_obj, vcf_file, num_records)
+
+    return vcf_variant_set
+
+
+def count_vcf_reads(vcf_obj, vcf_file, num_records):
+    """
+    This function counts the bytes read from a VCF file and the records at the positions of the test variants.  The
+    bytes read are the compressed blocks read from a bgzipped file, or the size of other files.
+
+    :param vcf_obj: The VCF file object, once the VCF file is read
+    :type vcf_obj: file
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+    :param num_records: The number of records at the positions of the test variants
+    :type num_records: int
+
+    :rtype: void
+    """
+    metrics = instrumentation.METRICS
+
+    if metrics.enabled:
+        metrics.count('bytes_read', vcf_obj.bytes_read if isinstance(vcf_obj, bgzf.BgzfReader) else
+                      os.path.getsize(vcf_file))
+        metrics.count('lines_parsed', num_records)
+
+
+def get_vcf_variants_indexed(vcf_file, test_variant_set, index_file):
+    """
+    This function returns the set of PASS variants from a bgzipped, indexed VCF file that are at the positions of the
+    test variants.  Only the BGZF blocks that the tabix/CSI index lists for each test position are decompressed.
+
+    :param vcf_file: The bgzipped VCF file
+    :type vcf_file: str
+    :param test_variant_set: Set of tuples of (chrom, pos, ref alt, filter) of the test variants
+    :type test_variant_set: set
+    :param index_file: The tabix (.tbi) or CSI (.csi) index of the VCF file
+    :type index_file: str
+
+    :return: Set of tuples of (chrom, pos, ref alt, filter)
+    :rtype: set
+    """
+    vcf_variant_set = set()
+    test_positions = sorted(set((var[0], int(var[1])) for var in test_variant_set))
+    num_records = 0
+
+    index = bgzf.BinningIndex(index_file)
 
+    with bgzf.BgzfReader(vcf_file) as reader:
+        for chrom, pos in test_positions:
+            for line_items in bgzf.query_lines(reader, index, chrom, pos - 1, pos):
+                num_records += 1
                 vcf_filter = line_items[6]
 
                 if vcf_filter == 'PASS':
-                    chrom = line_items[0]
-                    pos = line_items[1]
-                    ref = line_items[3]
-                    alt = line_items[4]
-
-                    var = (chrom, pos, ref, alt, vcf_filter)
+                    var = (line_items[0], line_items[1], line_items[3], line_items[4], vcf_filter)
                     vcf_variant_set.add(var)
                 else:
                     continue
-            else:
-                continue
+
+    count_vcf_reads(reader, vcf_file, num_records)
 
     return vcf_variant_set
 
 
-########################################################################################################################
-#
-#   MAIN
-#
-########################################################################################################################
-def main():
+def find_vcf_variants(vcf_file, test_variant_set):
+    """
+    This function returns the set of PASS variants from the VCF file that are at the positions of the test variants.
+    The index of the VCF file is used when there is one; otherwise the VCF file is streamed.
+
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+    :param test_variant_set: Set of tuples of (chrom, pos, ref alt, filter) of the test variants
+    :type test_variant_set: set
+
+    :return: Set of tuples of (chrom, pos, ref alt, filter)
+    :rtype: set
+    """
+    index_file = bgzf.get_index_file(vcf_file)
+    metrics = instrumentation.METRICS
+    metrics.count('vcf_files')
+
+    with metrics.stage('scan_vcf'):
+        if index_file:
+            vcf_variant_set = get_vcf_variants_indexed(vcf_file, test_variant_set, index_file)
+        else:
+            vcf_variant_set = get_vcf_variants(vcf_file, test_variant_set)
+
+    metrics.count('records_matched', len(vcf_variant_set))
+
+    return vcf_variant_set
+
+
+def get_sample_columns(vcf_file, samples):
+    """
+    This function returns the column index of each sample in the VCF file, from its #CHROM header line.
+
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+    :param samples: The sample names
+    :type samples: list
+
+    :return: Dictionary with key = sample and value = column index
+    :rtype: dict
+
+    :raises ValueError: If a sample has no column in the VCF file
+    """
+    sample_names = list()
+
+    with bgzf.open_vcf(vcf_file) as vcf_obj:
+        for line in vcf_obj:
+            if line.startswith('#CHROM'):
+                sample_names = line.rstrip('\n').split('\t')[9:]
+                break
+            elif not line.startswith('#'):
+                break
+
+    missing = [sample for sample in samples if sample not in sample_names]
+
+    if missing:
+        raise ValueError('{} has no column for the sample(s) {}'.format(vcf_file, ', '.join(sorted(missing))))
+
+    return dict((sample, 9 + sample_names.index(sample)) for sample in samples)
+
+
+def get_record_genotypes(line_items, sample_columns):
+    """
+    This function returns the normalized genotypes of the samples of a record.  Only the GT subfield of each sample
+    column is parsed; the FORMAT column is split only if GT is not its first key.
+
+    :param line_items: The columns of the record, split in 8 (the INFO column and beyond are not split)
+    :type line_items: list
+    :param sample_columns: Dictionary with key = sample and value = column index
+    :type sample_columns: dict
+
+    :return: Dictionary with key = sample and value = normalized genotype, or '.' if the record has no GT
+    :rtype: dict
+    """
+    columns = line_items[7].rstrip('\n').split('\t')  # INFO, FORMAT and the sample columns
+    format_keys = columns[1] if len(columns) > 1 else ''
+
+    if format_keys == 'GT' or format_keys.startswith('GT:'):
+        gt_index = 0
+    elif 'GT' in format_keys.split(':'):
+        gt_index = format_keys.split(':').index('GT')
+    else:
+        return dict((sample, '.') for sample in sample_columns)
+
+    genotypes = dict()
+
+    for sample, column in sample_columns.items():
+        sample_column = columns[column - 7] if column - 7 < len(columns) else '.'
+
+        if gt_index == 0:
+            end = sample_column.find(':')
+            gt = sample_column if end == -1 else sample_column[:end]
+        else:
+            sample_values = sample_column.split(':')
+            gt = sample_values[gt_index] if gt_index < len(sample_values) else '.'
+
+        genotypes[sample] = normalize_genotype(gt)
+
+    return genotypes
+
+
+def get_vcf_genotypes(vcf_file, test_genotypes, sample_columns):
+    """
+    This function returns the genotypes of the samples at the test variants that are PASS variants of the VCF file.
+    The VCF file is read once for all the samples: with its index when there is one, otherwise streamed until every
+    test variant has been found.
+
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+    :param test_genotypes: Dictionary with key = tuple of (chrom, pos, ref alt, filter) of the test variants
+    :type test_genotypes: dict
+    :param sample_columns: Dictionary with key = sample and value = column index
+    :type sample_columns: dict
+
+    :return: Dictionary with key = tuple of (chrom, pos, ref alt, filter) and value = dictionary with key = sample and
+    value = normalized genotype
+    :rtype: dict
+    """
+    vcf_genotypes = dict()
+    remaining_set = set(test_genotypes)
+    index_file = bgzf.get_index_file(vcf_file)
+    metrics = instrumentation.METRICS
+    metrics.count('vcf_files')
+    num_records = 0
+
+    def add_record(line_items):
+        var = (line_items[0], line_items[1], line_items[3], line_items[4], line_items[6])
+
+        if var in remaining_set:
+            vcf_genotypes[var] = get_record_genotypes(line_items, sample_columns)
+            remaining_set.discard(var)
+
+    with metrics.stage('scan_vcf'):
+        if index_file:
+            index = bgzf.BinningIndex(index_file)
+
+            with bgzf.BgzfReader(vcf_file) as vcf_obj:
+                for chrom, pos in sorted(set((var[0], int(var[1])) for var in test_genotypes)):
+                    for line_items in bgzf.query_lines(vcf_obj, index, chrom, pos - 1, pos):
+                        num_records += 1
+
+                        if line_items[6] == 'PASS':
+                            add_record(line_items)
+        else:
+            test_positions = get_test_positions(test_genotypes)
+
+            with bgzf.open_vcf(vcf_file) as vcf_obj:
+                for line in vcf_obj:
+                    if line.startswith('#'):
+                        continue
+
+                    line_items = line.split('\t', 7)
+                    positions = test_positions.get(line_items[0])
+
+                    if positions is None or line_items[1] not in positions:
+                        continue
+
+                    num_records += 1
+
+                    if line_items[6] == 'PASS':
+                        add_record(line_items)
+
+                        if not remaining_set:  # every test variant has been found
+                            break
+
+        count_vcf_reads(vcf_obj, vcf_file, num_records)
+
+    metrics.count('records_matched', len(vcf_genotypes))
+
+    return vcf_genotypes
+
+
+def verify_vcf_genotypes(job):
+    """
+    This function checks the expected genotypes of each member in all the truth files of one multi-sample VCF file.
+    The VCF file is read once for all the truth files and members.
+
+    :param job: Tuple of (VCF file, dictionary with key = truth file and value = expected genotypes, as returned by
+    get_test_genotypes())
+    :type job: tuple
+
+    :return: List of result rows: [VCF file, truth file, sample, 'Pass' or 'Fail', number of expected genotypes,
+    number of genotypes found, sorted list of missing genotypes (chrom, pos, ref, alt, filter, 'expected>found')]
+    :rtype: list
+    """
+    vcf_file, test_genotype_sets = job
+
+    merged_genotypes = dict()
+
+    for test_genotypes in test_genotype_sets.values():
+        for var, genotypes in test_genotypes.items():
+            merged_genotypes.setdefault(var, dict()).update(genotypes)
+
+    samples = sorted(set(sample for genotypes in merged_genotypes.values() for sample in genotypes))
+    vcf_genotypes = get_vcf_genotypes(vcf_file, merged_genotypes, get_sample_columns(vcf_file, samples))
+
+    results = list()
+
+    for truth_file in sorted(test_genotype_sets):
+        test_genotypes = test_genotype_sets[truth_file]
+        missing_by_sample = collections.OrderedDict()
+        expected_by_sample = collections.OrderedDict()
+
+        for var in sorted(test_genotypes):
+            for sample, expected_gt in test_genotypes[var].items():
+                found_gt = vcf_genotypes.get(var, {}).get(sample, '.')
+                expected_by_sample[sample] = expected_by_sample.get(sample, 0) + 1
+                missing_by_sample.setdefault(sample, list())
+
+                if found_gt != expected_gt:
+                    missing_by_sample[sample].append(var + ('{}>{}'.format(expected_gt, found_gt),))
+
+        for sample in sorted(expected_by_sample):
+            expected = expected_by_sample[sample]
+            missing = missing_by_sample[sample]
+            results.append([vcf_file, truth_file, sample, 'Fail' if missing else 'Pass', expected,
+                            expected - len(missing), missing])
+
+    return results
+
+
+def find_bundle_variants(vcf_file, bundle_files):
+    """
+    This function streams the VCF file once and looks up the variants of its PASS records in each truth bundle.
+    Reading stops as soon as every variant of every bundle has been found.
+
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+    :param bundle_files: List of truth bundles
+    :type bundle_files: list
+
+    :return: Dictionary with key = truth bundle and value = tuple of (number of variants, number of variants found,
+    list of missing variants (chrom, pos, ref, alt))
+    :rtype: dict
+    """
+    metrics = instrumentation.METRICS
+    metrics.count('vcf_files')
+    bundles = [truth_bundle.TruthBundle(bundle_file) for bundle_file in bundle_files]
+
+    try:
+        cursors = [truth_bundle.BundleCursor(bundle) for bundle in bundles]
+        found_flags = [bytearray(len(bundle)) for bundle in bundles]
+        remaining = sum(len(bundle) for bundle in bundles)
+        num_records = 0
+        num_found = 0
+
+        with metrics.stage('scan_vcf'):
+            with bgzf.open_vcf(vcf_file) as vcf_obj:
+                for line in vcf_obj:
+                    if not remaining:  # every truth variant has been found
+                        break
+
+                    if line.startswith('#'):
+                        continue
+
+                    line_items = line.split('\t', 7)
+
+                    if line_items[6] != 'PASS':
+                        continue
+
+                    num_records += 1
+                    pos = int(line_items[1])
+                    keys = truth_bundle.get_allele_keys(pos, line_items[3], line_items[4])
+
+                    for cursor, found in zip(cursors, found_flags):
+                        for index in cursor.find(line_items[0], pos, keys):
+                            if not found[index]:
+                                found[index] = 1
+                                remaining -= 1
+                                num_found += 1
+
+            count_vcf_reads(vcf_obj, vcf_file, num_records)
+
+        metrics.count('records_matched', num_found)
+
+        results = dict()
+
+        for bundle_file, bundle, found in zip(bundle_files, bundles, found_flags):
+            missing = list(bundle.iter_missing(found))
+            results[bundle_file] = (len(bundle), len(bundle) - len(missing), missing)
+    finally:
+        for bundle in bundles:
+            bundle.close()
+
+    return results
+
+
+def expand_patterns(patterns):
+    """
+    This function expands glob patterns into a sorted list of file names.  Patterns that match no file are kept as is,
+    so that a missing file is reported when it is opened.
+
+    :param patterns: File names or glob patterns
+    :type patterns: list
+
+    :return: List of file names
+    :rtype: list
+    """
+    filenames = list()
+
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+
+        if matches:
+            filenames.extend(matches)
+        else:
+            filenames.append(pattern)
+
+    return filenames
+
+
+def get_batch_jobs(manifest, truth_files, vcf_files):
+    """
+    This function returns the truth files to check for each VCF file.  With a manifest, each line pairs one truth file
+    with one VCF file.  Without a manifest, every truth file is checked against every VCF file.
+
+    :param manifest: Tab delimited file with the columns truth file and VCF file, or None
+    :type manifest: str
+    :param truth_files: List of truth files
+    :type truth_files: list
+    :param vcf_files: List of VCF files
+    :type vcf_files: list
+
+    :return: List of tuples of (VCF file, list of truth files)
+    :rtype: list
+    """
+    jobs = list()
+    truth_files_by_vcf = dict()
+
+    if manifest:
+        with open(manifest, 'r') as manifest_obj:
+            for line in manifest_obj:
+                if line.startswith('#') or not line.strip():
+                    continue
+
+                truth_file, vcf_file = line.strip().split('\t')[:2]
+
+                if vcf_file not in truth_files_by_vcf:
+                    truth_files_by_vcf[vcf_file] = list()
+                    jobs.append((vcf_file, truth_files_by_vcf[vcf_file]))
+
+                truth_files_by_vcf[vcf_file].append(truth_file)
+    else:
+        for vcf_file in vcf_files:
+            jobs.append((vcf_file, list(truth_files)))
+
+    return jobs
+
+
+def verify_vcf(job):
+    """
+    This function checks all the truth sets and truth bundles of one VCF file.  The truth variants of all the truth
+    sets are merged, so the VCF file is read once for the truth sets, and once for the truth bundles.
+
+    :param job: Tuple of (VCF file, dictionary with key = truth file and value = set of test variants, list of truth
+    bundles)
+    :type job: tuple
+
+    :return: List of result rows: [VCF file, truth file, 'Pass' or 'Fail', number of expected variants,
+    number of variants found, sorted list of missing variants]
+    :rtype: list
+    """
+    vcf_file, test_variant_sets, bundle_files = job
+
+    results = list()
+
+    if test_variant_sets:
+        merged_variant_set = set()
+
+        for test_variant_set in test_variant_sets.values():
+            merged_variant_set.update(test_variant_set)
+
+        vcf_variant_set = find_vcf_variants(vcf_file, merged_variant_set)
+
+        for truth_file in sorted(test_variant_sets):
+            test_variant_set = test_variant_sets[truth_file]
+            missing = sorted(test_variant_set - vcf_variant_set)
+            result = 'Fail' if missing else 'Pass'
+
+            results.append([vcf_file, truth_file, result, len(test_variant_set), len(test_variant_set) - len(missing),
+                            missing])
+
+    if bundle_files:
+        bundle_results = find_bundle_variants(vcf_file, bundle_files)
+
+        for bundle_file in sorted(bundle_results):
+            expected, found, missing = bundle_results[bundle_file]
+            results.append([vcf_file, bundle_file, 'Fail' if missing else 'Pass', expected, found, missing])
+
+    return results
+
+
+def run_batch(jobs, processes, output, genotypes=False):
+    """
+    This function checks the truth files of each VCF file in a process pool and writes a tab delimited results table.
+    Each truth file is read once, however many VCF files it is checked against.
+
+    :param jobs: List of tuples of (VCF file, list of truth files)
+    :type jobs: list
+    :param processes: Number of worker processes
+    :type processes: int
+    :param output: The output file; None for screen output
+    :type output: str
+    :param genotypes: True to check the expected genotype of each member (see get_test_genotypes()); the table then
+    has one row per truth file, VCF file and member
+    :type genotypes: bool
+
+    :raises ValueError: In genotype mode, if a truth file is a truth bundle
+    :rtype: void
     """
-    This is the main function.  It prints 'Pass' to the screen if the test variants are found in the VCF variants;
-    otherwise, it prints 'Fail'.
+    test_variant_sets = dict()
+    bundle_files = set()
+    metrics = instrumentation.METRICS
 
+    with metrics.stage('read_truth'):
+        for _, truth_files in jobs:
+            for truth_file in truth_files:
+                if truth_file in test_variant_sets or truth_file in bundle_files:
+                    continue
+                elif truth_bundle.is_truth_bundle(truth_file):
+                    if genotypes:
+                        raise ValueError('{} is a truth bundle, which has no genotypes'.format(truth_file))
+
+                    bundle_files.add(truth_file)  # memory-mapped by the worker processes
+                elif genotypes:
+                    test_variant_sets[truth_file] = get_test_genotypes(truth_file)
+                else:
+                    test_variant_sets[truth_file] = get_test_variants(truth_file)
+
+    metrics.count('truth_files', len(test_variant_sets) + len(bundle_files))
+    metrics.count('truth_variants', sum(len(test_variant_set) for test_variant_set in test_variant_sets.values()))
+
+    if genotypes:
+        verify_function = verify_vcf_genotypes
+        pool_jobs = [(vcf_file, dict((truth_file, test_variant_sets[truth_file]) for truth_file in truth_files))
+                     for vcf_file, truth_files in jobs]
+        header_columns = ['VCF File', 'Truth File', 'Sample', 'Result', 'Expected', 'Found', 'Missing']
+    else:
+        verify_function = verify_vcf
+        pool_jobs = [(vcf_file,
+                      dict((truth_file, test_variant_sets[truth_file]) for truth_file in truth_files
+                           if truth_file in test_variant_sets),
+                      sorted(set(truth_file for truth_file in truth_files if truth_file in bundle_files)))
+                     for vcf_file, truth_files in jobs]
+        header_columns = ['VCF File', 'Truth File', 'Result', 'Expected', 'Found', 'Missing']
+
+    pool = multiprocessing.Pool(max(1, min(processes, len(pool_jobs))))
+
+    try:
+        lines = ['\t'.join(header_columns)]
+
+        for results in instrumentation.map_counted(pool.imap, verify_function, pool_jobs):
+            for row in results:
+                missing_column = ','.join(':'.join(var) for var in row[-1])
+                lines.append('\t'.join([str(value) for value in row[:-1]] + [missing_column]))
+    finally:
+        pool.close()
+        pool.join()
+
+    with metrics.stage('write_output'):
+        if output:
+            with open(output, 'w') as outfile_obj:
+                outfile_obj.write('\n'.join(lines) + '\n')
+
+            print 'Output file created. It can be found at', output
+        else:
+            print '\n'.join(lines)
+
+
+def verify_bundle(bundle_file, vcf_file):
+    """
+    This function prints 'Pass' to the screen if the variants of the truth bundle are found in the VCF variants;
+    otherwise, it prints the first missing variants and 'Fail'.
+
+    :param bundle_file: The truth bundle
+    :type bundle_file: str
+    :param vcf_file: The VCF file
+    :type vcf_file: str
+
+    :rtype: void
+    """
+    expected, found, missing = find_bundle_variants(vcf_file, [bundle_file])[bundle_file]
+
+    print 'VCF File:', vcf_file.split('/')[-1]
+    print 'Truth Bundle:', bundle_file.split('/')[-1]
+    print 'Truth Variants:', expected
+    print 'Found:', found
+
+    if missing:
+        print 'Missing:', ', '.join(':'.join(var) for var in missing[:MAX_MISSING_PRINTED]) + \
+            (', ...' if len(missing) > MAX_MISSING_PRINTED else '')
+        print 'Fail\n'
+    else:
+        print 'Pass\n'
+
+
+def verify_genotypes(test_file, vcf_file):
+    """
+    This function prints, for each member, 'Pass' if the expected genotypes of the truth file are the genotypes of the
+    member in the VCF file; otherwise, it prints the genotypes that differ and 'Fail'.  It then prints 'Pass' if every
+    member passes, and 'Fail' otherwise.
+
+    :param test_file: The truth file with the expected genotypes
+    :type test_file: str
+    :param vcf_file: The multi-sample VCF file
+    :type vcf_file: str
+
+    :rtype: void
+    """
+    with instrumentation.METRICS.stage('read_truth'):
+        test_genotypes = get_test_genotypes(test_file)
+
+    instrumentation.METRICS.count('truth_files')
+    instrumentation.METRICS.count('truth_variants', len(test_genotypes))
+
+    results = verify_vcf_genotypes((vcf_file, {test_file: test_genotypes}))
+
+    print 'VCF File:', vcf_file.split('/')[-1]
+    print 'Truth File:', test_file.split('/')[-1]
+
+    for _, _, sample, result, expected, found, missing in results:
+        print '{}: {} ({} of {} genotypes)'.format(sample, result, found, expected)
+
+        for var in missing:
+            print '\t' + ':'.join(var)
+
+    if all(result[3] == 'Pass' for result in results):
+        print 'Pass\n'
+    else:
+        print 'Fail\n'
+
+
+def verify(truth_patterns, vcf_patterns, manifest=None, processes=1, output=None, genotypes=False):
+    """
+    This function prints 'Pass' to the screen if the test variants are found in the VCF variants; otherwise, it prints
+    'Fail'.  In batch mode (a manifest, or more than one truth file or VCF file), it writes a table with one row per
+    truth file and VCF file pair instead.
+
+    :param truth_patterns: The truth files or glob patterns
+    :type truth_patterns: list
+    :param vcf_patterns: The VCF files or glob patterns
+    :type vcf_patterns: list
+    :param manifest: Tab delimited file with a truth file and a VCF file per line, or None
+    :type manifest: str
+    :param processes: Batch mode: number of VCF files processed in parallel
+    :type processes: int
+    :param output: Batch mode: the results table; None for screen output
+    :type output: str
+    :param genotypes: True to check the expected genotype of each member in a multi-sample VCF file (see
+    get_test_genotypes())
+    :type genotypes: bool
+
+    :raises ValueError: If there is no manifest and no truth file or no VCF file
     :rtype: void
     """
-    test_variant_set, chromosome = get_test_variants()
+    truth_files = expand_patterns(truth_patterns)
+    vcf_files = expand_patterns(vcf_patterns)
+
+    if manifest or len(truth_files) > 1 or len(vcf_files) > 1:
+        jobs = get_batch_jobs(manifest, truth_files, vcf_files)
+        run_batch(jobs, processes, output, genotypes)
+        return
+
+    if not truth_files or not vcf_files:
+        raise ValueError('a truth file and a vcf file, or a manifest, are required')
+
+    test_file = truth_files[0]
+    vcf_file = vcf_files[0]
+
+    if truth_bundle.is_truth_bundle(test_file):
+        if genotypes:
+            raise ValueError('{} is a truth bundle, which has no genotypes'.format(test_file))
+
+        verify_bundle(test_file, vcf_file)
+        return
+
+    if genotypes:
+        verify_genotypes(test_file, vcf_file)
+        return
+
+    with instrumentation.METRICS.stage('read_truth'):
+        test_variant_set = get_test_variants(test_file)
 
-    vcf_variant_set = get_vcf_variants(chromosome)
+    instrumentation.METRICS.count('truth_files')
+    instrumentation.METRICS.count('truth_variants', len(test_variant_set))
+
+    vcf_variant_set = find_vcf_variants(vcf_file, test_variant_set)
 
     print 'VCF File:', vcf_file.split('/')[-1]
     print 'Truth File:', test_file.split('/')[-1]
@@ -112,4 +853,55 @@ def main():
         print 'Fail\n'
 
 
-main()
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It verifies the VCF files against the truth files (see verify()).
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--truth", nargs='+', help="The truth file(s) or glob pattern(s)")
+    parser.add_argument("-v", "--vcf", nargs='+', help="The vcf file(s) or glob pattern(s)")
+    parser.add_argument("-m", "--manifest",
+                        help="Batch mode: tab delimited file with a truth file and a vcf file per line")
+    parser.add_argument("-o", "--output", help="Batch mode: the results table; default is screen output")
+    parser.add_argument("-p", "--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="Batch mode: number of VCF files processed in parallel; default is the number of CPUs")
+    parser.add_argument("-g", "--genotypes", action='store_true',
+                        help="Check the expected genotype of each member of a multi-sample (e.g. trio) VCF file: the "
+                             "columns after the filter column of the truth files are sample=GT")
+    parser.add_argument("--metrics", help="Write the stage times and counters of the run to this file: Prometheus "
+                                          "text if it ends in .prom or .txt, JSON otherwise; default is no metrics "
+                                          "file")
+    parser.add_argument("--profile", action='store_true',
+                        help="Run under cProfile and write the profile (*.prof) and a report (*.profile.txt) next to "
+                             "the output file, or in the current directory")
+
+    args = parser.parse_args()
+
+    if args.metrics is not None:
+        instrumentation.METRICS.enable()
+
+    def run_args():
+        verify(args.truth or [], args.vcf or [], args.manifest, args.processes, args.output, args.genotypes)
+
+    try:
+        if args.profile:
+            report_prefix = os.path.splitext(args.output)[0] if args.output else 'verify_variants'
+            instrumentation.run_profiled(run_args, report_prefix)
+        else:
+            run_args()
+    except ValueError as error:
+        parser.error(error)
+
+    if args.metrics is not None:
+        instrumentation.METRICS.write(args.metrics, 'verify_variants')
+
+
+if __name__ == '__main__':
+    main()
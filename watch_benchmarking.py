@@ -0,0 +1,316 @@
+#!/usr/bin/python
+
+"""
+This script keeps the benchmarking metrics file of benchmarking_truth_set.py up to date while the benchmarking workflow
+writes its results, so the metrics are ready seconds after each hap.py run.
+
+It runs until it is stopped, and polls the input directory: when the *.extended.csv and *_indelSizeDistribution.txt
+files (or the annotated VCF files, with -a) of a case are new or changed, only these files are parsed again, and the
+output files are written again from the metrics of all the cases kept in memory.  Each output file is written to a
+temporary file and renamed, so readers never see a partly written output file.
+
+A file is parsed once it has not been modified for a few seconds (--settle), so files that hap.py is still writing are
+not parsed.  Cases without all their input files, or without a number of bases (or callable bases, with
+--callable-bases), are left out of the output files until they are complete.  When the number of bases file (or the
+BED manifest) changes, all the input files are parsed again.
+
+The input directory is polled, with os.walk, rather than watched with inotify, which needs a package outside the
+standard library; a poll of a results directory of a few thousand cases takes well under a second.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import benchmarking_truth_set
+import metrics_engine
+
+POLL_SECONDS = 10
+SETTLE_SECONDS = 5
+
+
+def get_signature(path):
+    """
+    This function returns the size and the modification time of a file.
+
+    :param path: The file
+    :type path: str
+
+    :return: Tuple of (size, modification time)
+    :rtype: tuple
+    """
+    stat = os.stat(path)
+
+    return stat.st_size, stat.st_mtime
+
+
+class Watcher(object):
+    """
+    The metrics of the cases of an input directory, updated by each poll.
+    """
+
+    def __init__(self, input_dir, output_dir='.', annotated_vcf=False, processes=1, bed_manifest=None,
+                 bed_cache=None, output_formats=('tsv',), settle_seconds=SETTLE_SECONDS,
+                 confidence_level=metrics_engine.DEFAULT_CONFIDENCE_LEVEL, callable_bases_file=None):
+        """
+        :param input_dir: The input directory
+        :type input_dir: str
+        :param output_dir: The output directory
+        :type output_dir: str
+        :param annotated_vcf: True to read the annotated VCF files instead of the extended.csv and
+        indelSizeDistribution.txt files
+        :type annotated_vcf: bool
+        :param processes: The number of input files parsed in parallel
+        :type processes: int
+        :param bed_manifest: The BED manifest, or None to read the number of bases file of the input directory
+        :type bed_manifest: str
+        :param bed_cache: The cache directory of the number of bases of the BED files, or None
+        :type bed_cache: str
+        :param output_formats: The output formats: tsv, csv and/or jsonl
+        :type output_formats: list
+        :param settle_seconds: The time since the last modification of an input file before it is parsed
+        :type settle_seconds: float
+        :param confidence_level: The confidence level of the intervals of the long form outputs
+        :type confidence_level: float
+        :param callable_bases_file: The callable bases file written by callable_bases.py, or None to compute TN from
+        the number of bases
+        :type callable_bases_file: str
+        """
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.annotated_vcf = annotated_vcf
+        self.processes = processes
+        self.bed_manifest = bed_manifest
+        self.bed_cache = bed_cache
+        self.output_formats = output_formats
+        self.settle_seconds = settle_seconds
+        self.confidence_level = confidence_level
+        self.callable_bases_file = callable_bases_file
+
+        self.parsed = dict()  # path of the input file -> metrics returned by parse_file()
+        self.signatures = dict()  # path of the input file -> (size, modification time) when it was parsed
+        self.num_bases_signature = None
+        self.num_bases_whole_exome_dict = dict()
+        self.num_bases_coding_exons_dict = dict()
+        self.output_cases = list()
+        self.callable_bases_signature = None
+        self.callable_whole_exome_dict = dict()
+        self.callable_coding_exons_dict = dict()
+
+    def update_number_of_bases(self, num_bases_file):
+        """
+        This function reads the number of bases of the cases again if the number of bases file (or the BED manifest)
+        changed.  All the input files are then parsed again, since their metrics depend on the number of bases; the
+        metrics parsed before are kept until then.
+
+        :param num_bases_file: The number of bases file found in the input directory, or None
+        :type num_bases_file: str
+
+        :rtype: void
+        """
+        source = self.bed_manifest or num_bases_file
+
+        if source is None:
+            return
+
+        signature = (source, get_signature(source))
+
+        if signature == self.num_bases_signature:
+            return
+
+        self.num_bases_whole_exome_dict, self.num_bases_coding_exons_dict = benchmarking_truth_set.get_number_of_bases(
+            num_bases_file, self.bed_manifest, self.bed_cache)
+        self.num_bases_signature = signature
+        self.signatures = dict()
+
+    def update_callable_bases(self):
+        """
+        This function reads the callable bases of the cases again if the callable bases file changed.  Until the file
+        exists, no case has callable bases.
+
+        :return: True if the callable bases changed
+        :rtype: bool
+        """
+        if self.callable_bases_file is None:
+            return False
+
+        if os.path.exists(self.callable_bases_file):
+            signature = get_signature(self.callable_bases_file)
+        else:
+            signature = None
+
+        if signature == self.callable_bases_signature:
+            return False
+
+        if signature is None:
+            self.callable_whole_exome_dict, self.callable_coding_exons_dict = dict(), dict()
+        else:
+            self.callable_whole_exome_dict, self.callable_coding_exons_dict = \
+                benchmarking_truth_set.create_base_num_dicts(self.callable_bases_file)
+
+        self.callable_bases_signature = signature
+
+        return True
+
+    def poll(self):
+        """
+        This function parses the input files that are new or changed, and writes the output files again if the metrics
+        of a case changed, or cases were added or removed.
+
+        :return: List of the cases whose input files were parsed
+        :rtype: list
+        """
+        num_bases_file, cases = benchmarking_truth_set.discover_cases(
+            self.input_dir, benchmarking_truth_set.get_required_suffixes(self.annotated_vcf))
+        self.update_number_of_bases(num_bases_file)
+        callable_bases_changed = self.update_callable_bases()
+        now = time.time()
+        jobs = list()
+        updated_cases = list()
+        complete_cases = list()
+
+        for case_name in sorted(cases):
+            case_files = cases[case_name]
+
+            if benchmarking_truth_set.get_missing_suffixes(case_files.values(), self.annotated_vcf) or \
+                    case_name not in self.num_bases_whole_exome_dict or \
+                    case_name not in self.num_bases_coding_exons_dict:
+                continue
+
+            if self.callable_bases_file is not None and (case_name not in self.callable_whole_exome_dict or
+                                                         case_name not in self.callable_coding_exons_dict):
+                continue
+
+            complete_cases.append(case_name)
+            signatures = dict((path, get_signature(path)) for path in case_files.values())
+
+            if any(now - mtime < self.settle_seconds for _, mtime in signatures.values()):
+                continue  # still being written; the metrics parsed before, if any, are kept until the next poll
+
+            case_jobs = [job for job in benchmarking_truth_set.get_jobs(case_files, case_name,
+                                                                        self.num_bases_whole_exome_dict,
+                                                                        self.num_bases_coding_exons_dict)
+                         if self.signatures.get(job[0]) != signatures[job[0]]]
+
+            if case_jobs:
+                jobs.extend(case_jobs)
+                updated_cases.append(case_name)
+
+                for job in case_jobs:
+                    self.signatures[job[0]] = signatures[job[0]]
+
+        if jobs:
+            self.parsed.update(benchmarking_truth_set.parse_files(jobs, processes=self.processes))
+
+        # forget the input files that were removed
+        paths = set(path for case_files in cases.values() for path in case_files.values())
+
+        for path in set(self.parsed) - paths:
+            del self.parsed[path]
+            self.signatures.pop(path, None)
+
+        output_cases = [case_name for case_name in complete_cases
+                        if all(path in self.parsed for path in cases[case_name].values())]
+
+        if updated_cases or output_cases != self.output_cases or (callable_bases_changed and output_cases):
+            case_metrics = [benchmarking_truth_set.get_case_metrics(cases[case_name], self.parsed, self.annotated_vcf)
+                            for case_name in output_cases]
+
+            if self.callable_bases_file is not None:
+                case_metrics = benchmarking_truth_set.apply_callable_bases(case_metrics, self.callable_whole_exome_dict,
+                                                                           self.callable_coding_exons_dict)
+            output_file = benchmarking_truth_set.get_output_file(self.output_dir)
+            benchmarking_truth_set.write_outputs(case_metrics, output_file, self.output_formats,
+                                                 self.confidence_level)
+            self.output_cases = output_cases
+
+            print '{} Output file updated with {} cases ({} parsed again). It can be found at {}'.format(
+                time.strftime('%Y-%m-%d %H:%M:%S'), len(output_cases), len(updated_cases), output_file)
+            sys.stdout.flush()
+
+        return updated_cases
+
+    def watch(self, poll_seconds=POLL_SECONDS, polls=None):
+        """
+        This function polls the input directory until it is stopped, or for a number of polls.
+
+        :param poll_seconds: The time between two polls
+        :type poll_seconds: float
+        :param polls: The number of polls, or None to poll until the process is stopped
+        :type polls: int
+
+        :rtype: void
+        """
+        poll_number = 0
+
+        while polls is None or poll_number < polls:
+            if poll_number:
+                time.sleep(poll_seconds)
+
+            self.poll()
+            poll_number += 1
+
+
+########################################################################################################################
+#
+#   MAIN
+#
+########################################################################################################################
+def main():
+    """
+    This is the main function.  It keeps the benchmarking metrics file of the input directory up to date.
+
+    :rtype: void
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", help="The input directory; default is current directory", default='.')
+    parser.add_argument("-o", "--output", help="The output directory; default is current directory", default='.')
+    parser.add_argument("-a", "--annotated-vcf", action='store_true',
+                        help="Read the annotated VCF files written by hap.py instead of the extended.csv and "
+                             "indelSizeDistribution.txt files")
+    parser.add_argument("-p", "--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="The number of input files parsed in parallel; default is the number of CPUs")
+    parser.add_argument("-b", "--bed-manifest",
+                        help="Tab delimited file with the case name, the whole exome BED file and the coding exons BED "
+                             "file of each case; default is the number_of_bases file of the input directory")
+    parser.add_argument("--bed-cache", help="The cache directory of the number of bases of the BED files; default is "
+                                            "no cache")
+    parser.add_argument("-f", "--format", nargs='+', choices=['tsv', 'csv', 'jsonl'], default=['tsv'],
+                        help="The output formats: tsv (the benchmarking metrics file), csv and jsonl (long form "
+                             "tables); default is tsv")
+    parser.add_argument("-n", "--interval", type=float, default=POLL_SECONDS,
+                        help="The seconds between two polls of the input directory; default is {}".format(POLL_SECONDS))
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="The seconds since the last change of an input file before it is parsed; default is "
+                             "{}".format(SETTLE_SECONDS))
+    parser.add_argument("--polls", type=int, help="Stop after this number of polls; default is to run until stopped")
+    parser.add_argument("--confidence-level", type=float, default=metrics_engine.DEFAULT_CONFIDENCE_LEVEL,
+                        help="The confidence level of the Wilson score intervals of precision, recall and NPA in the "
+                             "long form tables; default is {}".format(metrics_engine.DEFAULT_CONFIDENCE_LEVEL))
+    parser.add_argument("--callable-bases",
+                        help="The callable bases file written by callable_bases.py: TN is computed from the callable "
+                             "reference bases of the query gVCF files (the TN column is named 'TN = "
+                             "CallableReferenceBases - FN'), and cases without callable bases are left out")
+
+    args = parser.parse_args()
+
+    if not 0 < args.confidence_level < 1:
+        parser.error('the confidence level must be between 0 and 1')
+
+    watcher = Watcher(args.input, args.output, args.annotated_vcf, args.processes, args.bed_manifest, args.bed_cache,
+                      args.format, args.settle, args.confidence_level, args.callable_bases)
+
+    try:
+        watcher.watch(args.interval, args.polls)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as error:
+        print 'Error:'
+        print error
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()